@@ -20,5 +20,8 @@ __version__ = "1.1.0"
 
 
 from . import errors  # noqa: F401
+from .async_store_client import AsyncStoreClient  # noqa: F401
+from .config import ClientConfig  # noqa: F401
+from .discharge_cache import DischargeCache  # noqa: F401
 from .http_client import HTTPClient  # noqa: F401
 from .store_client import StoreClient  # noqa: F401
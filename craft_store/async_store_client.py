@@ -0,0 +1,318 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Craft Store AsyncStoreClient."""
+
+import asyncio
+import functools
+import logging
+import pathlib
+from typing import Awaitable, Callable, Dict, Optional, Sequence, Union
+
+import requests
+
+from . import endpoints, errors, protocol
+from .auth import Auth
+from .concurrency import ConcurrencyLimiter
+from .config import ClientConfig
+from .discharge_cache import DischargeCache
+from .hedging import Hedger
+from .http_client import (
+    HEDGED_METHODS,
+    build_limiter,
+    build_retry_budget,
+    get_default_retries,
+)
+from .models import WhoamiModel
+from .retry_budget import RetryBudget
+from .scheduling import RequestScheduler
+from .store_client import _build_bakery_client, _candid_discharge
+from .transport import AsyncHTTPXTransport, AsyncTransport
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncStoreClient:
+    """Encapsulates API calls for the Snap Store or Charmhub with asyncio.
+
+    This is the asyncio counterpart of :class:`.store_client.StoreClient`,
+    both drive the same :mod:`.protocol` core. Candid discharges, which may
+    require user interaction, and reading credentials, from the keyring or
+    a credential broker, run in the default executor.
+    """
+
+    def __init__(
+        self,
+        *,
+        base_url: str,
+        endpoints: endpoints.Endpoints,  # pylint: disable=W0621
+        application_name: str,
+        user_agent: str,
+        environment_auth: Optional[str] = None,
+        discharge_cache: Optional[DischargeCache] = None,
+        agent_username: Optional[str] = None,
+        agent_key: Optional[str] = None,
+        transport: Optional[AsyncTransport] = None,
+        hedger: Optional[Hedger] = None,
+        limiter: Optional[ConcurrencyLimiter] = None,
+        scheduler: Optional[RequestScheduler] = None,
+        retry_budget: Optional[RetryBudget] = None,
+        credential_broker: Optional[Union[str, pathlib.Path]] = None,
+        config: Optional[ClientConfig] = None,
+    ) -> None:
+        """Initialize the Async Store Client.
+
+        :param base_url: the base url of the API endpoint.
+        :param endpoints: :data:`.endpoints.CHARMHUB` or :data:`.endpoints.SNAP_STORE`.
+        :param application_name: the name application using this class, used for the keyring.
+        :param user_agent: User-Agent header to use for HTTP(s) requests.
+        :param environment_auth: environment variable to use for credentials.
+        :param discharge_cache: cache to reuse Candid discharge tokens across logins.
+        :param agent_username: Candid agent username for non interactive logins.
+        :param agent_key: base64 encoded private key for agent_username.
+        :param transport: :class:`.transport.AsyncTransport` to send requests with,
+                          defaults to a :class:`.transport.AsyncHTTPXTransport`.
+        :param hedger: :class:`.hedging.Hedger` to hedge idempotent requests with.
+        :param limiter: :class:`.concurrency.ConcurrencyLimiter` adapting the
+                        amount of concurrent requests to the store capacity.
+        :param scheduler: :class:`.scheduling.RequestScheduler` ordering
+                          requests by priority class.
+        :param retry_budget: :class:`.retry_budget.RetryBudget` for retries.
+        :param credential_broker: socket of a
+                                  :class:`.credential_broker.CredentialBroker`
+                                  to read credentials from.
+        :param config: :class:`.config.ClientConfig` to tune the client with,
+                       defaults to :meth:`.config.ClientConfig.from_env`.
+                       limiter and retry_budget take precedence over those
+                       the config sets up.
+
+        :raises ValueError: if only one of agent_username or agent_key is set.
+        """
+        self._bakery_client = _build_bakery_client(
+            user_agent=user_agent,
+            identity=agent_username or application_name,
+            discharge_cache=discharge_cache,
+            agent_username=agent_username,
+            agent_key=agent_key,
+        )
+        if config is None:
+            config = ClientConfig.from_env()
+        self.config = config
+        if limiter is None:
+            limiter = build_limiter(config)
+        if retry_budget is None:
+            retry_budget = build_retry_budget(config)
+        if transport is None:
+            transport = AsyncHTTPXTransport(
+                retries=get_default_retries(retry_budget, config)
+            )
+        self._transport = transport
+        self._hedger = hedger
+        self._limiter = limiter
+        self._scheduler = scheduler
+        self._retry_budget = retry_budget
+        self._static_headers = protocol.StaticHeaders(transport.headers)
+        self._static_headers.set("User-Agent", user_agent)
+        self._base_url = base_url
+        self._endpoints = endpoints
+
+        self._auth = Auth(
+            application_name,
+            base_url,
+            environment_auth=environment_auth,
+            credential_broker=credential_broker,
+        )
+
+    @property
+    def _auth_header(self) -> Optional[str]:
+        return self._static_headers.authorization
+
+    async def _install_auth_header(self) -> None:
+        if self._auth_header is None:
+            loop = asyncio.get_running_loop()
+            credentials = await loop.run_in_executor(None, self._auth.get_credentials)
+            self._static_headers.install_auth(credentials)
+
+    def _invalidate_auth_header(self) -> None:
+        self._static_headers.invalidate_auth()
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> requests.Response:
+        protocol.prepare_request(
+            method,
+            url,
+            params,
+            headers,
+            kwargs,
+            static_headers=self._static_headers,
+            timeout=self.config.timeout,
+            log=logger,
+        )
+        send: Callable[[], Awaitable[requests.Response]] = functools.partial(
+            self._send_request, method, url, params, headers, **kwargs
+        )
+        if self._limiter is not None:
+            send = functools.partial(self._limiter.async_run, send)
+        try:
+            if self._scheduler is not None:
+                return await self._scheduler.async_run(send)
+            return await send()
+        except errors.StoreServerError as store_error:
+            if protocol.is_auth_expired(store_error):
+                self._invalidate_auth_header()
+            raise
+
+    async def _send_request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, str]],
+        headers: Optional[Dict[str, str]],
+        **kwargs,
+    ) -> requests.Response:
+        def send() -> Awaitable[requests.Response]:
+            return self._transport.request(
+                method, url, params=params, headers=headers, **kwargs
+            )
+
+        if (
+            self._hedger is not None
+            and method.upper() in HEDGED_METHODS
+            and not kwargs.get("stream")
+        ):
+            response = await self._hedger.async_run(
+                send,
+                acquire_slot=protocol.hedge_slot_acquirer(
+                    self._limiter, self._scheduler
+                ),
+            )
+        else:
+            response = await send()
+        return protocol.handle_response(response, self._retry_budget)
+
+    async def _send_unauthenticated(
+        self, request: protocol.Request
+    ) -> requests.Response:
+        return await self._request(request.method, request.url, **request.as_kwargs())
+
+    async def _send(self, request: protocol.Request) -> requests.Response:
+        return await self.request(request.method, request.url, **request.as_kwargs())
+
+    async def _candid_discharge(self, macaroon: str) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, _candid_discharge, self._bakery_client, macaroon
+        )
+
+    async def login(
+        self,
+        *,
+        permissions: Sequence[str],
+        description: str,
+        ttl: int,
+        packages: Optional[Sequence[endpoints.Package]] = None,
+        channels: Optional[Sequence[str]] = None,
+    ) -> str:
+        """Obtain credentials to perform authenticated requests.
+
+        Refer to :meth:`.store_client.StoreClient.login`.
+
+        :param permissions: Set of permissions to grant the login.
+        :param description: Client description to refer to from the Store.
+        :param ttl: time to live for the credential, in other words, how
+                    long until it expires, expressed in seconds.
+        :param packages: Sequence of packages to limit the credentials to.
+        :param channels: Sequence of channel names to limit the credentials to.
+        """
+        flow = protocol.login(
+            base_url=self._base_url,
+            store_endpoints=self._endpoints,
+            permissions=permissions,
+            description=description,
+            ttl=ttl,
+            packages=packages,
+            channels=channels,
+        )
+
+        self._invalidate_auth_header()
+        store_authorized_macaroon = await protocol.async_run(
+            flow, self._send_unauthenticated, self._candid_discharge
+        )
+
+        # Save the authorization token.
+        self._auth.set_credentials(store_authorized_macaroon)
+
+        return self._auth.encode_credentials(store_authorized_macaroon)
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """Perform an authenticated request.
+
+        :param method: HTTP method used for the request.
+        :param url: URL to request with method.
+        :param params: Query parameters to be sent along with the request.
+        :param headers: Headers to be sent along with the request.
+
+        :raises errors.StoreServerError: for error responses.
+        :raises errors.NetworkError: for lower level network issues.
+        :raises errors.NotLoggedIn: if not logged in.
+
+        :return: Response from the request.
+        """
+        await self._install_auth_header()
+        return await self._request(
+            method, url, params=params, headers=headers, **kwargs
+        )
+
+    async def whoami(self) -> WhoamiModel:
+        """Return the identity of the credentials.
+
+        See :attr:`.endpoints.Endpoints.whoami`.
+
+        :raises pydantic.ValidationError: if the response lacks the account.
+        """
+        flow = protocol.whoami(base_url=self._base_url, store_endpoints=self._endpoints)
+        return await protocol.async_run(flow, self._send, self._candid_discharge)
+
+    def logout(self) -> None:
+        """Clear credentials.
+
+        :raises errors.NotLoggedIn: if not logged in.
+        """
+        self._invalidate_auth_header()
+        self._auth.del_credentials()
+
+    async def close(self) -> None:
+        """Close the transport and stop the hedger.
+
+        A transport or hedger shared with other clients is closed as well,
+        close the client when done with them all.
+        """
+        await self._transport.close()
+        if self._hedger is not None:
+            self._hedger.close()
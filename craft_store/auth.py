@@ -19,13 +19,16 @@
 import base64
 import logging
 import os
-from typing import Dict, Optional, Tuple
+import pathlib
+from typing import Dict, Optional, Tuple, Union
 
 import keyring
 import keyring.backend
 import keyring.errors
 
 from . import errors
+from .credential_broker import BrokerClient
+from .credentials import CredentialsInfo, inspect_credentials
 
 logger = logging.getLogger(__name__)
 
@@ -68,6 +71,10 @@ class Auth:
     Credentials are base64 encoded into the keyring and decoded on
     retrieval.
 
+    If credential_broker is set, credentials are read from the
+    :class:`.credential_broker.CredentialBroker` listening on it, falling
+    back to the keyring if unavailable, and changes are sent to it.
+
     :ivar application_name: name of the application using this library.
     :ivar host: specific host for the store used.
     """
@@ -77,15 +84,20 @@ class Auth:
         application_name: str,
         host: str,
         environment_auth: Optional[str] = None,
+        credential_broker: Optional[Union[str, pathlib.Path]] = None,
     ) -> None:
         """Initialize Auth.
 
         :param application_name: name of the application using this library.
         :param host: specific host for the store used.
         :param environment_auth: environment variable used for authentication.
+        :param credential_broker: socket of a credential broker to use.
         """
         self.application_name = application_name
         self.host = host
+        self._broker: Optional[BrokerClient] = None
+        if credential_broker is not None:
+            self._broker = BrokerClient(credential_broker)
 
         environment_auth_value = None
         if environment_auth:
@@ -124,9 +136,20 @@ class Auth:
         self._keyring.set_password(
             self.application_name, self.host, encoded_credentials
         )
+        if self._broker is not None:
+            try:
+                self._broker.set_credentials(credentials)
+            except errors.CredentialBrokerUnavailable as broker_error:
+                logger.debug("Credentials not sent to broker: %s", broker_error)
 
     def get_credentials(self) -> str:
-        """Retrieve credentials from the keyring."""
+        """Retrieve credentials from the broker if set, or the keyring."""
+        if self._broker is not None:
+            try:
+                return self._broker.get_credentials()
+            except errors.CredentialBrokerUnavailable as broker_error:
+                logger.debug("Falling back to the keyring: %s", broker_error)
+
         logger.debug(
             "Retrieving credentials for %r on %r from keyring %r.",
             self.application_name,
@@ -151,6 +174,14 @@ class Auth:
         credentials = self.decode_credentials(encoded_credentials_string)
         return credentials
 
+    def inspect_credentials(self) -> CredentialsInfo:
+        """Return the restrictions carried by the stored credentials.
+
+        :raises errors.NotLoggedIn: if credentials are not found.
+        :raises errors.CredentialsNotParseable: if credentials are not a macaroon.
+        """
+        return inspect_credentials(self.get_credentials())
+
     def del_credentials(self) -> None:
         """Delete credentials from the keyring."""
         # Try to get the credentials first to see if there are any,
@@ -164,3 +195,8 @@ class Auth:
             self._keyring.name,
         )
         self._keyring.delete_password(self.application_name, self.host)
+        if self._broker is not None:
+            try:
+                self._broker.clear()
+            except errors.CredentialBrokerUnavailable as broker_error:
+                logger.debug("Credentials not cleared from broker: %s", broker_error)
@@ -0,0 +1,352 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Record and replay HTTP interactions for offline, deterministic runs.
+
+A :class:`Cassette` holds request and response pairs, recorded with a
+:class:`RecordingTransport` wrapping a live transport and served back by a
+:class:`ReplayTransport` without touching the network. Macaroons are never
+written to a cassette: the Authorization, Macaroons and Cookie request
+headers and the Set-Cookie response headers are redacted like in debug
+logs, and the macaroons and Candid discharge tokens of JSON response
+bodies are replaced by placeholders, valid ones so that a replayed login
+goes through.
+"""
+
+import base64
+import collections
+import dataclasses
+import datetime
+import http.client
+import json
+import pathlib
+import threading
+import time
+from typing import Any, Deque, Dict, List, MutableMapping, Optional, Tuple, Union
+
+import requests
+import requests.structures
+from requests.adapters import Retry
+
+from . import errors, protocol
+from .transport import Transport
+
+CASSETTE_VERSION = 1
+"""Version of the on-disk cassette format."""
+
+REDACTED_MACAROON: Dict[str, Any] = {
+    "m": {
+        "i": "redacted",
+        "s64": "2g8pWqnJvUInZ6ZcO86BZAtw9n-43BYxXsFCxym2oZQ",
+        "l": "redacted",
+    },
+    "v": 3,
+    "ns": "",
+}
+"""Macaroon replacing those of recorded responses.
+
+A valid macaroon, without caveats to discharge, with root key, id and
+location ``redacted``.
+"""
+
+_REDACTED_TOKEN = "redacted"
+
+
+def _prepare_url(url: str, params: Optional[Dict[str, str]]) -> str:
+    prepared = requests.PreparedRequest()
+    prepared.prepare_url(url, params)
+    return prepared.url
+
+
+def _redact_body(content: bytes) -> bytes:
+    """Return content with the secrets of a JSON object body redacted.
+
+    Macaroons are found under ``macaroon`` keys for the store and
+    ``Macaroon`` keys for Candid discharges, serialized as a string or an
+    object, and discharge tokens in Candid responses with a ``kind``.
+    """
+    try:
+        payload = json.loads(content)
+    except ValueError:
+        return content
+    if not isinstance(payload, dict):
+        return content
+    redacted = False
+    for key in ("macaroon", "Macaroon"):
+        if key in payload:
+            if isinstance(payload[key], dict):
+                payload[key] = REDACTED_MACAROON
+            else:
+                payload[key] = json.dumps(REDACTED_MACAROON)
+            redacted = True
+    if "kind" in payload:
+        if "token" in payload:
+            payload["token"] = _REDACTED_TOKEN
+            redacted = True
+        if "token64" in payload:
+            payload["token64"] = base64.b64encode(_REDACTED_TOKEN.encode()).decode()
+            redacted = True
+    if not redacted:
+        return content
+    return json.dumps(payload).encode()
+
+
+@dataclasses.dataclass(frozen=True)
+class Interaction:
+    """A request sent and the response received for it.
+
+    :param method: HTTP method used for the request.
+    :param url: URL requested, including query parameters.
+    :param request_headers: redacted headers sent with the request.
+    :param status_code: status code of the response.
+    :param headers: headers of the response.
+    :param content: body of the response.
+    :param elapsed: seconds taken to receive the response.
+    """
+
+    method: str
+    url: str
+    request_headers: Dict[str, str]
+    status_code: int
+    headers: Dict[str, str]
+    content: bytes
+    elapsed: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return a JSON serializable representation of the interaction."""
+        data: Dict[str, Any] = {
+            "method": self.method,
+            "url": self.url,
+            "request_headers": self.request_headers,
+            "status": self.status_code,
+            "headers": self.headers,
+            "elapsed": round(self.elapsed, 6),
+        }
+        try:
+            data["body"] = self.content.decode()
+        except UnicodeDecodeError:
+            data["body_b64"] = base64.b64encode(self.content).decode()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Interaction":
+        """Return the interaction represented by data, from :meth:`to_dict`."""
+        if "body_b64" in data:
+            content = base64.b64decode(data["body_b64"])
+        else:
+            content = data["body"].encode()
+        return cls(
+            method=data["method"],
+            url=data["url"],
+            request_headers=data["request_headers"],
+            status_code=data["status"],
+            headers=data["headers"],
+            content=content,
+            elapsed=data["elapsed"],
+        )
+
+    def to_response(self) -> requests.Response:
+        """Return a :class:`requests.Response` replaying the interaction."""
+        prepared = requests.PreparedRequest()
+        prepared.method = self.method
+        prepared.url = self.url
+        prepared.headers = requests.structures.CaseInsensitiveDict(self.request_headers)
+
+        response = requests.Response()
+        response.status_code = self.status_code
+        response.reason = http.client.responses.get(self.status_code, "")
+        response.headers = requests.structures.CaseInsensitiveDict(self.headers)
+        response.url = self.url
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.elapsed = datetime.timedelta(seconds=self.elapsed)
+        response.request = prepared
+        response._content = self.content  # pylint: disable=W0212
+        response._content_consumed = True  # pylint: disable=W0212
+        return response
+
+
+class Cassette:
+    """Ordered collection of recorded :class:`Interaction`.
+
+    :ivar interactions: the recorded interactions, in order.
+    """
+
+    def __init__(self, interactions: Optional[List[Interaction]] = None) -> None:
+        self.interactions: List[Interaction] = list(interactions or [])
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.interactions)
+
+    def append(self, interaction: Interaction) -> None:
+        """Record interaction, safe to call from multiple threads."""
+        with self._lock:
+            self.interactions.append(interaction)
+
+    @classmethod
+    def load(cls, path: Union[str, pathlib.Path]) -> "Cassette":
+        """Load a cassette saved with :meth:`save`.
+
+        :raises errors.CraftStoreError: if the cassette cannot be read.
+        """
+        try:
+            data = json.loads(pathlib.Path(path).read_text())
+        except (OSError, ValueError) as error:
+            raise errors.CraftStoreError(
+                f"Cannot load cassette {str(path)!r}: {error}"
+            ) from error
+        if data.get("version") != CASSETTE_VERSION:
+            raise errors.CraftStoreError(
+                f"Unsupported cassette version {data.get('version')!r} "
+                f"in {str(path)!r}."
+            )
+        return cls([Interaction.from_dict(i) for i in data["interactions"]])
+
+    def save(self, path: Union[str, pathlib.Path]) -> None:
+        """Write the cassette to path as compact JSON."""
+        with self._lock:
+            data = {
+                "version": CASSETTE_VERSION,
+                "interactions": [i.to_dict() for i in self.interactions],
+            }
+        pathlib.Path(path).write_text(json.dumps(data, separators=(",", ":")))
+
+
+class RecordingTransport(Transport):
+    """Transport recording the interactions of another transport.
+
+    Responses are read in full to be recorded, streamed responses included,
+    and returned unchanged.
+
+    :param transport: transport to send requests with.
+    :param cassette: cassette to record interactions into.
+
+    :ivar transport: transport requests are sent with.
+    :ivar cassette: cassette interactions are recorded into.
+    """
+
+    def __init__(self, transport: Transport, cassette: Cassette) -> None:
+        super().__init__(retries=transport.retries)
+        self.transport = transport
+        self.cassette = cassette
+
+    @property
+    def headers(self) -> MutableMapping[str, str]:
+        """Headers of the wrapped transport."""
+        return self.transport.headers
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """Send a request with the wrapped transport and record it."""
+        response = self.transport.request(
+            method, url, params=params, headers=headers, **kwargs
+        )
+        request_headers = dict(self.transport.headers)
+        request_headers.update(headers or {})
+        request_headers = {
+            name: value for name, value in request_headers.items() if value is not None
+        }
+        self.cassette.append(
+            Interaction(
+                method=method.upper(),
+                url=_prepare_url(url, params),
+                request_headers=protocol.redact_headers(request_headers),
+                status_code=response.status_code,
+                headers=protocol.redact_headers(response.headers),
+                content=_redact_body(response.content),
+                elapsed=response.elapsed.total_seconds(),
+            )
+        )
+        return response
+
+    def warmup(self, url: str, connections: int = 1) -> int:
+        """Warm the wrapped transport up, nothing is recorded."""
+        return self.transport.warmup(url, connections)
+
+    def evict_idle(self) -> int:
+        """Evict the idle connections of the wrapped transport."""
+        return self.transport.evict_idle()
+
+    def close(self) -> None:
+        """Close the wrapped transport."""
+        self.transport.close()
+
+
+class ReplayTransport(Transport):
+    """Transport serving the interactions of a cassette, never the network.
+
+    Requests are matched by method and URL, query parameters included.
+    Interactions for the same request are served in recorded order, the
+    last one being served again once all were.
+
+    :param cassette: cassette to serve interactions from.
+    :param replay_latency: sleep for the recorded time of each interaction
+                           instead of responding at once.
+    :param retries: retry policy, unused as responses are final.
+    """
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        *,
+        replay_latency: bool = False,
+        retries: Optional[Retry] = None,
+    ) -> None:
+        super().__init__(retries=retries if retries is not None else Retry(0))
+        self.replay_latency = replay_latency
+        self._headers: MutableMapping[
+            str, str
+        ] = requests.structures.CaseInsensitiveDict()
+        self._lock = threading.Lock()
+        self._queues: Dict[Tuple[str, str], Deque[Interaction]] = {}
+        for interaction in cassette.interactions:
+            key = (interaction.method, interaction.url)
+            self._queues.setdefault(key, collections.deque()).append(interaction)
+
+    @property
+    def headers(self) -> MutableMapping[str, str]:
+        """Headers sent with every request, ignored for matching."""
+        return self._headers
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """Return the recorded response for the request.
+
+        :raises errors.CraftStoreError: if the request was not recorded.
+        """
+        key = (method.upper(), _prepare_url(url, params))
+        with self._lock:
+            queue = self._queues.get(key)
+            if not queue:
+                raise errors.CraftStoreError(
+                    f"No recorded interaction for {key[0]} {key[1]!r}."
+                )
+            interaction = queue.popleft() if len(queue) > 1 else queue[0]
+        if self.replay_latency:
+            time.sleep(interaction.elapsed)
+        return interaction.to_response()
@@ -0,0 +1,276 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Adaptive concurrency limits for bulk requests."""
+
+import asyncio
+import collections
+import contextlib
+import dataclasses
+import logging
+import math
+import threading
+import time
+from typing import Awaitable, Callable, Deque, Optional, Tuple, TypeVar
+
+from . import errors
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CONGESTION_CATEGORIES = frozenset(
+    [errors.ErrorCategory.RETRYABLE, errors.ErrorCategory.THROTTLED]
+)
+"""Error categories signaling the store is overloaded."""
+
+
+@dataclasses.dataclass(frozen=True)
+class AIMDPolicy:
+    """Settings for additive increase, multiplicative decrease of a limit.
+
+    :param initial_limit: concurrent requests allowed at first.
+    :param min_limit: lower bound for the limit.
+    :param max_limit: upper bound for the limit.
+    :param increase: added to the limit for every limit worth of successful
+                     requests, that is once per round trip at full use.
+    :param decrease_factor: factor applied to the limit on congestion.
+    :param latency_tolerance: latencies over this factor of the baseline,
+                              the lowest recent latency, signal congestion.
+    :param latency_slack: seconds over the baseline always tolerated, so
+                          jitter on fast requests is not seen as congestion.
+    :param window: amount of recent latencies to derive the baseline from.
+    :param min_samples: latencies needed before checking latencies.
+    """
+
+    initial_limit: int = 4
+    min_limit: int = 1
+    max_limit: int = 64
+    increase: float = 1.0
+    decrease_factor: float = 0.5
+    latency_tolerance: float = 2.0
+    latency_slack: float = 0.01
+    window: int = 100
+    min_samples: int = 10
+
+    def __post_init__(self) -> None:
+        if not 1 <= self.min_limit <= self.initial_limit <= self.max_limit:
+            raise ValueError(
+                "limits must satisfy 1 <= min_limit <= initial_limit <= max_limit"
+            )
+        if not 0 < self.decrease_factor < 1:
+            raise ValueError("decrease_factor must be between 0 and 1")
+        if self.latency_tolerance <= 1:
+            raise ValueError("latency_tolerance must be greater than 1")
+
+
+@dataclasses.dataclass
+class LimiterStats:
+    """Counters for requests sent through a limiter.
+
+    :ivar requests: requests sent.
+    :ivar congestion: requests that failed with a congestion error.
+    :ivar slow: requests slower than tolerated.
+    :ivar decreases: times the limit was decreased.
+    :ivar waits: requests that waited for a slot.
+    """
+
+    requests: int = 0
+    congestion: int = 0
+    slow: int = 0
+    decreases: int = 0
+    waits: int = 0
+
+
+class ConcurrencyLimiter:
+    """Limit concurrent requests, adapting the limit to the store capacity.
+
+    The limit grows additively while requests succeed with a stable latency
+    and at least half of the limit is in use, and is cut multiplicatively
+    when requests fail with a retryable or throttling error, see
+    :data:`CONGESTION_CATEGORIES`, or take longer than
+    :attr:`AIMDPolicy.latency_tolerance` times the baseline. A single
+    congestion event only cuts the limit once: requests sent before the
+    last decrease do not decrease it again.
+
+    A ConcurrencyLimiter can be shared among clients for a process wide
+    limit, blocking clients sending through :meth:`run` and asyncio ones
+    through :meth:`async_run`.
+
+    :ivar policy: the :class:`AIMDPolicy` in use.
+    :ivar stats: the :class:`LimiterStats` collected.
+    """
+
+    def __init__(self, policy: Optional[AIMDPolicy] = None) -> None:
+        self.policy = policy or AIMDPolicy()
+        self.stats = LimiterStats()
+        self._condition = threading.Condition()
+        self._limit = float(self.policy.initial_limit)
+        self._in_flight = 0
+        self._latencies: Deque[float] = collections.deque(maxlen=self.policy.window)
+        self._last_decrease = -math.inf
+        self._async_waiters: Deque[
+            Tuple[asyncio.AbstractEventLoop, "asyncio.Future[None]"]
+        ] = collections.deque()
+
+    @property
+    def limit(self) -> int:
+        """Concurrent requests currently allowed."""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        """Requests currently sent."""
+        return self._in_flight
+
+    def _acquire(self) -> None:
+        with self._condition:
+            if self._in_flight >= int(self._limit):
+                self.stats.waits += 1
+                self._condition.wait_for(lambda: self._in_flight < int(self._limit))
+            self._in_flight += 1
+            self.stats.requests += 1
+
+    async def _async_acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        waited = False
+        while True:
+            with self._condition:
+                if self._in_flight < int(self._limit):
+                    self._in_flight += 1
+                    self.stats.requests += 1
+                    return
+                if not waited:
+                    self.stats.waits += 1
+                    waited = True
+                waiter = (loop, loop.create_future())
+                self._async_waiters.append(waiter)
+            try:
+                await waiter[1]
+            finally:
+                with self._condition:
+                    with contextlib.suppress(ValueError):
+                        self._async_waiters.remove(waiter)
+
+    def _notify(self) -> None:
+        """Wake the threads and tasks waiting for a slot, lock held."""
+        self._condition.notify_all()
+        while self._async_waiters:
+            loop, future = self._async_waiters.popleft()
+            with contextlib.suppress(RuntimeError):
+                # the loop of an abandoned waiter may be closed.
+                loop.call_soon_threadsafe(_wake, future)
+
+    def try_acquire(self) -> bool:
+        """Take a slot for an extra attempt of a request if one is free.
+
+        Meant for attempts that must not wait, such as hedges: the slot is
+        given back with :meth:`release` and does not adapt the limit.
+        """
+        with self._condition:
+            if self._in_flight >= int(self._limit):
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self) -> None:
+        """Give back a slot taken with :meth:`try_acquire`."""
+        with self._condition:
+            self._in_flight -= 1
+            self._notify()
+
+    def _decrease(self, start: float) -> None:
+        if start < self._last_decrease:
+            return
+        self._limit = max(
+            float(self.policy.min_limit), self._limit * self.policy.decrease_factor
+        )
+        self._last_decrease = time.monotonic()
+        self.stats.decreases += 1
+        logger.debug("Concurrency limit decreased to %d.", self.limit)
+
+    def _release(self, start: float, congested: bool) -> None:
+        latency = time.monotonic() - start
+        with self._condition:
+            self._in_flight -= 1
+            if congested:
+                self.stats.congestion += 1
+                self._decrease(start)
+            else:
+                if len(self._latencies) >= self.policy.min_samples:
+                    baseline = min(self._latencies)
+                    tolerated = max(
+                        baseline * self.policy.latency_tolerance,
+                        baseline + self.policy.latency_slack,
+                    )
+                else:
+                    tolerated = math.inf
+                if latency > tolerated:
+                    self.stats.slow += 1
+                    self._decrease(start)
+                elif (self._in_flight + 1) * 2 >= self._limit:
+                    # only grow when the limit is in use, not when idle.
+                    self._limit = min(
+                        float(self.policy.max_limit),
+                        self._limit + self.policy.increase / self._limit,
+                    )
+                self._latencies.append(latency)
+            self._notify()
+
+    def run(self, send: Callable[[], T]) -> T:
+        """Call send once a slot is available and adapt the limit to its outcome.
+
+        :param send: callable sending a request and returning its response.
+        """
+        self._acquire()
+        start = time.monotonic()
+        try:
+            result = send()
+        except errors.CraftStoreError as error:
+            self._release(start, congested=error.category in CONGESTION_CATEGORIES)
+            raise
+        except BaseException:
+            self._release(start, congested=False)
+            raise
+        self._release(start, congested=False)
+        return result
+
+    async def async_run(self, send: Callable[[], Awaitable[T]]) -> T:
+        """Await send once a slot is available and adapt the limit to its outcome.
+
+        The asyncio counterpart of :meth:`run`, waiting without blocking
+        the event loop.
+
+        :param send: coroutine function sending a request and returning its
+                     response.
+        """
+        await self._async_acquire()
+        start = time.monotonic()
+        try:
+            result = await send()
+        except errors.CraftStoreError as error:
+            self._release(start, congested=error.category in CONGESTION_CATEGORIES)
+            raise
+        except BaseException:
+            self._release(start, congested=False)
+            raise
+        self._release(start, congested=False)
+        return result
+
+
+def _wake(future: "asyncio.Future[None]") -> None:
+    if not future.done():
+        future.set_result(None)
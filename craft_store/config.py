@@ -0,0 +1,261 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tuning of clients, as a whole.
+
+A :class:`ClientConfig` gathers the settings clients are tuned with:
+connection pool size, timeouts, retries, concurrency and cache sizes.
+Named presets fit the usual workloads, environment variables override
+them::
+
+    client = StoreClient(..., config=ClientConfig.from_env("bulk"))
+
+``CRAFT_STORE_PROFILE`` selects the preset when none is given and every
+field can be overridden with ``CRAFT_STORE_<FIELD>``, such as
+``CRAFT_STORE_RETRIES`` or ``CRAFT_STORE_READ_TIMEOUT``; ``none`` unsets
+optional fields.
+"""
+
+import dataclasses
+import math
+import os
+import typing
+from typing import Any, Mapping, Optional, Tuple, Type
+
+from requests.adapters import DEFAULT_POOLSIZE
+
+from .download_cache import DOWNLOAD_CACHE_SIZE
+from .transport import IDLE_CONNECTION_TIMEOUT
+
+REQUEST_TOTAL_RETRIES = 8
+"""Amount of retries for a request."""
+REQUEST_BACKOFF = 0.2
+"""Backoff before retrying a request."""
+REQUEST_BACKOFF_JITTER = 0.5
+"""Fraction of the backoff randomized to spread retries from many clients."""
+REQUEST_POOL_SIZE = DEFAULT_POOLSIZE
+"""Connections kept open per host."""
+
+PROFILE_ENVIRONMENT_VARIABLE = "CRAFT_STORE_PROFILE"
+"""Environment variable selecting the preset of :meth:`ClientConfig.from_env`."""
+
+
+def _get_env_value(
+    environ: Mapping[str, str],
+    environment_var: str,
+    default_value: Any,
+    kind: Type,
+    optional: bool = False,
+) -> Any:
+    """Return the value of environment_var parsed as kind, default_value if unset.
+
+    Numbers are parsed as the kind they are, a float is not truncated into
+    an int and must be finite, and must not be negative. ``none`` is only
+    valid if optional.
+
+    :raises ValueError: naming environment_var if its value is invalid.
+    """
+    environment_value = environ.get(environment_var)
+    if environment_value is None:
+        return default_value
+    if optional and environment_value.lower() == "none":
+        return None
+
+    try:
+        value = kind(environment_value)
+        if kind is float and not math.isfinite(value):
+            raise ValueError(environment_value)
+    except ValueError:
+        raise ValueError(
+            f"{environment_var} set to invalid value {environment_value!r}."
+        ) from None
+
+    if kind in (int, float) and value < 0:
+        raise ValueError(f"{environment_var} set to negative value {value!r}.")
+
+    return value
+
+
+def _field_kind(field: "dataclasses.Field") -> Tuple[Type, bool]:
+    """Return the type of the values of field and whether it is Optional."""
+    kinds = [kind for kind in typing.get_args(field.type) if kind is not type(None)]
+    if kinds:
+        return kinds[0], True
+    return field.type, False
+
+
+@dataclasses.dataclass(frozen=True)
+class ClientConfig:
+    """Settings to tune clients with.
+
+    The defaults keep the behavior of clients without a config.
+
+    :param pool_size: connections kept open per host, the most concurrent
+                      requests to a host that reuse connections.
+    :param max_idle: seconds a pooled connection can stay idle before being
+                     reopened, None to never reopen idle connections.
+    :param health_check_interval: seconds between background checks closing
+                                  idle connections that went stale, None to
+                                  only check them when reused.
+    :param connect_timeout: seconds to wait for a connection, None to wait
+                            for the operating system.
+    :param read_timeout: seconds to wait for data from the store between
+                         reads, None to wait forever.
+    :param retries: retries of a request on network errors and
+                    :attr:`.errors.ErrorCategory.RETRYABLE` responses.
+    :param backoff: backoff factor between retries, in seconds.
+    :param backoff_jitter: fraction of the backoff randomized.
+    :param max_concurrency: bound of the concurrent requests, adapted to the
+                            store capacity with a
+                            :class:`.concurrency.ConcurrencyLimiter`, None
+                            to not limit concurrency.
+    :param retry_budget_ratio: retries allowed per successful request with
+                               a :class:`.retry_budget.RetryBudget`, None
+                               to not bound retries across requests.
+    :param download_cache_path: directory of a
+                                :class:`.download_cache.DownloadCache`,
+                                None to not cache downloads.
+    :param download_cache_size: bound of the size of the download cache,
+                                in bytes.
+    """
+
+    pool_size: int = REQUEST_POOL_SIZE
+    max_idle: Optional[float] = IDLE_CONNECTION_TIMEOUT
+    health_check_interval: Optional[float] = None
+    connect_timeout: Optional[float] = None
+    read_timeout: Optional[float] = None
+    retries: int = REQUEST_TOTAL_RETRIES
+    backoff: float = REQUEST_BACKOFF
+    backoff_jitter: float = REQUEST_BACKOFF_JITTER
+    max_concurrency: Optional[int] = None
+    retry_budget_ratio: Optional[float] = None
+    download_cache_path: Optional[str] = None
+    download_cache_size: int = DOWNLOAD_CACHE_SIZE
+
+    def __post_init__(self) -> None:
+        if self.pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+        for name in (
+            "max_idle",
+            "health_check_interval",
+            "connect_timeout",
+            "read_timeout",
+        ):
+            value = getattr(self, name)
+            if value is not None and value <= 0:
+                raise ValueError(f"{name} must be positive")
+        if self.retries < 0:
+            raise ValueError("retries must not be negative")
+        if self.backoff < 0:
+            raise ValueError("backoff must not be negative")
+        if not 0 <= self.backoff_jitter <= 1:
+            raise ValueError("backoff_jitter must be between 0 and 1")
+        if self.max_concurrency is not None and self.max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        if self.retry_budget_ratio is not None and self.retry_budget_ratio < 0:
+            raise ValueError("retry_budget_ratio must not be negative")
+        if self.download_cache_size < 0:
+            raise ValueError("download_cache_size must not be negative")
+
+    @property
+    def timeout(self) -> Optional[Tuple[Optional[float], Optional[float]]]:
+        """Timeout for requests, as (connect, read), None if neither is set."""
+        if self.connect_timeout is None and self.read_timeout is None:
+            return None
+        return self.connect_timeout, self.read_timeout
+
+    @classmethod
+    def preset(cls, name: str) -> "ClientConfig":
+        """Return the preset called name, from :data:`PRESETS`.
+
+        :raises ValueError: if there is no such preset.
+        """
+        try:
+            return PRESETS[name]
+        except KeyError:
+            raise ValueError(
+                f"Unknown preset {name!r}, expected one of {sorted(PRESETS)!r}."
+            ) from None
+
+    @classmethod
+    def from_env(
+        cls, preset: Optional[str] = None, environ: Optional[Mapping[str, str]] = None
+    ) -> "ClientConfig":
+        """Return a preset with the overrides set in the environment.
+
+        Overrides are validated once, here, then the resulting config is
+        validated as a whole.
+
+        :param preset: name of the preset to start from, defaults to the
+                       one set in ``CRAFT_STORE_PROFILE``, else ``default``.
+        :param environ: environment to read, defaults to :data:`os.environ`.
+
+        :raises ValueError: if the preset is unknown, an override is invalid
+                            or negative, naming its variable, or the
+                            overrides result in an invalid config.
+        """
+        if environ is None:
+            environ = os.environ
+        if preset is None:
+            preset = environ.get(PROFILE_ENVIRONMENT_VARIABLE, "default")
+        config = cls.preset(preset)
+        overrides = {}
+        for field in dataclasses.fields(cls):
+            environment_var = f"CRAFT_STORE_{field.name.upper()}"
+            if environment_var in environ:
+                overrides[field.name] = _get_env_value(
+                    environ,
+                    environment_var,
+                    getattr(config, field.name),
+                    *_field_kind(field),
+                )
+        return dataclasses.replace(config, **overrides)
+
+
+PRESETS = {
+    "default": ClientConfig(),
+    "interactive": ClientConfig(
+        connect_timeout=5.0,
+        read_timeout=30.0,
+        retries=3,
+    ),
+    "ci": ClientConfig(
+        connect_timeout=10.0,
+        read_timeout=120.0,
+        backoff=0.5,
+        retry_budget_ratio=0.2,
+    ),
+    "bulk": ClientConfig(
+        pool_size=32,
+        connect_timeout=10.0,
+        read_timeout=300.0,
+        backoff=1.0,
+        max_concurrency=32,
+        retry_budget_ratio=0.1,
+        download_cache_size=50 * 1024**3,
+    ),
+}
+"""Named configs for the usual workloads.
+
+- ``default``: the behavior of clients without a config.
+- ``interactive``: a person is waiting, requests fail fast with few retries
+  and short timeouts.
+- ``ci``: unattended runs, requests ride out store hiccups with patient
+  retries, bounded by a retry budget so many jobs do not pile up retries.
+- ``bulk``: many concurrent requests, such as mirroring or mass releases,
+  with a larger pool and cache, concurrency adapted to the store capacity
+  and a retry budget.
+"""
@@ -0,0 +1,360 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Coordination of credentials across processes of an application.
+
+Processes sharing an application name and store host share credentials:
+
+- :class:`RefreshLock` is a file lock making sure a single process refreshes
+  expired credentials while the others wait and then use the new ones, see
+  :meth:`.StoreClient.refresh_login`.
+- :class:`CredentialBroker` serves credentials from memory over a Unix
+  socket, so sibling processes using a :class:`BrokerClient`, through the
+  ``credential_broker`` parameter of :class:`.auth.Auth`, do not each read
+  the keyring.
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import socket
+import socketserver
+import stat
+import struct
+import tempfile
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional, Union
+
+from . import errors
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .auth import Auth
+
+logger = logging.getLogger(__name__)
+
+_MAX_MESSAGE = 1 << 20
+
+REFRESH_LOCK_TIMEOUT = 300.0
+"""Seconds :meth:`.StoreClient.refresh_login` waits for the lock by default."""
+
+
+def _runtime_dir() -> pathlib.Path:
+    """Return a directory private to the user for sockets and locks.
+
+    This is ``XDG_RUNTIME_DIR`` if set, otherwise a ``craft-store-<uid>``
+    directory created in the temporary directory.
+
+    :raises errors.CraftStoreError: if the directory is not a directory owned
+                                    by the user and only accessible to them.
+    """
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        path = pathlib.Path(runtime_dir)
+    else:
+        path = pathlib.Path(tempfile.gettempdir()) / f"craft-store-{os.getuid()}"
+        with contextlib.suppress(FileExistsError):
+            path.mkdir(mode=0o700)
+    status = os.lstat(path)
+    if (
+        not stat.S_ISDIR(status.st_mode)
+        or status.st_uid != os.getuid()
+        or status.st_mode & 0o077
+    ):
+        raise errors.CraftStoreError(
+            f"Runtime directory {str(path)!r} must be a directory owned by "
+            "the user and only accessible to them."
+        )
+    return path
+
+
+def _peer_is_user(sock: socket.socket) -> bool:
+    """Tell if the process at the other end of sock runs as the user.
+
+    Peers cannot be checked on systems without ``SO_PEERCRED``, where the
+    permissions of the runtime directory are relied on instead.
+    """
+    if not hasattr(socket, "SO_PEERCRED"):
+        return True
+    credentials = sock.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+    )
+    _, uid, _ = struct.unpack("3i", credentials)
+    return uid == os.getuid()
+
+
+def _key(application_name: str, host: str) -> str:
+    return hashlib.sha256(f"{application_name}\0{host}".encode()).hexdigest()[:16]
+
+
+def default_socket_path(application_name: str, host: str) -> pathlib.Path:
+    """Return the default broker socket path for application_name on host."""
+    return _runtime_dir() / f"craft-store-{_key(application_name, host)}.sock"
+
+
+class RefreshLock:
+    """Exclusive lock on the credentials of application_name on host.
+
+    The lock is an advisory lock on a file, released by the system if the
+    holding process dies. Locks are not reentrant.
+
+    :param application_name: name of the application using this library.
+    :param host: specific host for the store used.
+    :param timeout: seconds to wait for the lock, forever if None.
+    :param path: lock file to use instead of the default one.
+    """
+
+    def __init__(
+        self,
+        application_name: str,
+        host: str,
+        *,
+        timeout: Optional[float] = None,
+        path: Optional[Union[str, pathlib.Path]] = None,
+    ) -> None:
+        if path is None:
+            path = _runtime_dir() / f"craft-store-{_key(application_name, host)}.lock"
+        self.path = pathlib.Path(path)
+        self.timeout = timeout
+        self._fd: Optional[int] = None
+
+    def acquire(self) -> None:
+        """Wait for and take the lock.
+
+        :raises errors.CraftStoreError: if timeout is reached or the lock file
+                                        is a symbolic link or is not owned by
+                                        the user.
+        """
+        try:
+            fd = os.open(
+                self.path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW | os.O_CLOEXEC, 0o600
+            )
+        except OSError as error:
+            raise errors.CraftStoreError(
+                f"Cannot open credentials lock {str(self.path)!r}: {error}"
+            ) from error
+        if os.fstat(fd).st_uid != os.getuid():
+            os.close(fd)
+            raise errors.CraftStoreError(
+                f"Credentials lock {str(self.path)!r} is not owned by the user."
+            )
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        delay = 0.005
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    os.close(fd)
+                    raise errors.CraftStoreError(
+                        f"Timed out waiting for credentials lock {str(self.path)!r}."
+                    ) from None
+                time.sleep(delay)
+                delay = min(delay * 2, 0.1)
+        self._fd = fd
+
+    def release(self) -> None:
+        """Release the lock."""
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self) -> "RefreshLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.release()
+
+
+def _send_message(sock: socket.socket, message: Dict[str, Any]) -> None:
+    sock.sendall(json.dumps(message).encode() + b"\n")
+
+
+def _receive_message(stream) -> Dict[str, Any]:
+    line = stream.readline(_MAX_MESSAGE)
+    if not line.endswith(b"\n"):
+        raise ValueError("Truncated message.")
+    return json.loads(line)
+
+
+class _BrokerHandler(socketserver.StreamRequestHandler):
+    server: "_BrokerServer"
+
+    def handle(self) -> None:
+        if not _peer_is_user(self.connection):
+            logger.warning("Rejected credentials broker client of another user.")
+            return
+        try:
+            request = _receive_message(self.rfile)
+            response = self.server.broker.handle(request)
+        except ValueError:
+            response = {"error": "invalid-request"}
+        _send_message(self.connection, response)
+
+
+class _BrokerServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, broker: "CredentialBroker") -> None:
+        self.broker = broker
+        super().__init__(path, _BrokerHandler)
+
+
+class CredentialBroker:
+    """Serve credentials from memory to processes over a Unix socket.
+
+    Credentials are read from auth once, when first requested, and updated
+    by clients storing or deleting credentials. The socket is only
+    accessible to the user running the broker, and clients run by other
+    users are rejected.
+
+    :param auth: :class:`.auth.Auth` to read credentials from, it must not
+                 use a broker itself.
+    :param path: path of the socket, defaults to :func:`default_socket_path`.
+    """
+
+    def __init__(
+        self, auth: "Auth", *, path: Optional[Union[str, pathlib.Path]] = None
+    ) -> None:
+        self.auth = auth
+        if path is None:
+            path = default_socket_path(auth.application_name, auth.host)
+        self.path = pathlib.Path(path)
+        self._credentials: Optional[str] = None
+        self._lock = threading.Lock()
+        self._server: Optional[_BrokerServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the response to a client request."""
+        operation = request.get("op")
+        with self._lock:
+            if operation == "get":
+                if self._credentials is None:
+                    try:
+                        self._credentials = self.auth.get_credentials()
+                    except errors.NotLoggedIn:
+                        return {"error": "not-logged-in"}
+                return {"credentials": self._credentials}
+            if operation == "set" and isinstance(request.get("credentials"), str):
+                self._credentials = request["credentials"]
+                return {}
+            if operation == "clear":
+                self._credentials = None
+                return {}
+        return {"error": "invalid-request"}
+
+    def start(self) -> None:
+        """Serve clients from a background thread."""
+        with contextlib.suppress(FileNotFoundError):
+            self.path.unlink()
+        old_umask = os.umask(0o177)
+        try:
+            self._server = _BrokerServer(str(self.path), self)
+        finally:
+            os.umask(old_umask)
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            kwargs={"poll_interval": 0.05},
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop serving clients and remove the socket."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with contextlib.suppress(FileNotFoundError):
+            self.path.unlink()
+
+    def __enter__(self) -> "CredentialBroker":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+
+class BrokerClient:
+    """Client of a :class:`CredentialBroker`.
+
+    Credentials are only exchanged with brokers run by the same user.
+
+    :param path: path of the broker socket.
+    :param timeout: seconds to wait for the broker.
+    """
+
+    def __init__(self, path: Union[str, pathlib.Path], *, timeout: float = 5.0) -> None:
+        self.path = pathlib.Path(path)
+        self.timeout = timeout
+
+    def _call(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.connect(str(self.path))
+                if not _peer_is_user(sock):
+                    raise errors.CredentialBrokerUnavailable(
+                        "Broker is run by another user."
+                    )
+                _send_message(sock, request)
+                with sock.makefile("rb") as stream:
+                    response = _receive_message(stream)
+        except (OSError, ValueError) as error:
+            raise errors.CredentialBrokerUnavailable(str(error)) from error
+        if response.get("error") == "invalid-request":
+            raise errors.CredentialBrokerUnavailable("Request rejected by the broker.")
+        return response
+
+    def get_credentials(self) -> str:
+        """Return the credentials held by the broker.
+
+        :raises errors.NotLoggedIn: if there are no credentials.
+        :raises errors.CredentialBrokerUnavailable: if the broker cannot be reached.
+        """
+        response = self._call({"op": "get"})
+        if response.get("error") == "not-logged-in":
+            raise errors.NotLoggedIn()
+        credentials = response.get("credentials")
+        if not isinstance(credentials, str):
+            raise errors.CredentialBrokerUnavailable("Invalid broker response.")
+        return credentials
+
+    def set_credentials(self, credentials: str) -> None:
+        """Replace the credentials held by the broker.
+
+        :raises errors.CredentialBrokerUnavailable: if the broker cannot be reached.
+        """
+        self._call({"op": "set", "credentials": credentials})
+
+    def clear(self) -> None:
+        """Drop the credentials held by the broker.
+
+        :raises errors.CredentialBrokerUnavailable: if the broker cannot be reached.
+        """
+        self._call({"op": "clear"})
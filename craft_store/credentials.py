@@ -0,0 +1,255 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Local introspection of store credentials.
+
+Credentials are macaroons attenuated by the store with first party caveats
+restricting their permissions, packages, channels and lifetime. The caveats
+are readable without the root key, so what credentials allow can be checked
+locally instead of asking :meth:`.StoreClient.whoami`.
+
+Caveats understood are ``time-before <timestamp>`` from the macaroon bakery
+and store caveats formatted as ``<namespace>|<field>|<json>``, where field
+is one of ``permissions``, ``packages``, ``channels`` or ``expires``. Other
+caveats are kept in :attr:`CredentialsInfo.caveats` but not interpreted.
+"""
+
+import base64
+import binascii
+import dataclasses
+import datetime
+import functools
+import json
+import re
+from typing import Any, FrozenSet, Iterable, Optional, Tuple
+
+import pymacaroons
+from pymacaroons.serializers import json_serializer
+
+from . import errors
+
+_META_PERMISSIONS = {
+    "package-manage": "package-manage-",
+    "package-view": "package-view-",
+}
+
+
+_TIMESTAMP = re.compile(
+    r"(?P<date>\d{4}-\d{2}-\d{2})[Tt ](?P<time>\d{2}:\d{2}:\d{2})"
+    r"(?:\.(?P<fraction>\d+))?"
+    r" ?(?:(?P<utc>[Zz])|(?P<sign>[+-])(?P<hours>\d{2}):?(?P<minutes>\d{2}))?"
+    r"(?: [A-Z]{3,5})?"
+)
+
+
+def _parse_timestamp(timestamp: str) -> datetime.datetime:
+    """Parse an RFC 3339 timestamp, or one formatted by Go's time.String.
+
+    Fractions of seconds are truncated to microseconds and timestamps
+    without an offset are in UTC, ``2022-03-18T19:54:57.151721234Z`` and
+    ``2022-03-18 19:54:57.151721234 +0000 UTC`` are both accepted.
+
+    :raises ValueError: if timestamp is not in a known format.
+    """
+    match = _TIMESTAMP.fullmatch(timestamp.strip())
+    if match is None:
+        raise ValueError(f"invalid timestamp {timestamp!r}")
+    tzinfo = datetime.timezone.utc
+    if match["sign"]:
+        offset = datetime.timedelta(
+            hours=int(match["hours"]), minutes=int(match["minutes"])
+        )
+        tzinfo = datetime.timezone(-offset if match["sign"] == "-" else offset)
+    microseconds = (match["fraction"] or "")[:6].ljust(6, "0")
+    return datetime.datetime.strptime(
+        f"{match['date']}T{match['time']}.{microseconds}", "%Y-%m-%dT%H:%M:%S.%f"
+    ).replace(tzinfo=tzinfo)
+
+
+def _narrow(current: Optional[FrozenSet[str]], values: Iterable[str]) -> FrozenSet[str]:
+    """Return the intersection of restrictions, as caveats only attenuate."""
+    values = frozenset(values)
+    return values if current is None else current & values
+
+
+@dataclasses.dataclass(frozen=True)
+class CredentialsInfo:
+    """Restrictions carried by credentials.
+
+    Restrictions set to None are not restricted by the credentials.
+
+    :param caveats: first party caveats of the credentials.
+    :param permissions: permissions granted, from :mod:`.attenuations`.
+    :param packages: names of the packages the credentials are limited to.
+    :param channels: channels the credentials are limited to.
+    :param expires: time after which the credentials are not valid.
+    """
+
+    caveats: Tuple[str, ...]
+    permissions: Optional[FrozenSet[str]] = None
+    packages: Optional[FrozenSet[str]] = None
+    channels: Optional[FrozenSet[str]] = None
+    expires: Optional[datetime.datetime] = None
+
+    @classmethod
+    def from_caveats(cls, caveats: Iterable[str]) -> "CredentialsInfo":
+        """Return the restrictions set by first party caveats.
+
+        Credentials with an expiry that cannot be read are rejected rather
+        than considered as never expiring.
+
+        :raises errors.CredentialsNotParseable: if an expiry is not a timestamp.
+        """
+        caveats = tuple(caveats)
+        restrictions: Any = dict.fromkeys(["permissions", "packages", "channels"])
+        expires = None
+        for caveat in caveats:
+            if caveat.startswith("time-before "):
+                field, value = "expires", caveat.partition(" ")[2]
+            else:
+                parts = caveat.split("|", 2)
+                if len(parts) != 3:
+                    continue
+                field = parts[1]
+                try:
+                    value = json.loads(parts[2])
+                except ValueError:
+                    continue
+
+            if field == "expires":
+                try:
+                    timestamp = _parse_timestamp(value)
+                except (ValueError, TypeError, AttributeError) as error:
+                    raise errors.CredentialsNotParseable(
+                        f"invalid expiry in caveat {caveat!r}"
+                    ) from error
+                expires = timestamp if expires is None else min(expires, timestamp)
+            elif field == "packages" and isinstance(value, list):
+                names = (p["name"] if isinstance(p, dict) else p for p in value)
+                restrictions[field] = _narrow(restrictions[field], names)
+            elif field in restrictions and isinstance(value, list):
+                restrictions[field] = _narrow(restrictions[field], value)
+        return cls(caveats=caveats, expires=expires, **restrictions)
+
+    def has_permission(self, permission: str) -> bool:
+        """Return True if permission is granted.
+
+        ``package-manage`` and ``package-view`` grant every permission they
+        are a prefix of, like the store does.
+
+        :param permission: a permission from :mod:`.attenuations`.
+        """
+        if self.permissions is None or permission in self.permissions:
+            return True
+        return any(
+            permission.startswith(prefix)
+            for meta, prefix in _META_PERMISSIONS.items()
+            if meta in self.permissions
+        )
+
+    def allows_package(self, name: str) -> bool:
+        """Return True if the credentials can be used for the package name."""
+        return self.packages is None or name in self.packages
+
+    def allows_channel(self, channel: str) -> bool:
+        """Return True if the credentials can be used for channel."""
+        return self.channels is None or channel in self.channels
+
+    def is_expired(self, now: Optional[datetime.datetime] = None) -> bool:
+        """Return True if the credentials expired.
+
+        :param now: time to check against, defaults to the current time.
+        """
+        if self.expires is None:
+            return False
+        if now is None:
+            now = datetime.datetime.now(datetime.timezone.utc)
+        return now >= self.expires
+
+    def allows(
+        self,
+        permission: str,
+        *,
+        package: Optional[str] = None,
+        channel: Optional[str] = None,
+    ) -> bool:
+        """Return True if unexpired and allowing every restriction given.
+
+        :param permission: a permission from :mod:`.attenuations`.
+        :param package: name of the package to act on.
+        :param channel: channel to act on.
+        """
+        return (
+            not self.is_expired()
+            and self.has_permission(permission)
+            and (package is None or self.allows_package(package))
+            and (channel is None or self.allows_channel(channel))
+        )
+
+
+def _deserialize_json(payload: Any) -> pymacaroons.Macaroon:
+    if isinstance(payload, list):
+        payload = payload[0]
+    if isinstance(payload, dict) and "m" in payload:
+        # bakery serialization, wrapping the macaroon.
+        payload = payload["m"]
+    return pymacaroons.Macaroon.deserialize(
+        json.dumps(payload), json_serializer.JsonSerializer()
+    )
+
+
+def _deserialize(credentials: str) -> pymacaroons.Macaroon:
+    """Return the root macaroon of credentials.
+
+    Credentials are either a serialized macaroon or the base64 encoded JSON
+    list of a macaroon and its discharges, as sent in Macaroons headers.
+    """
+    candidates = [credentials]
+    try:
+        candidates.append(
+            base64.urlsafe_b64decode(
+                credentials + "=" * (-len(credentials) % 4)
+            ).decode()
+        )
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        pass
+    for candidate in candidates:
+        try:
+            return _deserialize_json(json.loads(candidate))
+        except (ValueError, KeyError, IndexError, TypeError):
+            continue
+    return pymacaroons.Macaroon.deserialize(credentials)
+
+
+@functools.lru_cache(maxsize=32)
+def inspect_credentials(credentials: str) -> CredentialsInfo:
+    """Return the restrictions carried by credentials, without network I/O.
+
+    Results are cached, parsing the same credentials again is free.
+
+    :param credentials: credentials as stored by :class:`.auth.Auth`.
+
+    :raises errors.CredentialsNotParseable: if credentials are not a macaroon.
+    """
+    try:
+        macaroon = _deserialize(credentials)
+    except Exception as error:
+        raise errors.CredentialsNotParseable(str(error)) from error
+    return CredentialsInfo.from_caveats(
+        caveat.caveat_id_bytes.decode(errors="replace")
+        for caveat in macaroon.caveats
+        if caveat.first_party()
+    )
@@ -0,0 +1,109 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Cache for Candid discharge tokens."""
+
+import datetime
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+from macaroonbakery import bakery, checkers, httpbakery
+
+logger = logging.getLogger(__name__)
+
+
+class DischargeCache:
+    """In memory cache of Candid discharge tokens.
+
+    A discharge token is what Candid hands out after a successful
+    interaction (web browser or agent). Presenting it again lets Candid
+    discharge new third-party caveats for the same identity without
+    interacting a second time.
+
+    Tokens are keyed by third-party caveat location and identity and are
+    kept until the earliest ``time-before`` caveat found in the discharge
+    they were acquired with.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._tokens: Dict[
+            Tuple[str, str], Tuple[httpbakery.DischargeToken, datetime.datetime]
+        ] = {}
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    @staticmethod
+    def _now() -> datetime.datetime:
+        return datetime.datetime.utcnow()
+
+    def get(self, location: str, identity: str) -> Optional[httpbakery.DischargeToken]:
+        """Return a valid discharge token for location and identity.
+
+        Expired tokens are evicted on lookup.
+
+        :param location: location of the third-party caveat.
+        :param identity: identity the discharge was acquired for.
+        """
+        key = (location.rstrip("/"), identity)
+        with self._lock:
+            entry = self._tokens.get(key)
+            if entry is None:
+                return None
+            token, expires = entry
+            if expires <= self._now():
+                logger.debug("Discharge token for %r expired.", location)
+                del self._tokens[key]
+                return None
+        return token
+
+    def put(
+        self,
+        location: str,
+        identity: str,
+        token: httpbakery.DischargeToken,
+        discharge: bakery.Macaroon,
+    ) -> None:
+        """Cache token, expiring along with discharge.
+
+        Discharges without ``time-before`` caveats are not cached.
+
+        :param location: location of the third-party caveat.
+        :param identity: identity the discharge was acquired for.
+        :param token: discharge token returned from the interaction.
+        :param discharge: discharge macaroon acquired with token.
+        """
+        expires = checkers.macaroons_expiry_time(
+            checkers.Namespace(), [discharge.macaroon]
+        )
+        if expires is None:
+            logger.debug("Not caching discharge token for %r, no expiry.", location)
+            return
+
+        with self._lock:
+            self._tokens[location.rstrip("/"), identity] = (token, expires)
+
+    def evict(self, location: str, identity: str) -> None:
+        """Remove the discharge token for location and identity."""
+        with self._lock:
+            self._tokens.pop((location.rstrip("/"), identity), None)
+
+    def clear(self) -> None:
+        """Remove all cached discharge tokens."""
+        with self._lock:
+            self._tokens.clear()
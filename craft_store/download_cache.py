@@ -0,0 +1,301 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Content-addressed cache of downloaded artifacts.
+
+Artifacts are stored under the digest the store reports for them, so a
+revision downloaded once is served locally afterwards, whatever the URL
+it was downloaded from. The cache can be shared by processes: objects
+are populated atomically, a single process downloads a given digest at
+a time and eviction waits for readers. Set on a client with::
+
+    client = HTTPClient(user_agent=..., download_cache=DownloadCache(path))
+    client.download(url, target, digest=revision["sha3-384"])
+"""
+
+import contextlib
+import errno
+import fcntl
+import hashlib
+import logging
+import os
+import pathlib
+import shutil
+import tempfile
+from typing import Callable, Iterable, Iterator, Optional, Union
+
+from . import errors
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_CACHE_SIZE = 10 * 1024**3
+"""Default bound of the size of a download cache, in bytes."""
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+"""Size of the chunks downloads are written in."""
+
+_FICLONE = 0x40049409
+"""Linux ioctl cloning a file into another, sharing extents (reflink)."""
+
+
+def write_verified(
+    chunks: Iterable[bytes],
+    path: Union[str, pathlib.Path],
+    *,
+    digest: str,
+    algorithm: str = "sha3_384",
+    source: str = "",
+) -> pathlib.Path:
+    """Write chunks to path atomically, if they match digest.
+
+    Chunks are written to a temporary file next to path, renamed to path
+    once verified.
+
+    :param chunks: content to write.
+    :param path: path to write to.
+    :param digest: expected hex digest of the content.
+    :param algorithm: name of the :mod:`hashlib` algorithm of digest.
+    :param source: where chunks come from, for errors.
+
+    :raises errors.DigestMismatch: if content does not match digest.
+    """
+    path = pathlib.Path(path)
+    hasher = hashlib.new(algorithm)
+    with tempfile.NamedTemporaryFile(
+        dir=path.parent, prefix=f".{path.name}.", delete=False
+    ) as partial:
+        try:
+            for chunk in chunks:
+                hasher.update(chunk)
+                partial.write(chunk)
+            partial.flush()
+            os.fsync(partial.fileno())
+        except BaseException:
+            os.unlink(partial.name)
+            raise
+    if hasher.hexdigest() != digest.lower():
+        os.unlink(partial.name)
+        raise errors.DigestMismatch(source or str(path), digest, hasher.hexdigest())
+    os.replace(partial.name, path)
+    return path
+
+
+def _clone(source: pathlib.Path, target: pathlib.Path, *, hardlink: bool) -> None:
+    """Create target with the content of source, sharing storage if possible."""
+    with contextlib.suppress(OSError):
+        with open(source, "rb") as source_file, open(target, "wb") as target_file:
+            fcntl.ioctl(target_file.fileno(), _FICLONE, source_file.fileno())
+        return
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(target)
+    if hardlink:
+        try:
+            os.link(source, target)
+            return
+        except OSError as error:
+            if error.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+    shutil.copyfile(source, target)
+
+
+def _replace_with_clone(
+    source: pathlib.Path, target: pathlib.Path, *, hardlink: bool
+) -> None:
+    """Atomically replace target with a clone of source."""
+    partial = target.with_name(f".{target.name}.{os.getpid()}.partial")
+    try:
+        _clone(source, partial, hardlink=hardlink)
+        os.replace(partial, target)
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(partial)
+
+
+class DownloadCache:
+    """Size bounded, content-addressed cache of downloads on disk.
+
+    Objects are evicted least recently used first once the cache grows
+    over max_size. Objects are read-only, materialized copies are reflinks
+    when the file system supports them, hardlinks if allowed, full copies
+    otherwise.
+
+    :param root: directory of the cache.
+    :param max_size: bound of the size of the cache, in bytes.
+    :param hardlink: materialize cached objects as hardlinks when reflinks
+                     are not supported; the target then shares the
+                     read-only inode of the object and must not be modified
+                     in place. Targets of downloads are never hardlinks.
+    """
+
+    def __init__(
+        self,
+        root: Union[str, pathlib.Path],
+        *,
+        max_size: int = DOWNLOAD_CACHE_SIZE,
+        hardlink: bool = True,
+    ) -> None:
+        self.root = pathlib.Path(root)
+        self.max_size = max_size
+        self.hardlink = hardlink
+        for name in ("objects", "locks"):
+            (self.root / name).mkdir(parents=True, exist_ok=True)
+
+    @contextlib.contextmanager
+    def _lock(self, name: str, operation: int) -> Iterator[None]:
+        fd = os.open(self.root / "locks" / name, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, operation)
+            yield
+        finally:
+            os.close(fd)
+
+    def _object_path(self, digest: str, algorithm: str) -> pathlib.Path:
+        if algorithm not in hashlib.algorithms_available:
+            raise ValueError(f"Unknown algorithm {algorithm!r}.")
+        digest = digest.lower()
+        if not digest.isalnum():
+            raise ValueError(f"Invalid digest {digest!r}.")
+        return self.root / "objects" / algorithm / digest[:2] / digest
+
+    def get(self, digest: str, algorithm: str = "sha3_384") -> Optional[pathlib.Path]:
+        """Return the path of the object for digest, None if not cached.
+
+        The path must only be read while no eviction can happen, prefer
+        :meth:`materialize`.
+        """
+        path = self._object_path(digest, algorithm)
+        with self._lock("cache.lock", fcntl.LOCK_SH):
+            try:
+                # The modification time tracks use, for eviction.
+                os.utime(path)
+            except FileNotFoundError:
+                return None
+        return path
+
+    def __contains__(self, digest: str) -> bool:
+        return self._object_path(digest, "sha3_384").exists()
+
+    def materialize(
+        self,
+        digest: str,
+        target: Union[str, pathlib.Path],
+        algorithm: str = "sha3_384",
+    ) -> bool:
+        """Create target with the content of the object for digest.
+
+        Target is replaced atomically.
+
+        :return: False if digest is not cached.
+        """
+        source = self._object_path(digest, algorithm)
+        with self._lock("cache.lock", fcntl.LOCK_SH):
+            try:
+                os.utime(source)
+            except FileNotFoundError:
+                return False
+            _replace_with_clone(source, pathlib.Path(target), hardlink=self.hardlink)
+        return True
+
+    def fetch(
+        self,
+        digest: str,
+        download: Callable[[], Iterable[bytes]],
+        target: Union[str, pathlib.Path],
+        *,
+        algorithm: str = "sha3_384",
+        source: str = "",
+    ) -> bool:
+        """Materialize the object for digest into target, downloading if missing.
+
+        A single process downloads a given digest at a time, the others
+        wait for it and use the object it stored. Downloads are written to
+        a private file of the cache, cloned into target before being stored,
+        so target is created even if the object is evicted right away or is
+        larger than max_size, in which case it is not stored. Target is never
+        a hardlink of the object it was downloaded for, it is a reflink or a
+        copy the caller owns.
+
+        :param digest: hex digest of the content.
+        :param download: called to get the content if not cached.
+        :param target: path to materialize the object to.
+        :param algorithm: name of the :mod:`hashlib` algorithm of digest.
+        :param source: where the content is downloaded from, for errors.
+
+        :raises errors.DigestMismatch: if the content does not match digest.
+        :raises ValueError: for invalid digests or unknown algorithms.
+
+        :return: True if served from the cache, False if downloaded.
+        """
+        path = self._object_path(digest, algorithm)
+        if self.materialize(digest, target, algorithm):
+            logger.debug("Download cache hit for %r.", digest)
+            return True
+        with self._lock(f"{algorithm}-{digest.lower()}.lock", fcntl.LOCK_EX):
+            if self.materialize(digest, target, algorithm):
+                return True
+            logger.debug("Download cache miss for %r.", digest)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # The leading dot keeps the partial object out of size and evict.
+            partial = path.with_name(f".{path.name}.{os.getpid()}.partial")
+            try:
+                write_verified(
+                    download(),
+                    partial,
+                    digest=digest,
+                    algorithm=algorithm,
+                    source=source,
+                )
+                partial.chmod(0o444)
+                _replace_with_clone(partial, pathlib.Path(target), hardlink=False)
+                if partial.stat().st_size > self.max_size:
+                    logger.debug("%r is larger than the download cache.", path.name)
+                else:
+                    os.replace(partial, path)
+            finally:
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(partial)
+        self.evict()
+        return False
+
+    def size(self) -> int:
+        """Return the size of the objects in the cache, in bytes."""
+        return sum(
+            path.stat().st_size
+            for path in (self.root / "objects").glob("*/*/*")
+            if not path.name.startswith(".")
+        )
+
+    def evict(self) -> int:
+        """Remove least recently used objects until within max_size.
+
+        :return: the amount of bytes freed.
+        """
+        with self._lock("cache.lock", fcntl.LOCK_EX):
+            objects = []
+            for path in (self.root / "objects").glob("*/*/*"):
+                if path.name.startswith("."):
+                    continue
+                stat = path.stat()
+                objects.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in objects)
+            freed = 0
+            for _, size, path in sorted(objects):
+                if total - freed <= self.max_size:
+                    break
+                logger.debug("Evicting %r from the download cache.", path.name)
+                path.unlink()
+                freed += size
+        return freed
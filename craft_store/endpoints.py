@@ -17,7 +17,7 @@
 """Endpoint definitions for different services."""
 
 import dataclasses
-from typing import Any, Dict, Final, Optional, Sequence
+from typing import Any, Dict, Final, List, Optional, Sequence, Tuple
 
 
 @dataclasses.dataclass(frozen=True)
@@ -28,6 +28,29 @@ class Package:
     package_type: str
 
 
+@dataclasses.dataclass(frozen=True)
+class Release:
+    """Representation of a revision of a package to release to a channel."""
+
+    package_name: str
+    revision: int
+    channel: str
+
+
+@dataclasses.dataclass(frozen=True)
+class ReleaseRequest:
+    """A request releasing one or more :class:`Release`.
+
+    :param path: path to send the request to.
+    :param payload: JSON payload of the request.
+    :param releases: releases done by the request.
+    """
+
+    path: str
+    payload: Any
+    releases: Tuple[Release, ...]
+
+
 @dataclasses.dataclass(repr=True)
 class Endpoints:
     """Endpoints used to make requests to a store.
@@ -35,12 +58,23 @@ class Endpoints:
     :param whoami: path to the whoami API.
     :param tokens: path to the tokens API.
     :param tokens_exchange: path to the tokens_exchange API.
+    :param account_packages: path to the listing of the packages of the
+                             account, None if the store has none.
+    :param revisions: path template, on ``{name}``, to the listing of the
+                      revisions of a package, None if the store has none.
+    :param channel_map: path template, on ``{name}``, to the channel map
+                        of a package and its released revisions.
+    :param release: path template, on ``{name}``, to release revisions.
     """
 
     whoami: str
     tokens: str
     tokens_exchange: str
     valid_package_types: Sequence[str]
+    account_packages: Optional[str] = None
+    revisions: Optional[str] = None
+    channel_map: Optional[str] = None
+    release: Optional[str] = None
 
     def _validate_packages(self, packages: Sequence[Package]) -> None:
         unknown_packages = [
@@ -88,6 +122,35 @@ class Endpoints:
 
         return token_request
 
+    def _release_path(self, package_name: str) -> str:
+        if self.release is None:
+            raise ValueError("Releases are not supported for this store.")
+        return self.release.format(name=package_name)
+
+    def get_release_requests(self, releases: Sequence[Release]) -> List[ReleaseRequest]:
+        """Return the fewest requests doing releases.
+
+        All the releases of a package are done with a single request.
+
+        :param releases: a sequence of :class:`Release` to do.
+
+        :raises ValueError: if the store does not support releases.
+        """
+        packages: Dict[str, List[Release]] = {}
+        for release in releases:
+            packages.setdefault(release.package_name, []).append(release)
+        return [
+            ReleaseRequest(
+                path=self._release_path(package_name),
+                payload=[
+                    {"channel": r.channel, "revision": r.revision}
+                    for r in package_releases
+                ],
+                releases=tuple(package_releases),
+            )
+            for package_name, package_releases in packages.items()
+        ]
+
 
 @dataclasses.dataclass(repr=True)
 class _SnapStoreEndpoints(Endpoints):
@@ -122,12 +185,38 @@ class _SnapStoreEndpoints(Endpoints):
 
         return token_request
 
+    def get_release_requests(self, releases: Sequence[Release]) -> List[ReleaseRequest]:
+        """Return the fewest requests doing releases.
+
+        A request releases a single revision, to any amount of channels.
+        """
+        revisions: Dict[Tuple[str, int], List[Release]] = {}
+        for release in releases:
+            key = (release.package_name, release.revision)
+            revisions.setdefault(key, []).append(release)
+        return [
+            ReleaseRequest(
+                path=self._release_path(package_name),
+                payload={
+                    "name": package_name,
+                    "revision": str(revision),
+                    "channels": [r.channel for r in revision_releases],
+                },
+                releases=tuple(revision_releases),
+            )
+            for (package_name, revision), revision_releases in revisions.items()
+        ]
+
 
 CHARMHUB: Final = Endpoints(
     whoami="/v1/whoami",
     tokens="/v1/tokens",
     tokens_exchange="/v1/tokens/exchange",
     valid_package_types=["charm", "bundle"],
+    account_packages="/v1/charm",
+    revisions="/v1/charm/{name}/revisions",
+    channel_map="/v1/charm/{name}/releases",
+    release="/v1/charm/{name}/releases",
 )
 """Charmhub set of supported endpoints."""
 
@@ -137,5 +226,7 @@ SNAP_STORE: Final = _SnapStoreEndpoints(
     tokens="/api/v2/tokens",
     tokens_exchange="/api/v2/tokens/exchange",
     valid_package_types=["snap"],
+    channel_map="/api/v2/snaps/{name}/channel-map",
+    release="/dev/api/snap-release/",
 )
 """Snap Store set of supported endpoints."""
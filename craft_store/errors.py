@@ -17,9 +17,12 @@
 """Craft Store errors."""
 
 import contextlib
+import datetime
+import email.utils
+import enum
 import logging
 from json.decoder import JSONDecodeError
-from typing import Dict, List, Optional
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Tuple
 
 import requests
 import urllib3  # type: ignore
@@ -27,13 +30,126 @@ import urllib3  # type: ignore
 logger = logging.getLogger(__name__)
 
 
+class ErrorCategory(enum.Enum):
+    """Classification of errors used to decide whether to retry."""
+
+    RETRYABLE = "retryable"
+    """Transient failure, the request can be retried."""
+
+    THROTTLED = "throttled"
+    """The store is shedding load, retry after backing off."""
+
+    AUTH_EXPIRED = "auth-expired"
+    """Credentials are missing or expired, login before retrying."""
+
+    PERMANENT = "permanent"
+    """Retrying the same request will not succeed."""
+
+
+RETRYABLE_STATUS_CODES: FrozenSet[int] = frozenset([500, 502, 503, 504])
+"""Response status codes for transient store failures."""
+
+THROTTLING_STATUS_CODES: FrozenSet[int] = frozenset([429])
+"""Response status codes the store uses to throttle clients."""
+
+AUTH_EXPIRED_STATUS_CODES: FrozenSet[int] = frozenset([401])
+"""Response status codes for missing or expired credentials."""
+
+AUTH_EXPIRED_ERROR_CODES: FrozenSet[str] = frozenset(
+    ["macaroon-needs-refresh", "macaroon-authorization-required"]
+)
+"""Store error codes for expired credentials on other status codes."""
+
+AUTH_EXPIRED_ERROR_STATUS_CODES: FrozenSet[int] = frozenset([400, 403])
+"""Response status codes the store reports expired credentials on with an
+error code from :data:`AUTH_EXPIRED_ERROR_CODES`."""
+
+RETRY_CATEGORIES: FrozenSet[ErrorCategory] = frozenset(
+    [ErrorCategory.RETRYABLE, ErrorCategory.THROTTLED]
+)
+"""Categories of errors for requests that can be retried as is."""
+
+IDEMPOTENCY_SAFE_CATEGORIES: FrozenSet[ErrorCategory] = frozenset(
+    [ErrorCategory.THROTTLED]
+)
+"""Categories of responses for requests rejected before being processed,
+safe to retry whatever their method."""
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Return the seconds to wait from a Retry-After header value."""
+    if not value:
+        return None
+
+    with contextlib.suppress(TypeError, ValueError):
+        return max(float(value), 0.0)
+
+    try:
+        retry_date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        logger.debug("Invalid Retry-After value %r.", value)
+        return None
+    if retry_date.tzinfo is None:
+        retry_date = retry_date.replace(tzinfo=datetime.timezone.utc)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return max((retry_date - now).total_seconds(), 0.0)
+
+
+def classify_status(status_code: int) -> ErrorCategory:
+    """Return the error category for a response status code.
+
+    Only the status code is considered, the response body is not parsed.
+    """
+    if status_code in RETRYABLE_STATUS_CODES:
+        return ErrorCategory.RETRYABLE
+    if status_code in THROTTLING_STATUS_CODES:
+        return ErrorCategory.THROTTLED
+    if status_code in AUTH_EXPIRED_STATUS_CODES:
+        return ErrorCategory.AUTH_EXPIRED
+    return ErrorCategory.PERMANENT
+
+
+RETRY_STATUS_CODES: FrozenSet[int] = frozenset(
+    status_code
+    for status_code in range(400, 600)
+    if classify_status(status_code) in RETRY_CATEGORIES
+)
+"""Response status codes requests are retried on, from :func:`classify_status`."""
+
+
 class CraftStoreError(Exception):
-    """Base class error for craft-store."""
+    """Base class error for craft-store.
+
+    :cvar category: :class:`ErrorCategory` for this error.
+    :cvar retry_after: seconds to wait before retrying, if known.
+    :cvar idempotency_safe: whether the request is known not to have reached
+                            the store, making it safe to retry regardless of
+                            the method being idempotent.
+    """
+
+    category: ErrorCategory = ErrorCategory.PERMANENT
+    retry_after: Optional[float] = None
+    idempotency_safe: bool = False
 
     def __init__(self, message: str, resolution: Optional[str] = None) -> None:
         super().__init__(message)
         self.resolution = resolution
 
+    @property
+    def retryable(self) -> bool:
+        """Whether the failed request can be retried as is."""
+        return self.category in RETRY_CATEGORIES
+
+
+def _unwrap_network_exception(exception: Exception) -> Exception:
+    """Return the innermost urllib3 exception wrapped by requests."""
+    with contextlib.suppress(IndexError):
+        if isinstance(exception.args[0], Exception):
+            exception = exception.args[0]
+    if isinstance(exception, urllib3.exceptions.MaxRetryError) and exception.reason:
+        exception = exception.reason
+    return exception
+
 
 class NetworkError(CraftStoreError):
     """Error to raise on network or infrastructure issues.
@@ -41,26 +157,52 @@ class NetworkError(CraftStoreError):
     The original exception is used to potentially craft a user friendly
     error message to be used for :attr:`.brief`.
 
+    Errors establishing a connection are retryable and idempotency safe,
+    TLS errors are permanent and any other error is retryable.
+
     :param exception: original exception raised.
 
     :ivar exception: original exception raised.
     """
 
     def __init__(self, exception: Exception) -> None:
+        self.exception = exception
         message = str(exception)
         with contextlib.suppress(IndexError):
             if isinstance(exception.args[0], urllib3.exceptions.MaxRetryError):
                 message = "Maximum retries exceeded trying to reach the store."
 
+        reason = _unwrap_network_exception(exception)
+        if isinstance(
+            reason, (requests.exceptions.SSLError, urllib3.exceptions.SSLError)
+        ):
+            self.category = ErrorCategory.PERMANENT
+        else:
+            self.category = ErrorCategory.RETRYABLE
+            self.idempotency_safe = isinstance(
+                reason,
+                (
+                    requests.exceptions.ConnectTimeout,
+                    urllib3.exceptions.ConnectTimeoutError,
+                ),
+            )
+
         super().__init__(message)
 
 
 class StoreErrorList:
-    """Error List returned from the Store."""
+    """Error List returned from the Store.
+
+    Errors are indexed by code on the first lookup by code, further lookups
+    do not scan the list.
+    """
 
     def __len__(self) -> int:
         return len(self._error_list)
 
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        return iter(self._error_list)
+
     def __str__(self) -> str:
         error_list: List[str] = []
         for error in self._error_list:
@@ -68,35 +210,46 @@ class StoreErrorList:
         return "\n".join(error_list).strip()
 
     def __repr__(self) -> str:
-        code_list = []
-        for error in self._error_list:
-            code = error.get("code")
-            if code:
-                code_list.append(code)
-
-        return "<StoreErrorList: {' '.join(code_list)}>"
+        return f"<StoreErrorList: {' '.join(self._get_groups())}>"
 
     def __contains__(self, error_code: str) -> bool:
-        return any((error.get("code") == error_code for error in self._error_list))
+        return error_code in self._get_groups()
 
     def __getitem__(self, error_code: str) -> Dict[str, str]:
-        for error in self._error_list:
-            if error.get("code") == error_code:
-                return error
-
-        raise KeyError(error_code)
+        return self._get_groups()[error_code][0]
 
     def __init__(self, error_list: List[Dict[str, str]]) -> None:
         self._error_list = error_list
+        self._groups: Optional[Dict[str, List[Dict[str, str]]]] = None
+
+    def _get_groups(self) -> Dict[str, List[Dict[str, str]]]:
+        if self._groups is None:
+            self._groups = {}
+            for error in self._error_list:
+                code = error.get("code")
+                if code:
+                    self._groups.setdefault(code, []).append(error)
+        return self._groups
+
+    def group_by_code(self) -> Iterator[Tuple[str, List[Dict[str, str]]]]:
+        """Iterate over error codes and the errors reported for each of them.
+
+        Codes are yielded in the order they first appear in the error list,
+        errors without a code are skipped.
+        """
+        return iter(self._get_groups().items())
 
 
 class StoreServerError(CraftStoreError):
     """Error to raise on infrastructure issues from error codes above ``500``.
 
+    The response body is only parsed when :attr:`error_list` or the error
+    message, through ``args``, ``str`` or ``repr``, are first accessed, so
+    classifying the error by status code is free of parsing costs.
+
     :param response: the response from a :class:`requests.Request`.
 
     :ivar response: the response from a :class:`requests.Request`.
-    :ivar error_list: list of errors returned by the Store :class:`StoreErrorList`.
     """
 
     def _get_raw_error_list(self) -> List[Dict[str, str]]:
@@ -112,34 +265,116 @@ class StoreServerError(CraftStoreError):
 
     def __init__(self, response: requests.Response) -> None:
         self.response = response
+        self._error_list: Optional[StoreErrorList] = None
+        self._message_parsed = False
+        self._category: Optional[ErrorCategory] = None
+
+        super().__init__(
+            "Issue encountered while processing your request: "
+            f"[{response.status_code}] {response.reason}."
+        )
+
+    @property
+    def error_list(self) -> StoreErrorList:
+        """List of errors returned by the Store :class:`StoreErrorList`."""
+        if self._error_list is None:
+            try:
+                raw_error_list: List[Dict[str, str]] = self._get_raw_error_list()
+            except (KeyError, TypeError, JSONDecodeError):
+                # TypeError covers bodies that are valid JSON but not an object.
+                raw_error_list = []
+            self._error_list = StoreErrorList(raw_error_list)
+        return self._error_list
+
+    @property  # type: ignore[override]
+    def args(self) -> Tuple[Any, ...]:  # type: ignore[override]
+        """The error message, from the error list if the store sent one."""
+        if not self._message_parsed:
+            self._message_parsed = True
+            if self.error_list:
+                with contextlib.suppress(KeyError):
+                    message = "Store operation failed:\n" + str(self.error_list)
+                    BaseException.args.__set__(self, (message,))  # type: ignore
+        return BaseException.args.__get__(self)  # type: ignore
+
+    @args.setter
+    def args(self, value: Tuple[Any, ...]) -> None:
+        self._message_parsed = True
+        BaseException.args.__set__(self, value)  # type: ignore
 
-        try:
-            raw_error_list: List[Dict[str, str]] = self._get_raw_error_list()
-        except (KeyError, JSONDecodeError):
-            raw_error_list = []
-
-        self.error_list = StoreErrorList(raw_error_list)
-
-        message: Optional[str] = None
-        if self.error_list:
-            with contextlib.suppress(KeyError):
-                message = "Store operation failed:\n" + str(self.error_list)
-        if message is None:
-            message = (
-                "Issue encountered while processing your request: "
-                f"[{response.status_code}] {response.reason}."
-            )
+    def __str__(self) -> str:
+        args = self.args
+        return str(args[0]) if len(args) == 1 else str(args)
 
-        super().__init__(message)
+    def __repr__(self) -> str:
+        args = self.args
+        if len(args) == 1:
+            return f"{type(self).__name__}({args[0]!r})"
+        return f"{type(self).__name__}{args!r}"
+
+    @property  # type: ignore[override]
+    def category(self) -> ErrorCategory:  # type: ignore[override]
+        """:class:`ErrorCategory` for the response.
+
+        Derived from the status code, error codes are only looked up for
+        :data:`AUTH_EXPIRED_ERROR_STATUS_CODES`.
+        """
+        if self._category is None:
+            status_code = self.response.status_code
+            category = classify_status(status_code)
+            if status_code in AUTH_EXPIRED_ERROR_STATUS_CODES and any(
+                code in self.error_list for code in AUTH_EXPIRED_ERROR_CODES
+            ):
+                category = ErrorCategory.AUTH_EXPIRED
+            self._category = category
+        return self._category
+
+    @property  # type: ignore[override]
+    def idempotency_safe(self) -> bool:  # type: ignore[override]
+        """Throttled requests are rejected before being processed."""
+        return self.category in IDEMPOTENCY_SAFE_CATEGORIES
+
+    @property  # type: ignore[override]
+    def retry_after(self) -> Optional[float]:  # type: ignore[override]
+        """Seconds to wait before retrying from the Retry-After header."""
+        return _parse_retry_after(self.response.headers.get("Retry-After"))
 
 
 class NotLoggedIn(CraftStoreError):
     """Error raised when credentials are not found in the keyring."""
 
+    category = ErrorCategory.AUTH_EXPIRED
+
     def __init__(self) -> None:
         super().__init__("Not logged in.")
 
 
+class CredentialsNotParseable(CraftStoreError):
+    """Error raised when credentials cannot be decoded as a macaroon."""
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(f"Credentials could not be parsed: {reason}")
+
+
+class CredentialBrokerUnavailable(CraftStoreError):
+    """Error raised when a credential broker cannot be used."""
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(f"Credential broker unavailable: {reason}")
+
+
+class DigestMismatch(CraftStoreError):
+    """Error raised when downloaded content does not match its digest."""
+
+    def __init__(self, url: str, expected: str, actual: str) -> None:
+        super().__init__(
+            f"Content downloaded from {url!r} has digest {actual!r}, "
+            f"expected {expected!r}."
+        )
+        self.expected = expected
+        self.actual = actual
+
+
 class CandidTokenTimeoutError(CraftStoreError):
     """Error raised when timeout is reached trying to discharge a macaroon."""
 
@@ -0,0 +1,146 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Digests of artifacts, computed from memory-mapped files.
+
+Files are memory-mapped and every digest is updated from the same pages,
+so several digests cost a single read of the file. :func:`hash_files`
+spreads files over a thread pool to use all cores, as :mod:`hashlib`
+releases the GIL while hashing, and
+:class:`StreamHasher` hashes an artifact as it is read for upload so
+hashing overlaps with the network transfer::
+
+    digests = hashing.hash_files(artifacts)
+    digests[artifact]["sha3_384"]
+"""
+
+import hashlib
+import mmap
+import os
+import pathlib
+from concurrent import futures
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+DEFAULT_ALGORITHMS = ("sha3_384", "sha256")
+"""Digests computed by default, those the stores check artifacts with."""
+
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+"""Bytes handed to each digest at once, large enough for hashlib to
+release the GIL and for the cost of a call to be negligible."""
+
+Digests = Dict[str, str]
+"""Hex digests keyed by algorithm name."""
+
+
+def _update(hashers: Sequence["hashlib._Hash"], data: Union[bytes, memoryview]) -> None:
+    with memoryview(data) as view:
+        for start in range(0, len(view), HASH_CHUNK_SIZE):
+            chunk = view[start:][:HASH_CHUNK_SIZE]
+            for hasher in hashers:
+                hasher.update(chunk)
+
+
+def hash_file(
+    path: Union[str, pathlib.Path], algorithms: Sequence[str] = DEFAULT_ALGORITHMS
+) -> Digests:
+    """Return the digests of the content of path, reading it once.
+
+    :param path: path of the file.
+    :param algorithms: names of :mod:`hashlib` algorithms.
+
+    :raises ValueError: for unknown algorithms.
+    """
+    hashers = [hashlib.new(algorithm) for algorithm in algorithms]
+    with open(path, "rb") as artifact:
+        if os.fstat(artifact.fileno()).st_size:
+            with mmap.mmap(artifact.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                _update(hashers, mapped)
+    return {
+        algorithm: hasher.hexdigest() for algorithm, hasher in zip(algorithms, hashers)
+    }
+
+
+def hash_files(
+    paths: Iterable[Union[str, pathlib.Path]],
+    algorithms: Sequence[str] = DEFAULT_ALGORITHMS,
+    *,
+    max_workers: Optional[int] = None,
+) -> Dict[pathlib.Path, Digests]:
+    """Return the digests of each file of paths, hashed in parallel.
+
+    Files are hashed by a pool of threads, one per core by default, a
+    single file is hashed in the calling thread. Threads, rather than
+    processes, are safe to start from threaded applications and hash in
+    parallel since hashlib releases the GIL.
+
+    :param paths: paths of the files.
+    :param algorithms: names of :mod:`hashlib` algorithms.
+    :param max_workers: amount of threads hashing files.
+    """
+    unique: List[pathlib.Path] = list(dict.fromkeys(pathlib.Path(p) for p in paths))
+    if len(unique) <= 1 or max_workers == 1:
+        return {path: hash_file(path, algorithms) for path in unique}
+
+    workers = min(len(unique), max_workers or os.cpu_count() or 1)
+    with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(hash_file, unique, [algorithms] * len(unique))
+        return dict(zip(unique, results))
+
+
+class StreamHasher:
+    """Digests of a file computed from the bytes read while streaming it.
+
+    Bytes are hashed as they are first read, in order. Bytes read again
+    after a rewind are not hashed twice, and bytes never read, as when
+    the stream is interrupted, are hashed from the file by :meth:`digests`.
+
+    :param path: path of the file being streamed.
+    :param algorithms: names of :mod:`hashlib` algorithms.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, pathlib.Path],
+        algorithms: Sequence[str] = DEFAULT_ALGORITHMS,
+    ) -> None:
+        self.path = pathlib.Path(path)
+        self.algorithms = tuple(algorithms)
+        self._hashers = [hashlib.new(algorithm) for algorithm in self.algorithms]
+        self._hashed = 0
+
+    def update(self, offset: int, data: bytes) -> None:
+        """Hash data, read at offset of the file."""
+        if offset > self._hashed or offset + len(data) <= self._hashed:
+            return
+        unhashed = self._hashed - offset
+        with memoryview(data) as view:
+            _update(self._hashers, view[unhashed:])
+        self._hashed = offset + len(data)
+
+    def digests(self) -> Digests:
+        """Return the digests of the file, hashing what was not read."""
+        hashers = [hasher.copy() for hasher in self._hashers]
+        with open(self.path, "rb") as artifact:
+            size = os.fstat(artifact.fileno()).st_size
+            if size > self._hashed:
+                hashed = self._hashed
+                with mmap.mmap(artifact.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    with memoryview(mapped) as view:
+                        _update(hashers, view[hashed:])
+        return {
+            algorithm: hasher.hexdigest()
+            for algorithm, hasher in zip(self.algorithms, hashers)
+        }
@@ -0,0 +1,334 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Hedged requests to reduce tail latency."""
+
+import asyncio
+import collections
+import concurrent.futures
+import dataclasses
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, Deque, Optional, Tuple, TypeVar, Union
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclasses.dataclass(frozen=True)
+class HedgingPolicy:
+    """Settings for hedging requests.
+
+    :param percentile: latency percentile after which a hedge is sent.
+    :param min_delay: lower bound for the hedge delay, in seconds.
+    :param max_delay: upper bound for the hedge delay, in seconds, also used
+                      until enough latencies have been observed.
+    :param window: amount of recent latencies to derive the delay from.
+    :param min_samples: latencies needed before using the percentile.
+    :param budget_ratio: hedges earned per request, bounding the amount of
+                         extra requests sent.
+    :param max_budget: maximum amount of hedges that can be accumulated.
+    :param max_workers: threads used to send hedges, a request is not
+                        hedged while all of them are busy.
+    """
+
+    percentile: float = 95.0
+    min_delay: float = 0.01
+    max_delay: float = 1.0
+    window: int = 200
+    min_samples: int = 20
+    budget_ratio: float = 0.05
+    max_budget: float = 10.0
+    max_workers: int = 32
+
+    def __post_init__(self) -> None:
+        if not 0 < self.percentile < 100:
+            raise ValueError("percentile must be between 0 and 100")
+        if not 0 <= self.min_delay <= self.max_delay:
+            raise ValueError("min_delay must be between 0 and max_delay")
+        if self.budget_ratio < 0 or self.max_budget < 0:
+            raise ValueError("budget_ratio and max_budget must not be negative")
+
+
+@dataclasses.dataclass
+class HedgingStats:
+    """Counters for hedged requests.
+
+    :ivar requests: requests sent through the hedger.
+    :ivar hedges: hedge requests sent.
+    :ivar wins: hedge requests answering before the original request.
+    :ivar budget_exhausted: hedges not sent due to an exhausted budget.
+    :ivar no_slot: hedges not sent for lack of a concurrency slot or of an
+                   idle hedging thread.
+    """
+
+    requests: int = 0
+    hedges: int = 0
+    wins: int = 0
+    budget_exhausted: int = 0
+    no_slot: int = 0
+
+
+class Hedger:
+    """Send a second attempt for slow requests and use the first answer.
+
+    A hedge is sent when the original request has not completed after the
+    configured percentile of recently observed latencies. Each request adds
+    :attr:`HedgingPolicy.budget_ratio` to a budget and each hedge consumes
+    one, so hedging never amplifies load by more than that ratio.
+
+    A Hedger can be shared among clients for a process wide budget,
+    blocking clients sending through :meth:`run` and asyncio ones through
+    :meth:`async_run`. Its threads are stopped with :meth:`close`, requests
+    are then sent without hedging.
+
+    :ivar policy: the :class:`HedgingPolicy` in use.
+    :ivar stats: the :class:`HedgingStats` collected.
+    """
+
+    def __init__(self, policy: Optional[HedgingPolicy] = None) -> None:
+        self.policy = policy or HedgingPolicy()
+        self.stats = HedgingStats()
+        self._lock = threading.Lock()
+        self._latencies: Deque[float] = collections.deque(maxlen=self.policy.window)
+        self._budget = 0.0
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.policy.max_workers, thread_name_prefix="craft-store-hedge"
+        )
+        # Hedges only go to idle threads of the executor, never queue.
+        self._idle_workers = threading.BoundedSemaphore(self.policy.max_workers)
+        self._closed = False
+
+    def close(self) -> None:
+        """Stop the threads sending requests, letting running requests end."""
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=False)
+
+    @property
+    def delay(self) -> float:
+        """Seconds to wait for a request before hedging it."""
+        with self._lock:
+            if len(self._latencies) < self.policy.min_samples:
+                return self.policy.max_delay
+            latencies = sorted(self._latencies)
+        index = min(
+            int(len(latencies) * self.policy.percentile / 100), len(latencies) - 1
+        )
+        return min(max(latencies[index], self.policy.min_delay), self.policy.max_delay)
+
+    def _admit_hedge(
+        self, acquire_slot: Optional[Callable[[], Optional[Callable[[], None]]]]
+    ) -> Tuple[bool, Optional[Callable[[], None]]]:
+        """Return whether to hedge and the release of the slot taken for it."""
+        with self._lock:
+            if self._budget < 1:
+                self.stats.budget_exhausted += 1
+                return False, None
+            release = None
+            if acquire_slot is not None:
+                release = acquire_slot()
+                if release is None:
+                    self.stats.no_slot += 1
+                    return False, None
+            self._budget -= 1
+            self.stats.hedges += 1
+            return True, release
+
+    def _send_hedge(
+        self, send: Callable[[], T], release: Optional[Callable[[], None]]
+    ) -> T:
+        try:
+            return send()
+        finally:
+            if release is not None:
+                release()
+            self._idle_workers.release()
+
+    @staticmethod
+    def _start_primary(send: Callable[[], T]) -> "concurrent.futures.Future[T]":
+        """Call send on a thread of its own, so it starts right away."""
+        future: "concurrent.futures.Future[T]" = concurrent.futures.Future()
+
+        def run() -> None:
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(send())
+            except BaseException as error:  # pylint: disable=broad-except
+                future.set_exception(error)
+
+        threading.Thread(target=run, name="craft-store-request", daemon=True).start()
+        return future
+
+    @staticmethod
+    async def _async_send_hedge(
+        send: Callable[[], Awaitable[T]], release: Optional[Callable[[], None]]
+    ) -> T:
+        try:
+            return await send()
+        finally:
+            if release is not None:
+                release()
+
+    def _record(self, latency: float, hedge_won: bool) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+            if hedge_won:
+                self.stats.wins += 1
+
+    @staticmethod
+    def _discard(future: Union["concurrent.futures.Future", "asyncio.Future"]) -> None:
+        """Release the result of an attempt that lost the race."""
+        if future.cancelled() or future.exception() is not None:
+            return
+        close = getattr(future.result(), "close", None)
+        if close is not None:
+            close()
+
+    def _start(self) -> bool:
+        """Account a request, return whether it may be hedged."""
+        with self._lock:
+            if self._closed:
+                return False
+            self.stats.requests += 1
+            self._budget = min(
+                self._budget + self.policy.budget_ratio, self.policy.max_budget
+            )
+            return True
+
+    def run(
+        self,
+        send: Callable[[], T],
+        *,
+        acquire_slot: Optional[Callable[[], Optional[Callable[[], None]]]] = None,
+    ) -> T:
+        """Call send, hedging it with a second call if slow.
+
+        The result of whichever call completes first is returned, if it
+        raised, the other call is waited on. If both raise, the exception
+        from the original call is raised.
+
+        The original call runs on a thread of its own, started at once, so
+        it never waits behind other requests and the hedge delay only runs
+        while it is in flight. Hedges run on the threads of the hedger and
+        are only sent when one of them is idle.
+
+        When requests are bounded by a limiter or scheduler, the hedge must
+        hold a slot of its own: acquire_slot is called without blocking
+        before hedging and returns a callable releasing the slot it took,
+        None if no slot is free, in which case the request is not hedged.
+
+        :param send: idempotent callable performing the request.
+        :param acquire_slot: take a concurrency slot for the hedge.
+        """
+        if not self._start():
+            return send()
+
+        start = time.monotonic()
+        primary = self._start_primary(send)
+        done, _ = concurrent.futures.wait([primary], timeout=self.delay)
+        hedged, release = False, None
+        if not done:
+            if self._idle_workers.acquire(blocking=False):
+                hedged, release = self._admit_hedge(acquire_slot)
+                if not hedged:
+                    self._idle_workers.release()
+            else:
+                with self._lock:
+                    self.stats.no_slot += 1
+        if hedged:
+            try:
+                hedge = self._executor.submit(self._send_hedge, send, release)
+            except RuntimeError:
+                # closed while waiting for the original request.
+                if release is not None:
+                    release()
+                self._idle_workers.release()
+                hedged = False
+        if not hedged:
+            result = primary.result()
+            self._record(time.monotonic() - start, hedge_won=False)
+            return result
+
+        logger.debug("Hedging request after %.3fs.", time.monotonic() - start)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in (f for f in (primary, hedge) if f in done):
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.add_done_callback(self._discard)
+                    self._record(time.monotonic() - start, future is hedge)
+                    return future.result()
+
+        # Both attempts failed.
+        return primary.result()
+
+    async def async_run(
+        self,
+        send: Callable[[], Awaitable[T]],
+        *,
+        acquire_slot: Optional[Callable[[], Optional[Callable[[], None]]]] = None,
+    ) -> T:
+        """Await send, hedging it with a second call if slow.
+
+        The asyncio counterpart of :meth:`run`, the attempts run as tasks
+        of the running loop and the one losing the race is cancelled.
+
+        :param send: idempotent coroutine function performing the request.
+        :param acquire_slot: take a concurrency slot for the hedge.
+        """
+        if not self._start():
+            return await send()
+
+        start = time.monotonic()
+        primary: "asyncio.Future[T]" = asyncio.ensure_future(send())
+        attempts = [primary]
+        winner: "Optional[asyncio.Future[T]]" = None
+        try:
+            done, _ = await asyncio.wait([primary], timeout=self.delay)
+            hedged, release = (False, None) if done else self._admit_hedge(acquire_slot)
+            if not hedged:
+                result = await primary
+                winner = primary
+                self._record(time.monotonic() - start, hedge_won=False)
+                return result
+
+            logger.debug("Hedging request after %.3fs.", time.monotonic() - start)
+            hedge = asyncio.ensure_future(self._async_send_hedge(send, release))
+            attempts.append(hedge)
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in (t for t in attempts if t in done):
+                    if task.exception() is None:
+                        winner = task
+                        self._record(time.monotonic() - start, task is hedge)
+                        return task.result()
+
+            # Both attempts failed.
+            return primary.result()
+        finally:
+            for task in attempts:
+                if task is not winner:
+                    task.cancel()
+                    task.add_done_callback(self._discard)
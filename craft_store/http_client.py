@@ -16,90 +16,277 @@
 
 """Craft Store HTTPClient."""
 
+import contextlib
+import functools
 import logging
-import os
-from typing import Dict, Optional, Union
+import pathlib
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence, Union
 
 import requests
-from requests.adapters import HTTPAdapter, Retry
 
-from . import errors
+from . import errors, protocol, streaming
+from .cassette import Cassette, RecordingTransport
+from .concurrency import AIMDPolicy, ConcurrencyLimiter
+from .config import (  # noqa: F401
+    REQUEST_BACKOFF,
+    REQUEST_BACKOFF_JITTER,
+    REQUEST_TOTAL_RETRIES,
+    ClientConfig,
+)
+from .download_cache import DOWNLOAD_CHUNK_SIZE, DownloadCache, write_verified
+from .hedging import Hedger
+from .retry_budget import BudgetedRetry, RetryBudget, RetryBudgetPolicy
+from .scheduling import RequestScheduler
+from .transport import RequestsTransport, Transport
 
 logger = logging.getLogger(__name__)
 
 
-REQUEST_TOTAL_RETRIES = 8
-"""Amount of retries for a request."""
-REQUEST_BACKOFF = 0.2
-"""Backoff before retrying a request."""
-
-
-def _get_retry_value(
-    environment_var: str, default_value: Union[int, float]
-) -> Union[int, float]:
-    """Return the backoff to use in HTTPClient."""
-    environment_value = os.getenv(environment_var)
-    if environment_value is None:
-        return default_value
-
-    try:
-        value = int(environment_value)
-    except ValueError:
-        logger.debug(
-            "%r set to invalid value %r, setting to %r.",
-            environment_var,
-            environment_value,
-            default_value,
-        )
-        return default_value
-
-    if value < 0:
-        logger.debug(
-            "%r set to non positive value %r, setting to %r.",
-            environment_var,
-            value,
-            default_value,
+HEDGED_METHODS = frozenset(["GET", "HEAD"])
+"""Idempotent methods that are hedged when a Hedger is set."""
+
+
+def get_default_retries(
+    budget: Optional[RetryBudget] = None, config: Optional[ClientConfig] = None
+) -> BudgetedRetry:
+    """Return the retry policy used by default for requests.
+
+    The total amount of retries, backoff factor and jitter are those of
+    config, which defaults to :meth:`.config.ClientConfig.from_env`: the
+    total amount of retries and backoff factor default to
+    :data:`.REQUEST_TOTAL_RETRIES` and :data:`.REQUEST_BACKOFF`,
+    overridable with ``CRAFT_STORE_RETRIES`` and ``CRAFT_STORE_BACKOFF``.
+    The backoff is jittered by :data:`.REQUEST_BACKOFF_JITTER`.
+
+    :param budget: :class:`.retry_budget.RetryBudget` to spend retries from.
+    :param config: :class:`.config.ClientConfig` to take settings from.
+    """
+    if config is None:
+        config = ClientConfig.from_env()
+    return BudgetedRetry(
+        total=config.retries,
+        backoff_factor=config.backoff,
+        status_forcelist=sorted(errors.RETRY_STATUS_CODES),
+        jitter=config.backoff_jitter,
+        budget=budget,
+    )
+
+
+def build_limiter(config: ClientConfig) -> Optional[ConcurrencyLimiter]:
+    """Return the limiter for :attr:`.config.ClientConfig.max_concurrency`.
+
+    :return: None if config does not bound concurrency.
+    """
+    if config.max_concurrency is None:
+        return None
+    return ConcurrencyLimiter(
+        AIMDPolicy(
+            initial_limit=min(AIMDPolicy.initial_limit, config.max_concurrency),
+            max_limit=config.max_concurrency,
         )
-        return default_value
+    )
 
-    return value
+
+def build_retry_budget(config: ClientConfig) -> Optional[RetryBudget]:
+    """Return the budget for :attr:`.config.ClientConfig.retry_budget_ratio`.
+
+    :return: None if config does not bound retries.
+    """
+    if config.retry_budget_ratio is None:
+        return None
+    return RetryBudget(RetryBudgetPolicy(ratio=config.retry_budget_ratio))
+
+
+def build_download_cache(config: ClientConfig) -> Optional[DownloadCache]:
+    """Return the cache for :attr:`.config.ClientConfig.download_cache_path`.
+
+    :return: None if config does not cache downloads.
+    """
+    if config.download_cache_path is None:
+        return None
+    return DownloadCache(
+        config.download_cache_path, max_size=config.download_cache_size
+    )
 
 
 class HTTPClient:
     """Generic HTTP Client to communicate with Canonical's Developer Gateway.
 
-    This client has a requests like interface, it creates a requests.Session
-    on initialization to handle retries over HTTP and HTTPS requests.
+    This client has a requests like interface, requests are sent through a
+    :class:`.transport.Transport`, by default a requests.Session is created on
+    initialization to handle retries over HTTP and HTTPS requests.
 
+    The client is tuned with a :class:`.config.ClientConfig`, by default the
+    one set in the environment with :meth:`.config.ClientConfig.from_env`.
     The default number of retries is set in :data:`.REQUEST_TOTAL_RETRIES` and can
     be overridden with the ``CRAFT_STORE_RETRIES`` environment variable.
 
     The backoff factor has a default set in :data:`.REQUEST_BACKOFF` and can be
     overridden with the ``CRAFT_STORE_BACKOFF`` environment variable.
 
-    Retries are done for the following return codes: ``500``, ``502``, ``503``
-    and ``504``.
+    Retries across all requests can be bounded to a fraction of the
+    successful ones by setting a :class:`.retry_budget.RetryBudget`, so
+    retries do not pile up on a store that is struggling.
+
+    Idempotent requests can be hedged to cut tail latency by setting a
+    :class:`.hedging.Hedger`, streamed requests are never hedged. Hedges
+    take a slot of their own from the limiter and scheduler described
+    below, requests are not hedged when none is free.
+
+    Concurrent requests, such as those of bulk operations from many threads,
+    can be limited to what the store handles by setting a
+    :class:`.concurrency.ConcurrencyLimiter`. Interactive requests can be kept
+    ahead of bulk ones sharing the client by setting a
+    :class:`.scheduling.RequestScheduler`, requests are dispatched by the
+    scheduler before going through the limiter.
+
+    Large JSON listings can be consumed item by item as they arrive with
+    :meth:`stream_json`.
+
+    Artifacts are downloaded with :meth:`download`, verified against the
+    digest reported by the store. Repeated downloads are served locally by
+    setting a :class:`.download_cache.DownloadCache`, the one of the config
+    is only built on the first download.
+
+    Interactions can be recorded into a :class:`.cassette.Cassette` with
+    :meth:`recording`, to be replayed offline with a
+    :class:`.cassette.ReplayTransport`.
+
+    Retries are done for return codes classified as
+    :attr:`.errors.ErrorCategory.RETRYABLE` or
+    :attr:`.errors.ErrorCategory.THROTTLED`: ``429``, ``500``, ``502``,
+    ``503`` and ``504``, honoring the ``Retry-After`` header if sent.
+    Throttled requests were not processed and are retried whatever their
+    method, other requests only if idempotent. Other errors fail fast, and
+    errors classified :attr:`.errors.ErrorCategory.AUTH_EXPIRED` drop the
+    Authorization header installed on the transport.
 
     :ivar user_agent: User-Agent header to identify the client.
+    :ivar config: the :class:`.config.ClientConfig` in use.
     """
 
-    def __init__(self, *, user_agent: str) -> None:
+    def __init__(
+        self,
+        *,
+        user_agent: str,
+        hedger: Optional[Hedger] = None,
+        transport: Optional[Transport] = None,
+        limiter: Optional[ConcurrencyLimiter] = None,
+        scheduler: Optional[RequestScheduler] = None,
+        retry_budget: Optional[RetryBudget] = None,
+        download_cache: Optional[DownloadCache] = None,
+        config: Optional[ClientConfig] = None,
+    ) -> None:
         """Initialize an HTTPClient with a given user_agent.
 
         :param user_agent: User-Agent header to identify the client.
+        :param hedger: :class:`.hedging.Hedger` to hedge idempotent requests with.
+        :param transport: :class:`.transport.Transport` to send requests with,
+                          defaults to a :class:`.transport.RequestsTransport`
+                          using :func:`get_default_retries`.
+        :param limiter: :class:`.concurrency.ConcurrencyLimiter` adapting the
+                        amount of concurrent requests to the store capacity.
+        :param scheduler: :class:`.scheduling.RequestScheduler` ordering
+                          requests by priority class.
+        :param retry_budget: :class:`.retry_budget.RetryBudget` bounding
+                             retries, a transport set must retry with
+                             :func:`get_default_retries` for this budget.
+        :param download_cache: :class:`.download_cache.DownloadCache` serving
+                               repeated :meth:`download` calls locally.
+        :param config: :class:`.config.ClientConfig` to tune the client with,
+                       defaults to :meth:`.config.ClientConfig.from_env`.
+                       limiter, retry_budget and download_cache take
+                       precedence over those the config sets up.
         """
-        self._session = requests.Session()
+        if config is None:
+            config = ClientConfig.from_env()
+        self.config = config
+        if limiter is None:
+            limiter = build_limiter(config)
+        if retry_budget is None:
+            retry_budget = build_retry_budget(config)
+        if transport is None:
+            transport = RequestsTransport(
+                retries=get_default_retries(retry_budget, config),
+                max_idle=config.max_idle,
+                health_check_interval=config.health_check_interval,
+                pool_size=config.pool_size,
+            )
+        self._transport = transport
+        self._hedger = hedger
+        self._limiter = limiter
+        self._scheduler = scheduler
+        self._retry_budget = retry_budget
+        if download_cache is not None:
+            self._download_cache = download_cache
+        self._static_headers = protocol.StaticHeaders(transport.headers)
         self.user_agent = user_agent
 
-        # Setup max retries for all store URLs and the CDN
-        retries = Retry(
-            total=_get_retry_value("CRAFT_STORE_RETRIES", REQUEST_TOTAL_RETRIES),
-            backoff_factor=_get_retry_value("CRAFT_STORE_BACKOFF", REQUEST_BACKOFF),
-            status_forcelist=[500, 502, 503, 504],
-        )
-        http_adapter = HTTPAdapter(max_retries=retries)
-        self._session.mount("http://", http_adapter)
-        self._session.mount("https://", http_adapter)
+    def close(self) -> None:
+        """Release the connections of the transport and stop the hedger.
+
+        A transport or hedger shared with other clients is closed as well,
+        close the client when done with them all.
+        """
+        self._transport.close()
+        if self._hedger is not None:
+            self._hedger.close()
+
+    def __enter__(self) -> "HTTPClient":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @property
+    def user_agent(self) -> str:
+        """User-Agent header to identify the client."""
+        return self._static_headers["User-Agent"]
+
+    @user_agent.setter
+    def user_agent(self, user_agent: str) -> None:
+        self._set_static_header("User-Agent", user_agent)
+
+    def _set_static_header(self, name: str, value: str) -> None:
+        """Install a header sent with every request on the transport."""
+        self._static_headers.set(name, value)
+
+    def _del_static_header(self, name: str) -> None:
+        """Remove a header installed with :meth:`_set_static_header`."""
+        self._static_headers.delete(name)
+
+    @contextlib.contextmanager
+    def recording(self, path: Union[str, pathlib.Path]) -> Iterator[Cassette]:
+        """Record the interactions of requests sent within the context.
+
+        The cassette is saved to path when leaving the context, with
+        macaroons redacted.
+
+        :param path: path to save the cassette to.
+        """
+        cassette = Cassette()
+        transport = self._transport
+        self._transport = RecordingTransport(transport, cassette)
+        try:
+            yield cassette
+        finally:
+            self._transport = transport
+            cassette.save(path)
+
+    def warmup(self, url: str, connections: int = 1) -> int:
+        """Connect to the host of url ahead of the first requests.
+
+        Name resolution, TCP and TLS setup are paid upfront so the first
+        requests are as fast as the following ones. Warming up is best
+        effort and never raises.
+
+        :param url: URL of the host to connect to.
+        :param connections: amount of connections to open, for as many
+                            concurrent requests.
+
+        :return: the amount of connections opened.
+        """
+        return self._transport.warmup(url, connections)
 
     def get(self, *args, **kwargs) -> requests.Response:
         """Perform an HTTP GET request."""
@@ -113,6 +300,90 @@ class HTTPClient:
         """Perform an HTTP PUT request."""
         return self.request("PUT", *args, **kwargs)
 
+    def stream_json(
+        self,
+        method: str,
+        url: str,
+        *,
+        path: Sequence[str] = (),
+        chunk_size: int = streaming.STREAM_CHUNK_SIZE,
+        **kwargs,
+    ) -> Iterator[Any]:
+        """Send a request to url and yield the items of the JSON array returned.
+
+        The response is streamed and parsed incrementally with
+        :func:`.streaming.iter_json_items`, items are yielded as they arrive
+        and only the item being parsed is held in memory, instead of the
+        whole document as with ``response.json()``. The request is sent on
+        the first iteration and the response is closed once iteration ends.
+
+        :param method: HTTP method used for the request.
+        :param url: URL to request with method.
+        :param path: keys of nested objects leading to the array in the
+                     response, the response is the array itself if empty.
+        :param chunk_size: size of the chunks read from the response.
+        :param kwargs: arguments for :meth:`request`.
+
+        :raises errors.StoreServerError: for error responses.
+        :raises errors.NetworkError: for lower level network issues.
+        :raises json.JSONDecodeError: if the response is not valid JSON.
+        """
+        response = self.request(method, url, stream=True, **kwargs)
+        try:
+            yield from streaming.iter_json_items(
+                response.iter_content(chunk_size), path
+            )
+        finally:
+            response.close()
+
+    @functools.cached_property
+    def _download_cache(self) -> Optional[DownloadCache]:
+        return build_download_cache(self.config)
+
+    def download(
+        self,
+        url: str,
+        path: Union[str, pathlib.Path],
+        *,
+        digest: str,
+        algorithm: str = "sha3_384",
+        **kwargs,
+    ) -> bool:
+        """Download the content of url to path, verifying it against digest.
+
+        Path is replaced atomically once the content is verified. With a
+        download cache set, content already cached under digest is
+        materialized into path without sending any request.
+
+        :param url: URL to download.
+        :param path: path to write the content to.
+        :param digest: hex digest of the content, as reported by the store.
+        :param algorithm: name of the :mod:`hashlib` algorithm of digest.
+        :param kwargs: arguments for :meth:`request`.
+
+        :raises errors.DigestMismatch: if the content does not match digest.
+        :raises errors.StoreServerError: for error responses.
+        :raises errors.NetworkError: for lower level network issues.
+
+        :return: True if served from the download cache.
+        """
+
+        def chunks() -> Iterator[bytes]:
+            response = self.request("GET", url, stream=True, **kwargs)
+            try:
+                yield from response.iter_content(DOWNLOAD_CHUNK_SIZE)
+            finally:
+                response.close()
+
+        if self._download_cache is None:
+            write_verified(
+                chunks(), path, digest=digest, algorithm=algorithm, source=url
+            )
+            return False
+        return self._download_cache.fetch(
+            digest, chunks, path, algorithm=algorithm, source=url
+        )
+
     def request(
         self,
         method: str,
@@ -123,7 +394,8 @@ class HTTPClient:
     ) -> requests.Response:
         """Send a request to url.
 
-        :attr:`.user_agent` is set as part of the headers for the request.
+        :attr:`.user_agent` is set as part of the headers for the request,
+        it is installed once on the transport instead of per request.
         All requests are logged through a debug logs, headers matching
         Authorization and Macaroons have their value replaced.
 
@@ -137,34 +409,57 @@ class HTTPClient:
 
         :return: Response from the request.
         """
-        if headers:
-            headers["User-Agent"] = self.user_agent
-        else:
-            headers = {"User-Agent": self.user_agent}
-
-        debug_headers = headers.copy()
-        if debug_headers.get("Authorization"):
-            debug_headers["Authorization"] = "<macaroon>"
-        if debug_headers.get("Macaroons"):
-            debug_headers["Macaroons"] = "<macaroon>"
-        logger.debug(
-            "HTTP %r for %r with params %r and headers %r",
+        protocol.prepare_request(
             method,
             url,
             params,
-            debug_headers,
+            headers,
+            kwargs,
+            static_headers=self._static_headers,
+            timeout=self.config.timeout,
+            log=logger,
         )
+        send: Callable[[], requests.Response] = functools.partial(
+            self._send_request, method, url, params, headers, **kwargs
+        )
+        if self._limiter is not None:
+            send = functools.partial(self._limiter.run, send)
         try:
-            response = self._session.request(
+            if self._scheduler is not None:
+                return self._scheduler.run(send)
+            return send()
+        except errors.StoreServerError as store_error:
+            if protocol.is_auth_expired(store_error):
+                self._on_auth_expired()
+            raise
+
+    def _on_auth_expired(self) -> None:
+        """Drop credentials the store reported as missing or expired."""
+        self._del_static_header("Authorization")
+
+    def _send_request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, str]],
+        headers: Optional[Dict[str, str]],
+        **kwargs,
+    ) -> requests.Response:
+        if (
+            self._hedger is not None
+            and method.upper() in HEDGED_METHODS
+            and not kwargs.get("stream")
+        ):
+            acquire_slot = protocol.hedge_slot_acquirer(self._limiter, self._scheduler)
+            response = self._hedger.run(
+                lambda: self._transport.request(
+                    method, url, headers=headers, params=params, **kwargs
+                ),
+                acquire_slot=acquire_slot,
+            )
+        else:
+            response = self._transport.request(
                 method, url, headers=headers, params=params, **kwargs
             )
-        except (
-            requests.exceptions.ConnectionError,
-            requests.exceptions.RetryError,
-        ) as error:
-            raise errors.NetworkError(error) from error
-
-        if not response.ok:
-            raise errors.StoreServerError(response)
 
-        return response
+        return protocol.handle_response(response, self._retry_budget)
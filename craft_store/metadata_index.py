@@ -0,0 +1,356 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Local SQLite index of account packages, revisions and channel maps.
+
+A :class:`MetadataIndex` is filled with
+:meth:`.store_client.StoreClient.sync_index` and queried locally::
+
+    with MetadataIndex(path) as index:
+        store_client.sync_index(index)
+        for release in index.channel_map("my-charm"):
+            ...
+
+Syncs are incremental: every listing is requested conditionally with the
+``ETag`` and ``Last-Modified`` validators of the previous sync, listings
+the store reports as not modified are neither downloaded nor parsed.
+Revisions are added or updated as their status changes, while package
+listings and channel maps are replaced when they change. Packages gone
+from the account are dropped along with their revisions, channel maps and
+validators.
+"""
+
+import dataclasses
+import logging
+import pathlib
+import sqlite3
+import threading
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Union,
+)
+
+import requests
+
+from . import endpoints, streaming
+from .records import ReleaseRecord, RevisionRecord
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 2
+"""Version of the schema, indexes of other versions are rebuilt."""
+
+_SCHEMA = """
+CREATE TABLE packages (
+    name TEXT PRIMARY KEY,
+    type TEXT NOT NULL
+);
+CREATE TABLE revisions (
+    package TEXT NOT NULL,
+    revision INTEGER NOT NULL,
+    version TEXT,
+    status TEXT,
+    created_at TEXT,
+    size INTEGER,
+    sha3_384 TEXT,
+    PRIMARY KEY (package, revision)
+);
+CREATE TABLE releases (
+    package TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    revision INTEGER,
+    "when" TEXT,
+    expiration_date TEXT
+);
+CREATE INDEX releases_package ON releases (package);
+CREATE TABLE validators (
+    url TEXT PRIMARY KEY,
+    package TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    synced_at REAL NOT NULL
+);
+"""
+
+Request = Callable[..., requests.Response]
+
+
+@dataclasses.dataclass
+class SyncStats:
+    """Counters for a sync of a :class:`MetadataIndex`.
+
+    :ivar requests: listings requested.
+    :ivar not_modified: listings the store reported as not modified.
+    :ivar packages: packages listed.
+    :ivar revisions: revisions added or updated.
+    :ivar releases: channel map entries written.
+    """
+
+    requests: int = 0
+    not_modified: int = 0
+    packages: int = 0
+    revisions: int = 0
+    releases: int = 0
+
+
+class MetadataIndex:
+    """SQLite backed index of store metadata.
+
+    The index is a cache: an index from another :data:`SCHEMA_VERSION` is
+    dropped and rebuilt on the next sync. Access is serialized, an index
+    can be shared among threads.
+
+    :param path: path of the database file, kept in memory if None.
+    """
+
+    def __init__(self, path: Optional[Union[str, pathlib.Path]] = None) -> None:
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            ":memory:" if path is None else str(path), check_same_thread=False
+        )
+        if path is not None:
+            self._db.execute("PRAGMA journal_mode=WAL")
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            self._create_schema()
+
+    def _create_schema(self) -> None:
+        logger.debug("Creating metadata index schema %r.", SCHEMA_VERSION)
+        with self._db:
+            for (table,) in self._db.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            ).fetchall():
+                self._db.execute(f'DROP TABLE "{table}"')
+            self._db.executescript(_SCHEMA)
+            self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def __enter__(self) -> "MetadataIndex":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the database."""
+        self._db.close()
+
+    def packages(self) -> List[endpoints.Package]:
+        """Return the packages of the account, sorted by name."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT name, type FROM packages ORDER BY name"
+            ).fetchall()
+        return [endpoints.Package(name, package_type) for name, package_type in rows]
+
+    def revisions(self, name: str) -> List[RevisionRecord]:
+        """Return the revisions of package name, sorted by revision."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT revision, version, status, created_at, size, sha3_384 "
+                "FROM revisions WHERE package = ? ORDER BY revision",
+                (name,),
+            ).fetchall()
+        return [RevisionRecord(*row) for row in rows]
+
+    def channel_map(self, name: str) -> List[ReleaseRecord]:
+        """Return the channel map of package name."""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT channel, revision, "when", expiration_date '
+                "FROM releases WHERE package = ? ORDER BY rowid",
+                (name,),
+            ).fetchall()
+        return [ReleaseRecord(*row) for row in rows]
+
+    def synced_at(self, url: str) -> Optional[float]:
+        """Return the time url was last synced at, None if never synced."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT synced_at FROM validators WHERE url = ?", (url,)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def _get(
+        self, request: Request, url: str, stats: SyncStats
+    ) -> Optional[requests.Response]:
+        """Request url conditionally, return None if not modified."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified FROM validators WHERE url = ?", (url,)
+            ).fetchone()
+        headers = {}
+        if row is not None:
+            etag, last_modified = row
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        stats.requests += 1
+        response = request("GET", url, headers=headers, stream=True)
+        if response.status_code == 304:
+            logger.debug("%r not modified since last sync.", url)
+            response.close()
+            stats.not_modified += 1
+            with self._lock, self._db:
+                self._db.execute(
+                    "UPDATE validators SET synced_at = ? WHERE url = ?",
+                    (time.time(), url),
+                )
+            return None
+        return response
+
+    def _save_validators(
+        self, url: str, response: requests.Response, package: Optional[str] = None
+    ) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO validators VALUES (?, ?, ?, ?, ?)",
+                (
+                    url,
+                    package,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    time.time(),
+                ),
+            )
+
+    @staticmethod
+    def _items(response: requests.Response, path: Sequence[str]) -> Iterator[Any]:
+        try:
+            yield from streaming.iter_json_items(
+                response.iter_content(streaming.STREAM_CHUNK_SIZE), path
+            )
+        finally:
+            response.close()
+
+    def _add_revisions(self, name: str, items: Iterable[Dict[str, Any]]) -> int:
+        """Add or update the revisions of package name, return the changed count.
+
+        Items are read before the transaction starts, so streamed listings
+        do not hold the database while waiting on the network.
+        """
+        rows = [(name, *RevisionRecord.from_dict(item).to_tuple()) for item in items]
+        with self._lock, self._db:
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT INTO revisions VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (package, revision) DO UPDATE SET "
+                "version = excluded.version, status = excluded.status, "
+                "created_at = excluded.created_at, size = excluded.size, "
+                "sha3_384 = excluded.sha3_384 "
+                "WHERE (version, status, created_at, size, sha3_384) IS NOT "
+                "(excluded.version, excluded.status, excluded.created_at, "
+                "excluded.size, excluded.sha3_384)",
+                rows,
+            )
+            return self._db.total_changes - before
+
+    def sync(
+        self,
+        request: Request,
+        *,
+        base_url: str,
+        store_endpoints: endpoints.Endpoints,
+        packages: Optional[Sequence[str]] = None,
+    ) -> SyncStats:
+        """Bring the index up to date with the store.
+
+        Prefer :meth:`.store_client.StoreClient.sync_index`.
+
+        :param request: callable sending authenticated requests, with the
+                        signature of :meth:`.http_client.HTTPClient.request`.
+        :param base_url: the base url of the API endpoint.
+        :param store_endpoints: the endpoints of the store.
+        :param packages: names of the packages to sync, all the packages of
+                         the account if None.
+
+        :raises ValueError: if packages is None and the store cannot list
+                            the packages of the account.
+        :raises errors.StoreServerError: for error responses.
+        :raises errors.NetworkError: for lower level network issues.
+        """
+        stats = SyncStats()
+        if packages is None:
+            if store_endpoints.account_packages is None:
+                raise ValueError("The store cannot list the packages of the account.")
+            self._sync_packages(
+                request, base_url + store_endpoints.account_packages, stats
+            )
+            names = [package.package_name for package in self.packages()]
+        else:
+            names = list(packages)
+
+        for name in names:
+            if store_endpoints.revisions is not None:
+                url = base_url + store_endpoints.revisions.format(name=name)
+                response = self._get(request, url, stats)
+                if response is not None:
+                    stats.revisions += self._add_revisions(
+                        name, self._items(response, ["revisions"])
+                    )
+                    self._save_validators(url, response, name)
+            if store_endpoints.channel_map is not None:
+                url = base_url + store_endpoints.channel_map.format(name=name)
+                response = self._get(request, url, stats)
+                if response is not None:
+                    self._sync_channel_map(name, response, stats)
+                    self._save_validators(url, response, name)
+        logger.debug("Synced metadata index: %r.", stats)
+        return stats
+
+    def _sync_packages(self, request: Request, url: str, stats: SyncStats) -> None:
+        response = self._get(request, url, stats)
+        if response is None:
+            return
+        rows = [
+            (item["name"], item["type"]) for item in self._items(response, ["results"])
+        ]
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM packages")
+            self._db.executemany("INSERT INTO packages VALUES (?, ?)", rows)
+            for table in ("revisions", "releases", "validators"):
+                self._db.execute(
+                    f"DELETE FROM {table} "
+                    "WHERE package NOT IN (SELECT name FROM packages)"
+                )
+        stats.packages = len(rows)
+        self._save_validators(url, response)
+
+    def _sync_channel_map(
+        self, name: str, response: requests.Response, stats: SyncStats
+    ) -> None:
+        try:
+            payload = response.json()
+        finally:
+            response.close()
+        stats.revisions += self._add_revisions(name, payload.get("revisions", []))
+        rows = [
+            (name, *ReleaseRecord.from_dict(item).to_tuple())
+            for item in payload.get("channel-map", [])
+        ]
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM releases WHERE package = ?", (name,))
+            self._db.executemany("INSERT INTO releases VALUES (?, ?, ?, ?, ?)", rows)
+        stats.releases += len(rows)
@@ -0,0 +1,27 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Typed models of store responses.
+
+Models are built with :meth:`MarshableModel.unmarshal`, for instance
+``TokenModel.unmarshal(response.json())``, and returned by the clients, as
+:class:`WhoamiModel` from ``whoami()``.
+"""
+
+from ._base import MarshableModel, ModelList  # noqa: F401
+from .registered_name_model import RegisteredNameModel  # noqa: F401
+from .token_model import TokenModel  # noqa: F401
+from .whoami_model import AccountModel, WhoamiModel  # noqa: F401
@@ -0,0 +1,228 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Base model for store responses."""
+
+import collections.abc
+import copy
+import dataclasses
+import typing
+from typing import (
+    Any,
+    Dict,
+    Generic,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    overload,
+)
+
+import pydantic
+
+M = TypeVar("M", bound="MarshableModel")
+
+_MISSING = object()
+_IMMUTABLE_DEFAULTS = (type(None), bool, int, float, str, bytes)
+
+
+def _to_alias(name: str) -> str:
+    return name.replace("_", "-")
+
+
+def _nested_model(hint: Any) -> Optional[Tuple[Type["MarshableModel"], bool]]:
+    """Return the model in type hint and whether hint is a list of it."""
+    origin = typing.get_origin(hint)
+    args = typing.get_args(hint)
+    if origin is Union:
+        args = tuple(arg for arg in args if arg is not type(None))
+        return _nested_model(args[0]) if len(args) == 1 else None
+    if origin in (list, collections.abc.Sequence):
+        nested = _nested_model(args[0]) if args else None
+        if nested is None or nested[1]:
+            return None
+        return nested[0], True
+    if isinstance(hint, type) and issubclass(hint, MarshableModel):
+        return hint, False
+    return None
+
+
+@dataclasses.dataclass(frozen=True)
+class _FieldPlan:
+    name: str
+    alias: str
+    required: bool
+    default: Any
+    copy_default: bool
+    model: Optional[Type["MarshableModel"]]
+    is_list: bool
+
+
+class MarshableModel(pydantic.BaseModel):
+    """Model for store responses, with keys in kebab case.
+
+    Responses are trusted to match the model by default: :meth:`unmarshal`
+    builds models without validation, which is as cheap as it gets, while
+    ``validate=True`` runs the full pydantic validation.
+    """
+
+    class Config:  # pylint: disable=too-few-public-methods
+        """Pydantic model configuration."""
+
+        alias_generator = _to_alias
+        allow_population_by_field_name = True
+
+    @classmethod
+    def _fields_plan(cls) -> List[_FieldPlan]:
+        """Return how to build each field of the model from a payload.
+
+        Resolved from the fields and type hints of the class once and kept
+        on it.
+        """
+        plan = cls.__dict__.get("_plan")
+        if plan is None:
+            hints = typing.get_type_hints(cls)
+            plan = []
+            for name, field in cls.__fields__.items():
+                nested = _nested_model(hints.get(name))
+                plan.append(
+                    _FieldPlan(
+                        name=name,
+                        alias=field.alias,
+                        required=field.required,
+                        default=field.default,
+                        # defaults are copied unless immutable, like pydantic does.
+                        copy_default=not isinstance(field.default, _IMMUTABLE_DEFAULTS),
+                        model=nested[0] if nested else None,
+                        is_list=nested[1] if nested else False,
+                    )
+                )
+            setattr(cls, "_plan", plan)
+        return plan
+
+    @classmethod
+    def construct_from(cls: Type[M], data: Dict[str, Any]) -> M:
+        """Build a model from data without validation.
+
+        Nested models are built as well, missing optional fields get their
+        default and unknown keys are ignored. Data missing a required field
+        is validated instead, to report what is missing.
+
+        :raises pydantic.ValidationError: if a required field is missing.
+        """
+        values: Dict[str, Any] = {}
+        fields_set = set()
+        for field in cls._fields_plan():
+            value = data.get(field.alias, _MISSING)
+            if value is _MISSING and field.alias != field.name:
+                value = data.get(field.name, _MISSING)
+            if value is _MISSING:
+                if field.required:
+                    return cls.parse_obj(data)
+                if field.copy_default:
+                    values[field.name] = copy.deepcopy(field.default)
+                else:
+                    values[field.name] = field.default
+                continue
+            if field.model is not None and value is not None:
+                if field.is_list:
+                    value = [field.model.construct_from(item) for item in value]
+                else:
+                    value = field.model.construct_from(value)
+            values[field.name] = value
+            fields_set.add(field.name)
+        # as pydantic.BaseModel.construct does, without its second pass.
+        model = cls.__new__(cls)
+        object.__setattr__(model, "__dict__", values)
+        object.__setattr__(model, "__fields_set__", fields_set)
+        return model
+
+    @classmethod
+    def unmarshal(cls: Type[M], data: Dict[str, Any], *, validate: bool = False) -> M:
+        """Return the model for data, a response payload.
+
+        :param data: payload to build the model from.
+        :param validate: validate data against the model.
+
+        :raises pydantic.ValidationError: if validating and data is invalid.
+        """
+        if validate:
+            return cls.parse_obj(data)
+        return cls.construct_from(data)
+
+    @classmethod
+    def unmarshal_list(
+        cls: Type[M], data: Sequence[Dict[str, Any]], *, validate: bool = False
+    ) -> Sequence[M]:
+        """Return the models for data, a list of response items.
+
+        Without validation, models are only built for the items accessed.
+
+        :param data: items to build the models from.
+        :param validate: validate every item against the model.
+
+        :raises pydantic.ValidationError: if validating and an item is invalid.
+        """
+        if validate:
+            return [cls.parse_obj(item) for item in data]
+        return ModelList(cls, data)
+
+    def marshal(self) -> Dict[str, Any]:
+        """Return the payload for the model, with the keys it was built with."""
+        return self.dict(by_alias=True, exclude_unset=True)
+
+
+class ModelList(Sequence[M], Generic[M]):
+    """Sequence of models built on access from a list of payloads."""
+
+    def __init__(self, model: Type[M], data: Sequence[Dict[str, Any]]) -> None:
+        self._model = model
+        self._data = data
+        self._models: List[Optional[M]] = [None] * len(data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _get(self, index: int) -> M:
+        model = self._models[index]
+        if model is None:
+            model = self._model.construct_from(self._data[index])
+            self._models[index] = model
+        return model
+
+    @overload
+    def __getitem__(self, index: int) -> M:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[M]:
+        ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[M, List[M]]:
+        if isinstance(index, slice):
+            return [self._get(i) for i in range(*index.indices(len(self)))]
+        return self._get(index)
+
+    def __iter__(self) -> Iterator[M]:
+        for index in range(len(self._data)):
+            yield self._get(index)
+
+    def __repr__(self) -> str:
+        return f"ModelList({self._model.__name__}, {len(self)} items)"
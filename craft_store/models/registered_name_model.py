@@ -0,0 +1,35 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Models for listings of registered names."""
+
+from typing import Optional
+
+from ._base import MarshableModel
+from .whoami_model import AccountModel
+
+
+class RegisteredNameModel(MarshableModel):
+    """A package name registered in the store, an item of name listings."""
+
+    id: str
+    name: str
+    type: str
+    private: bool = False
+    status: Optional[str]
+    summary: Optional[str]
+    title: Optional[str]
+    publisher: Optional[AccountModel]
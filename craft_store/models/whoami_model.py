@@ -0,0 +1,41 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Models for whoami responses."""
+
+from typing import Any, Dict, List, Optional
+
+from ._base import MarshableModel
+
+
+class AccountModel(MarshableModel):
+    """An account, from Charmhub or the Snap Store."""
+
+    id: str
+    username: str
+    display_name: Optional[str]
+    name: Optional[str]
+    email: Optional[str]
+
+
+class WhoamiModel(MarshableModel):
+    """Identity and restrictions of the credentials in use."""
+
+    account: AccountModel
+    permissions: List[str] = []
+    channels: Optional[List[str]]
+    packages: Optional[List[Dict[str, Any]]]
+    expires: Optional[str]
@@ -0,0 +1,376 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Sans-IO core of the store protocol.
+
+The store protocol is expressed as generators that yield the operations
+to perform, either a :class:`Request` to send or a :class:`Discharge` to
+get from Candid, and receive their result until returning the final
+value. Drivers perform the I/O, :func:`run` for blocking I/O and
+:func:`async_run` for asyncio, so the protocol logic is shared by every
+client regardless of how requests are sent.
+
+The handling around every request is shared the same way: clients keep
+their static headers in :class:`StaticHeaders`, prepare requests with
+:func:`prepare_request` and hand responses to :func:`handle_response`.
+"""
+
+import dataclasses
+import functools
+import logging
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Generator,
+    Iterator,
+    Mapping,
+    MutableMapping,
+    Optional,
+    Sequence,
+    TypeVar,
+    Union,
+)
+
+import requests
+
+from . import endpoints, errors
+from .concurrency import ConcurrencyLimiter
+from .models import TokenModel, WhoamiModel
+from .retry_budget import RetryBudget
+from .scheduling import RequestScheduler
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclasses.dataclass(frozen=True)
+class Request:
+    """Description of a request to send to the store.
+
+    :param method: HTTP method used for the request.
+    :param url: URL to request with method.
+    :param params: Query parameters to be sent along with the request.
+    :param headers: Headers to be sent along with the request.
+    :param json: payload to send as JSON.
+    """
+
+    method: str
+    url: str
+    params: Optional[Dict[str, str]] = None
+    headers: Optional[Dict[str, str]] = None
+    json: Optional[Any] = None
+
+    def as_kwargs(self) -> Dict[str, Any]:
+        """Return the optional parts of the request as keyword arguments."""
+        kwargs: Dict[str, Any] = {}
+        if self.params is not None:
+            kwargs["params"] = self.params
+        if self.headers is not None:
+            kwargs["headers"] = self.headers
+        if self.json is not None:
+            kwargs["json"] = self.json
+        return kwargs
+
+
+@dataclasses.dataclass(frozen=True)
+class Discharge:
+    """Description of a Candid discharge for a macaroon.
+
+    The driver replies with the base64 encoded, discharged macaroons.
+
+    :param macaroon: JSON serialized macaroon to discharge.
+    """
+
+    macaroon: str
+
+
+Operation = Union[Request, Discharge]
+Flow = Generator[Operation, Any, T]
+"""Protocol generator yielding operations and returning a T."""
+
+
+def auth_header(credentials: str) -> str:
+    """Return the Authorization header value for credentials."""
+    return f"Macaroon {credentials}"
+
+
+_REDACTED_HEADERS = {
+    "authorization": "<macaroon>",
+    "macaroons": "<macaroon>",
+    "cookie": "<cookie>",
+    "set-cookie": "<cookie>",
+}
+"""Placeholders of secret headers, by lowercase header name."""
+
+
+def redact_headers(headers: Mapping[str, str]) -> Dict[str, str]:
+    """Return a copy of headers safe for logging, with macaroons and cookies redacted.
+
+    Header names are matched regardless of case.
+    """
+    return {
+        name: _REDACTED_HEADERS.get(name.lower(), value) if value else value
+        for name, value in headers.items()
+    }
+
+
+def check_response(response: requests.Response) -> requests.Response:
+    """Return response if successful.
+
+    :raises errors.StoreServerError: for error responses.
+    """
+    if not response.ok:
+        raise errors.StoreServerError(response)
+    return response
+
+
+class StaticHeaders:
+    """Headers sent with every request, installed once on a transport.
+
+    The Authorization header is installed from credentials with
+    :meth:`install_auth` and dropped with :meth:`invalidate_auth`, when the
+    credentials change or the store reports them as expired.
+
+    :param transport_headers: the headers of the transport to install on.
+    """
+
+    def __init__(self, transport_headers: MutableMapping[str, str]) -> None:
+        self._transport_headers = transport_headers
+        self._headers: Dict[str, str] = {}
+
+    def __getitem__(self, name: str) -> str:
+        return self._headers[name]
+
+    def items(self) -> Iterator:
+        """Return the installed headers and their values."""
+        return iter(self._headers.items())
+
+    def set(self, name: str, value: str) -> None:
+        """Install a header."""
+        self._headers[name] = value
+        self._transport_headers[name] = value
+
+    def delete(self, name: str) -> None:
+        """Remove a header installed with :meth:`set`."""
+        self._headers.pop(name, None)
+        self._transport_headers.pop(name, None)
+
+    @property
+    def authorization(self) -> Optional[str]:
+        """The Authorization header installed, if any."""
+        return self._headers.get("Authorization")
+
+    def install_auth(self, credentials: str) -> str:
+        """Install the Authorization header for credentials and return it."""
+        header = auth_header(credentials)
+        self.set("Authorization", header)
+        return header
+
+    def invalidate_auth(self) -> None:
+        """Drop the Authorization header."""
+        self.delete("Authorization")
+
+
+def prepare_request(
+    method: str,
+    url: str,
+    params: Optional[Dict[str, str]],
+    headers: Optional[Dict[str, str]],
+    kwargs: Dict[str, Any],
+    *,
+    static_headers: StaticHeaders,
+    timeout: Any = None,
+    log: logging.Logger = logger,
+) -> None:
+    """Complete the keyword arguments of a request about to be sent.
+
+    The timeout is set unless given and the request is logged through a
+    debug log with the static headers, headers matching Authorization and
+    Macaroons have their value replaced.
+
+    :param method: HTTP method used for the request.
+    :param url: URL to request with method.
+    :param params: Query parameters to be sent along with the request.
+    :param headers: Headers to be sent along with the request.
+    :param kwargs: other arguments for the transport, updated in place.
+    :param static_headers: headers installed on the transport.
+    :param timeout: timeout for the transport, None for no default.
+    :param log: logger of the client sending the request.
+    """
+    if timeout is not None:
+        kwargs.setdefault("timeout", timeout)
+    if log.isEnabledFor(logging.DEBUG):
+        debug_headers = dict(headers) if headers else {}
+        for name, value in static_headers.items():
+            debug_headers.setdefault(name, value)
+        log.debug(
+            "HTTP %r for %r with params %r and headers %r",
+            method,
+            url,
+            params,
+            redact_headers(debug_headers),
+        )
+
+
+def handle_response(
+    response: requests.Response, retry_budget: Optional[RetryBudget] = None
+) -> requests.Response:
+    """Account response in retry_budget and return it if successful.
+
+    :raises errors.StoreServerError: for error responses.
+    """
+    if retry_budget is not None:
+        retry_budget.record_response(response.status_code)
+    return check_response(response)
+
+
+def hedge_slot_acquirer(
+    limiter: Optional[ConcurrencyLimiter], scheduler: Optional[RequestScheduler]
+) -> Optional[Callable[[], Optional[Callable[[], None]]]]:
+    """Return the acquire_slot of a hedge for :meth:`.hedging.Hedger.run`.
+
+    The hedge takes a slot from the scheduler, in the priority class of
+    the request being sent, and from the limiter, without waiting.
+
+    :return: None if requests are not bounded.
+    """
+    if limiter is None and scheduler is None:
+        return None
+    priority_class = None if scheduler is None else scheduler.current_priority()
+
+    def acquire_slot() -> Optional[Callable[[], None]]:
+        releases = []
+        if scheduler is not None and priority_class is not None:
+            if not scheduler.try_acquire(priority_class):
+                return None
+            releases.append(functools.partial(scheduler.release, priority_class))
+        if limiter is not None:
+            if not limiter.try_acquire():
+                for release in releases:
+                    release()
+                return None
+            releases.append(limiter.release)
+
+        def release_all() -> None:
+            for release in reversed(releases):
+                release()
+
+        return release_all
+
+    return acquire_slot
+
+
+def is_auth_expired(error: errors.StoreServerError) -> bool:
+    """Return whether error reports credentials missing or expired."""
+    return error.category == errors.ErrorCategory.AUTH_EXPIRED
+
+
+def login(
+    *,
+    base_url: str,
+    store_endpoints: endpoints.Endpoints,
+    permissions: Sequence[str],
+    description: str,
+    ttl: int,
+    packages: Optional[Sequence[endpoints.Package]] = None,
+    channels: Optional[Sequence[str]] = None,
+) -> Flow[str]:
+    """Obtain a store authorized macaroon.
+
+    - request an initial macaroon on :attr:`.endpoints.Endpoints.tokens`.
+    - discharge that macaroon using Candid
+    - send the discharge macaroon to :attr:`.endpoints.Endpoints.tokens_exchange`
+      to obtain final authorization of the macaroon
+
+    :return: the authorized macaroon.
+    """
+    token_request = store_endpoints.get_token_request(
+        permissions=permissions,
+        description=description,
+        ttl=ttl,
+        packages=packages,
+        channels=channels,
+    )
+
+    token_response = yield Request(
+        "POST", base_url + store_endpoints.tokens, json=token_request
+    )
+    macaroon = TokenModel.unmarshal(token_response.json()).macaroon
+
+    candid_discharged_macaroon = yield Discharge(macaroon)
+
+    token_exchange_response = yield Request(
+        "POST",
+        base_url + store_endpoints.tokens_exchange,
+        headers={"Macaroons": candid_discharged_macaroon},
+        json={},
+    )
+    return TokenModel.unmarshal(token_exchange_response.json()).macaroon
+
+
+def whoami(*, base_url: str, store_endpoints: endpoints.Endpoints) -> Flow[WhoamiModel]:
+    """Return the identity from :attr:`.endpoints.Endpoints.whoami`."""
+    response = yield Request("GET", base_url + store_endpoints.whoami)
+    return WhoamiModel.unmarshal(response.json())
+
+
+def run(
+    flow: Flow[T],
+    send: Callable[[Request], requests.Response],
+    discharge: Callable[[str], str],
+) -> T:
+    """Drive flow with blocking I/O.
+
+    :param flow: the protocol generator to drive.
+    :param send: callable sending a request, raising on error responses.
+    :param discharge: callable discharging a macaroon.
+    """
+    result: Any = None
+    try:
+        while True:
+            operation = flow.send(result)
+            if isinstance(operation, Request):
+                result = send(operation)
+            else:
+                result = discharge(operation.macaroon)
+    except StopIteration as stop:
+        return stop.value
+
+
+async def async_run(
+    flow: Flow[T],
+    send: Callable[[Request], Awaitable[requests.Response]],
+    discharge: Callable[[str], Awaitable[str]],
+) -> T:
+    """Drive flow with asyncio.
+
+    :param flow: the protocol generator to drive.
+    :param send: coroutine function sending a request, raising on error responses.
+    :param discharge: coroutine function discharging a macaroon.
+    """
+    result: Any = None
+    try:
+        while True:
+            operation = flow.send(result)
+            if isinstance(operation, Request):
+                result = await send(operation)
+            else:
+                result = await discharge(operation.macaroon)
+    except StopIteration as stop:
+        return stop.value
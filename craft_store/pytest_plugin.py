@@ -0,0 +1,71 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Pytest fixtures to test clients against a local :class:`.StubStore`.
+
+The plugin is not registered with pytest on install, test suites opt in
+with ``pytest_plugins = ["craft_store.pytest_plugin"]`` in their root
+conftest.py or test modules:
+
+- ``stub_store``: a running :class:`.stub_store.StubStore`, with no latency
+  nor faults until configured.
+- ``stub_store_client``: a :class:`.StoreClient` for Charmhub endpoints on
+  ``stub_store``, with credentials set and no retry backoff.
+- ``latency_budget``: a :class:`.stub_store.LatencyBudget` to measure and
+  assert on operations.
+"""
+
+import keyring
+import pytest
+
+from .auth import Auth
+from .endpoints import CHARMHUB
+from .store_client import StoreClient
+from .stub_store import LatencyBudget, StubStore
+
+
+@pytest.fixture
+def stub_store():
+    """Return a running stub store."""
+    with StubStore() as store:
+        yield store
+
+
+@pytest.fixture
+def stub_store_client(stub_store, monkeypatch):
+    """Return a client authenticated against stub_store."""
+    current_keyring = keyring.get_keyring()
+    monkeypatch.setenv("CRAFT_STORE_BACKOFF", "0")
+    monkeypatch.setenv(
+        "CRAFT_STORE_STUB_CREDENTIALS",
+        Auth.encode_credentials(stub_store.credentials),
+    )
+    client = StoreClient(
+        base_url=stub_store.url,
+        endpoints=CHARMHUB,
+        application_name="stubcraft",
+        user_agent="StubCraft",
+        environment_auth="CRAFT_STORE_STUB_CREDENTIALS",
+    )
+    yield client
+    client.close()
+    keyring.set_keyring(current_keyring)
+
+
+@pytest.fixture
+def latency_budget():
+    """Return an empty latency budget."""
+    return LatencyBudget()
@@ -0,0 +1,195 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Compact records for large listings and their columnar export.
+
+Records are frozen, slotted dataclasses built from the JSON items of
+listings, such as those yielded by
+:meth:`.http_client.HTTPClient.stream_json`::
+
+    revisions = records.RevisionRecord.from_items(
+        client.stream_json("GET", url, path=["revisions"])
+    )
+
+A record holds its values without a per row dict and with repeated
+strings shared, taking a fraction of the memory of the decoded JSON.
+Lists of records can be exported to columns with :func:`to_columns`,
+:func:`to_numpy` and :func:`to_arrow`, the latter two requiring NumPy and
+PyArrow respectively.
+"""
+
+import dataclasses
+import sys
+from typing import (
+    Any,
+    ClassVar,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+)
+
+from . import errors
+
+try:
+    import numpy  # type: ignore
+except ImportError:
+    numpy = None  # type: ignore
+
+try:
+    import pyarrow  # type: ignore
+except ImportError:
+    pyarrow = None  # type: ignore
+
+R = TypeVar("R", bound="Record")
+
+
+class Record:
+    """Base of the compact records, subclasses are slotted frozen dataclasses.
+
+    Fields map to the kebab-case keys of the JSON items, as for
+    :class:`.models.MarshableModel`. Values of the fields in
+    :attr:`_interned` have few distinct values and are shared among records.
+    """
+
+    __slots__ = ()
+
+    _interned: ClassVar[FrozenSet[str]] = frozenset()
+
+    @classmethod
+    def from_dict(cls: Type[R], data: Mapping[str, Any]) -> R:
+        """Return a record for data, missing keys default to None."""
+        values = []
+        for field in dataclasses.fields(cls):
+            value = data.get(field.name.replace("_", "-"))
+            if isinstance(value, str) and field.name in cls._interned:
+                value = sys.intern(value)
+            values.append(value)
+        return cls(*values)
+
+    @classmethod
+    def from_items(cls: Type[R], items: Iterable[Mapping[str, Any]]) -> List[R]:
+        """Return a record for each item, consuming items one at a time."""
+        from_dict = cls.from_dict
+        return [from_dict(item) for item in items]
+
+    def to_tuple(self) -> Tuple[Any, ...]:
+        """Return the values of the fields of the record, in order."""
+        return tuple(getattr(self, field.name) for field in dataclasses.fields(self))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the JSON representation of the record."""
+        return {
+            field.name.replace("_", "-"): getattr(self, field.name)
+            for field in dataclasses.fields(self)
+        }
+
+
+@dataclasses.dataclass(frozen=True)
+class RevisionRecord(Record):
+    """Compact representation of an uploaded revision."""
+
+    __slots__ = ("revision", "version", "status", "created_at", "size", "sha3_384")
+    _interned = frozenset(["status"])
+
+    revision: int
+    version: Optional[str]
+    status: Optional[str]
+    created_at: Optional[str]
+    size: Optional[int]
+    sha3_384: Optional[str]
+
+
+@dataclasses.dataclass(frozen=True)
+class ReleaseRecord(Record):
+    """Compact representation of a revision released to a channel."""
+
+    __slots__ = ("channel", "revision", "when", "expiration_date")
+    _interned = frozenset(["channel"])
+
+    channel: str
+    revision: Optional[int]
+    when: Optional[str]
+    expiration_date: Optional[str]
+
+
+def to_columns(records: Sequence[Record]) -> Dict[str, List[Any]]:
+    """Return the values of each field of records, keyed by field name.
+
+    :param records: records of the same type.
+    """
+    if not records:
+        return {}
+    names = [field.name for field in dataclasses.fields(records[0])]
+    return {name: [getattr(record, name) for record in records] for name in names}
+
+
+def _numpy_dtype(name: str, values: List[Any]) -> Any:
+    """Return the structured array field for a column of values."""
+    present = [value for value in values if value is not None]
+    if present and all(isinstance(value, int) for value in present):
+        return (name, "i8")
+    strings = [str(value) for value in present]
+    width = max((len(string) for string in strings), default=1)
+    # ASCII strings take a byte per character instead of four.
+    kind = "S" if all(string.isascii() for string in strings) else "U"
+    return (name, f"{kind}{width}")
+
+
+def to_numpy(records: Sequence[Record]) -> "numpy.ndarray":
+    """Return records as a NumPy structured array.
+
+    Integer fields are stored as ``int64`` with missing values as ``-1``,
+    other fields as fixed width strings, of bytes if all values are ASCII,
+    with missing values as ``""``.
+
+    :param records: records of the same type.
+
+    :raises errors.CraftStoreError: if NumPy is not installed.
+    """
+    if numpy is None:
+        raise errors.CraftStoreError(
+            "NumPy is required for this export.",
+            resolution="Install craft-store[numpy].",
+        )
+    columns = to_columns(records)
+    dtype = [_numpy_dtype(name, values) for name, values in columns.items()]
+    array = numpy.empty(len(records), dtype=dtype)
+    for name, kind in dtype:
+        missing: Any = -1 if kind == "i8" else ""
+        array[name] = [missing if value is None else value for value in columns[name]]
+    return array
+
+
+def to_arrow(records: Sequence[Record]) -> "pyarrow.Table":
+    """Return records as a PyArrow table, missing values as nulls.
+
+    :param records: records of the same type.
+
+    :raises errors.CraftStoreError: if PyArrow is not installed.
+    """
+    if pyarrow is None:
+        raise errors.CraftStoreError(
+            "PyArrow is required for this export.",
+            resolution="Install craft-store[arrow].",
+        )
+    return pyarrow.table(to_columns(records))
@@ -0,0 +1,212 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Retry budgets bounding the retries sent to a struggling store.
+
+Retry counts apply per request, during a brownout every busy worker
+retrying up to its limit multiplies the load on the store. A
+:class:`RetryBudget` shared among requests only lets retries through while
+they stay under a fraction of the recent successful requests::
+
+    budget = retry_budget.RetryBudget()
+    client = HTTPClient(user_agent=..., retry_budget=budget)
+
+Retries are counted by :class:`BudgetedRetry`, the retry policy built by
+:func:`.http_client.get_default_retries`, which also jitters the backoff
+so retries from many clients do not arrive in lockstep.
+"""
+
+import collections
+import dataclasses
+import logging
+import random
+import threading
+import time
+from typing import Deque, Optional
+
+from requests.adapters import Retry
+
+from . import errors
+
+logger = logging.getLogger(__name__)
+
+BUDGETLESS_STATUS_CODES = frozenset(
+    errors.RETRYABLE_STATUS_CODES | errors.THROTTLING_STATUS_CODES
+)
+"""Status codes of responses not counting as successful requests."""
+
+
+@dataclasses.dataclass(frozen=True)
+class RetryBudgetPolicy:
+    """Settings for a retry budget.
+
+    :param ratio: retries allowed per successful request in the window.
+    :param min_retries: retries always allowed in the window, so requests
+                        can recover when there were no recent successes.
+    :param window: seconds of history the budget is computed over.
+    """
+
+    ratio: float = 0.1
+    min_retries: int = 10
+    window: float = 10.0
+
+    def __post_init__(self) -> None:
+        if self.ratio < 0:
+            raise ValueError("ratio must not be negative")
+        if self.min_retries < 0:
+            raise ValueError("min_retries must not be negative")
+        if self.window <= 0:
+            raise ValueError("window must be positive")
+
+
+@dataclasses.dataclass
+class RetryBudgetStats:
+    """Counters for a retry budget.
+
+    :ivar successes: successful requests recorded.
+    :ivar retries: retries allowed.
+    :ivar rejected: retries rejected for lack of budget.
+    """
+
+    successes: int = 0
+    retries: int = 0
+    rejected: int = 0
+
+
+class RetryBudget:
+    """Allow retries while under a fraction of recent successful requests.
+
+    Within the last :attr:`RetryBudgetPolicy.window` seconds, retries are
+    allowed up to :attr:`RetryBudgetPolicy.ratio` times the successful
+    requests plus :attr:`RetryBudgetPolicy.min_retries`, bounding the
+    traffic retries add to ``1 + ratio`` times the successful traffic.
+
+    A RetryBudget can be shared among clients for a process wide budget.
+
+    :ivar policy: the :class:`RetryBudgetPolicy` in use.
+    :ivar stats: the :class:`RetryBudgetStats` collected.
+    """
+
+    def __init__(self, policy: Optional[RetryBudgetPolicy] = None) -> None:
+        self.policy = policy or RetryBudgetPolicy()
+        self.stats = RetryBudgetStats()
+        self._lock = threading.Lock()
+        self._successes: Deque[float] = collections.deque()
+        self._retries: Deque[float] = collections.deque()
+
+    def _expire(self, now: float) -> None:
+        horizon = now - self.policy.window
+        for events in (self._successes, self._retries):
+            while events and events[0] <= horizon:
+                events.popleft()
+
+    def record_success(self) -> None:
+        """Record a successful request, adding to the budget."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            self._successes.append(now)
+            self.stats.successes += 1
+
+    def record_response(self, status_code: int) -> None:
+        """Record a final response, successful unless retryable or throttled."""
+        if status_code not in BUDGETLESS_STATUS_CODES:
+            self.record_success()
+
+    def try_acquire(self) -> bool:
+        """Spend a retry from the budget.
+
+        :return: True if the retry is allowed, False if the budget is spent.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            allowed = len(self._successes) * self.policy.ratio + self.policy.min_retries
+            if len(self._retries) >= allowed:
+                self.stats.rejected += 1
+                return False
+            self._retries.append(now)
+            self.stats.retries += 1
+            return True
+
+    def available(self) -> int:
+        """Return the amount of retries currently allowed."""
+        with self._lock:
+            self._expire(time.monotonic())
+            allowed = len(self._successes) * self.policy.ratio + self.policy.min_retries
+            return max(0, int(allowed) - len(self._retries))
+
+
+class BudgetedRetry(Retry):
+    """Retry policy spending from a :class:`RetryBudget` with jittered backoff.
+
+    Whether a response is retried follows :func:`.errors.classify_status`:
+    responses in :data:`.errors.RETRY_CATEGORIES` are retried, for any
+    method if in :data:`.errors.IDEMPOTENCY_SAFE_CATEGORIES` and for
+    idempotent methods otherwise, other responses fail fast.
+
+    Retries are taken from budget when set, a retry rejected by the budget
+    exhausts the policy as if no retries were left. The exponential backoff
+    of :class:`urllib3.util.retry.Retry` is scaled by a random factor
+    between ``1 - jitter`` and ``1``; ``Retry-After`` waits are honored as
+    sent.
+
+    :param budget: budget shared by the requests retried with this policy.
+    :param jitter: fraction of the backoff that is randomized, from 0 to 1.
+    """
+
+    def __init__(
+        self,
+        *args,
+        budget: Optional[RetryBudget] = None,
+        jitter: float = 0.0,
+        **kwargs,
+    ) -> None:
+        if not 0 <= jitter <= 1:
+            raise ValueError("jitter must be between 0 and 1")
+        super().__init__(*args, **kwargs)
+        self.budget = budget
+        self.jitter = jitter
+
+    def new(self, **kw) -> "BudgetedRetry":
+        kw.setdefault("budget", self.budget)
+        kw.setdefault("jitter", self.jitter)
+        return super().new(**kw)
+
+    def is_retry(
+        self, method: str, status_code: int, has_retry_after: bool = False
+    ) -> bool:
+        category = errors.classify_status(status_code)
+        if category not in errors.RETRY_CATEGORIES:
+            return False
+        if self.status_forcelist and status_code not in self.status_forcelist:
+            return False
+        if category in errors.IDEMPOTENCY_SAFE_CATEGORIES:
+            return True
+        return self._is_method_retryable(method)
+
+    def increment(self, *args, **kwargs) -> "BudgetedRetry":
+        retries = super().increment(*args, **kwargs)
+        if self.budget is not None and not self.budget.try_acquire():
+            logger.debug("Retry budget spent, not retrying.")
+            return Retry.increment(self.new(total=0), *args, **kwargs)
+        return retries
+
+    def get_backoff_time(self) -> float:
+        backoff = super().get_backoff_time()
+        if not backoff or not self.jitter:
+            return backoff
+        return random.uniform(backoff * (1 - self.jitter), backoff)
@@ -0,0 +1,327 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Priority scheduling of requests sharing a client.
+
+Requests are sent in a :class:`Priority` class, set for the current thread
+or task with :func:`priority` and defaulting to
+:attr:`SchedulerPolicy.default_priority`::
+
+    with scheduling.priority(scheduling.Priority.BATCH):
+        for name in names:
+            store_client.request(...)
+
+A :class:`RequestScheduler` set on :class:`.http_client.HTTPClient` bounds
+the requests in flight and picks which queued request goes next.
+"""
+
+import asyncio
+import collections
+import contextlib
+import contextvars
+import dataclasses
+import enum
+import threading
+import time
+from typing import (
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    Mapping,
+    Optional,
+    TypeVar,
+)
+
+T = TypeVar("T")
+
+
+class Priority(enum.IntEnum):
+    """Priority classes of requests, lower values are more urgent."""
+
+    INTERACTIVE = 0
+    """Requests a user waits on, such as whoami or permission checks."""
+
+    BATCH = 1
+    """Background and bulk requests."""
+
+
+_PRIORITY: "contextvars.ContextVar[Optional[Priority]]" = contextvars.ContextVar(
+    "craft_store_priority", default=None
+)
+
+
+@contextlib.contextmanager
+def priority(priority_class: Priority) -> Iterator[None]:
+    """Send the requests made within the context in priority_class."""
+    token = _PRIORITY.set(priority_class)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+
+
+def _default_quotas() -> Dict[Priority, int]:
+    return {Priority.INTERACTIVE: 10, Priority.BATCH: 8}
+
+
+def _default_weights() -> Dict[Priority, float]:
+    return {Priority.INTERACTIVE: 4.0, Priority.BATCH: 1.0}
+
+
+@dataclasses.dataclass(frozen=True)
+class SchedulerPolicy:
+    """Settings for scheduling requests.
+
+    The defaults match the connection pool of the default transport, with
+    two connections never used by batch requests.
+
+    :param max_concurrency: requests in flight across classes.
+    :param quotas: requests in flight per class, classes missing are
+                   bounded by max_concurrency only.
+    :param weights: share of dispatches per class when several classes have
+                    queued requests, classes missing weigh 1.
+    :param default_priority: class of requests sent outside :func:`priority`.
+    """
+
+    max_concurrency: int = 10
+    quotas: Mapping[Priority, int] = dataclasses.field(default_factory=_default_quotas)
+    weights: Mapping[Priority, float] = dataclasses.field(
+        default_factory=_default_weights
+    )
+    default_priority: Priority = Priority.INTERACTIVE
+
+    def __post_init__(self) -> None:
+        if self.max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        if any(quota < 1 for quota in self.quotas.values()):
+            raise ValueError("quotas must be at least 1")
+        if any(weight <= 0 for weight in self.weights.values()):
+            raise ValueError("weights must be positive")
+
+
+@dataclasses.dataclass
+class QueueStats:
+    """Counters for the requests of a priority class.
+
+    :ivar requests: requests dispatched.
+    :ivar queued: requests that waited to be dispatched.
+    :ivar total_wait: seconds spent waiting by all requests.
+    :ivar max_wait: longest wait, in seconds.
+    """
+
+    requests: int = 0
+    queued: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    @property
+    def mean_wait(self) -> float:
+        """Mean seconds waited by requests."""
+        return self.total_wait / self.requests if self.requests else 0.0
+
+
+class _Waiter:
+    """A request waiting to be dispatched, by a thread or an asyncio task."""
+
+    __slots__ = ("event", "enqueued", "dispatched", "loop", "future")
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        self.enqueued = time.monotonic()
+        self.dispatched = False
+        self.loop = loop
+        self.event: Optional[threading.Event] = None
+        self.future: "Optional[asyncio.Future[None]]" = None
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def wake(self) -> None:
+        self.dispatched = True
+        if self.event is not None:
+            self.event.set()
+        elif self.loop is not None:
+            with contextlib.suppress(RuntimeError):
+                # the loop of an abandoned waiter may be closed.
+                self.loop.call_soon_threadsafe(self._set_future)
+
+    def _set_future(self) -> None:
+        if self.future is not None and not self.future.done():
+            self.future.set_result(None)
+
+
+class RequestScheduler:
+    """Dispatch requests by priority class with quotas and fair queueing.
+
+    Requests in flight are bounded by :attr:`SchedulerPolicy.max_concurrency`
+    and per class by :attr:`SchedulerPolicy.quotas`. When classes have
+    queued requests, the next request is taken from the class that received
+    the least service relative to its weight, so interactive requests are
+    dispatched ahead of a batch backlog without starving it. Requests of a
+    class are dispatched in order.
+
+    A RequestScheduler can be shared among clients using the same pool,
+    blocking clients sending through :meth:`run` and asyncio ones through
+    :meth:`async_run`.
+
+    :ivar policy: the :class:`SchedulerPolicy` in use.
+    :ivar stats: :class:`QueueStats` per priority class.
+    """
+
+    def __init__(self, policy: Optional[SchedulerPolicy] = None) -> None:
+        self.policy = policy or SchedulerPolicy()
+        self.stats: Dict[Priority, QueueStats] = {p: QueueStats() for p in Priority}
+        self._lock = threading.Lock()
+        self._queues: Dict[Priority, Deque[_Waiter]] = {
+            p: collections.deque() for p in Priority
+        }
+        self._running: Dict[Priority, int] = dict.fromkeys(Priority, 0)
+        self._total_running = 0
+        self._service: Dict[Priority, float] = dict.fromkeys(Priority, 0.0)
+        self._virtual_time = 0.0
+
+    def queue_depth(self, priority_class: Priority) -> int:
+        """Return the amount of requests queued in priority_class."""
+        return len(self._queues[priority_class])
+
+    def running(self, priority_class: Priority) -> int:
+        """Return the amount of requests in flight in priority_class."""
+        return self._running[priority_class]
+
+    def _quota(self, priority_class: Priority) -> int:
+        return self.policy.quotas.get(priority_class, self.policy.max_concurrency)
+
+    def _dispatch(self) -> None:
+        """Dispatch queued requests while capacity allows, lock held."""
+        while self._total_running < self.policy.max_concurrency:
+            candidates = [
+                p
+                for p in Priority
+                if self._queues[p] and self._running[p] < self._quota(p)
+            ]
+            if not candidates:
+                return
+            chosen = min(candidates, key=lambda p: (self._service[p], p))
+            waiter = self._queues[chosen].popleft()
+            self._virtual_time = self._service[chosen]
+            self._service[chosen] += 1 / self.policy.weights.get(chosen, 1.0)
+            self._running[chosen] += 1
+            self._total_running += 1
+
+            wait = time.monotonic() - waiter.enqueued
+            stats = self.stats[chosen]
+            stats.requests += 1
+            stats.total_wait += wait
+            stats.max_wait = max(stats.max_wait, wait)
+            waiter.wake()
+
+    def _enqueue(self, priority_class: Priority, waiter: _Waiter) -> None:
+        with self._lock:
+            queue = self._queues[priority_class]
+            if not queue and not self._running[priority_class]:
+                # a class becoming active does not get credit for idle time.
+                self._service[priority_class] = max(
+                    self._service[priority_class], self._virtual_time
+                )
+            queue.append(waiter)
+            self._dispatch()
+            if not waiter.dispatched:
+                self.stats[priority_class].queued += 1
+
+    def _acquire(self, priority_class: Priority) -> None:
+        waiter = _Waiter()
+        self._enqueue(priority_class, waiter)
+        if waiter.event is not None:
+            waiter.event.wait()
+
+    async def _async_acquire(self, priority_class: Priority) -> None:
+        waiter = _Waiter(asyncio.get_running_loop())
+        self._enqueue(priority_class, waiter)
+        if waiter.dispatched or waiter.future is None:
+            return
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                dispatched = waiter.dispatched
+                if not dispatched:
+                    self._queues[priority_class].remove(waiter)
+            if dispatched:
+                self.release(priority_class)
+            raise
+
+    def try_acquire(self, priority_class: Priority) -> bool:
+        """Take a slot in priority_class for an extra attempt of a request.
+
+        Meant for attempts that must not wait, such as hedges: a slot is
+        only taken if free and no request is queued, so extra attempts never
+        go ahead of queued requests. The slot is given back with
+        :meth:`release`.
+        """
+        with self._lock:
+            if (
+                any(self._queues.values())
+                or self._total_running >= self.policy.max_concurrency
+                or self._running[priority_class] >= self._quota(priority_class)
+            ):
+                return False
+            self._running[priority_class] += 1
+            self._total_running += 1
+            return True
+
+    def release(self, priority_class: Priority) -> None:
+        """Give back a slot of priority_class, dispatching queued requests."""
+        with self._lock:
+            self._running[priority_class] -= 1
+            self._total_running -= 1
+            self._dispatch()
+
+    def current_priority(self) -> Priority:
+        """Return the priority class requests sent now are dispatched in."""
+        priority_class = _PRIORITY.get()
+        if priority_class is None:
+            priority_class = self.policy.default_priority
+        return priority_class
+
+    def run(self, send: Callable[[], T]) -> T:
+        """Call send when dispatched in the current priority class.
+
+        :param send: callable sending a request and returning its response.
+        """
+        priority_class = self.current_priority()
+        self._acquire(priority_class)
+        try:
+            return send()
+        finally:
+            self.release(priority_class)
+
+    async def async_run(self, send: Callable[[], Awaitable[T]]) -> T:
+        """Await send when dispatched in the current priority class.
+
+        The asyncio counterpart of :meth:`run`, waiting without blocking
+        the event loop.
+
+        :param send: coroutine function sending a request and returning its
+                     response.
+        """
+        priority_class = self.current_priority()
+        await self._async_acquire(priority_class)
+        try:
+            return await send()
+        finally:
+            self.release(priority_class)
@@ -17,17 +17,63 @@
 """Craft Store StoreClient."""
 
 import base64
+import concurrent.futures
+import dataclasses
 import json
-from typing import Any, Dict, Optional, Sequence
-from urllib.parse import urlparse
+import pathlib
+from typing import Callable, Dict, List, Optional, Sequence, Union, cast
+from urllib.parse import urljoin, urlparse
 
+import macaroonbakery._utils as bakery_utils
 import requests
 from macaroonbakery import bakery, httpbakery
+from macaroonbakery.httpbakery import agent
 from pymacaroons.serializers import json_serializer
 
-from . import endpoints, errors
+from . import endpoints, errors, protocol
 from .auth import Auth
+from .concurrency import ConcurrencyLimiter
+from .config import ClientConfig
+from .credential_broker import REFRESH_LOCK_TIMEOUT, RefreshLock
+from .credentials import CredentialsInfo, inspect_credentials
+from .discharge_cache import DischargeCache
+from .download_cache import DownloadCache
+from .hashing import StreamHasher
+from .hedging import Hedger
 from .http_client import HTTPClient
+from .metadata_index import MetadataIndex, SyncStats
+from .models import WhoamiModel
+from .retry_budget import RetryBudget
+from .scheduling import Priority, RequestScheduler, priority
+from .transport import Transport
+from .uploads import UPLOAD_WORKERS, MultipartBody, ProgressCallback, UploadManager
+
+RELEASE_CONCURRENCY = 8
+"""Amount of release requests sent concurrently by a batch release."""
+
+
+@dataclasses.dataclass(frozen=True)
+class ReleaseOutcome:
+    """Outcome of a :class:`.endpoints.Release` from a batch release.
+
+    :param release: the release.
+    :param error: the error releasing, None if released.
+    """
+
+    release: endpoints.Release
+    error: Optional[errors.CraftStoreError] = None
+
+    @property
+    def ok(self) -> bool:
+        """True if released."""
+        return self.error is None
+
+    @property
+    def error_list(self) -> Optional[errors.StoreErrorList]:
+        """Errors reported by the store, None if released or not reported."""
+        if isinstance(self.error, errors.StoreServerError):
+            return self.error.error_list
+        return None
 
 
 def _macaroon_to_json_string(macaroon) -> str:
@@ -49,8 +95,12 @@ class WebBrowserWaitingInteractor(httpbakery.WebBrowserInteractor):
 
     # TODO: transfer implementation to macaroonbakery.
     def _wait_for_token(self, ctx, wait_token_url):
-        request_client = HTTPClient(user_agent=self.user_agent)
-        resp = request_client.request("GET", wait_token_url)
+        send = getattr(ctx, "send", None)
+        if send is not None:
+            resp = send("GET", wait_token_url)
+        else:
+            request_client = HTTPClient(user_agent=self.user_agent)
+            resp = request_client.request("GET", wait_token_url)
         if resp.status_code != 200:
             raise errors.CandidTokenTimeoutError(url=wait_token_url)
         json_resp = resp.json()
@@ -68,6 +118,177 @@ class WebBrowserWaitingInteractor(httpbakery.WebBrowserInteractor):
         )
 
 
+class CandidAgentInteractor(agent.AgentInteractor):
+    """AgentInteractor for a single Candid agent.
+
+    Unlike :class:`macaroonbakery.httpbakery.agent.AgentInteractor`, the
+    agent is not matched against the discharge location, the given username
+    is used for whichever Candid the store delegates to.
+
+    This allows discharging macaroons without user interaction, making it
+    suitable for headless environments.
+    """
+
+    def __init__(self, *, key: str, username: str) -> None:
+        """Initialize a CandidAgentInteractor.
+
+        :param key: base64 encoded private key of the agent.
+        :param username: username of the agent.
+        """
+        super().__init__(
+            agent.AuthInfo(key=bakery.PrivateKey.deserialize(key), agents=[])
+        )
+        self.username = username
+
+    def _find_agent(self, location):
+        return agent.Agent(url=location, username=self.username)
+
+    # Same as the parent implementation, requesting the agent macaroon
+    # through the client so it goes through its transport.
+    def interact(self, client, location, interaction_required_err):
+        methods = interaction_required_err.info.interaction_methods or {}
+        login_url = (methods.get("agent") or {}).get("login-url")
+        if not login_url:
+            raise httpbakery.InteractionError(
+                "no login-url field found in agent interaction method"
+            )
+        candid_agent = self._find_agent(location)
+        if not location.endswith("/"):
+            location += "/"
+        resp = client.request(
+            "GET",
+            urljoin(location, login_url),
+            params={
+                "username": candid_agent.username,
+                "public-key": str(self._auth_info.key.public_key),
+            },
+        )
+        if resp.status_code != 200:
+            raise httpbakery.InteractionError(
+                f"cannot acquire agent macaroon: {resp.status_code} {resp.text}"
+            )
+        macaroon = resp.json().get("macaroon")
+        if macaroon is None:
+            raise httpbakery.InteractionError("no macaroon in response")
+        discharges = bakery.discharge_all(
+            bakery.Macaroon.from_dict(macaroon), None, self._auth_info.key
+        )
+        token = bytearray()
+        for discharge in discharges:
+            token.extend(bakery_utils.b64decode(discharge.serialize()))
+        return httpbakery.DischargeToken(kind="agent", value=bytes(token))
+
+
+class _TransportBakeryClient(httpbakery.Client):
+    """httpbakery.Client sending its requests with a given callable.
+
+    Candid discharges then go through the transport of a client, with its
+    retries and connections, and are recorded along the store requests.
+
+    :ivar send: callable sending a request as :meth:`.transport.Transport.request`,
+                the requests library is used if None.
+    """
+
+    def __init__(
+        self, *, send: Optional[Callable[..., requests.Response]] = None, **kwargs
+    ) -> None:
+        super().__init__(**kwargs)
+        self.send = send
+
+    def request(self, method, url, **kwargs):
+        if self.send is None:
+            return super().request(method, url, **kwargs)
+        return self.send(method, url, cookies=self.cookies, **kwargs)
+
+
+class _CachingBakeryClient(_TransportBakeryClient):
+    """httpbakery.Client reusing discharge tokens from a DischargeCache.
+
+    Discharge tokens obtained through interaction are stored in the cache
+    and presented on further discharges for the same location and identity,
+    falling back to interaction if Candid no longer accepts them.
+    """
+
+    def __init__(
+        self, *, discharge_cache: DischargeCache, identity: str, **kwargs
+    ) -> None:
+        super().__init__(**kwargs)
+        self.discharge_cache = discharge_cache
+        self.identity = identity
+        self._interaction_token: Optional[httpbakery.DischargeToken] = None
+
+    def _interact(self, location, error_info, payload):
+        token, macaroon = super()._interact(location, error_info, payload)
+        self._interaction_token = token
+        return token, macaroon
+
+    def acquire_discharge(self, cav, payload):
+        token = self.discharge_cache.get(cav.location, self.identity)
+        if token is not None:
+            resp = self._acquire_discharge_with_token(cav, payload, token)
+            if resp.status_code == 200:
+                return bakery.Macaroon.from_dict(resp.json().get("Macaroon"))
+            self.discharge_cache.evict(cav.location, self.identity)
+
+        self._interaction_token = None
+        discharge = super().acquire_discharge(cav, payload)
+        if self._interaction_token is not None:
+            self.discharge_cache.put(
+                cav.location, self.identity, self._interaction_token, discharge
+            )
+        return discharge
+
+
+def _build_bakery_client(
+    *,
+    user_agent: str,
+    identity: str,
+    discharge_cache: Optional[DischargeCache],
+    agent_username: Optional[str],
+    agent_key: Optional[str],
+    send: Optional[Callable[..., requests.Response]] = None,
+) -> httpbakery.Client:
+    """Return a bakery client to discharge macaroons with Candid.
+
+    :param send: callable to send the requests of discharges with.
+
+    :raises ValueError: if only one of agent_username or agent_key is set.
+    """
+    if (agent_username is None) != (agent_key is None):
+        raise ValueError("agent_username and agent_key must be set together")
+
+    interaction_methods: List[httpbakery.Interactor] = [
+        WebBrowserWaitingInteractor(user_agent=user_agent)
+    ]
+    if agent_username is not None and agent_key is not None:
+        interaction_methods.insert(
+            0, CandidAgentInteractor(key=agent_key, username=agent_username)
+        )
+    if discharge_cache is None:
+        return _TransportBakeryClient(
+            interaction_methods=interaction_methods, send=send
+        )
+    return _CachingBakeryClient(
+        discharge_cache=discharge_cache,
+        identity=identity,
+        interaction_methods=interaction_methods,
+        send=send,
+    )
+
+
+def _candid_discharge(bakery_client: httpbakery.Client, macaroon: str) -> str:
+    """Discharge macaroon, returning the base64 encoded discharged macaroons."""
+    bakery_macaroon = bakery.Macaroon.from_dict(json.loads(macaroon))
+    discharges = bakery.discharge_all(bakery_macaroon, bakery_client.acquire_discharge)
+
+    # serialize macaroons the bakery-way
+    discharged_macaroons = (
+        "[" + ",".join(map(_macaroon_to_json_string, discharges)) + "]"
+    )
+
+    return base64.urlsafe_b64encode(discharged_macaroons.encode()).decode("ascii")
+
+
 class StoreClient(HTTPClient):
     """Encapsulates API calls for the Snap Store or Charmhub."""
 
@@ -79,6 +300,18 @@ class StoreClient(HTTPClient):
         application_name: str,
         user_agent: str,
         environment_auth: Optional[str] = None,
+        discharge_cache: Optional[DischargeCache] = None,
+        agent_username: Optional[str] = None,
+        agent_key: Optional[str] = None,
+        hedger: Optional[Hedger] = None,
+        transport: Optional[Transport] = None,
+        limiter: Optional[ConcurrencyLimiter] = None,
+        scheduler: Optional[RequestScheduler] = None,
+        retry_budget: Optional[RetryBudget] = None,
+        credential_broker: Optional[Union[str, pathlib.Path]] = None,
+        storage_base_url: Optional[str] = None,
+        download_cache: Optional[DownloadCache] = None,
+        config: Optional[ClientConfig] = None,
     ) -> None:
         """Initialize the Store Client.
 
@@ -87,49 +320,124 @@ class StoreClient(HTTPClient):
         :param application_name: the name application using this class, used for the keyring.
         :param user_agent: User-Agent header to use for HTTP(s) requests.
         :param environment_auth: environment variable to use for credentials.
+        :param discharge_cache: cache to reuse Candid discharge tokens across logins.
+        :param agent_username: Candid agent username for non interactive logins.
+        :param agent_key: base64 encoded private key for agent_username.
+        :param hedger: :class:`.hedging.Hedger` to hedge idempotent requests with.
+        :param transport: :class:`.transport.Transport` to send requests with.
+        :param limiter: :class:`.concurrency.ConcurrencyLimiter` for requests.
+        :param scheduler: :class:`.scheduling.RequestScheduler` for requests.
+        :param retry_budget: :class:`.retry_budget.RetryBudget` for retries.
+        :param credential_broker: socket of a
+                                  :class:`.credential_broker.CredentialBroker`
+                                  to read credentials from.
+        :param storage_base_url: the base url of the storage API artifacts
+                                 are uploaded to.
+        :param download_cache: :class:`.download_cache.DownloadCache` serving
+                               repeated :meth:`download` calls locally.
+        :param config: :class:`.config.ClientConfig` to tune the client with.
+
+        :raises ValueError: if only one of agent_username or agent_key is set.
         """
-        super().__init__(user_agent=user_agent)
+        super().__init__(
+            user_agent=user_agent,
+            hedger=hedger,
+            transport=transport,
+            limiter=limiter,
+            scheduler=scheduler,
+            retry_budget=retry_budget,
+            config=config,
+        )
 
-        self._bakery_client = httpbakery.Client(
-            interaction_methods=[WebBrowserWaitingInteractor(user_agent=user_agent)]
+        self._bakery_client = _build_bakery_client(
+            user_agent=user_agent,
+            identity=agent_username or application_name,
+            discharge_cache=discharge_cache,
+            agent_username=agent_username,
+            agent_key=agent_key,
+            send=self._send_candid_request,
         )
         self._base_url = base_url
         self._store_host = urlparse(base_url).netloc
         self._endpoints = endpoints
+        self._storage_base_url = storage_base_url
+        # Uploads are not authenticated, the store credentials installed on
+        # the transport of this client are not sent to the storage API.
+        # Uploads are not limited either: the latency of an upload is that
+        # of its body and would read as congestion to the limiter.
+        self._storage_client: Optional[HTTPClient] = None
+        if storage_base_url is not None:
+            self._storage_client = HTTPClient(
+                user_agent=user_agent,
+                retry_budget=self._retry_budget,
+                config=dataclasses.replace(self.config, max_concurrency=None),
+            )
+        # Artifacts are downloaded from a CDN, without credentials either.
+        # Downloads share the limiter of this client, the download cache is
+        # only built by the download client.
+        self._download_client = HTTPClient(
+            user_agent=user_agent,
+            limiter=self._limiter,
+            retry_budget=self._retry_budget,
+            download_cache=download_cache,
+            config=self.config,
+        )
 
-        self._auth = Auth(application_name, base_url, environment_auth=environment_auth)
-
-    def _get_macaroon(self, token_request: Dict[str, Any]) -> str:
-        token_response = super().request(
-            "POST",
-            self._base_url + self._endpoints.tokens,
-            json=token_request,
+        self._application_name = application_name
+        self._auth = Auth(
+            application_name,
+            base_url,
+            environment_auth=environment_auth,
+            credential_broker=credential_broker,
         )
+        # The Authorization header last installed, kept when the store
+        # reports expired credentials so refresh_login can tell whether
+        # another process refreshed them since.
+        self._sent_auth_header: Optional[str] = None
+
+    @property
+    def _auth_header(self) -> Optional[str]:
+        """The Authorization header installed on the session, if any."""
+        return self._static_headers.authorization
+
+    def _install_auth_header(self) -> None:
+        """Install the Authorization header on the session if missing.
 
-        return token_response.json()["macaroon"]
+        Credentials are read from the keyring once and the encoded header
+        is reused for every request until invalidated.
+        """
+        if self._auth_header is None:
+            self._static_headers.install_auth(self._auth.get_credentials())
+            self._sent_auth_header = self._auth_header
+
+    def _invalidate_auth_header(self) -> None:
+        """Drop the installed Authorization header, forcing a keyring read."""
+        self._static_headers.invalidate_auth()
+
+    _on_auth_expired = _invalidate_auth_header
 
     def _candid_discharge(self, macaroon: str) -> str:
-        bakery_macaroon = bakery.Macaroon.from_dict(json.loads(macaroon))
-        discharges = bakery.discharge_all(
-            bakery_macaroon, self._bakery_client.acquire_discharge
-        )
+        return _candid_discharge(self._bakery_client, macaroon)
 
-        # serialize macaroons the bakery-way
-        discharged_macaroons = (
-            "[" + ",".join(map(_macaroon_to_json_string, discharges)) + "]"
-        )
+    def _send_candid_request(
+        self, method: str, url: str, **kwargs
+    ) -> requests.Response:
+        """Send a request of a Candid discharge through the transport.
 
-        return base64.urlsafe_b64encode(discharged_macaroons.encode()).decode("ascii")
+        The response is returned as is, the bakery client handles errors.
+        The Authorization header is removed from the request, store
+        credentials are never sent to Candid, even if another thread
+        installs them on the transport during :meth:`login`.
+        """
+        headers = dict(kwargs.pop("headers", None) or {})
+        headers["Authorization"] = None
+        return self._transport.request(method, url, headers=headers, **kwargs)
 
-    def _authorize_token(self, candid_discharged_macaroon: str) -> str:
-        token_exchange_response = super().request(
-            "POST",
-            self._base_url + self._endpoints.tokens_exchange,
-            headers={"Macaroons": candid_discharged_macaroon},
-            json={},
-        )
+    def _send_unauthenticated(self, request: protocol.Request) -> requests.Response:
+        return super().request(request.method, request.url, **request.as_kwargs())
 
-        return token_exchange_response.json()["macaroon"]
+    def _send(self, request: protocol.Request) -> requests.Response:
+        return self.request(request.method, request.url, **request.as_kwargs())
 
     def login(
         self,
@@ -165,7 +473,9 @@ class StoreClient(HTTPClient):
         :param packages: Sequence of packages to limit the credentials to.
         :param channels: Sequence of channel names to limit the credentials to.
         """
-        token_request = self._endpoints.get_token_request(
+        flow = protocol.login(
+            base_url=self._base_url,
+            store_endpoints=self._endpoints,
             permissions=permissions,
             description=description,
             ttl=ttl,
@@ -173,15 +483,63 @@ class StoreClient(HTTPClient):
             channels=channels,
         )
 
-        macaroon = self._get_macaroon(token_request)
-        candid_discharged_macaroon = self._candid_discharge(macaroon)
-        store_authorized_macaroon = self._authorize_token(candid_discharged_macaroon)
+        self._invalidate_auth_header()
+        store_authorized_macaroon = protocol.run(
+            flow, self._send_unauthenticated, self._candid_discharge
+        )
 
         # Save the authorization token.
         self._auth.set_credentials(store_authorized_macaroon)
 
         return self._auth.encode_credentials(store_authorized_macaroon)
 
+    def refresh_login(
+        self,
+        *,
+        permissions: Sequence[str],
+        description: str,
+        ttl: int,
+        packages: Optional[Sequence[endpoints.Package]] = None,
+        channels: Optional[Sequence[str]] = None,
+        lock_timeout: Optional[float] = REFRESH_LOCK_TIMEOUT,
+    ) -> str:
+        """Obtain new credentials unless another process just did.
+
+        Processes sharing credentials, with the same application_name and
+        base_url, refresh them one at a time under a
+        :class:`.credential_broker.RefreshLock`. If the credentials found
+        once holding the lock differ from the ones this client last used,
+        even if the store has since rejected them, another process
+        refreshed them and they are used as is, otherwise :meth:`login` is
+        called with the given parameters.
+
+        :param lock_timeout: seconds to wait for the lock, forever if None.
+
+        :raises errors.CraftStoreError: if lock_timeout is reached.
+        """
+        stale_auth_header = self._sent_auth_header
+        with RefreshLock(self._application_name, self._base_url, timeout=lock_timeout):
+            try:
+                credentials: Optional[str] = self._auth.get_credentials()
+            except errors.NotLoggedIn:
+                credentials = None
+
+            if (
+                credentials is not None
+                and stale_auth_header is not None
+                and protocol.auth_header(credentials) != stale_auth_header
+            ):
+                self._invalidate_auth_header()
+                return self._auth.encode_credentials(credentials)
+
+            return self.login(
+                permissions=permissions,
+                description=description,
+                ttl=ttl,
+                packages=packages,
+                channels=channels,
+            )
+
     def request(
         self,
         method: str,
@@ -190,7 +548,12 @@ class StoreClient(HTTPClient):
         headers: Dict[str, str] = None,
         **kwargs,
     ) -> requests.Response:
-        """Perform an authenticated request if auth_headers are True.
+        """Perform an authenticated request.
+
+        The Authorization header is installed on the transport on first use
+        and dropped on :meth:`login`, :meth:`logout` or when the store
+        reports expired credentials, so credentials are re-read from the
+        keyring.
 
         :param method: HTTP method used for the request.
         :param url: URL to request with method.
@@ -203,11 +566,7 @@ class StoreClient(HTTPClient):
 
         :return: Response from the request.
         """
-        if headers is None:
-            headers = {}
-
-        auth = self._auth.get_credentials()
-        headers["Authorization"] = f"Macaroon {auth}"
+        self._install_auth_header()
 
         return super().request(
             method,
@@ -217,13 +576,208 @@ class StoreClient(HTTPClient):
             **kwargs,
         )
 
-    def whoami(self) -> Dict[str, Any]:
-        """Return whoami json data queyring :attr:`.endpoints.Endpoints.whoami`."""
-        return self.request("GET", self._base_url + self._endpoints.whoami).json()
+    def whoami(self) -> WhoamiModel:
+        """Return the identity of the credentials.
+
+        See :attr:`.endpoints.Endpoints.whoami`.
+
+        :raises pydantic.ValidationError: if the response lacks the account.
+        """
+        flow = protocol.whoami(base_url=self._base_url, store_endpoints=self._endpoints)
+        return protocol.run(flow, self._send, self._candid_discharge)
+
+    def warmup(self, url: Optional[str] = None, connections: int = 1) -> int:
+        """Connect to the store ahead of the first requests.
+
+        :param url: URL of the host to connect to, defaults to base_url.
+        :param connections: amount of connections to open.
+
+        :return: the amount of connections opened.
+        """
+        return super().warmup(url or self._base_url, connections)
+
+    def inspect_credentials(self) -> CredentialsInfo:
+        """Return the restrictions carried by the credentials in use.
+
+        Credentials are decoded locally, without a whoami request, and
+        read from the keyring only if not already in use.
+
+        :raises errors.NotLoggedIn: if not logged in.
+        :raises errors.CredentialsNotParseable: if credentials are not a macaroon.
+        """
+        self._install_auth_header()
+        credentials = cast(str, self._auth_header).partition(" ")[2]
+        return inspect_credentials(credentials)
+
+    def sync_index(
+        self, index: MetadataIndex, *, packages: Optional[Sequence[str]] = None
+    ) -> SyncStats:
+        """Bring a local metadata index up to date with the store.
+
+        Only listings modified since the previous sync are downloaded, see
+        :class:`.metadata_index.MetadataIndex`.
+
+        :param index: the index to sync.
+        :param packages: names of the packages to sync, all the packages of
+                         the account if None.
+
+        :raises ValueError: if packages is None and the store cannot list
+                            the packages of the account.
+        :raises errors.StoreServerError: for error responses.
+        :raises errors.NetworkError: for lower level network issues.
+        :raises errors.NotLoggedIn: if not logged in.
+        """
+        return index.sync(
+            self.request,
+            base_url=self._base_url,
+            store_endpoints=self._endpoints,
+            packages=packages,
+        )
+
+    def release_batch(
+        self,
+        releases: Sequence[endpoints.Release],
+        *,
+        max_workers: int = RELEASE_CONCURRENCY,
+    ) -> List[ReleaseOutcome]:
+        """Release revisions to channels, with the fewest requests possible.
+
+        Releases are grouped into requests with
+        :meth:`.endpoints.Endpoints.get_release_requests`, sent concurrently
+        in the :attr:`.scheduling.Priority.BATCH` class. A failed request
+        does not stop the others, it fails the releases it carried.
+
+        :param releases: the releases to do.
+        :param max_workers: amount of requests sent concurrently.
+
+        :raises ValueError: if the store does not support releases.
+        :raises errors.NotLoggedIn: if not logged in.
+
+        :return: the outcome of each release, in the order of releases.
+        """
+        release_requests = self._endpoints.get_release_requests(releases)
+        if not release_requests:
+            return []
+        self._install_auth_header()
+
+        def send(release_request: endpoints.ReleaseRequest) -> None:
+            with priority(Priority.BATCH):
+                self.request(
+                    "POST",
+                    self._base_url + release_request.path,
+                    json=release_request.payload,
+                )
+
+        outcomes: Dict[endpoints.Release, ReleaseOutcome] = {}
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(max_workers, len(release_requests)),
+            thread_name_prefix="craft-store-release",
+        ) as executor:
+            futures = {
+                executor.submit(send, release_request): release_request
+                for release_request in release_requests
+            }
+            for future in concurrent.futures.as_completed(futures):
+                error = future.exception()
+                if error is not None and not isinstance(error, errors.CraftStoreError):
+                    raise error
+                for release in futures[future].releases:
+                    outcomes[release] = ReleaseOutcome(
+                        release, cast(Optional[errors.CraftStoreError], error)
+                    )
+        return [outcomes[release] for release in releases]
+
+    def upload_file(
+        self,
+        path: Union[str, pathlib.Path],
+        *,
+        progress: Optional[Callable[[int], None]] = None,
+        hasher: Optional[StreamHasher] = None,
+    ) -> str:
+        """Upload the artifact at path to the storage API.
+
+        The artifact is streamed from disk, never held in memory. Digests
+        of the artifact can be computed from the bytes sent with hasher,
+        overlapping hashing with the upload instead of reading the
+        artifact a second time::
+
+            hasher = hashing.StreamHasher(path)
+            upload_id = store_client.upload_file(path, hasher=hasher)
+            digests = hasher.digests()
+
+        :param path: path of the artifact.
+        :param progress: called with the bytes of the artifact sent so far.
+        :param hasher: :class:`.hashing.StreamHasher` for path, fed with the
+                       bytes of the artifact as they are sent.
+
+        :raises ValueError: if the client has no storage_base_url.
+        :raises errors.CraftStoreError: if the storage API rejected the upload.
+        :raises errors.StoreServerError: for error responses.
+        :raises errors.NetworkError: for lower level network issues.
+
+        :return: the upload id, to refer to the artifact in store requests.
+        """
+        if self._storage_client is None:
+            raise ValueError("A storage_base_url is required to upload.")
+        with MultipartBody(path, on_read=progress, hasher=hasher) as body:
+            response = self._storage_client.request(
+                "POST",
+                f"{self._storage_base_url}/unscanned-upload/",
+                headers={"Content-Type": body.content_type},
+                data=body,
+            )
+        result = response.json()
+        if not result.get("successful"):
+            raise errors.CraftStoreError(f"Upload of {str(path)!r} failed.")
+        return result["upload_id"]
+
+    def upload_manager(
+        self,
+        journal: Union[str, pathlib.Path],
+        *,
+        workers: int = UPLOAD_WORKERS,
+        on_progress: Optional[ProgressCallback] = None,
+    ) -> UploadManager:
+        """Return a manager uploading artifacts in the background.
+
+        :param journal: path of the journal recording uploads across runs.
+        :param workers: amount of concurrent uploads.
+        :param on_progress: called with an upload as its bytes are sent.
+        """
+        return UploadManager(
+            self.upload_file, journal, workers=workers, on_progress=on_progress
+        )
+
+    def close(self) -> None:
+        """Release the connections of the store, storage and download clients."""
+        super().close()
+        if self._storage_client is not None:
+            self._storage_client.close()
+        self._download_client.close()
+
+    def download(
+        self,
+        url: str,
+        path: Union[str, pathlib.Path],
+        *,
+        digest: str,
+        algorithm: str = "sha3_384",
+        **kwargs,
+    ) -> bool:
+        """Download the artifact at url to path, verifying it against digest.
+
+        Downloads are sent without the store credentials, see
+        :meth:`.HTTPClient.download`.
+        """
+        return self._download_client.download(
+            url, path, digest=digest, algorithm=algorithm, **kwargs
+        )
 
     def logout(self) -> None:
         """Clear credentials.
 
         :raises errors.NotLoggedIn: if not logged in.
         """
+        self._invalidate_auth_header()
+        self._sent_auth_header = None
         self._auth.del_credentials()
@@ -0,0 +1,146 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Incremental parsing of JSON listings from streamed response bodies.
+
+:func:`iter_json_items` yields the items of a JSON array as the chunks
+holding them arrive, keeping only the item being parsed in memory::
+
+    response = transport.request("GET", url, stream=True)
+    for revision in streaming.iter_json_items(
+        response.iter_content(STREAM_CHUNK_SIZE), path=["revisions"]
+    ):
+        ...
+"""
+
+import codecs
+import json
+from typing import Any, Iterable, Iterator, Sequence, Union
+
+STREAM_CHUNK_SIZE = 64 * 1024
+"""Size of the chunks read from streamed response bodies."""
+
+_WHITESPACE = " \t\n\r"
+_DECODER = json.JSONDecoder()
+
+
+class _Reader:
+    """Buffer over chunks of a JSON document, dropping consumed text."""
+
+    def __init__(self, chunks: Iterable[Union[bytes, str]]) -> None:
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Read the next chunk, return False at the end of the document."""
+        if self.eof:
+            return False
+        text = ""
+        while not text:
+            try:
+                chunk = next(self._chunks)
+            except StopIteration:
+                text = self._decoder.decode(b"", final=True)
+                self.eof = True
+                break
+            text = chunk if isinstance(chunk, str) else self._decoder.decode(chunk)
+        consumed = self.pos
+        self.buffer = self.buffer[consumed:] + text
+        self.pos = 0
+        return bool(text) or not self.eof
+
+    def error(self, message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, self.buffer, self.pos)
+
+    def peek(self) -> str:
+        """Return the next character that is not whitespace."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise self.error("Unexpected end of document")
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise self.error(f"Expecting {char!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Parse and return the next complete value."""
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A value ending with the buffer, such as a number, may go on
+            # in the next chunk.
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_items(
+    chunks: Iterable[Union[bytes, str]], path: Sequence[str] = ()
+) -> Iterator[Any]:
+    """Yield the items of a JSON array as chunks of the document are read.
+
+    Values of keys before path are parsed and discarded, parsing stops at
+    the end of the array without reading the rest of the document.
+
+    :param chunks: chunks of an UTF-8 encoded JSON document.
+    :param path: keys of nested objects leading to the array, the array is
+                 the document itself if empty.
+
+    :raises json.JSONDecodeError: if the document is not valid JSON.
+
+    :return: an iterator over the items of the array, empty if a key of
+             path is missing.
+    """
+    reader = _Reader(chunks)
+    for key in path:
+        reader.expect("{")
+        while True:
+            if reader.peek() == "}":
+                return
+            name = reader.value()
+            reader.expect(":")
+            if name == key:
+                break
+            reader.value()
+            if reader.peek() == ",":
+                reader.pos += 1
+
+    reader.expect("[")
+    if reader.peek() == "]":
+        return
+    while True:
+        yield reader.value()
+        separator = reader.peek()
+        reader.pos += 1
+        if separator == "]":
+            return
+        if separator != ",":
+            reader.pos -= 1
+            raise reader.error("Expecting ',' delimiter")
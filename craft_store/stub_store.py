@@ -0,0 +1,369 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Local stub store with latency and fault injection.
+
+:class:`StubStore` serves the token and whoami paths of
+:data:`.endpoints.CHARMHUB` and :data:`.endpoints.SNAP_STORE` over HTTP on
+localhost, delaying responses following a latency distribution and
+injecting faults such as bursts of error responses, connection resets
+and slow bodies, to exercise retry policies, timeouts and pool sizes.
+:class:`LatencyBudget` measures operations sent to it and asserts on
+their latency and throughput.
+
+The stub is exposed to pytest as fixtures by :mod:`.pytest_plugin`,
+loaded with ``pytest_plugins = ["craft_store.pytest_plugin"]``.
+"""
+
+import abc
+import collections
+import contextlib
+import dataclasses
+import http.server
+import json
+import math
+import random
+import socket
+import struct
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from macaroonbakery import bakery
+
+from . import endpoints
+
+Latency = Callable[[random.Random], float]
+"""Distribution of response latencies, in seconds."""
+
+
+def constant(seconds: float) -> Latency:
+    """Return a latency distribution always delaying for seconds."""
+    return lambda rng: seconds
+
+
+def uniform(low: float, high: float) -> Latency:
+    """Return a latency distribution uniform between low and high seconds."""
+    return lambda rng: rng.uniform(low, high)
+
+
+def lognormal(median: float, sigma: float) -> Latency:
+    """Return a long tailed latency distribution around median seconds.
+
+    :param median: median latency, in seconds.
+    :param sigma: shape of the tail, latencies above the median grow with it.
+    """
+    return lambda rng: rng.lognormvariate(math.log(median), sigma)
+
+
+@dataclasses.dataclass
+class Fault(abc.ABC):
+    """A fault injected in the next count requests matching path.
+
+    :param count: amount of requests to inject the fault into.
+    :param path: only inject into requests for path, any request if None.
+    """
+
+    count: int = 1
+    path: Optional[str] = None
+
+    @abc.abstractmethod
+    def inject(self, handler: "_StubHandler") -> None:
+        """Respond to the request handled by handler with the fault."""
+
+
+@dataclasses.dataclass
+class ErrorBurst(Fault):
+    """Respond with status, e.g. ``503`` or ``429``.
+
+    :param status: status code to respond with.
+    :param retry_after: value of the Retry-After header, not sent if None.
+    """
+
+    status: int = 503
+    retry_after: Optional[str] = None
+
+    def inject(self, handler: "_StubHandler") -> None:
+        headers = {}
+        if self.retry_after is not None:
+            headers["Retry-After"] = self.retry_after
+        handler.reply(
+            self.status,
+            {"error-list": [{"code": "stub-fault", "message": "injected fault"}]},
+            headers=headers,
+        )
+
+
+@dataclasses.dataclass
+class ConnectionReset(Fault):
+    """Reset the connection without responding."""
+
+    def inject(self, handler: "_StubHandler") -> None:
+        handler.connection.setsockopt(
+            socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0)
+        )
+        handler.close_connection = True
+
+
+@dataclasses.dataclass
+class SlowBody(Fault):
+    """Respond normally, sending the body in chunks spaced by delay seconds.
+
+    :param delay: seconds to wait before sending each chunk.
+    :param chunk_size: size of the chunks of the body.
+    """
+
+    delay: float = 0.1
+    chunk_size: int = 16
+
+    def inject(self, handler: "_StubHandler") -> None:
+        handler.route(chunk_delay=self.delay, chunk_size=self.chunk_size)
+
+
+class _StubHandler(http.server.BaseHTTPRequestHandler):
+    server: "StubStore"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):  # pylint: disable=W0221
+        pass
+
+    def reply(
+        self,
+        status: int,
+        payload: Any,
+        *,
+        headers: Optional[Dict[str, str]] = None,
+        chunk_delay: float = 0.0,
+        chunk_size: int = 0,
+    ) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not chunk_delay:
+            self.wfile.write(body)
+            return
+        chunks = (body[i:][:chunk_size] for i in range(0, len(body), chunk_size))
+        for chunk in chunks:
+            time.sleep(chunk_delay)
+            self.wfile.write(chunk)
+            self.wfile.flush()
+
+    def route(self, **reply_kwargs) -> None:
+        """Reply as the store would to the request."""
+        response = self.server.routes.get((self.command, self.path.split("?")[0]))
+        if response is None:
+            self.reply(
+                404,
+                {"error-list": [{"code": "not-found", "message": "not found"}]},
+                **reply_kwargs,
+            )
+        else:
+            self.reply(200, response(), **reply_kwargs)
+
+    def _handle(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        self.server.log_request(self.command, self.path)
+
+        latency = self.server.latency
+        if latency is not None:
+            time.sleep(max(0.0, self.server.sample(latency)))
+
+        fault = self.server.next_fault(self.path.split("?")[0])
+        if fault is None:
+            self.route()
+        else:
+            fault.inject(self)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle  # noqa: N815
+
+
+class StubStore(http.server.ThreadingHTTPServer):
+    """Local store serving the Charmhub and Snap Store token and whoami paths.
+
+    Login results in :attr:`credentials`, with no Candid interaction as the
+    root macaroon served has no third party caveats, and whoami returns
+    :attr:`account`.
+
+    :param seed: seed for the random generator used by latency distributions.
+
+    :ivar url: base URL of the stub, to use as ``base_url`` of a client.
+    :ivar latency: distribution of response latencies, no delay if None.
+    :ivar account: payload returned by whoami.
+    :ivar credentials: credentials returned by the tokens exchange.
+    :ivar requests: log of the method and path of requests received.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, *, seed: int = 0) -> None:
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.latency: Optional[Latency] = None
+        self.account: Dict[str, Any] = {
+            "account": {"id": "stub-id", "username": "stub", "name": "Stub User"}
+        }
+        self.credentials = "stub-credentials"
+        self.requests: List[Tuple[str, str]] = []
+        self._random = random.Random(seed)
+        self._faults: Deque[Fault] = collections.deque()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        root_macaroon = bakery.Macaroon(
+            root_key=b"stub-root-key",
+            id=b"stub-id",
+            location="stub-store",
+            version=bakery.LATEST_VERSION,
+        )
+        self.root_macaroon = json.dumps(root_macaroon.to_dict())
+
+        self.routes: Dict[Tuple[str, str], Callable[[], Any]] = {}
+        for store_endpoints in (endpoints.CHARMHUB, endpoints.SNAP_STORE):
+            self.routes[("POST", store_endpoints.tokens)] = lambda: {
+                "macaroon": self.root_macaroon
+            }
+            self.routes[("POST", store_endpoints.tokens_exchange)] = lambda: {
+                "macaroon": self.credentials
+            }
+            self.routes[("GET", store_endpoints.whoami)] = lambda: self.account
+
+    def __enter__(self) -> "StubStore":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        """Serve requests from a background thread."""
+        self._thread = threading.Thread(
+            target=self.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop serving and release the listening socket."""
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+
+    def inject(self, *faults: Fault) -> None:
+        """Queue faults, injected in order into the requests they match."""
+        with self._lock:
+            self._faults.extend(faults)
+
+    def sample(self, latency: Latency) -> float:
+        """Return a latency drawn from the seeded random generator."""
+        with self._lock:
+            return latency(self._random)
+
+    def log_request(self, method: str, path: str) -> None:
+        """Record a request received."""
+        with self._lock:
+            self.requests.append((method, path))
+
+    def next_fault(self, path: str) -> Optional[Fault]:
+        """Return the first queued fault matching path, consuming it."""
+        with self._lock:
+            for fault in self._faults:
+                if fault.path is None or fault.path == path:
+                    fault.count -= 1
+                    if fault.count <= 0:
+                        self._faults.remove(fault)
+                    return fault
+        return None
+
+
+def _percentile(samples: List[float], percent: float) -> float:
+    ordered = sorted(samples)
+    rank = max(0, math.ceil(percent / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+class LatencyBudget:
+    """Latency and throughput measurements of operations.
+
+    :ivar samples: latency of each operation measured, in seconds.
+    """
+
+    def __init__(self) -> None:
+        self.samples: List[float] = []
+        self._first_start: Optional[float] = None
+        self._last_end: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def measure(self) -> Iterator[None]:
+        """Measure the operation run within the context."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            end = time.monotonic()
+            with self._lock:
+                self.samples.append(end - start)
+                if self._first_start is None or start < self._first_start:
+                    self._first_start = start
+                if self._last_end is None or end > self._last_end:
+                    self._last_end = end
+
+    def percentile(self, percent: float) -> float:
+        """Return the latency under which percent of operations completed."""
+        if not self.samples:
+            raise ValueError("No operations measured.")
+        return _percentile(self.samples, percent)
+
+    @property
+    def throughput(self) -> float:
+        """Operations completed per second over the measured time span."""
+        if self._first_start is None or self._last_end is None:
+            raise ValueError("No operations measured.")
+        span = self._last_end - self._first_start
+        return len(self.samples) / span if span > 0 else math.inf
+
+    def check(
+        self,
+        *,
+        p50: Optional[float] = None,
+        p95: Optional[float] = None,
+        p99: Optional[float] = None,
+        min_throughput: Optional[float] = None,
+    ) -> None:
+        """Assert the measured operations are within budget.
+
+        :param p50: maximum median latency, in seconds.
+        :param p95: maximum 95th percentile latency, in seconds.
+        :param p99: maximum 99th percentile latency, in seconds.
+        :param min_throughput: minimum operations per second.
+
+        :raises AssertionError: listing every exceeded budget.
+        """
+        exceeded = []
+        for percent, budget in ((50, p50), (95, p95), (99, p99)):
+            if budget is not None and self.percentile(percent) > budget:
+                exceeded.append(
+                    f"p{percent} latency {self.percentile(percent):.3f}s > {budget}s"
+                )
+        if min_throughput is not None and self.throughput < min_throughput:
+            exceeded.append(f"throughput {self.throughput:.1f}/s < {min_throughput}/s")
+        if exceeded:
+            raise AssertionError("Budget exceeded: " + ", ".join(exceeded))
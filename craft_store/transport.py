@@ -0,0 +1,807 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Transports used by HTTPClient to send requests."""
+
+import abc
+import asyncio
+import contextlib
+import functools
+import logging
+import queue
+import ssl
+import threading
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    Mapping,
+    MutableMapping,
+    NoReturn,
+    Optional,
+    Tuple,
+)
+
+import requests
+import requests.structures
+import urllib3  # type: ignore
+import urllib3.connectionpool  # type: ignore
+import urllib3.util.connection  # type: ignore
+from requests.adapters import DEFAULT_POOLSIZE, HTTPAdapter, Retry
+
+from . import errors
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+
+class Transport(abc.ABC):
+    """Send requests on behalf of :class:`.http_client.HTTPClient`.
+
+    Transports retry requests following :attr:`retries`, return a
+    :class:`requests.Response` for any response received and raise the
+    same exceptions a :class:`requests.Session` mounted with a
+    :class:`requests.adapters.HTTPAdapter` would.
+
+    :param retries: retry policy for requests.
+
+    :ivar retries: retry policy for requests.
+    """
+
+    def __init__(self, *, retries: Retry) -> None:
+        self.retries = retries
+
+    @property
+    @abc.abstractmethod
+    def headers(self) -> MutableMapping[str, str]:
+        """Headers sent with every request."""
+
+    @abc.abstractmethod
+    def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """Send a request to url.
+
+        :param method: HTTP method used for the request.
+        :param url: URL to request with method.
+        :param params: Query parameters to be sent along with the request.
+        :param headers: Headers to be sent along with the request, a header
+                        set to None is not sent, even if set on the
+                        transport.
+
+        :raises errors.NetworkError: for lower level network issues.
+        """
+
+    def warmup(self, url: str, connections: int = 1) -> int:
+        """Open connections to the host of url ahead of requests.
+
+        Warming up is best effort, failures are logged and not raised.
+
+        :param url: URL of the host to connect to.
+        :param connections: amount of connections to open.
+
+        :return: the amount of connections opened.
+        """
+        return 0
+
+    def evict_idle(self) -> int:
+        """Close pooled connections idle for too long or dropped by the peer.
+
+        :return: the amount of connections closed.
+        """
+        return 0
+
+    def close(self) -> None:
+        """Release the connections held by the transport."""
+
+
+IDLE_CONNECTION_TIMEOUT = 30.0
+"""Seconds after which idle pooled connections are not reused.
+
+Servers and load balancers close keep-alive connections idle for a while,
+commonly after 60 seconds, reusing a connection around that time fails.
+"""
+
+
+class _IdleTrackingMixin:
+    """Connection pool closing connections idle for over max_idle seconds.
+
+    Closed connections are reopened when used, instead of failing on a
+    connection closed by the peer and having to be retried.
+    """
+
+    def __init__(self, *args, max_idle: Optional[float] = None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)  # type: ignore
+        self.max_idle = max_idle
+
+    def _idle_too_long(self, conn) -> bool:
+        idle_since = getattr(conn, "idle_since", None)
+        return (
+            self.max_idle is not None
+            and idle_since is not None
+            and time.monotonic() - idle_since > self.max_idle
+        )
+
+    def _get_conn(self, timeout=None):
+        # dropped connections are already closed by urllib3.
+        conn = super()._get_conn(timeout)  # type: ignore
+        if conn.sock is not None and self._idle_too_long(conn):
+            conn.close()
+        return conn
+
+    def _put_conn(self, conn) -> None:
+        if conn is not None:
+            conn.idle_since = time.monotonic()
+        super()._put_conn(conn)  # type: ignore
+
+    def evict_idle(self) -> int:
+        """Check every idle connection out and close the stale ones."""
+        checked_out = []
+        evicted = 0
+        try:
+            while True:
+                try:
+                    conn = self.pool.get(block=False)  # type: ignore
+                except queue.Empty:
+                    break
+                checked_out.append(conn)
+                if getattr(conn, "sock", None) is not None and (
+                    self._idle_too_long(conn)
+                    or urllib3.util.connection.is_connection_dropped(conn)
+                ):
+                    conn.close()
+                    evicted += 1
+        finally:
+            for conn in reversed(checked_out):
+                try:
+                    self.pool.put(conn, block=False)  # type: ignore
+                except queue.Full:
+                    # replaced by a new connection while checked out.
+                    if conn is not None:
+                        conn.close()
+        return evicted
+
+
+class _IdleTrackingHTTPConnectionPool(
+    _IdleTrackingMixin, urllib3.connectionpool.HTTPConnectionPool
+):
+    pass
+
+
+class _IdleTrackingHTTPSConnectionPool(
+    _IdleTrackingMixin, urllib3.connectionpool.HTTPSConnectionPool
+):
+    pass
+
+
+class _IdleTrackingHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools do not reuse stale connections."""
+
+    def __init__(self, *, max_idle: Optional[float], **kwargs) -> None:
+        self.max_idle = max_idle
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        max_idle = getattr(self, "max_idle", IDLE_CONNECTION_TIMEOUT)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": functools.partial(
+                _IdleTrackingHTTPConnectionPool, max_idle=max_idle
+            ),
+            "https": functools.partial(
+                _IdleTrackingHTTPSConnectionPool, max_idle=max_idle
+            ),
+        }
+
+
+class RequestsTransport(Transport):
+    """Transport using a :class:`requests.Session`.
+
+    A connection is used per concurrent request, over HTTP/1.1.
+
+    Pooled connections idle for more than max_idle seconds, or closed by the
+    peer, are reopened on checkout instead of failing the request. With
+    health_check_interval set, a background thread also closes them while
+    idle, so the next request does not pay for it.
+
+    :param retries: retry policy for requests.
+    :param max_idle: seconds after which idle connections are not reused,
+                     they are reused regardless of idle time if None.
+    :param health_check_interval: seconds between background checks of idle
+                                  connections, no background checks if None.
+    :param pool_size: connections kept open per host.
+
+    :ivar session: the session used to send requests.
+    """
+
+    def __init__(
+        self,
+        *,
+        retries: Retry,
+        max_idle: Optional[float] = IDLE_CONNECTION_TIMEOUT,
+        health_check_interval: Optional[float] = None,
+        pool_size: int = DEFAULT_POOLSIZE,
+    ) -> None:
+        super().__init__(retries=retries)
+        self.session = requests.Session()
+        self._http_adapter = _IdleTrackingHTTPAdapter(
+            max_idle=max_idle, max_retries=retries, pool_maxsize=pool_size
+        )
+        self.session.mount("http://", self._http_adapter)
+        self.session.mount("https://", self._http_adapter)
+
+        self._stop_health_checks = threading.Event()
+        self._health_checks: Optional[threading.Thread] = None
+        if health_check_interval is not None:
+            self._health_checks = threading.Thread(
+                target=self._check_health,
+                args=(health_check_interval,),
+                name="craft-store-idle-connections",
+                daemon=True,
+            )
+            self._health_checks.start()
+
+    def _check_health(self, interval: float) -> None:
+        while not self._stop_health_checks.wait(interval):
+            evicted = self.evict_idle()
+            if evicted:
+                logger.debug("Closed %d stale idle connections.", evicted)
+
+    @property
+    def headers(self) -> MutableMapping[str, str]:
+        """Headers sent with every request."""
+        return self.session.headers
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """Send a request to url using the session."""
+        try:
+            return self.session.request(
+                method, url, headers=headers, params=params, **kwargs
+            )
+        except (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.RetryError,
+        ) as error:
+            raise errors.NetworkError(error) from error
+
+    def warmup(self, url: str, connections: int = 1) -> int:
+        """Open connections to the host of url, TLS included, into the pool.
+
+        connections is capped to the size of the pool.
+        """
+        settings = self.session.merge_environment_settings(url, {}, None, None, None)
+        pool = self._http_adapter.get_connection(url)
+        # verify certificates the way requests sent by the session would.
+        self._http_adapter.cert_verify(pool, url, settings["verify"], settings["cert"])
+        checked_out = []
+        opened = 0
+        try:
+            for _ in range(min(connections, pool.pool.maxsize)):
+                conn = pool._get_conn()  # pylint: disable=W0212
+                checked_out.append(conn)
+                if conn.sock is None:
+                    conn.connect()
+                    opened += 1
+        except Exception as error:  # pylint: disable=broad-except
+            logger.debug("Warming up connections to %r failed: %r", url, error)
+        finally:
+            for conn in checked_out:
+                pool._put_conn(conn)  # pylint: disable=W0212
+        return opened
+
+    def evict_idle(self) -> int:
+        """Close stale idle connections across pools."""
+        pools = self._http_adapter.poolmanager.pools
+        evicted = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if isinstance(pool, _IdleTrackingMixin):
+                evicted += pool.evict_idle()
+        return evicted
+
+    def close(self) -> None:
+        """Stop health checks and close the session."""
+        self._stop_health_checks.set()
+        if self._health_checks is not None:
+            self._health_checks.join()
+            self._health_checks = None
+        self.session.close()
+
+
+class _RetryResponse:
+    """Minimal urllib3 response interface used by Retry."""
+
+    def __init__(self, response: "httpx.Response") -> None:
+        self.status = response.status_code
+        self.headers = response.headers
+
+    def getheader(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        return self.headers.get(name, default)
+
+    @staticmethod
+    def get_redirect_location() -> bool:
+        # Redirects are followed by httpx.
+        return False
+
+
+class _HTTPXRaw:
+    """File like wrapper for streamed httpx responses, used as Response.raw.
+
+    Errors reading the body are raised as the urllib3 errors requests maps
+    from urllib3's own responses, so they reach callers as the same
+    requests exceptions as with :class:`RequestsTransport`.
+    """
+
+    def __init__(self, response: "httpx.Response") -> None:
+        self._response = response
+        self._chunks: Optional[Iterator[bytes]] = None
+        self._buffer = b""
+
+    def _iter_bytes(self) -> Iterator[bytes]:
+        try:
+            yield from self._response.iter_bytes()
+        except httpx.DecodingError as error:
+            raise urllib3.exceptions.DecodeError(str(error)) from error
+        except httpx.TransportError as error:
+            raise _to_urllib3_error(error, str(self._response.url)) from error
+
+    def stream(self, chunk_size: int = 1024, decode_content: bool = True):
+        # pylint: disable=unused-argument
+        # Data is yielded as received, in chunks of up to chunk_size, rather
+        # than waiting for chunk_size bytes as httpx does.
+        for chunk in self._iter_bytes():
+            while len(chunk) > chunk_size:
+                yield chunk[:chunk_size]
+                chunk = chunk[chunk_size:]
+            if chunk:
+                yield chunk
+
+    def read(self, amt: Optional[int] = None, **kwargs) -> bytes:
+        # pylint: disable=unused-argument
+        if self._chunks is None:
+            self._chunks = self._iter_bytes()
+        while amt is None or len(self._buffer) < amt:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if amt is None:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:amt], self._buffer[amt:]
+        return data
+
+    def close(self) -> None:
+        self._response.close()
+
+    release_conn = close
+
+
+def _to_urllib3_error(error: "httpx.TransportError", url: str) -> Exception:
+    """Map an httpx error to the urllib3 error raised in the same situation."""
+    if isinstance(error, httpx.ConnectTimeout):
+        return urllib3.exceptions.ConnectTimeoutError(None, str(error))
+    if isinstance(error, httpx.ConnectError):
+        if isinstance(error.__context__, ssl.SSLError):
+            return urllib3.exceptions.SSLError(error.__context__)
+        return urllib3.exceptions.NewConnectionError(None, str(error))
+    if isinstance(error, httpx.TimeoutException):
+        return urllib3.exceptions.ReadTimeoutError(None, url, str(error))
+    return urllib3.exceptions.ProtocolError(str(error), error)
+
+
+def _to_requests_error(error: Exception) -> Exception:
+    """Map a urllib3 error to the exception raised by requests' HTTPAdapter."""
+    if isinstance(error, urllib3.exceptions.MaxRetryError):
+        reason = error.reason
+        if isinstance(reason, urllib3.exceptions.ConnectTimeoutError) and not (
+            isinstance(reason, urllib3.exceptions.NewConnectionError)
+        ):
+            return requests.exceptions.ConnectTimeout(error)
+        if isinstance(reason, urllib3.exceptions.ResponseError):
+            return requests.exceptions.RetryError(error)
+        if isinstance(reason, urllib3.exceptions.SSLError):
+            return requests.exceptions.SSLError(error)
+        return requests.exceptions.ConnectionError(error)
+    if isinstance(error, urllib3.exceptions.SSLError):
+        return requests.exceptions.SSLError(error)
+    if isinstance(error, urllib3.exceptions.ReadTimeoutError):
+        return requests.exceptions.ReadTimeout(error)
+    return requests.exceptions.ConnectionError(error)
+
+
+def _raise(error: Exception, cause: Exception) -> NoReturn:
+    """Raise error as requests would, mapped to NetworkError as HTTPClient does."""
+    requests_error = _to_requests_error(error)
+    if isinstance(
+        requests_error,
+        (requests.exceptions.ConnectionError, requests.exceptions.RetryError),
+    ):
+        raise errors.NetworkError(requests_error) from cause
+    raise requests_error from cause
+
+
+class _RetryState:
+    """Sans-IO retry bookkeeping following a urllib3 Retry policy.
+
+    Drivers report errors and responses and get back how long to sleep
+    before retrying, errors are raised once retries are exhausted.
+    """
+
+    def __init__(self, retries: Retry, method: str, url: str) -> None:
+        self.retries = retries
+        self.method = method
+        self.url = url
+
+    def on_error(self, transport_error: "httpx.TransportError") -> float:
+        """Return the seconds to wait before retrying after transport_error."""
+        error = _to_urllib3_error(transport_error, self.url)
+        try:
+            self.retries = self.retries.increment(
+                method=self.method, url=self.url, error=error
+            )
+        except Exception as retry_error:  # pylint: disable=broad-except
+            _raise(retry_error, transport_error)
+        logger.debug("Retrying %r after %r.", self.url, error)
+        return self.retries.get_backoff_time()
+
+    def on_read_error(self, transport_error: "httpx.TransportError") -> NoReturn:
+        """Raise for an error reading the body of a response."""
+        _raise(_to_urllib3_error(transport_error, self.url), transport_error)
+
+    def on_response(self, response: "httpx.Response") -> Optional[float]:
+        """Return the seconds to wait before retrying, None to use response."""
+        has_retry_after = bool(response.headers.get("Retry-After"))
+        if not self.retries.is_retry(
+            self.method, response.status_code, has_retry_after
+        ):
+            return None
+
+        retry_response = _RetryResponse(response)
+        try:
+            self.retries = self.retries.increment(
+                method=self.method, url=self.url, response=retry_response
+            )
+        except urllib3.exceptions.MaxRetryError as retry_error:
+            if self.retries.raise_on_status:
+                _raise(retry_error, retry_error)
+            return None
+
+        logger.debug("Retrying %r after status %r.", self.url, response.status_code)
+        if self.retries.respect_retry_after_header:
+            retry_after = self.retries.get_retry_after(retry_response)
+            if retry_after:
+                return retry_after
+        return self.retries.get_backoff_time()
+
+
+def _build_request_kwargs(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Map requests keyword arguments to httpx ones."""
+    request_kwargs: Dict[str, Any] = {}
+    for name in ("json", "files", "cookies", "timeout"):
+        if name in kwargs:
+            request_kwargs[name] = kwargs.pop(name)
+    timeout = request_kwargs.get("timeout")
+    if isinstance(timeout, tuple):
+        # requests takes (connect, read), httpx all four timeouts.
+        connect, read = timeout
+        request_kwargs["timeout"] = httpx.Timeout(read, connect=connect)
+    data = kwargs.pop("data", None)
+    # httpx only form encodes mappings, any other body is sent as content.
+    if isinstance(data, Mapping):
+        request_kwargs["data"] = data
+    elif data is not None:
+        request_kwargs["content"] = data
+    if kwargs:
+        raise TypeError(f"Unsupported request arguments {sorted(kwargs)!r}")
+    return request_kwargs
+
+
+def _body_rewinder(content: Any, retries: Retry) -> Tuple[Callable[[], None], Retry]:
+    """Return how to rewind a request body before a retry and the retries to use.
+
+    Seekable file-like bodies are sought back to where the first attempt
+    started reading. Bodies which cannot be sent twice, file-like objects
+    which cannot seek and iterators, are sent once without retries.
+    """
+
+    def noop() -> None:
+        pass
+
+    if content is None or isinstance(content, (bytes, str)):
+        return noop, retries
+    if hasattr(content, "read"):
+        try:
+            seekable = content.seekable() if hasattr(content, "seekable") else True
+            position = content.tell() if seekable else None
+        except (AttributeError, OSError, ValueError):
+            position = None
+        if position is None:
+            return noop, retries.new(total=0, raise_on_status=False)
+
+        def rewind() -> None:
+            content.seek(position)
+
+        return rewind, retries
+    if isinstance(content, Iterator):
+        return noop, retries.new(total=0, raise_on_status=False)
+    return noop, retries
+
+
+def _to_response(response: "httpx.Response", method: str) -> requests.Response:
+    """Convert an httpx response to a requests one.
+
+    The body of response is used as is if read, otherwise it is streamed.
+    """
+    prepared = requests.PreparedRequest()
+    prepared.method = method
+    prepared.url = str(response.request.url)
+    prepared.headers = requests.structures.CaseInsensitiveDict(response.request.headers)
+
+    converted = requests.Response()
+    converted.status_code = response.status_code
+    converted.reason = response.reason_phrase
+    converted.headers = requests.structures.CaseInsensitiveDict(response.headers)
+    converted.url = str(response.url)
+    converted.encoding = requests.utils.get_encoding_from_headers(converted.headers)
+    converted.request = prepared
+    if response.is_closed:
+        # responses built in memory (e.g. by httpx.MockTransport) are closed
+        # before the client can time them.
+        with contextlib.suppress(RuntimeError):
+            converted.elapsed = response.elapsed
+        converted._content = response.content  # pylint: disable=W0212
+    else:
+        converted.raw = _HTTPXRaw(response)
+    return converted
+
+
+def _check_httpx() -> None:
+    if httpx is None:
+        raise errors.CraftStoreError(
+            "httpx is required for this transport.",
+            resolution="Install craft-store[http2].",
+        )
+
+
+class HTTPXTransport(Transport):
+    """Transport using an :class:`httpx.Client`, HTTP/2 capable.
+
+    With HTTP/2 enabled, concurrent requests to the same host are
+    multiplexed over a single connection.
+
+    Requires the ``http2`` extra, ``pip install craft-store[http2]``.
+
+    :param retries: retry policy for requests.
+    :param http2: negotiate HTTP/2 with servers supporting it.
+    :param client_kwargs: further arguments for :class:`httpx.Client`.
+
+    :ivar client: the httpx client used to send requests.
+    """
+
+    def __init__(self, *, retries: Retry, http2: bool = True, **client_kwargs) -> None:
+        _check_httpx()
+        super().__init__(retries=retries)
+        client_kwargs.setdefault("timeout", None)
+        client_kwargs.setdefault("follow_redirects", True)
+        self.client = httpx.Client(http2=http2, **client_kwargs)
+
+    @property
+    def headers(self) -> MutableMapping[str, str]:
+        """Headers sent with every request."""
+        return self.client.headers
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """Send a request to url using the httpx client."""
+        stream = bool(kwargs.pop("stream", False))
+        follow_redirects = kwargs.pop("allow_redirects", True)
+        removed = [name for name, value in (headers or {}).items() if value is None]
+        if removed:
+            headers = {
+                name: value for name, value in headers.items() if value is not None
+            }
+        request_kwargs = _build_request_kwargs(kwargs)
+        rewind, retries = _body_rewinder(request_kwargs.get("content"), self.retries)
+        request = self.client.build_request(
+            method, url, params=params, headers=headers, **request_kwargs
+        )
+        for name in removed:
+            request.headers.pop(name, None)
+
+        state = _RetryState(retries, method, url)
+        while True:
+            try:
+                response = self.client.send(
+                    request, stream=True, follow_redirects=follow_redirects
+                )
+            except httpx.TransportError as transport_error:
+                time.sleep(state.on_error(transport_error))
+                rewind()
+                continue
+
+            try:
+                delay = state.on_response(response)
+            except BaseException:
+                response.close()
+                raise
+            if delay is None:
+                break
+            response.close()
+            time.sleep(delay)
+            rewind()
+
+        if not stream:
+            try:
+                response.read()
+            except httpx.TransportError as transport_error:
+                state.on_read_error(transport_error)
+            finally:
+                response.close()
+        return _to_response(response, method)
+
+    def warmup(self, url: str, connections: int = 1) -> int:
+        """Open a connection to the host of url with a HEAD request.
+
+        A single connection is opened, it is shared by concurrent requests
+        over HTTP/2. httpx expires idle connections on its own, following
+        the ``limits`` given on initialization.
+        """
+        try:
+            self.client.head(url).close()
+        except httpx.HTTPError as error:
+            logger.debug("Warming up connections to %r failed: %r", url, error)
+            return 0
+        return 1
+
+    def close(self) -> None:
+        """Close the httpx client."""
+        self.client.close()
+
+
+class AsyncTransport(abc.ABC):
+    """Send requests with asyncio, the counterpart of :class:`Transport`.
+
+    :param retries: retry policy for requests.
+
+    :ivar retries: retry policy for requests.
+    """
+
+    def __init__(self, *, retries: Retry) -> None:
+        self.retries = retries
+
+    @property
+    @abc.abstractmethod
+    def headers(self) -> MutableMapping[str, str]:
+        """Headers sent with every request."""
+
+    @abc.abstractmethod
+    async def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """Send a request to url.
+
+        Streaming is not supported, the response body is always read.
+
+        :raises errors.NetworkError: for lower level network issues.
+        """
+
+    async def close(self) -> None:
+        """Release the connections held by the transport."""
+
+
+class AsyncHTTPXTransport(AsyncTransport):
+    """AsyncTransport using an :class:`httpx.AsyncClient`, HTTP/2 capable.
+
+    Retries and errors follow :class:`HTTPXTransport`.
+
+    :param retries: retry policy for requests.
+    :param http2: negotiate HTTP/2 with servers supporting it.
+    :param client_kwargs: further arguments for :class:`httpx.AsyncClient`.
+
+    :ivar client: the httpx client used to send requests.
+    """
+
+    def __init__(self, *, retries: Retry, http2: bool = True, **client_kwargs) -> None:
+        _check_httpx()
+        super().__init__(retries=retries)
+        client_kwargs.setdefault("timeout", None)
+        client_kwargs.setdefault("follow_redirects", True)
+        self.client = httpx.AsyncClient(http2=http2, **client_kwargs)
+
+    @property
+    def headers(self) -> MutableMapping[str, str]:
+        """Headers sent with every request."""
+        return self.client.headers
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """Send a request to url using the httpx client."""
+        follow_redirects = kwargs.pop("allow_redirects", True)
+        request_kwargs = _build_request_kwargs(kwargs)
+        rewind, retries = _body_rewinder(request_kwargs.get("content"), self.retries)
+        request = self.client.build_request(
+            method, url, params=params, headers=headers, **request_kwargs
+        )
+
+        state = _RetryState(retries, method, url)
+        while True:
+            try:
+                response = await self.client.send(
+                    request, stream=True, follow_redirects=follow_redirects
+                )
+            except httpx.TransportError as transport_error:
+                await asyncio.sleep(state.on_error(transport_error))
+                rewind()
+                continue
+
+            try:
+                delay = state.on_response(response)
+            except BaseException:
+                await response.aclose()
+                raise
+            if delay is None:
+                break
+            await response.aclose()
+            await asyncio.sleep(delay)
+            rewind()
+
+        try:
+            await response.aread()
+        except httpx.TransportError as transport_error:
+            state.on_read_error(transport_error)
+        finally:
+            await response.aclose()
+        return _to_response(response, method)
+
+    async def close(self) -> None:
+        """Close the httpx client."""
+        await self.client.aclose()
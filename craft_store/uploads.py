@@ -0,0 +1,481 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Background uploads of artifacts with a persistent journal.
+
+An :class:`UploadManager` uploads artifacts from a pool of workers and
+returns right away with an :class:`Upload` to follow progress and wait
+on::
+
+    with store_client.upload_manager(journal_path) as manager:
+        uploads = [manager.submit(path) for path in artifacts]
+        upload_ids = [upload.result() for upload in uploads]
+
+Uploads are deduplicated by the SHA3-384 digest of their content: bytes
+already uploaded, in this run or a previous one recorded in the journal,
+are not sent again. Uploads interrupted by a crash or restart are
+resubmitted when the manager is created again with the same journal.
+"""
+
+import dataclasses
+import enum
+import io
+import json
+import logging
+import os
+import pathlib
+import threading
+import uuid
+from concurrent import futures
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+from . import errors
+from .hashing import StreamHasher, hash_file, hash_files
+from .scheduling import Priority, priority
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+"""Size of the chunks artifacts are sent in."""
+
+UPLOAD_WORKERS = 4
+"""Default amount of concurrent uploads."""
+
+ProgressCallback = Callable[["Upload"], None]
+"""Called with an upload as its bytes are sent."""
+
+Uploader = Callable[..., str]
+"""Uploads a file, with the signature of
+:meth:`.store_client.StoreClient.upload_file`, returning an upload id."""
+
+
+def file_digest(path: Union[str, pathlib.Path]) -> str:
+    """Return the hex SHA3-384 digest of the content of path."""
+    return hash_file(path, ["sha3_384"])["sha3_384"]
+
+
+class MultipartBody(io.RawIOBase):
+    """Multipart form body streaming a file, read in chunks as sent.
+
+    The body is seekable so transports can rewind it to retry, its length
+    is known upfront to send a ``Content-Length``.
+
+    :param path: file to send.
+    :param field: name of the form field holding the file.
+    :param on_read: called with the bytes of the file read so far.
+    :param hasher: fed with the bytes of the file as they are read.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, pathlib.Path],
+        *,
+        field: str = "binary",
+        on_read: Optional[Callable[[int], None]] = None,
+        hasher: Optional[StreamHasher] = None,
+    ) -> None:
+        super().__init__()
+        self.boundary = uuid.uuid4().hex
+        filename = pathlib.Path(path).name.replace('"', "")
+        self._head = (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode()
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode()
+        self._file = open(path, "rb")  # pylint: disable=consider-using-with
+        self._size = os.fstat(self._file.fileno()).st_size
+        self._pos = 0
+        self._on_read = on_read
+        self._hasher = hasher
+
+    @property
+    def content_type(self) -> str:
+        """Content-Type header of the body."""
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self) -> int:
+        return len(self._head) + self._size + len(self._tail)
+
+    def __iter__(self) -> Iterator[bytes]:  # type: ignore[override]
+        return iter(lambda: self.read(UPLOAD_CHUNK_SIZE), b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self)}
+        self._pos = max(0, min(len(self), base[whence] + offset))
+        return self._pos
+
+    def read(self, size: int = -1) -> bytes:  # type: ignore[override]
+        if size is None or size < 0:
+            size = len(self) - self._pos
+        parts = []
+        while size > 0 and self._pos < len(self):
+            offset = self._pos - len(self._head)
+            if offset < 0:
+                start = self._pos
+                part = self._head[start:][:size]
+            elif offset < self._size:
+                self._file.seek(offset)
+                part = self._file.read(min(size, self._size - offset))
+                if self._hasher is not None:
+                    self._hasher.update(offset, part)
+            else:
+                offset -= self._size
+                part = self._tail[offset:][:size]
+            if not part:
+                break
+            parts.append(part)
+            self._pos += len(part)
+            size -= len(part)
+        if self._on_read is not None:
+            self._on_read(min(self._size, max(0, self._pos - len(self._head))))
+        return b"".join(parts)
+
+    def close(self) -> None:
+        self._file.close()
+        super().close()
+
+
+class UploadState(enum.Enum):
+    """States of an upload, as recorded in the journal."""
+
+    QUEUED = "queued"
+    UPLOADING = "uploading"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class Upload:
+    """An artifact uploaded by an :class:`UploadManager`.
+
+    :ivar path: path of the artifact.
+    :ivar digest: hex SHA3-384 digest of the artifact.
+    :ivar size: size of the artifact, in bytes.
+    :ivar state: the :class:`UploadState` of the upload.
+    :ivar sent: bytes of the artifact sent so far.
+    :ivar upload_id: id of the upload in the store once done.
+    :ivar error: the error the upload failed with.
+    """
+
+    def __init__(self, path: pathlib.Path, digest: str, size: int) -> None:
+        self.path = path
+        self.digest = digest
+        self.size = size
+        self.state = UploadState.QUEUED
+        self.sent = 0
+        self.upload_id: Optional[str] = None
+        self.error: Optional[BaseException] = None
+        self._done: "futures.Future[str]" = futures.Future()
+
+    @property
+    def progress(self) -> float:
+        """Fraction of the artifact sent, from 0 to 1."""
+        if self.state == UploadState.DONE:
+            return 1.0
+        if not self.size:
+            return 0.0
+        return min(1.0, self.sent / self.size)
+
+    def done(self) -> bool:
+        """Return True if the upload is done or failed."""
+        return self._done.done()
+
+    def result(self, timeout: Optional[float] = None) -> str:
+        """Wait for the upload and return its upload id.
+
+        :param timeout: seconds to wait for, forever if None.
+
+        :raises concurrent.futures.TimeoutError: if not done within timeout.
+        :raises errors.CraftStoreError: if the upload failed.
+        """
+        return self._done.result(timeout)
+
+    def _finish(self, upload_id: Optional[str], error: Optional[BaseException]) -> None:
+        if error is None:
+            self.state = UploadState.DONE
+            self.upload_id = upload_id
+            self.sent = self.size
+            self._done.set_result(upload_id)
+        else:
+            self.state = UploadState.FAILED
+            self.error = error
+            self._done.set_exception(error)
+
+    def __repr__(self) -> str:
+        return f"<Upload {self.path.name} {self.state.value} {self.progress:.0%}>"
+
+
+class UploadJournal:
+    """Append only journal of uploads, surviving crashes.
+
+    Entries are JSON lines flushed to disk before returning, the latest
+    entry for a digest wins. A line torn by a crash is ignored. The journal
+    is compacted to an entry per digest when loaded.
+
+    :param path: path of the journal file.
+    """
+
+    def __init__(self, path: Union[str, pathlib.Path]) -> None:
+        self.path = pathlib.Path(path)
+        self._lock = threading.Lock()
+        self.entries = self._load()
+        self._compact()
+        # pylint: disable=consider-using-with
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        entries: Dict[str, Dict[str, Any]] = {}
+        try:
+            lines = self.path.read_text(encoding="utf-8").splitlines()
+        except FileNotFoundError:
+            return entries
+        for line in lines:
+            try:
+                entry = json.loads(line)
+                entries[entry["digest"]] = entry
+            except (ValueError, KeyError, TypeError):
+                logger.debug("Skipping invalid journal entry %r.", line)
+        return entries
+
+    def _compact(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        partial = self.path.with_name(self.path.name + ".partial")
+        with open(partial, "w", encoding="utf-8") as compacted:
+            for entry in self.entries.values():
+                compacted.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            compacted.flush()
+            os.fsync(compacted.fileno())
+        os.replace(partial, self.path)
+
+    def record(self, upload: Upload) -> None:
+        """Record the current state of upload."""
+        entry = {
+            "digest": upload.digest,
+            "path": str(upload.path),
+            "size": upload.size,
+            "state": upload.state.value,
+            "upload-id": upload.upload_id,
+        }
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file.closed:
+                # Left as last recorded, to be resumed.
+                return
+            self.entries[upload.digest] = entry
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        """Close the journal file."""
+        with self._lock:
+            self._file.close()
+
+
+@dataclasses.dataclass
+class UploadStats:
+    """Counters for an upload manager.
+
+    :ivar submitted: artifacts submitted.
+    :ivar deduplicated: artifacts not uploaded as already uploaded or
+                        being uploaded.
+    :ivar resumed: uploads resubmitted from the journal.
+    :ivar uploaded: artifacts uploaded.
+    :ivar failed: uploads that failed.
+    """
+
+    submitted: int = 0
+    deduplicated: int = 0
+    resumed: int = 0
+    uploaded: int = 0
+    failed: int = 0
+
+
+class UploadManager:
+    """Upload artifacts from a pool of workers, recorded in a journal.
+
+    Prefer :meth:`.store_client.StoreClient.upload_manager` to create one.
+    Uploads run in the :attr:`.scheduling.Priority.BATCH` class.
+
+    :param uploader: callable uploading a file and returning its upload id.
+    :param journal: path of the journal, see :class:`UploadJournal`.
+    :param workers: amount of concurrent uploads.
+    :param on_progress: called with an upload as its bytes are sent.
+
+    :ivar stats: the :class:`UploadStats` collected.
+    """
+
+    def __init__(
+        self,
+        uploader: Uploader,
+        journal: Union[str, pathlib.Path],
+        *,
+        workers: int = UPLOAD_WORKERS,
+        on_progress: Optional[ProgressCallback] = None,
+    ) -> None:
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self._uploader = uploader
+        self._on_progress = on_progress
+        self._lock = threading.Lock()
+        self._uploads: Dict[str, Upload] = {}
+        self._journal = UploadJournal(journal)
+        self._executor = futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="craft-store-upload"
+        )
+        self._closed = threading.Event()
+        self.stats = UploadStats()
+        self._resume()
+
+    def __enter__(self) -> "UploadManager":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _resume(self) -> None:
+        pending = (UploadState.QUEUED.value, UploadState.UPLOADING.value)
+        for entry in list(self._journal.entries.values()):
+            if entry["state"] not in pending:
+                continue
+            path = pathlib.Path(entry["path"])
+            try:
+                unchanged = file_digest(path) == entry["digest"]
+            except OSError:
+                unchanged = False
+            if not unchanged:
+                logger.debug("Not resuming upload of changed %r.", str(path))
+                continue
+            logger.debug("Resuming upload of %r.", str(path))
+            self.stats.resumed += 1
+            self._start(Upload(path, entry["digest"], entry["size"]))
+
+    def _start(self, upload: Upload) -> None:
+        self._uploads[upload.digest] = upload
+        self._journal.record(upload)
+        self._executor.submit(self._run, upload)
+
+    def submit(
+        self, path: Union[str, pathlib.Path], *, digest: Optional[str] = None
+    ) -> Upload:
+        """Queue the upload of the artifact at path.
+
+        :param path: path of the artifact.
+        :param digest: hex SHA3-384 digest of the artifact, computed if None.
+
+        :return: the upload, already done if the same content was uploaded
+                 before, shared with an upload of the same content queued
+                 or in progress.
+        """
+        path = pathlib.Path(path)
+        if digest is None:
+            digest = file_digest(path)
+        with self._lock:
+            self.stats.submitted += 1
+            upload = self._uploads.get(digest)
+            if upload is not None and upload.state != UploadState.FAILED:
+                self.stats.deduplicated += 1
+                return upload
+
+            entry = self._journal.entries.get(digest)
+            if entry is not None and entry["state"] == UploadState.DONE.value:
+                self.stats.deduplicated += 1
+                upload = Upload(path, digest, entry["size"])
+                upload._finish(  # pylint: disable=protected-access
+                    entry["upload-id"], None
+                )
+                self._uploads[digest] = upload
+                return upload
+
+            upload = Upload(path, digest, path.stat().st_size)
+            self._start(upload)
+            return upload
+
+    def submit_many(
+        self,
+        paths: Iterable[Union[str, pathlib.Path]],
+        *,
+        max_workers: Optional[int] = None,
+    ) -> List[Upload]:
+        """Queue the uploads of the artifacts at paths.
+
+        Artifacts are hashed in parallel with :func:`.hashing.hash_files`
+        before being queued.
+
+        :param paths: paths of the artifacts.
+        :param max_workers: amount of threads hashing artifacts.
+
+        :return: the uploads, in the order of paths.
+        """
+        paths = [pathlib.Path(path) for path in paths]
+        digests = hash_files(paths, ["sha3_384"], max_workers=max_workers)
+        return [self.submit(path, digest=digests[path]["sha3_384"]) for path in paths]
+
+    def uploads(self) -> List[Upload]:
+        """Return the uploads of this manager, in submission order."""
+        with self._lock:
+            return list(self._uploads.values())
+
+    def _progress(self, upload: Upload, sent: int) -> None:
+        upload.sent = min(upload.size, sent)
+        if self._on_progress is not None:
+            self._on_progress(upload)
+
+    def _run(self, upload: Upload) -> None:
+        if self._closed.is_set():
+            # Not recorded, the journal keeps the upload queued to resume.
+            upload._finish(  # pylint: disable=protected-access
+                None, errors.CraftStoreError("Upload manager closed before upload.")
+            )
+            return
+        upload.state = UploadState.UPLOADING
+        self._journal.record(upload)
+        try:
+            with priority(Priority.BATCH):
+                upload_id = self._uploader(
+                    upload.path, progress=lambda sent: self._progress(upload, sent)
+                )
+        except Exception as error:  # pylint: disable=broad-except
+            logger.debug("Upload of %r failed: %s", str(upload.path), error)
+            with self._lock:
+                self.stats.failed += 1
+            upload._finish(None, error)  # pylint: disable=protected-access
+        else:
+            with self._lock:
+                self.stats.uploaded += 1
+            upload._finish(upload_id, None)  # pylint: disable=protected-access
+        self._journal.record(upload)
+
+    def close(self, wait: bool = True) -> None:
+        """Stop the workers and close the journal.
+
+        :param wait: wait for queued uploads, uploads not started are left
+                     to be resumed by the next manager on the journal
+                     otherwise.
+        """
+        if not wait:
+            self._closed.set()
+        self._executor.shutdown(wait=wait)
+        self._journal.close()
@@ -0,0 +1,38 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import pytest
+
+_RESULTS = []
+
+
+def pytest_terminal_summary(terminalreporter):
+    if _RESULTS:
+        terminalreporter.write_sep("-", "benchmark results")
+        for result in _RESULTS:
+            terminalreporter.write_line(result)
+
+
+@pytest.fixture
+def benchmark_report(request, record_property):
+    """Report a measure, in the terminal summary and the junit properties."""
+
+    def report(name: str, value: float, unit: str) -> None:
+        record_property(name, value)
+        _RESULTS.append(f"{request.node.nodeid}: {name} = {value:.1f}{unit}")
+
+    return report
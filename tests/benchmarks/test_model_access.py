@@ -0,0 +1,82 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Typed model access compared to dict access on a large listing."""
+
+import timeit
+
+import pytest
+
+from craft_store.models import RegisteredNameModel
+
+pytestmark = pytest.mark.benchmark
+
+ITEMS = 10_000
+PASSES = 5
+
+
+def _listing():
+    return [
+        {
+            "id": f"id-{i}",
+            "name": f"name-{i}",
+            "type": "charm",
+            "private": False,
+            "status": "registered",
+            "publisher": {"id": "fake-id", "username": "fake"},
+        }
+        for i in range(ITEMS)
+    ]
+
+
+def _walk(items):
+    for _ in range(PASSES):
+        for item in items:
+            item.name, item.status, item.publisher.username
+
+
+def test_listing_access(benchmark_report):
+    listing = _listing()
+
+    def dict_access():
+        for _ in range(PASSES):
+            for item in listing:
+                item["name"], item["status"], item["publisher"]["username"]
+
+    names = list(RegisteredNameModel.unmarshal_list(listing))
+    dict_time = min(timeit.repeat(dict_access, number=1, repeat=5))
+    model_time = min(timeit.repeat(lambda: _walk(names), number=1, repeat=5))
+    benchmark_report("dict access", dict_time * 1000, "ms")
+    benchmark_report("model access", model_time * 1000, "ms")
+
+    assert model_time <= dict_time * 1.5
+
+
+def test_listing_unmarshal(benchmark_report):
+    listing = _listing()
+
+    def unmarshal():
+        list(RegisteredNameModel.unmarshal_list(listing))
+
+    def unmarshal_validated():
+        RegisteredNameModel.unmarshal_list(listing, validate=True)
+
+    unmarshal_time = min(timeit.repeat(unmarshal, number=1, repeat=3))
+    validated_time = min(timeit.repeat(unmarshal_validated, number=1, repeat=3))
+    benchmark_report("unmarshal", unmarshal_time * 1000, "ms")
+    benchmark_report("validated unmarshal", validated_time * 1000, "ms")
+
+    assert unmarshal_time * 2 < validated_time
@@ -0,0 +1,93 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Memory per row of listings held as decoded JSON, records and columns."""
+
+import gc
+import json
+import tracemalloc
+
+import pytest
+
+from craft_store import records
+from craft_store.records import RevisionRecord
+
+pytestmark = pytest.mark.benchmark
+
+ROWS = 20_000
+
+
+def _listing_text():
+    return json.dumps(
+        [
+            {
+                "revision": i,
+                "version": f"{i // 100}.{i % 100}",
+                "status": "released" if i % 3 else "approved",
+                "created-at": f"2021-07-{i % 28 + 1:02d}T10:{i % 60:02d}:00+00:00",
+                "size": 1_000_000 + i,
+                "sha3-384": f"{i:096x}",
+                "bases": [
+                    {"name": "ubuntu", "channel": "20.04", "architecture": "amd64"}
+                ],
+                "errors": None,
+            }
+            for i in range(ROWS)
+        ]
+    )
+
+
+def _bytes_per_row(build):
+    """Return the memory held per row by the result of build."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        held, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return held / ROWS
+
+
+def test_memory_per_row(benchmark_report):
+    text = _listing_text()
+
+    dict_row = _bytes_per_row(lambda: json.loads(text))
+    record_row = _bytes_per_row(lambda: RevisionRecord.from_items(json.loads(text)))
+    benchmark_report("dict bytes per row", dict_row, "B")
+    benchmark_report("record bytes per row", record_row, "B")
+
+    assert record_row <= dict_row / 2
+
+
+@pytest.mark.parametrize(
+    "module,export", [("numpy", records.to_numpy), ("pyarrow", records.to_arrow)]
+)
+def test_columnar_memory_per_row(module, export, benchmark_report):
+    pytest.importorskip(module)
+    text = _listing_text()
+    record_row = _bytes_per_row(lambda: RevisionRecord.from_items(json.loads(text)))
+    revisions = RevisionRecord.from_items(json.loads(text))
+
+    # buffers are reported by the export, PyArrow allocates them out of
+    # the reach of tracemalloc.
+    column_row = export(revisions).nbytes / ROWS
+    benchmark_report("record bytes per row", record_row, "B")
+    benchmark_report(f"{module} bytes per row", column_row, "B")
+
+    assert column_row <= record_row / 2
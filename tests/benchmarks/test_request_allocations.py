@@ -0,0 +1,99 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Per request allocation benchmark for authenticated StoreClient requests."""
+
+import statistics
+import tracemalloc
+
+import keyring
+import pytest
+import requests
+import requests.adapters
+
+from craft_store import HTTPClient, StoreClient, endpoints
+from craft_store.http_client import get_default_retries
+from craft_store.transport import RequestsTransport
+
+pytestmark = pytest.mark.benchmark
+
+ROUNDS = 200
+
+AUTHORIZATION_OVERHEAD = 512
+"""Bytes an authenticated request may allocate over an anonymous one."""
+
+
+class StaticAdapter(requests.adapters.BaseAdapter):
+    """Adapter replying 200 to every request without network I/O."""
+
+    def send(self, request, **kwargs):  # pylint: disable=W0221
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b"{}"  # pylint: disable=W0212
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+def _static_transport():
+    transport = RequestsTransport(retries=get_default_retries())
+    transport.session.mount("https://", StaticAdapter())
+    return transport
+
+
+@pytest.fixture
+def store_client(monkeypatch):
+    current_keyring = keyring.get_keyring()
+    monkeypatch.setenv("CRAFT_STORE_BENCHMARK_CREDENTIALS", "c2VjcmV0LWtleXM=")
+    yield StoreClient(
+        base_url="https://fake-server.com",
+        endpoints=endpoints.CHARMHUB,
+        application_name="benchcraft",
+        user_agent="BenchCraft",
+        environment_auth="CRAFT_STORE_BENCHMARK_CREDENTIALS",
+        transport=_static_transport(),
+    )
+    keyring.set_keyring(current_keyring)
+
+
+def _per_request_peak(request) -> float:
+    """Return the median peak of traced memory for a single request."""
+    request()  # warm up caches, lazy imports and the Authorization header.
+    peaks = []
+    for _ in range(ROUNDS):
+        tracemalloc.start()
+        request()
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return statistics.median(peaks)
+
+
+def test_authorization_header_allocations(store_client, benchmark_report):
+    url = "https://fake-server.com/v1/whoami"
+    anonymous_client = HTTPClient(
+        user_agent="BenchCraft", transport=_static_transport()
+    )
+
+    anonymous_peak = _per_request_peak(lambda: anonymous_client.request("GET", url))
+    authenticated_peak = _per_request_peak(lambda: store_client.request("GET", url))
+    benchmark_report("anonymous request peak", anonymous_peak, "B")
+    benchmark_report("authenticated request peak", authenticated_peak, "B")
+
+    # Credentials are read and encoded once, not on every request.
+    assert authenticated_peak - anonymous_peak < AUTHORIZATION_OVERHEAD
@@ -0,0 +1,188 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+import logging
+import threading
+from unittest.mock import call, patch
+
+import pytest
+
+from craft_store import endpoints, errors
+from craft_store.concurrency import ConcurrencyLimiter
+from craft_store.hedging import Hedger, HedgingPolicy
+from craft_store.http_client import get_default_retries
+from craft_store.scheduling import RequestScheduler
+
+httpx = pytest.importorskip("httpx")
+
+# pylint: disable=wrong-import-position
+from craft_store.async_store_client import AsyncStoreClient  # noqa: E402
+from craft_store.transport import AsyncHTTPXTransport  # noqa: E402
+
+
+@pytest.fixture
+def auth_mock():
+    patched_auth = patch("craft_store.async_store_client.Auth", autospec=True)
+    mocked_auth = patched_auth.start()
+    mocked_auth.return_value.get_credentials.return_value = "secret-macaroon"
+    mocked_auth.return_value.encode_credentials.return_value = "c2VjcmV0LWtleXM="
+    yield mocked_auth
+    patched_auth.stop()
+
+
+@pytest.fixture
+def discharge_mock():
+    patched_discharge = patch(
+        "craft_store.async_store_client._candid_discharge",
+        return_value="discharged",
+    )
+    yield patched_discharge.start()
+    patched_discharge.stop()
+
+
+@pytest.fixture
+def requests_log():
+    return []
+
+
+@pytest.fixture
+def store_client_factory(monkeypatch, requests_log, auth_mock):
+    monkeypatch.setenv("CRAFT_STORE_BACKOFF", "0")
+
+    def handler(request):
+        requests_log.append(request)
+        if request.url.path == "/v1/tokens":
+            return httpx.Response(200, json={"macaroon": "root"})
+        if request.url.path == "/v1/tokens/exchange":
+            return httpx.Response(200, json={"macaroon": "authorized"})
+        if request.url.path == "/v1/whoami":
+            return httpx.Response(
+                200, json={"account": {"id": "fake-id", "username": "fakeuser"}}
+            )
+        if request.url.path == "/expired":
+            return httpx.Response(401, json={})
+        return httpx.Response(404, json={})
+
+    def build(**kwargs):
+        transport = AsyncHTTPXTransport(
+            retries=get_default_retries(), transport=httpx.MockTransport(handler)
+        )
+        return AsyncStoreClient(
+            base_url="https://fake-server.com",
+            endpoints=endpoints.CHARMHUB,
+            application_name="fakecraft",
+            user_agent="FakeCraft Unix X11",
+            transport=transport,
+            **kwargs,
+        )
+
+    return build
+
+
+@pytest.fixture
+def store_client(store_client_factory):
+    return store_client_factory()
+
+
+def test_login(store_client, requests_log, auth_mock, discharge_mock):
+    credentials = asyncio.run(
+        store_client.login(permissions=["perm-1"], description="fakecraft@foo", ttl=60)
+    )
+
+    assert credentials == "c2VjcmV0LWtleXM="
+    assert [(r.method, r.url.path) for r in requests_log] == [
+        ("POST", "/v1/tokens"),
+        ("POST", "/v1/tokens/exchange"),
+    ]
+    assert json.loads(requests_log[0].content) == {
+        "permissions": ["perm-1"],
+        "description": "fakecraft@foo",
+        "ttl": 60,
+    }
+    assert requests_log[1].headers["Macaroons"] == "discharged"
+    assert "Authorization" not in requests_log[1].headers
+    assert discharge_mock.mock_calls == [call(store_client._bakery_client, "root")]
+    assert auth_mock.return_value.set_credentials.mock_calls == [call("authorized")]
+
+
+def test_whoami(store_client, requests_log):
+    assert asyncio.run(store_client.whoami()).account.username == "fakeuser"
+    assert requests_log[0].headers["Authorization"] == "Macaroon secret-macaroon"
+    assert requests_log[0].headers["User-Agent"] == "FakeCraft Unix X11"
+
+
+def test_credentials_read_off_the_event_loop(store_client, auth_mock):
+    threads = []
+
+    def get_credentials():
+        threads.append(threading.get_ident())
+        return "secret-macaroon"
+
+    auth_mock.return_value.get_credentials.side_effect = get_credentials
+
+    asyncio.run(store_client.whoami())
+
+    assert len(threads) == 1
+    assert threads[0] != threading.get_ident()
+
+
+def test_debug_logging(caplog, store_client):
+    caplog.set_level(logging.DEBUG, logger="craft_store.async_store_client")
+
+    asyncio.run(store_client.whoami())
+
+    assert [rec.message for rec in caplog.records] == [
+        "HTTP 'GET' for 'https://fake-server.com/v1/whoami' with params None "
+        "and headers {'User-Agent': 'FakeCraft Unix X11', "
+        "'Authorization': '<macaroon>'}"
+    ]
+
+
+def test_request_controls(store_client_factory, requests_log):
+    limiter = ConcurrencyLimiter()
+    scheduler = RequestScheduler()
+    hedger = Hedger(HedgingPolicy())
+    store_client = store_client_factory(
+        limiter=limiter, scheduler=scheduler, hedger=hedger
+    )
+
+    async def main():
+        await store_client.whoami()
+        await store_client.close()
+
+    asyncio.run(main())
+
+    assert limiter.stats.requests == 1
+    assert limiter.in_flight == 0
+    assert sum(stats.requests for stats in scheduler.stats.values()) == 1
+    assert hedger.stats.requests == 1
+    assert len(requests_log) == 1
+
+
+def test_request_auth_expired(store_client, auth_mock):
+    with pytest.raises(errors.StoreServerError) as raised:
+        asyncio.run(store_client.request("GET", "https://fake-server.com/expired"))
+
+    assert raised.value.category == errors.ErrorCategory.AUTH_EXPIRED
+    assert "Authorization" not in store_client._transport.headers
+
+
+def test_logout(store_client, auth_mock):
+    store_client.logout()
+
+    assert auth_mock.return_value.del_credentials.mock_calls == [call()]
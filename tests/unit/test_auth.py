@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
 import logging
 from typing import Any, List, Optional, Tuple
 from unittest.mock import ANY, patch
@@ -24,6 +25,7 @@ import pytest
 
 from craft_store import errors
 from craft_store.auth import Auth, MemoryKeyring
+from craft_store.credential_broker import CredentialBroker
 
 
 class FakeKeyring:
@@ -229,3 +231,39 @@ def test_memory_keyring_delete_empty():
 
     with pytest.raises(keyring.errors.PasswordDeleteError):
         k.delete_password("my-service", "my-user")
+
+
+def test_inspect_credentials(fake_keyring):
+    fake_keyring.password = Auth.encode_credentials(
+        json.dumps({"i": "id", "s64": "c2ln", "c": [{"i": 'store|channels|["edge"]'}]})
+    )
+    auth = Auth("fakeclient", "fake-host.com")
+
+    assert auth.inspect_credentials().channels == {"edge"}
+
+
+def test_broker_credentials(fake_keyring, tmp_path):
+    broker_auth = Auth("fakeclient", "fake-host.com")
+    with CredentialBroker(broker_auth, path=tmp_path / "broker.sock") as broker:
+        auth = Auth("fakeclient", "fake-host.com", credential_broker=broker.path)
+        fake_keyring.get_password_calls.clear()
+
+        assert auth.get_credentials() == "{'password': 'secret'}"
+        assert auth.get_credentials() == "{'password': 'secret'}"
+        assert len(fake_keyring.get_password_calls) == 1
+
+        auth.set_credentials("new-secret")
+
+        assert auth.get_credentials() == "new-secret"
+        assert len(fake_keyring.set_password_calls) == 1
+
+
+def test_broker_unavailable_falls_back_to_keyring(fake_keyring, tmp_path):
+    auth = Auth("fakeclient", "fake-host.com", credential_broker=tmp_path / "x.sock")
+
+    assert auth.get_credentials() == "{'password': 'secret'}"
+
+    auth.set_credentials("new-secret")
+    auth.del_credentials()
+
+    assert len(fake_keyring.delete_password_calls) == 1
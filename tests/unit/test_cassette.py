@@ -0,0 +1,233 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import json
+import time
+from unittest.mock import Mock
+
+import pytest
+import requests
+from requests.adapters import Retry
+
+from craft_store import HTTPClient, errors
+from craft_store.cassette import (
+    REDACTED_MACAROON,
+    Cassette,
+    Interaction,
+    RecordingTransport,
+    ReplayTransport,
+)
+from craft_store.transport import Transport
+
+
+class CannedTransport(Transport):
+    """Transport answering every request with a JSON echo of it."""
+
+    def __init__(self) -> None:
+        super().__init__(retries=Retry(0))
+        self._headers = requests.structures.CaseInsensitiveDict()
+        self.sent = 0
+
+    @property
+    def headers(self):
+        return self._headers
+
+    def request(self, method, url, params=None, headers=None, **kwargs):
+        self.sent += 1
+        response = requests.Response()
+        response.status_code = 200
+        response.headers["Content-Type"] = "application/json"
+        response.headers["Set-Cookie"] = "session=secret; HttpOnly"
+        response.elapsed = datetime.timedelta(seconds=0.05)
+        if url.endswith("/tokens"):
+            payload = {"macaroon": "secret-root"}
+        else:
+            payload = {"method": method, "params": params, "sent": self.sent}
+        response._content = json.dumps(payload).encode()
+        return response
+
+
+@pytest.fixture
+def cassette_path(tmp_path):
+    return tmp_path / "cassette.json"
+
+
+@pytest.fixture
+def http_client():
+    return HTTPClient(user_agent="Secret Agent", transport=CannedTransport())
+
+
+def test_recording(http_client, cassette_path):
+    with http_client.recording(cassette_path) as cassette:
+        http_client.get(
+            "https://foo.bar/list",
+            params={"q": "a"},
+            headers={
+                "Authorization": "Macaroon secret",
+                "Macaroons": "secret",
+                "Cookie": "session=secret",
+            },
+        )
+        http_client.post("https://foo.bar/tokens")
+
+    assert isinstance(http_client._transport, CannedTransport)
+    assert [(i.method, i.url) for i in cassette.interactions] == [
+        ("GET", "https://foo.bar/list?q=a"),
+        ("POST", "https://foo.bar/tokens"),
+    ]
+    assert cassette.interactions[0].request_headers == {
+        "User-Agent": "Secret Agent",
+        "Authorization": "<macaroon>",
+        "Macaroons": "<macaroon>",
+        "Cookie": "<cookie>",
+    }
+    assert cassette.interactions[0].headers == {
+        "Content-Type": "application/json",
+        "Set-Cookie": "<cookie>",
+    }
+    assert cassette.interactions[0].elapsed == 0.05
+    assert json.loads(cassette.interactions[1].content) == {
+        "macaroon": json.dumps(REDACTED_MACAROON)
+    }
+    assert "secret" not in cassette_path.read_text()
+
+
+@pytest.mark.parametrize(
+    "payload,redacted",
+    [
+        ({"Macaroon": {"s64": "secret"}}, {"Macaroon": REDACTED_MACAROON}),
+        ({"macaroon": {"s64": "secret"}}, {"macaroon": REDACTED_MACAROON}),
+        (
+            {"kind": "agent", "token": "secret", "token64": "c2VjcmV0"},
+            {"kind": "agent", "token": "redacted", "token64": "cmVkYWN0ZWQ="},
+        ),
+        ({"token": "kept"}, {"token": "kept"}),
+    ],
+)
+def test_recording_redacts_candid_secrets(cassette_path, payload, redacted):
+    class CandidTransport(CannedTransport):
+        def request(self, method, url, params=None, headers=None, **kwargs):
+            response = super().request(method, url, params, headers, **kwargs)
+            response._content = json.dumps(payload).encode()
+            return response
+
+    http_client = HTTPClient(user_agent="Agent", transport=CandidTransport())
+
+    with http_client.recording(cassette_path) as cassette:
+        http_client.post("https://candid/discharge")
+
+    assert json.loads(cassette.interactions[0].content) == redacted
+
+
+def test_recording_returns_responses_unchanged(http_client, cassette_path):
+    with http_client.recording(cassette_path):
+        response = http_client.post("https://foo.bar/tokens")
+
+    assert response.json() == {"macaroon": "secret-root"}
+
+
+def test_save_load_roundtrip(cassette_path):
+    cassette = Cassette(
+        [
+            Interaction("GET", "https://foo.bar/a", {}, 200, {}, b"text", 0.1),
+            Interaction("GET", "https://foo.bar/b", {}, 200, {}, b"\xff\xfe", 0.2),
+        ]
+    )
+    cassette.save(cassette_path)
+
+    assert Cassette.load(cassette_path).interactions == cassette.interactions
+
+
+@pytest.mark.parametrize(
+    "content", ["not json", json.dumps({"version": 0, "interactions": []})]
+)
+def test_load_invalid(cassette_path, content):
+    cassette_path.write_text(content)
+
+    with pytest.raises(errors.CraftStoreError):
+        Cassette.load(cassette_path)
+
+
+def test_record_replay(http_client, cassette_path):
+    with http_client.recording(cassette_path):
+        http_client.get("https://foo.bar/list", params={"page": "1"})
+        http_client.get("https://foo.bar/list", params={"page": "1"})
+        http_client.put("https://foo.bar/item")
+    client = HTTPClient(
+        user_agent="Secret Agent",
+        transport=ReplayTransport(Cassette.load(cassette_path)),
+    )
+
+    responses = [
+        client.get("https://foo.bar/list", params={"page": "1"}).json()["sent"]
+        for _ in range(3)
+    ]
+    put_response = client.put("https://foo.bar/item")
+
+    assert responses == [1, 2, 2]
+    assert put_response.json() == {"method": "PUT", "params": None, "sent": 3}
+    assert put_response.elapsed == datetime.timedelta(seconds=0.05)
+    assert put_response.reason == "OK"
+    assert list(put_response.iter_content(4))[0] == b'{"me'
+
+
+def test_replay_missing_interaction():
+    transport = ReplayTransport(Cassette())
+
+    with pytest.raises(errors.CraftStoreError):
+        transport.request("GET", "https://foo.bar")
+
+
+def test_replay_error_responses():
+    cassette = Cassette(
+        [Interaction("GET", "https://foo.bar/", {}, 404, {}, b"{}", 0.0)]
+    )
+    client = HTTPClient(user_agent="Agent", transport=ReplayTransport(cassette))
+
+    with pytest.raises(errors.StoreServerError):
+        client.get("https://foo.bar/")
+
+
+def test_replay_latency():
+    cassette = Cassette([Interaction("GET", "https://foo.bar/", {}, 200, {}, b"", 0.1)])
+    transport = ReplayTransport(cassette, replay_latency=True)
+
+    start = time.monotonic()
+    transport.request("GET", "https://foo.bar/")
+
+    assert time.monotonic() - start >= 0.1
+
+
+def test_recording_transport_delegates():
+    inner = CannedTransport()
+    transport = RecordingTransport(inner, Cassette())
+    transport.headers["X-Foo"] = "bar"
+
+    assert inner.headers["X-Foo"] == "bar"
+    assert transport.retries is inner.retries
+
+
+def test_recording_transport_forwards_connection_management():
+    inner = Mock(spec=Transport, retries=Retry(0))
+    inner.warmup.return_value = 2
+    inner.evict_idle.return_value = 1
+    transport = RecordingTransport(inner, Cassette())
+
+    assert transport.warmup("https://foo.bar", connections=2) == 2
+    assert transport.evict_idle() == 1
+    inner.warmup.assert_called_once_with("https://foo.bar", 2)
+    assert len(transport.cassette) == 0
@@ -0,0 +1,275 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from craft_store import HTTPClient, errors
+from craft_store.concurrency import AIMDPolicy, ConcurrencyLimiter
+from craft_store.transport import Transport
+
+
+def _server_error(status_code):
+    response = Mock(status_code=status_code, ok=False, reason="error", headers={})
+    response.json.return_value = {"error-list": []}
+    return errors.StoreServerError(response)
+
+
+def _fail(error):
+    def send():
+        raise error
+
+    return send
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"min_limit": 0},
+        {"initial_limit": 100},
+        {"min_limit": 5, "initial_limit": 4},
+        {"decrease_factor": 1},
+        {"latency_tolerance": 1},
+    ],
+)
+def test_policy_invalid(kwargs):
+    with pytest.raises(ValueError):
+        AIMDPolicy(**kwargs)
+
+
+def test_additive_increase():
+    limiter = ConcurrencyLimiter(AIMDPolicy(initial_limit=1, max_limit=2))
+
+    assert limiter.run(lambda: "ok") == "ok"
+    assert limiter.limit == 2
+
+    for _ in range(10):
+        limiter.run(lambda: "ok")
+
+    assert limiter.limit == 2
+    assert limiter.stats.requests == 11
+    assert limiter.in_flight == 0
+
+
+def test_no_increase_when_underused():
+    limiter = ConcurrencyLimiter(AIMDPolicy(initial_limit=8))
+
+    for _ in range(20):
+        limiter.run(lambda: "ok")
+
+    assert limiter.limit == 8
+
+
+@pytest.mark.parametrize(
+    "error,decreased",
+    [
+        (_server_error(503), True),
+        (_server_error(429), True),
+        (errors.NetworkError(Exception("reset")), True),
+        (_server_error(404), False),
+        (ValueError("unrelated"), False),
+    ],
+)
+def test_multiplicative_decrease(error, decreased):
+    limiter = ConcurrencyLimiter(AIMDPolicy(initial_limit=8))
+
+    with pytest.raises(type(error)):
+        limiter.run(_fail(error))
+
+    assert (limiter.limit == 4) is decreased
+    assert limiter.stats.decreases == int(decreased)
+    assert limiter.in_flight == 0
+
+
+def test_decrease_floor():
+    limiter = ConcurrencyLimiter(AIMDPolicy(initial_limit=2, min_limit=2))
+
+    with pytest.raises(errors.StoreServerError):
+        limiter.run(_fail(_server_error(503)))
+
+    assert limiter.limit == 2
+
+
+def test_single_decrease_per_congestion_event():
+    limiter = ConcurrencyLimiter(AIMDPolicy(initial_limit=16))
+    release = threading.Event()
+    started = threading.Barrier(5)
+
+    def send():
+        started.wait()
+        release.wait()
+        raise _server_error(503)
+
+    def worker():
+        with pytest.raises(errors.StoreServerError):
+            limiter.run(send)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    started.wait()
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert limiter.limit == 8
+    assert limiter.stats.congestion == 4
+    assert limiter.stats.decreases == 1
+
+    with pytest.raises(errors.StoreServerError):
+        limiter.run(_fail(_server_error(503)))
+
+    assert limiter.limit == 4
+
+
+def test_latency_growth_decreases():
+    limiter = ConcurrencyLimiter(AIMDPolicy(initial_limit=8, min_samples=5))
+    for _ in range(5):
+        limiter.run(lambda: time.sleep(0.001))
+    limit = limiter.limit
+
+    limiter.run(lambda: time.sleep(0.05))
+
+    assert limiter.stats.slow == 1
+    assert limiter.limit == limit // 2
+
+
+def test_try_acquire():
+    limiter = ConcurrencyLimiter(AIMDPolicy(initial_limit=1, max_limit=2))
+
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+    limiter.release()
+    assert limiter.in_flight == 0
+    assert limiter.limit == 1
+
+
+def test_limit_enforced():
+    limiter = ConcurrencyLimiter(AIMDPolicy(initial_limit=2, max_limit=2))
+    lock = threading.Lock()
+    in_flight = []
+    peak = []
+
+    def send():
+        with lock:
+            in_flight.append(1)
+            peak.append(len(in_flight))
+        time.sleep(0.01)
+        with lock:
+            in_flight.pop()
+
+    threads = [threading.Thread(target=limiter.run, args=(send,)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max(peak) == 2
+    assert limiter.stats.waits >= 1
+
+
+def test_async_limit_enforced():
+    limiter = ConcurrencyLimiter(AIMDPolicy(initial_limit=2, max_limit=2))
+    in_flight = []
+    peak = []
+
+    async def send():
+        in_flight.append(None)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.pop()
+        return "ok"
+
+    async def main():
+        return await asyncio.gather(*(limiter.async_run(send) for _ in range(6)))
+
+    assert asyncio.run(main()) == ["ok"] * 6
+    assert max(peak) == 2
+    assert limiter.stats.waits == 4
+    assert limiter.in_flight == 0
+
+
+def test_async_congestion_decreases():
+    limiter = ConcurrencyLimiter(AIMDPolicy(initial_limit=4))
+
+    async def send():
+        raise _server_error(503)
+
+    with pytest.raises(errors.StoreServerError):
+        asyncio.run(limiter.async_run(send))
+
+    assert limiter.limit == 2
+    assert limiter.in_flight == 0
+
+
+def test_converges_to_capacity():
+    """The limit settles around the capacity of an overloaded store."""
+    capacity = 6
+    limiter = ConcurrencyLimiter(
+        AIMDPolicy(initial_limit=1, max_limit=64, latency_tolerance=100)
+    )
+    lock = threading.Lock()
+    in_flight = [0]
+
+    def send():
+        with lock:
+            in_flight[0] += 1
+            overloaded = in_flight[0] > capacity
+        try:
+            time.sleep(0.001)
+            if overloaded:
+                raise _server_error(429)
+        finally:
+            with lock:
+                in_flight[0] -= 1
+
+    limits = []
+
+    def worker():
+        for _ in range(60):
+            try:
+                limiter.run(send)
+            except errors.StoreServerError:
+                pass
+            limits.append(limiter.limit)
+
+    threads = [threading.Thread(target=worker) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert limiter.stats.decreases > 0
+    assert sum(limits) / len(limits) <= capacity * 2
+
+
+def test_http_client_limiter():
+    transport = Mock(spec=Transport, headers={})
+    transport.request.return_value = Mock(
+        status_code=503, ok=False, reason="error", headers={}
+    )
+    limiter = ConcurrencyLimiter(AIMDPolicy(initial_limit=4))
+    client = HTTPClient(user_agent="Agent", transport=transport, limiter=limiter)
+
+    with pytest.raises(errors.StoreServerError):
+        client.get("https://foo.bar")
+
+    assert limiter.stats.congestion == 1
+    assert limiter.limit == 2
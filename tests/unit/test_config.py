@@ -0,0 +1,298 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import dataclasses
+import logging
+from unittest.mock import patch
+
+import pytest
+
+from craft_store import AsyncStoreClient, HTTPClient, StoreClient, endpoints
+from craft_store.config import PRESETS, ClientConfig, _get_env_value
+from craft_store.http_client import get_default_retries
+
+
+@pytest.mark.parametrize(
+    "environment_value,kind,expected",
+    [("0", int, 0), ("20000", int, 20000), ("0.5", float, 0.5), ("10", float, 10.0)],
+)
+def test_get_env_value(caplog, environment_value, kind, expected):
+    caplog.set_level(logging.DEBUG)
+
+    value = _get_env_value({"FAKE_ENV": environment_value}, "FAKE_ENV", 1, kind)
+
+    assert value == expected
+    assert type(value) is kind
+    assert len(caplog.records) == 0
+
+
+def test_get_env_value_unset():
+    assert _get_env_value({}, "FAKE_ENV", 3, int) == 3
+
+
+@pytest.mark.parametrize(
+    "environment_value,kind,default",
+    [
+        ("NaN", int, 10),
+        ("NaN", float, 0.4),
+        ("inf", float, 0.4),
+        ("foo", int, 1),
+        ("2.5", int, 8),
+        ("none", int, 8),
+    ],
+)
+def test_get_env_value_invalid(environment_value, kind, default):
+    with pytest.raises(ValueError) as raised:
+        _get_env_value({"FAKE_ENV": environment_value}, "FAKE_ENV", default, kind)
+
+    assert str(raised.value) == (
+        f"FAKE_ENV set to invalid value {environment_value!r}."
+    )
+
+
+@pytest.mark.parametrize(
+    "environment_value,kind,default", [("-1", int, 10), ("-0.5", float, 0.4)]
+)
+def test_get_env_value_negative(environment_value, kind, default):
+    with pytest.raises(ValueError) as raised:
+        _get_env_value({"FAKE_ENV": environment_value}, "FAKE_ENV", default, kind)
+
+    assert str(raised.value) == (
+        f"FAKE_ENV set to negative value {kind(environment_value)!r}."
+    )
+
+
+def test_get_env_value_none_optional():
+    assert _get_env_value({"FAKE_ENV": "None"}, "FAKE_ENV", 5.0, float, True) is None
+
+
+def test_default_config():
+    config = ClientConfig()
+
+    assert config.retries == 8
+    assert config.backoff == 0.2
+    assert config.backoff_jitter == 0.5
+    assert config.timeout is None
+    assert config.max_concurrency is None
+    assert config.retry_budget_ratio is None
+    assert config.download_cache_path is None
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"pool_size": 0},
+        {"max_idle": 0},
+        {"health_check_interval": 0.0},
+        {"connect_timeout": -1.0},
+        {"read_timeout": 0.0},
+        {"retries": -1},
+        {"backoff": -0.1},
+        {"backoff_jitter": 1.5},
+        {"max_concurrency": 0},
+        {"retry_budget_ratio": -0.1},
+        {"download_cache_size": -1},
+    ],
+)
+def test_config_invalid(kwargs):
+    with pytest.raises(ValueError):
+        ClientConfig(**kwargs)
+
+
+def test_timeout():
+    assert ClientConfig(connect_timeout=3.0).timeout == (3.0, None)
+    assert ClientConfig(read_timeout=30.0).timeout == (None, 30.0)
+
+
+def test_presets():
+    assert set(PRESETS) == {"default", "interactive", "ci", "bulk"}
+    assert ClientConfig.preset("default") == ClientConfig()
+    assert ClientConfig.preset("interactive").retries < ClientConfig().retries
+    assert ClientConfig.preset("bulk").pool_size > ClientConfig().pool_size
+
+
+def test_preset_unknown():
+    with pytest.raises(ValueError, match="Unknown preset 'fast'"):
+        ClientConfig.preset("fast")
+
+
+def test_from_env_default():
+    assert ClientConfig.from_env(environ={}) == ClientConfig()
+
+
+def test_from_env_profile():
+    config = ClientConfig.from_env(environ={"CRAFT_STORE_PROFILE": "ci"})
+
+    assert config == PRESETS["ci"]
+
+
+def test_from_env_preset_over_profile():
+    config = ClientConfig.from_env("bulk", environ={"CRAFT_STORE_PROFILE": "ci"})
+
+    assert config == PRESETS["bulk"]
+
+
+def test_from_env_overrides():
+    config = ClientConfig.from_env(
+        "interactive",
+        environ={
+            "CRAFT_STORE_RETRIES": "5",
+            "CRAFT_STORE_BACKOFF": "0.75",
+            "CRAFT_STORE_READ_TIMEOUT": "none",
+            "CRAFT_STORE_MAX_CONCURRENCY": "8",
+            "CRAFT_STORE_HEALTH_CHECK_INTERVAL": "30",
+            "CRAFT_STORE_DOWNLOAD_CACHE_PATH": "/var/cache/store",
+        },
+    )
+
+    assert config == ClientConfig(
+        connect_timeout=PRESETS["interactive"].connect_timeout,
+        retries=5,
+        backoff=0.75,
+        max_concurrency=8,
+        health_check_interval=30.0,
+        download_cache_path="/var/cache/store",
+    )
+
+
+def test_from_env_invalid_override():
+    with pytest.raises(ValueError, match="CRAFT_STORE_POOL_SIZE"):
+        ClientConfig.from_env(environ={"CRAFT_STORE_POOL_SIZE": "invalid"})
+
+
+def test_from_env_invalid_config():
+    with pytest.raises(ValueError, match="backoff_jitter"):
+        ClientConfig.from_env(environ={"CRAFT_STORE_BACKOFF_JITTER": "2"})
+
+
+def test_from_env_os_environ(monkeypatch):
+    monkeypatch.setenv("CRAFT_STORE_PROFILE", "bulk")
+    monkeypatch.setenv("CRAFT_STORE_BACKOFF", "0.3")
+
+    assert ClientConfig.from_env().backoff == 0.3
+    assert ClientConfig.from_env().pool_size == PRESETS["bulk"].pool_size
+
+
+def test_get_default_retries_config():
+    retries = get_default_retries(config=ClientConfig(retries=2, backoff=1.5))
+
+    assert retries.total == 2
+    assert retries.backoff_factor == 1.5
+
+
+def test_http_client_config(tmp_path):
+    config = ClientConfig(
+        pool_size=3,
+        max_idle=5.0,
+        health_check_interval=60.0,
+        retries=1,
+        max_concurrency=2,
+        retry_budget_ratio=0.3,
+        download_cache_path=str(tmp_path),
+        download_cache_size=1000,
+    )
+
+    client = HTTPClient(user_agent="tests", config=config)
+
+    assert client.config is config
+    assert client._limiter.policy.max_limit == 2
+    assert client._limiter.policy.initial_limit == 2
+    assert client._retry_budget.policy.ratio == 0.3
+    assert client._download_cache.max_size == 1000
+    adapter = client._transport._http_adapter
+    assert adapter._pool_maxsize == 3
+    assert adapter.max_idle == 5.0
+    assert adapter.max_retries.total == 1
+    assert adapter.max_retries.budget is client._retry_budget
+    assert client._transport._health_checks.is_alive()
+
+    client.close()
+
+    assert client._transport._health_checks is None
+
+
+def test_http_client_config_default():
+    client = HTTPClient(user_agent="tests")
+
+    assert client.config == ClientConfig()
+    assert client._limiter is None
+    assert client._retry_budget is None
+    assert client._download_cache is None
+    assert client._transport._health_checks is None
+
+
+def test_http_client_config_timeout():
+    client = HTTPClient(
+        user_agent="tests",
+        config=ClientConfig(connect_timeout=2.0, read_timeout=20.0),
+    )
+
+    with patch.object(client._transport, "request") as request:
+        request.return_value.status_code = 200
+        request.return_value.ok = True
+        client.request("GET", "https://foo.bar")
+        client.request("GET", "https://foo.bar", timeout=1)
+
+    assert [c.kwargs["timeout"] for c in request.mock_calls] == [(2.0, 20.0), 1]
+
+
+def test_store_client_config(tmp_path):
+    config = ClientConfig(
+        retry_budget_ratio=0.3,
+        max_concurrency=4,
+        download_cache_path=str(tmp_path),
+    )
+
+    client = StoreClient(
+        base_url="https://fake-server.com",
+        storage_base_url="https://storage.fake-server.com",
+        endpoints=endpoints.CHARMHUB,
+        application_name="testcraft",
+        user_agent="craft-store unit tests, should not be hitting a real server",
+        config=config,
+    )
+
+    assert client.config is config
+    assert client._storage_client.config == dataclasses.replace(
+        config, max_concurrency=None
+    )
+    assert client._download_client.config is config
+    assert client._storage_client._retry_budget is client._retry_budget
+    assert client._download_client._retry_budget is client._retry_budget
+    assert client._limiter is not None
+    assert client._storage_client._limiter is None
+    assert client._download_client._limiter is client._limiter
+    assert client._download_client._download_cache.root == tmp_path
+    assert "_download_cache" not in vars(client)
+    assert "_download_cache" not in vars(client._storage_client)
+
+
+def test_async_store_client_config():
+    pytest.importorskip("httpx")
+    config = ClientConfig(retries=2, retry_budget_ratio=0.3)
+
+    client = AsyncStoreClient(
+        base_url="https://fake-server.com",
+        endpoints=endpoints.CHARMHUB,
+        application_name="testcraft",
+        user_agent="craft-store unit tests, should not be hitting a real server",
+        config=config,
+    )
+
+    assert client.config is config
+    assert client._transport.retries.total == 2
+    assert client._transport.retries.budget is client._retry_budget
@@ -0,0 +1,206 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import socket
+import tempfile
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from craft_store import errors
+from craft_store.credential_broker import (
+    BrokerClient,
+    CredentialBroker,
+    RefreshLock,
+    default_socket_path,
+)
+
+
+@pytest.fixture(autouse=True)
+def runtime_dir(monkeypatch, tmp_path):
+    tmp_path.chmod(0o700)
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def other_user(monkeypatch):
+    uid = os.getuid() + 1
+    monkeypatch.setattr("craft_store.credential_broker.os.getuid", lambda: uid)
+
+
+def test_refresh_lock_serializes(runtime_dir):
+    counter = runtime_dir / "counter"
+    counter.write_text("0")
+
+    def refresh():
+        with RefreshLock("fakecraft", "https://fake-server.com"):
+            value = int(counter.read_text())
+            time.sleep(0.01)
+            counter.write_text(str(value + 1))
+
+    threads = [threading.Thread(target=refresh) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert counter.read_text() == "5"
+
+
+def test_refresh_lock_timeout():
+    with RefreshLock("fakecraft", "https://fake-server.com"):
+        with pytest.raises(errors.CraftStoreError, match="Timed out"):
+            RefreshLock("fakecraft", "https://fake-server.com", timeout=0.05).acquire()
+
+    with RefreshLock("fakecraft", "https://fake-server.com", timeout=0.05):
+        pass
+
+
+def test_refresh_lock_per_host():
+    with RefreshLock("fakecraft", "https://fake-server.com"):
+        with RefreshLock("fakecraft", "https://other-server.com", timeout=0):
+            pass
+
+
+def test_refresh_lock_symlink(runtime_dir):
+    path = runtime_dir / "lock"
+    path.symlink_to(runtime_dir / "target")
+
+    with pytest.raises(errors.CraftStoreError, match="Cannot open"):
+        RefreshLock("fakecraft", "https://fake-server.com", path=path).acquire()
+
+    assert not (runtime_dir / "target").exists()
+
+
+def test_refresh_lock_owner(runtime_dir, other_user):
+    lock = RefreshLock(
+        "fakecraft", "https://fake-server.com", path=runtime_dir / "lock"
+    )
+
+    with pytest.raises(errors.CraftStoreError, match="not owned"):
+        lock.acquire()
+
+
+def test_default_socket_path(runtime_dir):
+    path = default_socket_path("fakecraft", "https://fake-server.com")
+
+    assert path.parent == runtime_dir
+    assert path != default_socket_path("fakecraft", "https://other-server.com")
+
+
+def test_default_socket_path_without_runtime_dir(monkeypatch, tmp_path):
+    monkeypatch.delenv("XDG_RUNTIME_DIR")
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+
+    path = default_socket_path("fakecraft", "https://fake-server.com")
+
+    assert path.parent == tmp_path / f"craft-store-{os.getuid()}"
+    assert path.parent.stat().st_mode & 0o777 == 0o700
+    assert default_socket_path("fakecraft", "https://fake-server.com") == path
+
+
+def test_default_socket_path_insecure_runtime_dir(runtime_dir):
+    runtime_dir.chmod(0o755)
+
+    with pytest.raises(errors.CraftStoreError, match="only accessible"):
+        default_socket_path("fakecraft", "https://fake-server.com")
+
+
+def test_default_socket_path_runtime_dir_of_other_user(runtime_dir, other_user):
+    with pytest.raises(errors.CraftStoreError, match="owned by the user"):
+        default_socket_path("fakecraft", "https://fake-server.com")
+
+
+@pytest.fixture
+def auth():
+    auth = Mock(application_name="fakecraft", host="https://fake-server.com")
+    auth.get_credentials.return_value = "secret"
+    return auth
+
+
+@pytest.fixture
+def broker(auth):
+    with CredentialBroker(auth) as broker:
+        yield broker
+
+
+def test_broker_get_credentials(broker, auth):
+    client = BrokerClient(broker.path)
+
+    assert client.get_credentials() == "secret"
+    assert client.get_credentials() == "secret"
+    assert auth.get_credentials.call_count == 1
+    assert broker.path.stat().st_mode & 0o777 == 0o600
+
+
+def test_broker_set_clear_credentials(broker, auth):
+    client = BrokerClient(broker.path)
+
+    client.set_credentials("new-secret")
+
+    assert client.get_credentials() == "new-secret"
+    assert auth.get_credentials.call_count == 0
+
+    client.clear()
+    auth.get_credentials.side_effect = errors.NotLoggedIn()
+
+    with pytest.raises(errors.NotLoggedIn):
+        client.get_credentials()
+
+
+def test_broker_invalid_request(broker):
+    assert broker.handle({"op": "unknown"}) == {"error": "invalid-request"}
+    assert broker.handle({"op": "set", "credentials": 1}) == {
+        "error": "invalid-request"
+    }
+
+
+def test_broker_unavailable(runtime_dir):
+    client = BrokerClient(runtime_dir / "missing.sock", timeout=0.1)
+
+    with pytest.raises(errors.CredentialBrokerUnavailable):
+        client.get_credentials()
+
+
+def test_broker_stop_removes_socket(auth):
+    broker = CredentialBroker(auth)
+    broker.start()
+    broker.stop()
+
+    assert not broker.path.exists()
+
+
+def test_broker_client_rejects_other_user(broker, auth, other_user):
+    client = BrokerClient(broker.path)
+
+    with pytest.raises(errors.CredentialBrokerUnavailable, match="another user"):
+        client.set_credentials("secret")
+
+    assert auth.get_credentials.call_count == 0
+
+
+def test_broker_rejects_other_user(broker, auth, other_user):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(5)
+        sock.connect(str(broker.path))
+
+        assert sock.recv(1024) == b""
+
+    assert auth.get_credentials.call_count == 0
@@ -0,0 +1,190 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import base64
+import datetime
+import json
+
+import pymacaroons
+import pytest
+from pymacaroons.serializers import json_serializer
+
+from craft_store import attenuations, errors
+from craft_store.credentials import CredentialsInfo, inspect_credentials
+
+EXPIRES = datetime.datetime(2030, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+@pytest.fixture
+def macaroon():
+    macaroon = pymacaroons.Macaroon(location="fake-store", identifier="id", key="k")
+    macaroon.add_first_party_caveat(
+        'charmhub|permissions|["package-manage", "package-view-metrics"]'
+    )
+    macaroon.add_first_party_caveat(
+        'charmhub|packages|[{"type": "charm", "name": "fake-charm"}]'
+    )
+    macaroon.add_first_party_caveat('charmhub|channels|["edge", "beta"]')
+    macaroon.add_first_party_caveat("time-before 2030-01-01T00:00:00.000Z")
+    macaroon.add_first_party_caveat("declared username fake")
+    macaroon.add_third_party_caveat("https://candid", "key", "third-party")
+    return macaroon
+
+
+def _bakery_credentials(macaroon):
+    discharges = "[" + macaroon.serialize(json_serializer.JsonSerializer()) + "]"
+    return base64.urlsafe_b64encode(discharges.encode()).decode()
+
+
+@pytest.mark.parametrize(
+    "serialize",
+    [
+        lambda m: m.serialize(),
+        lambda m: m.serialize(json_serializer.JsonSerializer()),
+        _bakery_credentials,
+        lambda m: json.dumps(
+            {"m": json.loads(m.serialize(json_serializer.JsonSerializer())), "v": 3}
+        ),
+    ],
+)
+def test_inspect_credentials(macaroon, serialize):
+    info = inspect_credentials(serialize(macaroon))
+
+    assert info.caveats == (
+        'charmhub|permissions|["package-manage", "package-view-metrics"]',
+        'charmhub|packages|[{"type": "charm", "name": "fake-charm"}]',
+        'charmhub|channels|["edge", "beta"]',
+        "time-before 2030-01-01T00:00:00.000Z",
+        "declared username fake",
+    )
+    assert info.permissions == {"package-manage", "package-view-metrics"}
+    assert info.packages == {"fake-charm"}
+    assert info.channels == {"edge", "beta"}
+    assert info.expires == EXPIRES
+
+
+def test_inspect_credentials_cached(macaroon):
+    credentials = macaroon.serialize()
+
+    assert inspect_credentials(credentials) is inspect_credentials(credentials)
+
+
+@pytest.mark.parametrize("credentials", ["", "not a macaroon", "e30="])
+def test_inspect_credentials_invalid(credentials):
+    with pytest.raises(errors.CredentialsNotParseable):
+        inspect_credentials(credentials)
+
+
+def test_from_caveats_unrestricted():
+    info = CredentialsInfo.from_caveats([])
+
+    assert info.allows(attenuations.PACKAGE_MANAGE_RELEASES, package="a", channel="b")
+    assert not info.is_expired()
+
+
+def test_from_caveats_narrows():
+    info = CredentialsInfo.from_caveats(
+        [
+            'store|channels|["edge", "beta"]',
+            'store|channels|["beta", "stable"]',
+            "time-before 2031-01-01T00:00:00Z",
+            'store|expires|"2030-01-01T00:00:00"',
+            "store|permissions|not-json",
+        ]
+    )
+
+    assert info.channels == {"beta"}
+    assert info.expires == EXPIRES
+    assert info.permissions is None
+
+
+@pytest.mark.parametrize(
+    "timestamp",
+    [
+        "2030-01-01T00:00:00Z",
+        "2030-01-01T00:00:00z",
+        "2030-01-01T00:00:00",
+        "2030-01-01T00:00:00+00:00",
+        "2030-01-01T01:30:00+01:30",
+        "2029-12-31T22:00:00-0200",
+        "2030-01-01T00:00:00.0Z",
+        "2030-01-01T00:00:00.12Z",
+        "2030-01-01T00:00:00.1234Z",
+        "2030-01-01T00:00:00.123456789Z",
+        "2030-01-01 00:00:00.123456789 +0000 UTC",
+        "2030-01-01 01:00:00 +0100 CET",
+    ],
+)
+def test_from_caveats_expiry_formats(timestamp):
+    info = CredentialsInfo.from_caveats([f"time-before {timestamp}"])
+
+    assert info.expires is not None
+    assert info.expires.replace(microsecond=0) == EXPIRES
+
+
+def test_from_caveats_expiry_truncates_fractions():
+    info = CredentialsInfo.from_caveats(["time-before 2030-01-01T00:00:00.1234567Z"])
+
+    assert info.expires == EXPIRES.replace(microsecond=123456)
+
+
+@pytest.mark.parametrize(
+    "caveat",
+    [
+        "time-before not-a-date",
+        "time-before 2030-01-01",
+        "time-before 2030-01-01T00:00:00+0000 UTC junk",
+        "store|expires|42",
+        'store|expires|"tomorrow"',
+    ],
+)
+def test_from_caveats_invalid_expiry(caveat):
+    with pytest.raises(errors.CredentialsNotParseable):
+        CredentialsInfo.from_caveats(["store|channels|[]", caveat])
+
+
+@pytest.mark.parametrize(
+    "permission,granted",
+    [
+        (attenuations.PACKAGE_MANAGE, True),
+        (attenuations.PACKAGE_MANAGE_RELEASES, True),
+        (attenuations.PACKAGE_MANAGE_METADATA, True),
+        (attenuations.PACKAGE_VIEW_METRICS, True),
+        (attenuations.PACKAGE_VIEW_RELEASES, False),
+        (attenuations.ACCOUNT_REGISTER_PACKAGE, False),
+    ],
+)
+def test_has_permission(macaroon, permission, granted):
+    assert inspect_credentials(macaroon.serialize()).has_permission(permission) is (
+        granted
+    )
+
+
+def test_allows(macaroon):
+    info = inspect_credentials(macaroon.serialize())
+    permission = attenuations.PACKAGE_MANAGE_RELEASES
+
+    assert info.allows(permission, package="fake-charm", channel="edge")
+    assert not info.allows(permission, package="other-charm")
+    assert not info.allows(permission, channel="stable")
+    assert not info.allows(attenuations.ACCOUNT_VIEW_PACKAGES)
+
+
+def test_is_expired(macaroon):
+    info = inspect_credentials(macaroon.serialize())
+
+    assert not info.is_expired(EXPIRES - datetime.timedelta(seconds=1))
+    assert info.is_expired(EXPIRES)
@@ -0,0 +1,92 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+from typing import Optional
+
+import pytest
+from macaroonbakery import bakery, checkers, httpbakery
+
+from craft_store.discharge_cache import DischargeCache
+
+
+def _discharge(expires: Optional[datetime.datetime]) -> bakery.Macaroon:
+    macaroon = bakery.Macaroon(
+        root_key=b"root-key",
+        id=b"caveat-id",
+        location="https://candid.fake",
+        version=bakery.LATEST_VERSION,
+    )
+    if expires is not None:
+        macaroon.add_caveat(checkers.time_before_caveat(expires))
+    return macaroon
+
+
+@pytest.fixture
+def token():
+    return httpbakery.DischargeToken(kind="macaroon", value=b"token")
+
+
+def test_get_empty():
+    assert DischargeCache().get("https://candid.fake", "fakecraft") is None
+
+
+def test_put_get(token):
+    cache = DischargeCache()
+    expires = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+
+    cache.put("https://candid.fake/", "fakecraft", token, _discharge(expires))
+
+    assert cache.get("https://candid.fake", "fakecraft") == token
+    assert cache.get("https://candid.fake/", "fakecraft") == token
+    assert cache.get("https://candid.fake", "othercraft") is None
+    assert cache.get("https://other.fake", "fakecraft") is None
+
+
+def test_put_without_expiry_not_cached(token):
+    cache = DischargeCache()
+
+    cache.put("https://candid.fake", "fakecraft", token, _discharge(None))
+
+    assert len(cache) == 0
+    assert cache.get("https://candid.fake", "fakecraft") is None
+
+
+def test_get_expired(token):
+    cache = DischargeCache()
+    expires = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+
+    cache.put("https://candid.fake", "fakecraft", token, _discharge(expires))
+
+    assert len(cache) == 1
+    assert cache.get("https://candid.fake", "fakecraft") is None
+    assert len(cache) == 0
+
+
+def test_evict_and_clear(token):
+    cache = DischargeCache()
+    expires = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    cache.put("https://candid.fake", "fakecraft", token, _discharge(expires))
+    cache.put("https://candid.fake", "othercraft", token, _discharge(expires))
+
+    cache.evict("https://candid.fake", "fakecraft")
+
+    assert cache.get("https://candid.fake", "fakecraft") is None
+    assert cache.get("https://candid.fake", "othercraft") == token
+
+    cache.clear()
+
+    assert len(cache) == 0
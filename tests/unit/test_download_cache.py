@@ -0,0 +1,328 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import hashlib
+import http.server
+import os
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from craft_store import HTTPClient, StoreClient, endpoints, errors
+from craft_store.download_cache import DownloadCache, write_verified
+
+CONTENT = b"charm bytes " * 1000
+DIGEST = hashlib.sha3_384(CONTENT).hexdigest()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DownloadCache(tmp_path / "cache")
+
+
+def _download(*contents):
+    return Mock(side_effect=[iter([content]) for content in contents])
+
+
+def test_write_verified(tmp_path):
+    path = tmp_path / "artifact"
+
+    write_verified([CONTENT[:10], CONTENT[10:]], path, digest=DIGEST)
+
+    assert path.read_bytes() == CONTENT
+    assert os.listdir(tmp_path) == ["artifact"]
+
+
+def test_write_verified_mismatch(tmp_path):
+    path = tmp_path / "artifact"
+    path.write_bytes(b"previous")
+
+    with pytest.raises(errors.DigestMismatch) as raised:
+        write_verified([b"other"], path, digest=DIGEST, source="https://cdn/a")
+
+    assert raised.value.expected == DIGEST
+    assert "https://cdn/a" in str(raised.value)
+    assert path.read_bytes() == b"previous"
+    assert os.listdir(tmp_path) == ["artifact"]
+
+
+def test_write_verified_interrupted(tmp_path):
+    def chunks():
+        yield b"partial"
+        raise ConnectionError()
+
+    with pytest.raises(ConnectionError):
+        write_verified(chunks(), tmp_path / "artifact", digest=DIGEST)
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_fetch_miss_then_hit(cache, tmp_path):
+    download = _download(CONTENT)
+
+    assert cache.fetch(DIGEST, download, tmp_path / "first") is False
+    assert cache.fetch(DIGEST.upper(), download, tmp_path / "second") is True
+
+    download.assert_called_once_with()
+    assert (tmp_path / "first").read_bytes() == CONTENT
+    assert (tmp_path / "second").read_bytes() == CONTENT
+    assert DIGEST in cache
+    assert cache.size() == len(CONTENT)
+
+
+def test_fetch_mismatch_not_cached(cache, tmp_path):
+    with pytest.raises(errors.DigestMismatch):
+        cache.fetch(DIGEST, _download(b"corrupted"), tmp_path / "artifact")
+
+    assert DIGEST not in cache
+    assert cache.size() == 0
+    assert not (tmp_path / "artifact").exists()
+
+
+def test_fetch_other_algorithm(cache, tmp_path):
+    digest = hashlib.sha256(CONTENT).hexdigest()
+
+    cache.fetch(digest, _download(CONTENT), tmp_path / "a", algorithm="sha256")
+
+    assert cache.get(digest, "sha256") is not None
+    assert cache.get(digest) is None
+
+
+def test_fetch_concurrent_downloads_once(cache, tmp_path):
+    started = threading.Event()
+
+    def slow_download():
+        started.set()
+        time.sleep(0.1)
+        return iter([CONTENT])
+
+    download = Mock(side_effect=slow_download)
+    threads = [
+        threading.Thread(
+            target=cache.fetch, args=(DIGEST, download, tmp_path / f"target-{i}")
+        )
+        for i in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    download.assert_called_once_with()
+    for i in range(4):
+        assert (tmp_path / f"target-{i}").read_bytes() == CONTENT
+
+
+def test_fetch_evicted_concurrently(cache, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "materialize", Mock(return_value=False))
+
+    assert cache.fetch(DIGEST, _download(CONTENT), tmp_path / "artifact") is False
+
+    assert (tmp_path / "artifact").read_bytes() == CONTENT
+
+
+def test_fetch_larger_than_cache(tmp_path):
+    cache = DownloadCache(tmp_path / "cache", max_size=len(CONTENT) - 1)
+
+    assert cache.fetch(DIGEST, _download(CONTENT), tmp_path / "artifact") is False
+
+    assert (tmp_path / "artifact").read_bytes() == CONTENT
+    assert DIGEST not in cache
+    assert cache.size() == 0
+
+
+def test_invalid_digest(cache):
+    with pytest.raises(ValueError):
+        cache.get("../../etc/passwd")
+
+
+def test_unknown_algorithm(cache, tmp_path):
+    download = _download(CONTENT)
+
+    with pytest.raises(ValueError, match="Unknown algorithm"):
+        cache.fetch(DIGEST, download, tmp_path / "artifact", algorithm="../sha")
+
+    download.assert_not_called()
+    assert os.listdir(cache.root / "locks") == []
+
+
+def test_materialize_missing(cache, tmp_path):
+    assert cache.materialize(DIGEST, tmp_path / "artifact") is False
+    assert not (tmp_path / "artifact").exists()
+
+
+def test_materialize_replaces_target(cache, tmp_path):
+    target = tmp_path / "artifact"
+    target.write_bytes(b"previous")
+    cache.fetch(DIGEST, _download(CONTENT), tmp_path / "first")
+
+    assert cache.materialize(DIGEST, target) is True
+
+    assert target.read_bytes() == CONTENT
+    assert sorted(os.listdir(tmp_path)) == ["artifact", "cache", "first"]
+
+
+def test_materialize_hardlink(cache, tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        "craft_store.download_cache.fcntl.ioctl", Mock(side_effect=OSError)
+    )
+    cache.fetch(DIGEST, _download(CONTENT), tmp_path / "first")
+    cache.materialize(DIGEST, tmp_path / "artifact")
+
+    assert (tmp_path / "artifact").stat().st_ino == cache.get(DIGEST).stat().st_ino
+
+
+def test_materialize_copy(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        "craft_store.download_cache.fcntl.ioctl", Mock(side_effect=OSError)
+    )
+    cache = DownloadCache(tmp_path / "cache", hardlink=False)
+    cache.fetch(DIGEST, _download(CONTENT), tmp_path / "artifact")
+
+    assert (tmp_path / "artifact").stat().st_ino != cache.get(DIGEST).stat().st_ino
+    assert (tmp_path / "artifact").read_bytes() == CONTENT
+
+
+def test_fetch_miss_target_not_hardlinked(cache, tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        "craft_store.download_cache.fcntl.ioctl", Mock(side_effect=OSError)
+    )
+    target = tmp_path / "artifact"
+
+    cache.fetch(DIGEST, _download(CONTENT), target)
+
+    assert target.stat().st_nlink == 1
+    assert target.stat().st_mode & 0o200
+    target.write_bytes(b"modified")
+    assert cache.get(DIGEST).stat().st_mode & 0o222 == 0
+    assert cache.get(DIGEST).read_bytes() == CONTENT
+    assert os.listdir(cache.get(DIGEST).parent) == [DIGEST]
+
+
+def test_objects_read_only(cache, tmp_path):
+    cache.fetch(DIGEST, _download(CONTENT), tmp_path / "artifact")
+
+    assert cache.get(DIGEST).stat().st_mode & 0o222 == 0
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = DownloadCache(tmp_path / "cache", max_size=2 * (len(CONTENT) + 1))
+    contents = [CONTENT + bytes([i]) for i in range(3)]
+    digests = [hashlib.sha3_384(content).hexdigest() for content in contents]
+    for i in range(2):
+        cache.fetch(digests[i], _download(contents[i]), tmp_path / "artifact")
+        os.utime(cache.get(digests[i]), (1000 + i, 1000 + i))
+    # Using the oldest object makes the second one least recently used.
+    assert cache.materialize(digests[0], tmp_path / "artifact")
+
+    cache.fetch(digests[2], _download(contents[2]), tmp_path / "artifact")
+
+    assert digests[0] in cache
+    assert digests[1] not in cache
+    assert digests[2] in cache
+    assert cache.size() <= cache.max_size
+
+
+def test_evict_within_size(cache, tmp_path):
+    cache.fetch(DIGEST, _download(CONTENT), tmp_path / "artifact")
+
+    assert cache.evict() == 0
+    assert DIGEST in cache
+
+
+class CDNServer(http.server.ThreadingHTTPServer):
+    """CDN serving a single artifact."""
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), CDNHandler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}/artifact"
+        self.requests = []
+
+
+class CDNHandler(http.server.BaseHTTPRequestHandler):
+    server: CDNServer
+
+    def log_message(self, *args):  # pylint: disable=W0221
+        pass
+
+    def do_GET(self):  # noqa: N802
+        self.server.requests.append(dict(self.headers))
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(CONTENT)))
+        self.end_headers()
+        self.wfile.write(CONTENT)
+
+
+@pytest.fixture
+def cdn():
+    server = CDNServer()
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_http_client_download(cdn, tmp_path):
+    client = HTTPClient(user_agent="tests")
+
+    assert client.download(cdn.url, tmp_path / "a", digest=DIGEST) is False
+    assert client.download(cdn.url, tmp_path / "b", digest=DIGEST) is False
+
+    assert len(cdn.requests) == 2
+    assert (tmp_path / "b").read_bytes() == CONTENT
+
+
+def test_http_client_download_mismatch(cdn, tmp_path):
+    client = HTTPClient(user_agent="tests")
+
+    with pytest.raises(errors.DigestMismatch):
+        client.download(cdn.url, tmp_path / "a", digest="0" * 96)
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_http_client_download_cached(cdn, cache, tmp_path):
+    client = HTTPClient(user_agent="tests", download_cache=cache)
+
+    assert client.download(cdn.url, tmp_path / "a", digest=DIGEST) is False
+    assert client.download(cdn.url + "?mirror", tmp_path / "b", digest=DIGEST)
+
+    assert len(cdn.requests) == 1
+    assert (tmp_path / "b").read_bytes() == CONTENT
+
+
+def test_store_client_download(cdn, cache, tmp_path):
+    client = StoreClient(
+        base_url="https://fake-server.com",
+        endpoints=endpoints.CHARMHUB,
+        application_name="testcraft",
+        user_agent="craft-store unit tests, should not be hitting a real server",
+        download_cache=cache,
+    )
+    client._set_static_header("Authorization", "Macaroon secret")
+
+    client.download(cdn.url, tmp_path / "a", digest=DIGEST)
+    client.download(cdn.url, tmp_path / "b", digest=DIGEST)
+
+    (headers,) = cdn.requests
+    assert "Authorization" not in headers
+    assert (tmp_path / "b").read_bytes() == CONTENT
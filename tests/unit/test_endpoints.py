@@ -25,6 +25,9 @@ def test_charmhub():
     assert charmhub.tokens == "/v1/tokens"
     assert charmhub.tokens_exchange == "/v1/tokens/exchange"
     assert charmhub.whoami == "/v1/whoami"
+    assert charmhub.account_packages == "/v1/charm"
+    assert charmhub.revisions == "/v1/charm/{name}/revisions"
+    assert charmhub.channel_map == "/v1/charm/{name}/releases"
     assert charmhub.get_token_request(
         permissions=["permission-foo", "permission-bar"],
         description="client description",
@@ -98,6 +101,9 @@ def test_snap_store():
     assert snap_store.tokens == "/api/v2/tokens"
     assert snap_store.tokens_exchange == "/api/v2/tokens/exchange"
     assert snap_store.whoami == "/api/v2/tokens/whoami"
+    assert snap_store.account_packages is None
+    assert snap_store.revisions is None
+    assert snap_store.channel_map == "/api/v2/snaps/{name}/channel-map"
     assert snap_store.get_token_request(
         permissions=["permission-foo", "permission-bar"],
         description="client description",
@@ -161,3 +167,66 @@ def test_snap_store_invalid_packages():
             ],
         )
     assert str(raised.value) == "Package types ['charm', 'rock'] not in ['snap']"
+
+
+RELEASES = [
+    endpoints.Release("package1", 1, "latest/stable"),
+    endpoints.Release("package2", 2, "latest/edge"),
+    endpoints.Release("package1", 1, "latest/candidate"),
+    endpoints.Release("package1", 3, "latest/edge"),
+]
+
+
+def test_charmhub_release_requests():
+    assert endpoints.CHARMHUB.get_release_requests(RELEASES) == [
+        endpoints.ReleaseRequest(
+            path="/v1/charm/package1/releases",
+            payload=[
+                {"channel": "latest/stable", "revision": 1},
+                {"channel": "latest/candidate", "revision": 1},
+                {"channel": "latest/edge", "revision": 3},
+            ],
+            releases=(RELEASES[0], RELEASES[2], RELEASES[3]),
+        ),
+        endpoints.ReleaseRequest(
+            path="/v1/charm/package2/releases",
+            payload=[{"channel": "latest/edge", "revision": 2}],
+            releases=(RELEASES[1],),
+        ),
+    ]
+
+
+def test_snap_store_release_requests():
+    assert endpoints.SNAP_STORE.get_release_requests(RELEASES) == [
+        endpoints.ReleaseRequest(
+            path="/dev/api/snap-release/",
+            payload={
+                "name": "package1",
+                "revision": "1",
+                "channels": ["latest/stable", "latest/candidate"],
+            },
+            releases=(RELEASES[0], RELEASES[2]),
+        ),
+        endpoints.ReleaseRequest(
+            path="/dev/api/snap-release/",
+            payload={"name": "package2", "revision": "2", "channels": ["latest/edge"]},
+            releases=(RELEASES[1],),
+        ),
+        endpoints.ReleaseRequest(
+            path="/dev/api/snap-release/",
+            payload={"name": "package1", "revision": "3", "channels": ["latest/edge"]},
+            releases=(RELEASES[3],),
+        ),
+    ]
+
+
+def test_release_requests_unsupported():
+    store_endpoints = endpoints.Endpoints(
+        whoami="/whoami",
+        tokens="/tokens",
+        tokens_exchange="/tokens/exchange",
+        valid_package_types=["charm"],
+    )
+
+    with pytest.raises(ValueError):
+        store_endpoints.get_release_requests(RELEASES)
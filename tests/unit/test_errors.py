@@ -14,6 +14,8 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import datetime
+import email.utils
 from json.decoder import JSONDecodeError
 from textwrap import dedent
 from unittest import mock
@@ -25,10 +27,11 @@ import urllib3  # type: ignore
 from craft_store import errors
 
 
-def _fake_error_response(status_code, reason, json=None):
+def _fake_error_response(status_code, reason, json=None, headers=None):
     response = mock.Mock()
     response.status_code = status_code
     response.reason = reason
+    response.headers = headers or {}
     if json is None:
         response.json.side_effect = JSONDecodeError("foo", "doc", 0)
     else:
@@ -82,6 +85,11 @@ scenarios = (
         "args": ["https://foo.bar"],
         "expected_message": "Empty token value returned from 'https://foo.bar'.",
     },
+    {
+        "exception_class": errors.DigestMismatch,
+        "args": ["https://foo.bar", "abc", "def"],
+        "expected_message": "Content downloaded from 'https://foo.bar' has digest 'def', expected 'abc'.",
+    },
 )
 
 
@@ -145,3 +153,232 @@ def test_store_error_list_missing_element(missing, error_list_key):
         str(errors.StoreServerError(response))
         == "Issue encountered while processing your request: [404] resource-not-found."
     )
+
+
+def test_store_error_list_lookup():
+    error_list = errors.StoreErrorList(
+        [
+            {"code": "invalid-field", "message": "name is invalid"},
+            {"code": "missing-field", "message": "version is missing"},
+            {"code": "invalid-field", "message": "type is invalid"},
+            {"message": "no code"},
+        ]
+    )
+
+    assert "invalid-field" in error_list
+    assert "resource-not-found" not in error_list
+    assert error_list["invalid-field"] == {
+        "code": "invalid-field",
+        "message": "name is invalid",
+    }
+    with pytest.raises(KeyError):
+        error_list["resource-not-found"]  # pylint: disable=W0104
+    assert repr(error_list) == "<StoreErrorList: invalid-field missing-field>"
+    assert len(list(error_list)) == 4
+    assert list(error_list.group_by_code()) == [
+        (
+            "invalid-field",
+            [
+                {"code": "invalid-field", "message": "name is invalid"},
+                {"code": "invalid-field", "message": "type is invalid"},
+            ],
+        ),
+        ("missing-field", [{"code": "missing-field", "message": "version is missing"}]),
+    ]
+
+
+def test_store_server_error_args():
+    response = _fake_error_response(
+        404,
+        "resource-not-found",
+        json={"error-list": [{"code": "resource-not-found", "message": "gone"}]},
+    )
+
+    error = errors.StoreServerError(response)
+
+    assert error.args == ("Store operation failed:\n- resource-not-found: gone",)
+    assert str(error) == error.args[0]
+    assert repr(error) == (
+        "StoreServerError('Store operation failed:\\n- resource-not-found: gone')"
+    )
+    response.json.assert_called_once_with()
+
+
+def test_store_server_error_parses_lazily():
+    response = _fake_error_response(
+        404,
+        "resource-not-found",
+        json={"error-list": [{"code": "resource-not-found", "message": "gone"}]},
+    )
+
+    error = errors.StoreServerError(response)
+
+    assert error.category == errors.ErrorCategory.PERMANENT
+    assert not error.retryable
+    response.json.assert_not_called()
+    assert str(error) == "Store operation failed:\n- resource-not-found: gone"
+    response.json.assert_called_once_with()
+
+
+def test_store_server_error_args_without_error_list():
+    error = errors.StoreServerError(_fake_error_response(500, "internal error"))
+
+    assert error.args == (
+        "Issue encountered while processing your request: [500] internal error.",
+    )
+    assert repr(error) == f"StoreServerError({error.args[0]!r})"
+
+
+def test_store_error_list_indexes_lazily():
+    error_list = errors.StoreErrorList([{"code": "invalid-field", "message": "m"}])
+
+    assert error_list._groups is None  # pylint: disable=W0212
+    assert "invalid-field" in error_list
+    assert error_list._groups == {  # pylint: disable=W0212
+        "invalid-field": [{"code": "invalid-field", "message": "m"}]
+    }
+
+
+@pytest.mark.parametrize(
+    "status_code,category",
+    [
+        (500, errors.ErrorCategory.RETRYABLE),
+        (502, errors.ErrorCategory.RETRYABLE),
+        (503, errors.ErrorCategory.RETRYABLE),
+        (504, errors.ErrorCategory.RETRYABLE),
+        (429, errors.ErrorCategory.THROTTLED),
+        (401, errors.ErrorCategory.AUTH_EXPIRED),
+        (400, errors.ErrorCategory.PERMANENT),
+        (404, errors.ErrorCategory.PERMANENT),
+        (501, errors.ErrorCategory.PERMANENT),
+    ],
+)
+def test_store_server_error_category(status_code, category):
+    response = _fake_error_response(status_code, "reason")
+
+    error = errors.StoreServerError(response)
+
+    assert error.category == category
+    assert error.retryable == (
+        category in (errors.ErrorCategory.RETRYABLE, errors.ErrorCategory.THROTTLED)
+    )
+    assert error.idempotency_safe == (category == errors.ErrorCategory.THROTTLED)
+
+
+def test_store_server_error_category_looks_up_codes_sparingly():
+    response = _fake_error_response(
+        404,
+        "not-found",
+        json={"error_list": [{"code": "macaroon-needs-refresh", "message": "m"}]},
+    )
+
+    error = errors.StoreServerError(response)
+
+    assert error.category == errors.ErrorCategory.PERMANENT
+    assert error.error_list._groups is None  # pylint: disable=W0212
+
+
+def test_retry_status_codes():
+    assert errors.RETRY_STATUS_CODES == (
+        errors.RETRYABLE_STATUS_CODES | errors.THROTTLING_STATUS_CODES
+    )
+
+
+def test_store_server_error_category_from_error_code():
+    response = _fake_error_response(
+        403,
+        "forbidden",
+        json={"error_list": [{"code": "macaroon-needs-refresh", "message": "m"}]},
+    )
+
+    assert errors.StoreServerError(response).category == (
+        errors.ErrorCategory.AUTH_EXPIRED
+    )
+
+
+@pytest.mark.parametrize(
+    "retry_after,expected", [(None, None), ("120", 120.0), ("-1", 0.0), ("foo", None)]
+)
+def test_store_server_error_retry_after(retry_after, expected):
+    headers = {} if retry_after is None else {"Retry-After": retry_after}
+    response = _fake_error_response(429, "too many requests", headers=headers)
+
+    assert errors.StoreServerError(response).retry_after == expected
+
+
+def test_store_server_error_retry_after_date():
+    retry_date = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+        minutes=2
+    )
+    response = _fake_error_response(
+        503,
+        "unavailable",
+        headers={"Retry-After": email.utils.format_datetime(retry_date)},
+    )
+
+    assert 60 < errors.StoreServerError(response).retry_after <= 120  # type: ignore
+
+
+@pytest.mark.parametrize(
+    "exception,category,idempotency_safe",
+    [
+        (
+            requests.exceptions.ConnectionError(
+                urllib3.exceptions.MaxRetryError(
+                    pool="test-pool",
+                    url="test-url",
+                    reason=urllib3.exceptions.NewConnectionError(
+                        "test-pool", "refused"
+                    ),
+                )
+            ),
+            errors.ErrorCategory.RETRYABLE,
+            True,
+        ),
+        (
+            requests.exceptions.ConnectTimeout("timeout"),
+            errors.ErrorCategory.RETRYABLE,
+            True,
+        ),
+        (
+            requests.exceptions.ConnectionError(
+                urllib3.exceptions.ProtocolError("connection reset")
+            ),
+            errors.ErrorCategory.RETRYABLE,
+            False,
+        ),
+        (
+            requests.exceptions.SSLError(
+                urllib3.exceptions.MaxRetryError(
+                    pool="test-pool",
+                    url="test-url",
+                    reason=urllib3.exceptions.SSLError("bad certificate"),
+                )
+            ),
+            errors.ErrorCategory.PERMANENT,
+            False,
+        ),
+        (
+            requests.exceptions.RetryError(
+                urllib3.exceptions.MaxRetryError(
+                    pool="test-pool",
+                    url="test-url",
+                    reason=urllib3.exceptions.ResponseError("too many 503"),
+                )
+            ),
+            errors.ErrorCategory.RETRYABLE,
+            False,
+        ),
+    ],
+)
+def test_network_error_category(exception, category, idempotency_safe):
+    error = errors.NetworkError(exception)
+
+    assert error.exception == exception
+    assert error.category == category
+    assert error.idempotency_safe == idempotency_safe
+    assert error.retry_after is None
+
+
+def test_not_logged_in_category():
+    assert errors.NotLoggedIn().category == errors.ErrorCategory.AUTH_EXPIRED
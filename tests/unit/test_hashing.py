@@ -0,0 +1,100 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+
+import pytest
+
+from craft_store import hashing
+from craft_store.hashing import StreamHasher, hash_file, hash_files
+
+CONTENT = bytes(range(256)) * 400
+
+
+def _expected(data, algorithms=hashing.DEFAULT_ALGORITHMS):
+    return {
+        algorithm: hashlib.new(algorithm, data).hexdigest() for algorithm in algorithms
+    }
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(hashing, "HASH_CHUNK_SIZE", 1000)
+
+
+@pytest.fixture
+def artifact(tmp_path):
+    path = tmp_path / "artifact.snap"
+    path.write_bytes(CONTENT)
+    return path
+
+
+@pytest.mark.parametrize("data", [b"", b"a", CONTENT])
+def test_hash_file(tmp_path, small_chunks, data):
+    path = tmp_path / "artifact"
+    path.write_bytes(data)
+
+    assert hash_file(path) == _expected(data)
+
+
+def test_hash_file_algorithms(artifact):
+    assert hash_file(artifact, ["md5"]) == _expected(CONTENT, ["md5"])
+
+
+def test_hash_file_unknown_algorithm(artifact):
+    with pytest.raises(ValueError):
+        hash_file(artifact, ["not-an-algorithm"])
+
+
+@pytest.mark.parametrize("max_workers", [None, 1, 2])
+def test_hash_files(tmp_path, max_workers):
+    paths = []
+    for index in range(3):
+        paths.append(tmp_path / f"artifact-{index}")
+        paths[-1].write_bytes(CONTENT * index)
+
+    digests = hash_files(paths + [str(paths[0])], max_workers=max_workers)
+
+    assert digests == {path: _expected(CONTENT * i) for i, path in enumerate(paths)}
+
+
+def test_stream_hasher_sequential(artifact, small_chunks):
+    hasher = StreamHasher(artifact)
+    for offset in range(0, len(CONTENT), 4096):
+        hasher.update(offset, CONTENT[offset:][:4096])
+
+    assert hasher.digests() == _expected(CONTENT)
+
+
+def test_stream_hasher_rewind(artifact):
+    hasher = StreamHasher(artifact, ["sha256"])
+    hasher.update(0, CONTENT[:5000])
+    # a retry reads the file again from the start.
+    hasher.update(0, CONTENT[:3000])
+    hasher.update(3000, CONTENT[3000:])
+
+    assert hasher.digests() == _expected(CONTENT, ["sha256"])
+
+
+@pytest.mark.parametrize("read", [0, 5000])
+def test_stream_hasher_unread(artifact, read):
+    hasher = StreamHasher(artifact)
+    hasher.update(0, CONTENT[:read])
+    # bytes past a gap are not hashed from the stream.
+    offset = read + 10
+    hasher.update(offset, CONTENT[offset:][:100])
+
+    assert hasher.digests() == _expected(CONTENT)
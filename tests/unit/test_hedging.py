@@ -0,0 +1,330 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from craft_store.hedging import Hedger, HedgingPolicy
+
+
+def _hedger(**kwargs) -> Hedger:
+    policy = {
+        "min_delay": 0.01,
+        "max_delay": 0.05,
+        "min_samples": 1,
+        "budget_ratio": 1.0,
+        "max_budget": 1.0,
+    }
+    policy.update(kwargs)
+    return Hedger(HedgingPolicy(**policy))
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"percentile": 0},
+        {"percentile": 100},
+        {"min_delay": 2, "max_delay": 1},
+        {"budget_ratio": -1},
+    ],
+)
+def test_policy_invalid(kwargs):
+    with pytest.raises(ValueError):
+        HedgingPolicy(**kwargs)
+
+
+def test_delay_from_percentile():
+    hedger = _hedger(percentile=50, min_samples=3, max_delay=1.0)
+
+    assert hedger.delay == 1.0
+
+    for latency in (0.1, 0.2, 0.3, 0.4):
+        hedger._record(latency, hedge_won=False)  # pylint: disable=W0212
+
+    assert hedger.delay == 0.3
+
+
+def test_delay_clamped():
+    hedger = _hedger(min_delay=0.2, max_delay=0.5)
+    hedger._record(0.001, hedge_won=False)  # pylint: disable=W0212
+
+    assert hedger.delay == 0.2
+
+    hedger._record(10, hedge_won=False)  # pylint: disable=W0212
+    hedger._record(10, hedge_won=False)  # pylint: disable=W0212
+
+    assert hedger.delay == 0.5
+
+
+def test_fast_request_not_hedged():
+    hedger = _hedger()
+    send = Mock(return_value="response")
+
+    assert hedger.run(send) == "response"
+    assert send.call_count == 1
+    assert hedger.stats.requests == 1
+    assert hedger.stats.hedges == 0
+
+
+def test_slow_request_hedged():
+    hedger = _hedger()
+    release = threading.Event()
+    calls = []
+    slow_response = Mock()
+
+    def send():
+        calls.append(None)
+        if len(calls) == 1:
+            release.wait(5)
+            return slow_response
+        return "hedge response"
+
+    assert hedger.run(send) == "hedge response"
+    assert hedger.stats.hedges == 1
+    assert hedger.stats.wins == 1
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while not slow_response.close.called and time.monotonic() < deadline:
+        time.sleep(0.01)
+    slow_response.close.assert_called_once_with()
+
+
+def test_original_runs_without_waiting_for_workers():
+    hedger = _hedger(max_workers=1, max_delay=1.0, min_samples=100)
+    release = threading.Event()
+    results = []
+
+    def blocked():
+        release.wait(5)
+        return "blocked"
+
+    thread = threading.Thread(target=lambda: results.append(hedger.run(blocked)))
+    thread.start()
+    start = time.monotonic()
+
+    assert hedger.run(Mock(return_value="response")) == "response"
+    assert time.monotonic() - start < 0.5
+
+    release.set()
+    thread.join()
+    assert results == ["blocked"]
+    assert hedger.stats.hedges == 0
+
+
+def test_hedge_without_idle_worker_not_sent():
+    hedger = _hedger(max_workers=1)
+    release = threading.Event()
+
+    def send():
+        release.wait(5)
+        return "response"
+
+    # The only worker is busy with a hedge of the first request.
+    thread = threading.Thread(target=hedger.run, args=(send,))
+    thread.start()
+    deadline = time.monotonic() + 5
+    while hedger.stats.hedges == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    hedger._budget = 1.0  # pylint: disable=W0212
+
+    threading.Timer(0.2, release.set).start()
+    assert hedger.run(send) == "response"
+
+    thread.join()
+    assert hedger.stats.hedges == 1
+    assert hedger.stats.no_slot == 1
+
+
+def test_hedge_budget_exhausted():
+    hedger = _hedger(budget_ratio=0.5)
+
+    def send():
+        time.sleep(0.1)
+        return "response"
+
+    assert hedger.run(send) == "response"
+    assert hedger.stats.hedges == 0
+    assert hedger.stats.budget_exhausted == 1
+
+
+def test_failed_hedge_waits_for_original():
+    hedger = _hedger()
+    calls = []
+
+    def send():
+        calls.append(None)
+        if len(calls) == 1:
+            time.sleep(0.1)
+            return "response"
+        raise ConnectionError("hedge failed")
+
+    assert hedger.run(send) == "response"
+    assert hedger.stats.hedges == 1
+    assert hedger.stats.wins == 0
+
+
+def test_both_attempts_fail():
+    hedger = _hedger()
+    calls = []
+
+    def send():
+        calls.append(None)
+        if len(calls) == 1:
+            time.sleep(0.1)
+            raise ConnectionError("original failed")
+        raise ConnectionError("hedge failed")
+
+    with pytest.raises(ConnectionError, match="original failed"):
+        hedger.run(send)
+
+
+def test_original_error_not_hedged():
+    hedger = _hedger()
+    send = Mock(side_effect=ConnectionError("failed"))
+
+    with pytest.raises(ConnectionError):
+        hedger.run(send)
+
+    assert send.call_count == 1
+
+
+def _slow_original():
+    calls = []
+
+    def send():
+        calls.append(None)
+        if len(calls) == 1:
+            time.sleep(0.2)
+            return "original response"
+        return "hedge response"
+
+    return send
+
+
+def test_hedge_takes_slot():
+    hedger = _hedger()
+    release = Mock()
+
+    assert hedger.run(_slow_original(), acquire_slot=lambda: release) == (
+        "hedge response"
+    )
+
+    hedger.close()
+    hedger._executor.shutdown(wait=True)  # pylint: disable=W0212
+    release.assert_called_once_with()
+    assert hedger.stats.hedges == 1
+
+
+def test_hedge_without_slot_not_sent():
+    hedger = _hedger()
+
+    assert hedger.run(_slow_original(), acquire_slot=lambda: None) == (
+        "original response"
+    )
+    assert hedger.stats.hedges == 0
+    assert hedger.stats.no_slot == 1
+
+
+def test_hedge_without_budget_takes_no_slot():
+    hedger = _hedger(budget_ratio=0.5)
+    acquire_slot = Mock()
+
+    hedger.run(_slow_original(), acquire_slot=acquire_slot)
+
+    acquire_slot.assert_not_called()
+
+
+def test_close():
+    hedger = _hedger()
+    hedger.close()
+
+    assert hedger.run(_slow_original()) == "original response"
+    assert hedger.stats.requests == 0
+    assert hedger._executor._shutdown  # pylint: disable=W0212
+
+
+def test_async_fast_request_not_hedged():
+    hedger = _hedger()
+
+    async def send():
+        return "response"
+
+    assert asyncio.run(hedger.async_run(send)) == "response"
+    assert hedger.stats.requests == 1
+    assert hedger.stats.hedges == 0
+
+
+def test_async_slow_request_hedged():
+    hedger = _hedger()
+    calls = []
+    slow_response = Mock()
+    cancelled = []
+
+    async def send():
+        calls.append(None)
+        if len(calls) == 1:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(None)
+                raise
+            return slow_response
+        return "hedge response"
+
+    assert asyncio.run(hedger.async_run(send)) == "hedge response"
+    assert hedger.stats.hedges == 1
+    assert hedger.stats.wins == 1
+    assert cancelled == [None]
+
+
+def test_async_failed_hedge_waits_for_original():
+    hedger = _hedger()
+    calls = []
+
+    async def send():
+        calls.append(None)
+        if len(calls) == 1:
+            await asyncio.sleep(0.1)
+            return "original response"
+        raise ValueError()
+
+    assert asyncio.run(hedger.async_run(send)) == "original response"
+    assert hedger.stats.hedges == 1
+    assert hedger.stats.wins == 0
+
+
+def test_async_hedge_releases_slot():
+    hedger = _hedger()
+    release = Mock()
+    calls = []
+
+    async def send():
+        calls.append(None)
+        if len(calls) == 1:
+            await asyncio.sleep(0.1)
+            return "original response"
+        return "hedge response"
+
+    assert (
+        asyncio.run(hedger.async_run(send, acquire_slot=lambda: release))
+        == "hedge response"
+    )
+    release.assert_called_once_with()
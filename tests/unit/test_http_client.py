@@ -23,7 +23,10 @@ import requests
 import urllib3  # type: ignore
 
 from craft_store import HTTPClient, errors
-from craft_store.http_client import _get_retry_value
+from craft_store.concurrency import AIMDPolicy, ConcurrencyLimiter
+from craft_store.hedging import Hedger
+from craft_store.scheduling import Priority, RequestScheduler, SchedulerPolicy
+from craft_store.transport import Transport
 
 
 def _fake_error_response(status_code, reason, json_raises=False):
@@ -41,13 +44,14 @@ def session_mock():
     patched_session = patch("requests.Session", autospec=True)
     mocked_session = patched_session.start()
     mocked_session().request.return_value = _fake_error_response(200, "")
+    mocked_session().headers = {}
     yield mocked_session
     patched_session.stop()
 
 
 @pytest.fixture
 def retry_mock():
-    patched_retry = patch("craft_store.http_client.Retry", autospec=True)
+    patched_retry = patch("craft_store.http_client.BudgetedRetry", autospec=True)
     yield patched_retry.start()
     patched_retry.stop()
 
@@ -55,12 +59,18 @@ def retry_mock():
 def test_session_defaults(session_mock, retry_mock):
     HTTPClient(user_agent="Secret Agent")
 
+    assert session_mock().headers == {"User-Agent": "Secret Agent"}
+
     assert [
         call("http://", ANY),
         call("https://", ANY),
     ] in session_mock().mount.mock_calls
     retry_mock.assert_called_once_with(
-        total=8, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]
+        total=8,
+        backoff_factor=0.2,
+        status_forcelist=[429, 500, 502, 503, 504],
+        jitter=0.5,
+        budget=None,
     )
 
 
@@ -75,7 +85,11 @@ def test_session_environment_values(monkeypatch, session_mock, retry_mock):
         call("https://", ANY),
     ] in session_mock().mount.mock_calls
     retry_mock.assert_called_once_with(
-        total=20, backoff_factor=10, status_forcelist=[500, 502, 503, 504]
+        total=20,
+        backoff_factor=10,
+        status_forcelist=[429, 500, 502, 503, 504],
+        jitter=0.5,
+        budget=None,
     )
 
 
@@ -88,31 +102,51 @@ def test_methods(session_mock, method):
         call(
             method.upper(),
             "https://foo.bar",
-            headers={"User-Agent": "Secret Agent"},
+            headers=None,
             params=None,
         )
     ]
 
 
+def test_user_agent_update(session_mock):
+    client = HTTPClient(user_agent="Secret Agent")
+
+    client.user_agent = "Double Agent"
+
+    assert client.user_agent == "Double Agent"
+    assert session_mock().headers == {"User-Agent": "Double Agent"}
+
+
+@pytest.mark.parametrize(
+    "status_code,dropped", [(401, True), (403, False), (500, False)]
+)
+def test_auth_expired_drops_authorization(session_mock, status_code, dropped):
+    session_mock().request.return_value = _fake_error_response(status_code, "")
+    client = HTTPClient(user_agent="Secret Agent")
+    client._set_static_header("Authorization", "Macaroon secret")
+
+    with pytest.raises(errors.StoreServerError):
+        client.request("GET", "https://foo.bar")
+
+    assert ("Authorization" not in session_mock().headers) is dropped
+
+
 scenarios = [
     {
         "expected_params": None,
-        "expected_headers": {"User-Agent": "Secret Agent"},
+        "expected_headers": None,
         "expected_logger_debug_tail": "None and headers {'User-Agent': 'Secret Agent'}",
     },
     {
         "kwargs": {"headers": {"foo": "bar"}},
         "expected_params": None,
-        "expected_headers": {"User-Agent": "Secret Agent", "foo": "bar"},
+        "expected_headers": {"foo": "bar"},
         "expected_logger_debug_tail": "None and headers {'foo': 'bar', 'User-Agent': 'Secret Agent'}",
     },
     {
         "kwargs": {"headers": {"Authorization": "bar"}},
         "expected_params": None,
-        "expected_headers": {
-            "User-Agent": "Secret Agent",
-            "Authorization": "bar",
-        },
+        "expected_headers": {"Authorization": "bar"},
         "expected_logger_debug_tail": (
             "None and headers {'Authorization': '<macaroon>', 'User-Agent': 'Secret Agent'}"
         ),
@@ -120,26 +154,19 @@ scenarios = [
     {
         "kwargs": {"headers": {"Macaroons": "bar"}},
         "expected_params": None,
-        "expected_headers": {
-            "User-Agent": "Secret Agent",
-            "Macaroons": "bar",
-        },
+        "expected_headers": {"Macaroons": "bar"},
         "expected_logger_debug_tail": "None and headers {'Macaroons': '<macaroon>', 'User-Agent': 'Secret Agent'}",
     },
     {
         "kwargs": {"params": {"query": "bar"}},
         "expected_params": {"query": "bar"},
-        "expected_headers": {
-            "User-Agent": "Secret Agent",
-        },
+        "expected_headers": None,
         "expected_logger_debug_tail": "{'query': 'bar'} and headers {'User-Agent': 'Secret Agent'}",
     },
     {
         "kwargs": {"params": {"query": "bar"}},
         "expected_params": {"query": "bar"},
-        "expected_headers": {
-            "User-Agent": "Secret Agent",
-        },
+        "expected_headers": None,
         "expected_logger_debug_tail": "{'query': 'bar'} and headers {'User-Agent': 'Secret Agent'}",
     },
 ]
@@ -169,6 +196,91 @@ def test_request(caplog, session_mock, scenario):
     ] == [rec.message for rec in caplog.records]
 
 
+def test_request_no_debug_logging(caplog, session_mock):
+    caplog.set_level(logging.INFO)
+
+    HTTPClient(user_agent="Secret Agent").request(
+        "GET", "https://foo.bar", headers={"Authorization": "bar"}
+    )
+
+    assert caplog.records == []
+
+
+@pytest.mark.parametrize(
+    "method,kwargs,hedged",
+    [
+        ("GET", {}, True),
+        ("HEAD", {}, True),
+        ("GET", {"stream": True}, False),
+        ("POST", {}, False),
+    ],
+)
+def test_request_hedger(session_mock, method, kwargs, hedged):
+    hedger = Mock(spec=Hedger)
+    hedger.run.side_effect = lambda send, acquire_slot: send()
+
+    HTTPClient(user_agent="Secret Agent", hedger=hedger).request(
+        method, "https://foo.bar", **kwargs
+    )
+
+    assert hedger.run.called == hedged
+    if hedged:
+        assert hedger.run.call_args.kwargs["acquire_slot"] is None
+    assert session_mock().request.mock_calls == [
+        call(method, "https://foo.bar", headers=None, params=None, **kwargs)
+    ]
+
+
+def test_hedge_slot_from_limiter_and_scheduler(session_mock):
+    hedger = Mock(spec=Hedger)
+    slots = []
+    hedger.run.side_effect = (
+        lambda send, acquire_slot: slots.append(acquire_slot()) or send()
+    )
+    limiter = ConcurrencyLimiter(AIMDPolicy(initial_limit=2, max_limit=2))
+    scheduler = RequestScheduler(SchedulerPolicy(max_concurrency=2))
+    client = HTTPClient(
+        user_agent="Secret Agent", hedger=hedger, limiter=limiter, scheduler=scheduler
+    )
+
+    client.request("GET", "https://foo.bar")
+    (release,) = slots
+    assert limiter.in_flight == 1
+    assert scheduler.running(Priority.INTERACTIVE) == 1
+    release()
+    assert limiter.in_flight == 0
+    assert scheduler.running(Priority.INTERACTIVE) == 0
+
+
+def test_hedge_slot_unavailable(session_mock):
+    hedger = Mock(spec=Hedger)
+    slots = []
+    hedger.run.side_effect = (
+        lambda send, acquire_slot: slots.append(acquire_slot()) or send()
+    )
+    limiter = ConcurrencyLimiter(AIMDPolicy(initial_limit=1, max_limit=2))
+    scheduler = RequestScheduler(SchedulerPolicy(max_concurrency=2))
+    client = HTTPClient(
+        user_agent="Secret Agent", hedger=hedger, limiter=limiter, scheduler=scheduler
+    )
+
+    client.request("GET", "https://foo.bar")
+
+    assert slots == [None]
+    # the scheduler slot taken before the limiter refused was given back.
+    assert scheduler.running(Priority.INTERACTIVE) == 0
+
+
+def test_close(session_mock):
+    hedger = Mock(spec=Hedger)
+
+    with HTTPClient(user_agent="Secret Agent", hedger=hedger):
+        pass
+
+    session_mock().close.assert_called_once_with()
+    hedger.close.assert_called_once_with()
+
+
 def test_request_500(session_mock):
     fake_response = _fake_error_response(503, "cannot reach server", json_raises=True)
     session_mock().request.return_value = fake_response
@@ -208,39 +320,11 @@ def test_request_retry_error(session_mock):
         assert network_error.exception == retry_error  # type: ignore
 
 
-@pytest.mark.parametrize("environment_value", ("0", "10", "20000"))
-def test_get_retry_value_environment_override(monkeypatch, caplog, environment_value):
-    monkeypatch.setenv("FAKE_ENV", environment_value)
-    caplog.set_level(logging.DEBUG)
-
-    assert _get_retry_value("FAKE_ENV", 0) == int(environment_value)
-    assert len(caplog.records) == 0
-
-
-@pytest.mark.parametrize(
-    "environment_value,default", [("NaN", 10), ("NaN", 0.4), ("foo", 1)]
-)
-def test_get_retry_value_not_a_number_returns_default(
-    monkeypatch, caplog, environment_value, default
-):
-    monkeypatch.setenv("FAKE_ENV", environment_value)
-    caplog.set_level(logging.DEBUG)
+def test_warmup():
+    transport = Mock(spec=Transport, headers={})
+    transport.warmup.return_value = 2
 
-    assert _get_retry_value("FAKE_ENV", default) == default
-    assert [
-        f"'FAKE_ENV' set to invalid value {environment_value!r}, setting to {default}."
-    ] == [rec.message for rec in caplog.records]
+    client = HTTPClient(user_agent="Secret Agent", transport=transport)
 
-
-@pytest.mark.parametrize("environment_value,default", [("-1", 10), ("-1000", 0.4)])
-def test_get_retry_value_negative_number_returns_default(
-    monkeypatch, caplog, environment_value, default
-):
-    monkeypatch.setenv("FAKE_ENV", environment_value)
-    caplog.set_level(logging.DEBUG)
-
-    assert _get_retry_value("FAKE_ENV", default) == default
-    int_value = int(environment_value)
-    assert [
-        f"'FAKE_ENV' set to non positive value {int_value!r}, setting to {default}."
-    ] == [rec.message for rec in caplog.records]
+    assert client.warmup("https://foo.bar", 2) == 2
+    assert transport.warmup.mock_calls == [call("https://foo.bar", 2)]
@@ -0,0 +1,268 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import http.server
+import json
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from craft_store import HTTPClient, StoreClient, endpoints, errors
+from craft_store.metadata_index import SCHEMA_VERSION, MetadataIndex
+from craft_store.records import ReleaseRecord, RevisionRecord
+
+
+def _revision(revision):
+    return {
+        "revision": revision,
+        "version": str(revision),
+        "status": "released",
+        "created-at": "2021-07-01T10:00:00+00:00",
+        "size": 1024,
+        "sha3-384": "a" * 96,
+    }
+
+
+class ListingServer(http.server.ThreadingHTTPServer):
+    """Store listings served with ETags, honoring If-None-Match."""
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), ListingHandler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.listings = {
+            "/v1/charm": {
+                "results": [
+                    {"name": "charm1", "type": "charm", "status": "registered"},
+                    {"name": "bundle1", "type": "bundle", "status": "registered"},
+                ]
+            },
+            "/v1/charm/charm1/revisions": {"revisions": [_revision(1), _revision(2)]},
+            "/v1/charm/charm1/releases": {
+                "channel-map": [
+                    {"channel": "latest/stable", "revision": 1, "when": "then"},
+                    {"channel": "latest/edge", "revision": 2, "when": "now"},
+                ],
+                "revisions": [_revision(1), _revision(2)],
+            },
+            "/v1/charm/bundle1/revisions": {"revisions": []},
+            "/v1/charm/bundle1/releases": {"channel-map": [], "revisions": []},
+        }
+        self.sent = []
+
+
+class ListingHandler(http.server.BaseHTTPRequestHandler):
+    server: ListingServer
+
+    def log_message(self, *args):  # pylint: disable=W0221
+        pass
+
+    def do_GET(self):  # noqa: N802
+        if self.path not in self.server.listings:
+            self.send_error(404)
+            return
+        body = json.dumps(self.server.listings[self.path]).encode()
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            self.server.sent.append((self.path, 304))
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.server.sent.append((self.path, 200))
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def listing_server():
+    server = ListingServer()
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def index():
+    with MetadataIndex() as metadata_index:
+        yield metadata_index
+
+
+def _sync(index, server, **kwargs):
+    client = HTTPClient(user_agent="Agent")
+    return index.sync(
+        client.request,
+        base_url=server.url,
+        store_endpoints=endpoints.CHARMHUB,
+        **kwargs,
+    )
+
+
+def test_sync(index, listing_server):
+    stats = _sync(index, listing_server)
+
+    assert (stats.requests, stats.not_modified) == (5, 0)
+    assert (stats.packages, stats.revisions, stats.releases) == (2, 2, 2)
+    assert index.packages() == [
+        endpoints.Package("bundle1", "bundle"),
+        endpoints.Package("charm1", "charm"),
+    ]
+    assert index.revisions("charm1") == [
+        RevisionRecord.from_dict(_revision(1)),
+        RevisionRecord.from_dict(_revision(2)),
+    ]
+    assert index.channel_map("charm1") == [
+        ReleaseRecord("latest/stable", 1, "then", None),
+        ReleaseRecord("latest/edge", 2, "now", None),
+    ]
+    assert index.synced_at(listing_server.url + "/v1/charm") is not None
+
+
+def test_sync_not_modified(index, listing_server):
+    _sync(index, listing_server)
+    listing_server.sent.clear()
+
+    stats = _sync(index, listing_server)
+
+    assert (stats.requests, stats.not_modified) == (5, 5)
+    assert {status for _, status in listing_server.sent} == {304}
+    assert len(index.packages()) == 2
+    assert len(index.revisions("charm1")) == 2
+
+
+def test_sync_incremental(index, listing_server):
+    _sync(index, listing_server)
+    listing_server.sent.clear()
+    listings = listing_server.listings
+    listings["/v1/charm/charm1/revisions"]["revisions"].append(_revision(3))
+    listings["/v1/charm/charm1/releases"]["channel-map"][1]["revision"] = 3
+
+    stats = _sync(index, listing_server)
+
+    assert sorted(path for path, status in listing_server.sent if status == 200) == [
+        "/v1/charm/charm1/releases",
+        "/v1/charm/charm1/revisions",
+    ]
+    assert (stats.revisions, stats.releases) == (1, 2)
+    assert [r.revision for r in index.revisions("charm1")] == [1, 2, 3]
+    assert [r.revision for r in index.channel_map("charm1")] == [1, 3]
+
+
+def test_sync_revision_status_changed(index, listing_server):
+    _sync(index, listing_server)
+    listings = listing_server.listings
+    for path in ("/v1/charm/charm1/revisions", "/v1/charm/charm1/releases"):
+        listings[path]["revisions"][0]["status"] = "closed"
+
+    stats = _sync(index, listing_server)
+
+    assert stats.revisions == 1
+    assert [r.status for r in index.revisions("charm1")] == ["closed", "released"]
+
+
+def test_sync_package_removed(index, listing_server):
+    _sync(index, listing_server)
+    listings = listing_server.listings
+    removed = listings["/v1/charm"]["results"].pop(0)
+
+    _sync(index, listing_server)
+
+    assert index.packages() == [endpoints.Package("bundle1", "bundle")]
+    assert index.revisions("charm1") == []
+    assert index.channel_map("charm1") == []
+    assert index.synced_at(listing_server.url + "/v1/charm/charm1/releases") is None
+
+    listings["/v1/charm"]["results"].append(removed)
+    listing_server.sent.clear()
+
+    _sync(index, listing_server)
+
+    assert ("/v1/charm/charm1/revisions", 200) in listing_server.sent
+    assert len(index.revisions("charm1")) == 2
+    assert len(index.channel_map("charm1")) == 2
+
+
+def test_sync_packages(index, listing_server):
+    stats = _sync(index, listing_server, packages=["charm1"])
+
+    assert stats.requests == 2
+    assert index.packages() == []
+    assert len(index.revisions("charm1")) == 2
+
+
+def test_sync_packages_required(index):
+    with pytest.raises(ValueError):
+        index.sync(
+            Mock(), base_url="https://fake", store_endpoints=endpoints.SNAP_STORE
+        )
+
+
+def test_sync_error(index, listing_server):
+    listing_server.listings.pop("/v1/charm/charm1/revisions")
+
+    with pytest.raises(errors.StoreServerError):
+        _sync(index, listing_server)
+
+    assert index.revisions("charm1") == []
+
+
+def test_persistent(tmp_path, listing_server):
+    path = tmp_path / "index.db"
+    with MetadataIndex(path) as index:
+        _sync(index, listing_server)
+
+    with MetadataIndex(path) as index:
+        assert len(index.packages()) == 2
+        stats = _sync(index, listing_server)
+
+    assert stats.not_modified == 5
+
+
+def test_schema_version_rebuilt(tmp_path):
+    path = tmp_path / "index.db"
+    with MetadataIndex(path) as index:
+        index._db.execute("INSERT INTO packages VALUES ('charm1', 'charm')")
+        index._db.commit()
+        index._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION + 1}")
+
+    with MetadataIndex(path) as index:
+        assert index.packages() == []
+
+
+def test_store_client_sync_index():
+    index = Mock(spec=MetadataIndex)
+    client = StoreClient(
+        base_url="https://fake-server.com",
+        endpoints=endpoints.CHARMHUB,
+        application_name="testcraft",
+        user_agent="craft-store unit tests, should not be hitting a real server",
+    )
+
+    assert client.sync_index(index, packages=["charm1"]) == index.sync.return_value
+    index.sync.assert_called_once_with(
+        client.request,
+        base_url="https://fake-server.com",
+        store_endpoints=endpoints.CHARMHUB,
+        packages=["charm1"],
+    )
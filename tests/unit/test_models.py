@@ -0,0 +1,155 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from typing import List, Optional
+
+import pydantic
+import pytest
+
+from craft_store.models import (
+    AccountModel,
+    MarshableModel,
+    ModelList,
+    RegisteredNameModel,
+    TokenModel,
+    WhoamiModel,
+)
+
+CHARMHUB_WHOAMI = {
+    "account": {"display-name": "Fake User", "id": "fake-id", "username": "fake"},
+    "channels": None,
+    "packages": None,
+    "permissions": ["account-register-package", "package-view"],
+}
+
+SNAP_STORE_WHOAMI = {
+    "account": {
+        "email": "fake@example.com",
+        "id": "fake-id",
+        "name": "Fake User",
+        "username": "fake",
+    },
+    "channels": ["stable"],
+    "expires": "2022-01-01T00:00:00.000",
+    "packages": [{"series": "16", "name": "fake-snap"}],
+    "permissions": ["package_access"],
+}
+
+
+@pytest.mark.parametrize("validate", [False, True])
+@pytest.mark.parametrize("payload", [CHARMHUB_WHOAMI, SNAP_STORE_WHOAMI])
+def test_whoami(payload, validate):
+    whoami = WhoamiModel.unmarshal(payload, validate=validate)
+
+    assert isinstance(whoami.account, AccountModel)
+    assert whoami.account.id == "fake-id"
+    assert whoami.account.username == "fake"
+    assert whoami.permissions == payload["permissions"]
+    assert whoami.marshal() == payload
+
+
+@pytest.mark.parametrize("validate", [False, True])
+def test_unmarshal_defaults(validate):
+    whoami = WhoamiModel.unmarshal(
+        {"account": {"id": "fake-id", "username": "fake"}}, validate=validate
+    )
+
+    assert whoami.permissions == []
+    assert whoami.channels is None
+    assert whoami.account.display_name is None
+    assert whoami.marshal() == {"account": {"id": "fake-id", "username": "fake"}}
+
+
+def test_unmarshal_ignores_unknown_keys():
+    token = TokenModel.unmarshal({"macaroon": "root", "unknown": True})
+
+    assert token == TokenModel(macaroon="root")
+    assert token.marshal() == {"macaroon": "root"}
+
+
+def test_unmarshal_without_validation_trusts_data():
+    token = TokenModel.unmarshal({"macaroon": 42})
+
+    assert token.macaroon == 42
+
+
+@pytest.mark.parametrize(
+    "payload", [{}, {"account": {"id": "fake-id"}}], ids=["model", "nested"]
+)
+def test_unmarshal_missing_required_validates(payload):
+    with pytest.raises(pydantic.ValidationError):
+        WhoamiModel.unmarshal(payload)
+
+
+class _TeamModel(MarshableModel):
+    members: List[AccountModel]
+    lead: Optional[AccountModel]
+
+
+def test_unmarshal_nested_lists():
+    team = _TeamModel.unmarshal(
+        {
+            "members": [{"id": "1", "username": "a"}, {"id": "2", "username": "b"}],
+            "lead": {"id": "1", "username": "a"},
+        }
+    )
+
+    assert [member.username for member in team.members] == ["a", "b"]
+    assert isinstance(team.lead, AccountModel)
+    assert _TeamModel.unmarshal({"members": []}).lead is None
+
+
+def test_unmarshal_validate_invalid():
+    with pytest.raises(pydantic.ValidationError):
+        WhoamiModel.unmarshal({"account": {"id": "fake-id"}}, validate=True)
+
+
+def _names(count):
+    return [
+        {
+            "id": f"id-{i}",
+            "name": f"name-{i}",
+            "type": "charm",
+            "private": False,
+            "status": "registered",
+            "publisher": {"id": "fake-id", "username": "fake"},
+        }
+        for i in range(count)
+    ]
+
+
+def test_unmarshal_list_lazy():
+    names = RegisteredNameModel.unmarshal_list(_names(3))
+
+    assert isinstance(names, ModelList)
+    assert len(names) == 3
+    assert names._models == [None, None, None]
+    assert names[1].name == "name-1"
+    assert names[1] is names[1]
+    assert names._models[0] is None
+    assert names[-1].id == "id-2"
+    assert [n.name for n in names[:2]] == ["name-0", "name-1"]
+    assert [n.publisher.username for n in names] == ["fake"] * 3
+    assert repr(names) == "ModelList(RegisteredNameModel, 3 items)"
+
+
+def test_unmarshal_list_validate():
+    names = RegisteredNameModel.unmarshal_list(_names(2), validate=True)
+
+    assert [n.name for n in names] == ["name-0", "name-1"]
+
+    with pytest.raises(pydantic.ValidationError):
+        RegisteredNameModel.unmarshal_list([{"name": "no-id"}], validate=True)
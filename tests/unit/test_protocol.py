@@ -0,0 +1,248 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+from unittest.mock import Mock
+
+import pytest
+
+from craft_store import endpoints, errors, protocol
+
+
+def _fake_response(status_code=200, json=None):
+    response = Mock()
+    response.status_code = status_code
+    response.ok = status_code == 200
+    response.json.return_value = json
+    return response
+
+
+def test_login_flow():
+    flow = protocol.login(
+        base_url="https://fake-server.com",
+        store_endpoints=endpoints.CHARMHUB,
+        permissions=["perm-1"],
+        description="fakecraft@foo",
+        ttl=60,
+        channels=["edge"],
+    )
+
+    assert next(flow) == protocol.Request(
+        "POST",
+        "https://fake-server.com/v1/tokens",
+        json={
+            "permissions": ["perm-1"],
+            "description": "fakecraft@foo",
+            "ttl": 60,
+            "channels": ["edge"],
+        },
+    )
+    assert flow.send(_fake_response(json={"macaroon": "root"})) == protocol.Discharge(
+        "root"
+    )
+    assert flow.send("discharged") == protocol.Request(
+        "POST",
+        "https://fake-server.com/v1/tokens/exchange",
+        headers={"Macaroons": "discharged"},
+        json={},
+    )
+    with pytest.raises(StopIteration) as stop:
+        flow.send(_fake_response(json={"macaroon": "authorized"}))
+
+    assert stop.value.value == "authorized"
+
+
+def test_whoami_flow():
+    flow = protocol.whoami(
+        base_url="https://fake-server.com", store_endpoints=endpoints.SNAP_STORE
+    )
+
+    assert next(flow) == protocol.Request(
+        "GET", "https://fake-server.com/api/v2/tokens/whoami"
+    )
+    with pytest.raises(StopIteration) as stop:
+        flow.send(
+            _fake_response(json={"account": {"id": "fake-id", "username": "fake"}})
+        )
+
+    assert stop.value.value.account.username == "fake"
+
+
+def test_request_as_kwargs():
+    assert protocol.Request("GET", "https://foo.bar").as_kwargs() == {}
+    assert protocol.Request(
+        "POST", "https://foo.bar", params={"q": "a"}, headers={"h": "v"}, json={}
+    ).as_kwargs() == {"params": {"q": "a"}, "headers": {"h": "v"}, "json": {}}
+
+
+def test_redact_headers():
+    headers = {
+        "Authorization": "secret",
+        "Macaroons": "secret",
+        "cookie": "secret",
+        "Set-Cookie": "secret",
+        "foo": "bar",
+    }
+
+    assert protocol.redact_headers(headers) == {
+        "Authorization": "<macaroon>",
+        "Macaroons": "<macaroon>",
+        "cookie": "<cookie>",
+        "Set-Cookie": "<cookie>",
+        "foo": "bar",
+    }
+    assert headers["Authorization"] == "secret"
+
+
+def test_check_response():
+    response = _fake_response(200)
+
+    assert protocol.check_response(response) is response
+
+    with pytest.raises(errors.StoreServerError):
+        protocol.check_response(_fake_response(500))
+
+
+def test_static_headers():
+    transport_headers = {"Accept": "*/*"}
+    static_headers = protocol.StaticHeaders(transport_headers)
+
+    static_headers.set("User-Agent", "agent")
+    assert static_headers.install_auth("secret") == "Macaroon secret"
+
+    assert static_headers.authorization == "Macaroon secret"
+    assert static_headers["User-Agent"] == "agent"
+    assert transport_headers == {
+        "Accept": "*/*",
+        "User-Agent": "agent",
+        "Authorization": "Macaroon secret",
+    }
+
+    static_headers.invalidate_auth()
+
+    assert static_headers.authorization is None
+    assert dict(static_headers.items()) == {"User-Agent": "agent"}
+    assert transport_headers == {"Accept": "*/*", "User-Agent": "agent"}
+
+
+def test_prepare_request(caplog):
+    caplog.set_level(logging.DEBUG)
+    static_headers = protocol.StaticHeaders({})
+    static_headers.set("User-Agent", "agent")
+    static_headers.install_auth("secret")
+    kwargs = {}
+
+    protocol.prepare_request(
+        "GET",
+        "https://foo",
+        {"q": "1"},
+        {"Macaroons": "secret"},
+        kwargs,
+        static_headers=static_headers,
+        timeout=(1, 2),
+    )
+
+    assert kwargs == {"timeout": (1, 2)}
+    assert [rec.message for rec in caplog.records] == [
+        "HTTP 'GET' for 'https://foo' with params {'q': '1'} and headers "
+        "{'Macaroons': '<macaroon>', 'User-Agent': 'agent', "
+        "'Authorization': '<macaroon>'}"
+    ]
+
+
+def test_prepare_request_keeps_timeout():
+    kwargs = {"timeout": 5}
+
+    protocol.prepare_request(
+        "GET",
+        "https://foo",
+        None,
+        None,
+        kwargs,
+        static_headers=protocol.StaticHeaders({}),
+        timeout=(1, 2),
+    )
+
+    assert kwargs == {"timeout": 5}
+
+
+def test_handle_response():
+    budget = Mock()
+    response = _fake_response(200)
+
+    assert protocol.handle_response(response, budget) is response
+    with pytest.raises(errors.StoreServerError):
+        protocol.handle_response(_fake_response(503), budget)
+
+    assert budget.record_response.mock_calls[0].args == (200,)
+    assert budget.record_response.mock_calls[1].args == (503,)
+
+
+def _responses():
+    return {
+        "https://fake-server.com/v1/tokens": _fake_response(json={"macaroon": "root"}),
+        "https://fake-server.com/v1/tokens/exchange": _fake_response(
+            json={"macaroon": "authorized"}
+        ),
+    }
+
+
+def _login_flow():
+    return protocol.login(
+        base_url="https://fake-server.com",
+        store_endpoints=endpoints.CHARMHUB,
+        permissions=["perm-1"],
+        description="fakecraft@foo",
+        ttl=60,
+    )
+
+
+def test_run():
+    responses = _responses()
+    discharges = []
+
+    def discharge(macaroon):
+        discharges.append(macaroon)
+        return "discharged"
+
+    assert (
+        protocol.run(_login_flow(), lambda r: responses[r.url], discharge)
+        == "authorized"
+    )
+    assert discharges == ["root"]
+
+
+def test_async_run():
+    responses = _responses()
+
+    async def send(request):
+        return responses[request.url]
+
+    async def discharge(macaroon):  # pylint: disable=W0613
+        return "discharged"
+
+    assert (
+        asyncio.run(protocol.async_run(_login_flow(), send, discharge)) == "authorized"
+    )
+
+
+def test_run_propagates_errors():
+    def send(request):
+        raise errors.StoreServerError(_fake_response(500))
+
+    with pytest.raises(errors.StoreServerError):
+        protocol.run(_login_flow(), send, lambda m: m)
@@ -0,0 +1,153 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import dataclasses
+
+import pytest
+
+from craft_store import errors, records
+from craft_store.records import ReleaseRecord, RevisionRecord
+
+REVISION = {
+    "revision": 2,
+    "version": "2.0",
+    "status": "released",
+    "created-at": "2021-07-01T10:00:00+00:00",
+    "size": 1024,
+    "sha3-384": "a" * 96,
+    "bases": [{"name": "ubuntu", "channel": "20.04", "architecture": "amd64"}],
+}
+
+
+def test_record_from_dict():
+    record = RevisionRecord.from_dict(REVISION)
+
+    assert record == RevisionRecord(
+        revision=2,
+        version="2.0",
+        status="released",
+        created_at="2021-07-01T10:00:00+00:00",
+        size=1024,
+        sha3_384="a" * 96,
+    )
+
+
+def test_record_missing_keys():
+    record = ReleaseRecord.from_dict({"channel": "latest/stable"})
+
+    assert record == ReleaseRecord("latest/stable", None, None, None)
+
+
+def test_record_compact_and_frozen():
+    record = RevisionRecord.from_dict(REVISION)
+
+    assert not hasattr(record, "__dict__")
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        record.revision = 3  # type: ignore
+
+
+def test_record_interned_values():
+    first, second = RevisionRecord.from_items(
+        [dict(REVISION, status="".join(["re", "leased"])) for _ in range(2)]
+    )
+
+    assert first.status is second.status
+
+
+def test_record_to_dict():
+    record = RevisionRecord.from_dict(REVISION)
+
+    assert record.to_dict() == {
+        key: value for key, value in REVISION.items() if key != "bases"
+    }
+
+
+def test_record_to_tuple():
+    record = ReleaseRecord.from_dict({"channel": "latest/stable", "revision": 1})
+
+    assert record.to_tuple() == ("latest/stable", 1, None, None)
+
+
+def test_to_columns():
+    releases = ReleaseRecord.from_items(
+        [
+            {"channel": "latest/stable", "revision": 1, "when": "today"},
+            {"channel": "latest/edge", "revision": 2, "expiration-date": "never"},
+        ]
+    )
+
+    assert records.to_columns(releases) == {
+        "channel": ["latest/stable", "latest/edge"],
+        "revision": [1, 2],
+        "when": ["today", None],
+        "expiration_date": [None, "never"],
+    }
+
+
+def test_to_columns_empty():
+    assert records.to_columns([]) == {}
+
+
+def test_to_numpy():
+    numpy = pytest.importorskip("numpy")
+    releases = ReleaseRecord.from_items(
+        [
+            {"channel": "latest/stable", "revision": 1, "when": "tödåy"},
+            {"channel": "latest/edge", "when": "now"},
+        ]
+    )
+
+    array = records.to_numpy(releases)
+
+    assert array.dtype == numpy.dtype(
+        [
+            ("channel", "S13"),
+            ("revision", "i8"),
+            ("when", "U5"),
+            ("expiration_date", "S1"),
+        ]
+    )
+    assert array["revision"].tolist() == [1, -1]
+    assert array["when"].tolist() == ["tödåy", "now"]
+
+
+def test_to_arrow():
+    pytest.importorskip("pyarrow")
+    releases = ReleaseRecord.from_items([{"channel": "latest/stable"}])
+
+    table = records.to_arrow(releases)
+
+    assert table.column_names == ["channel", "revision", "when", "expiration_date"]
+    assert table.to_pylist() == [
+        {
+            "channel": "latest/stable",
+            "revision": None,
+            "when": None,
+            "expiration_date": None,
+        }
+    ]
+
+
+@pytest.mark.parametrize(
+    "module,export", [("numpy", records.to_numpy), ("pyarrow", records.to_arrow)]
+)
+def test_export_missing_dependency(monkeypatch, module, export):
+    monkeypatch.setattr(records, module, None)
+
+    with pytest.raises(errors.CraftStoreError) as raised:
+        export([])
+
+    assert raised.value.resolution.startswith("Install craft-store[")
@@ -0,0 +1,179 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from unittest.mock import patch
+
+import pytest
+import urllib3  # type: ignore
+
+from craft_store import HTTPClient, errors
+from craft_store.endpoints import CHARMHUB
+from craft_store.retry_budget import BudgetedRetry, RetryBudget, RetryBudgetPolicy
+from craft_store.stub_store import ErrorBurst, StubStore
+
+
+@pytest.mark.parametrize("kwargs", [{"ratio": -1}, {"min_retries": -1}, {"window": 0}])
+def test_policy_invalid(kwargs):
+    with pytest.raises(ValueError):
+        RetryBudgetPolicy(**kwargs)
+
+
+def test_budget_min_retries():
+    budget = RetryBudget(RetryBudgetPolicy(ratio=0.5, min_retries=2))
+
+    assert budget.available() == 2
+    assert budget.try_acquire()
+    assert budget.try_acquire()
+    assert not budget.try_acquire()
+    assert budget.stats.retries == 2
+    assert budget.stats.rejected == 1
+
+
+def test_budget_ratio_of_successes():
+    budget = RetryBudget(RetryBudgetPolicy(ratio=0.5, min_retries=0))
+    for _ in range(4):
+        budget.record_success()
+
+    assert budget.available() == 2
+    assert budget.try_acquire()
+    assert budget.try_acquire()
+    assert not budget.try_acquire()
+    assert budget.stats.successes == 4
+
+
+@pytest.mark.parametrize("status_code,available", [(200, 1), (404, 1), (503, 0)])
+def test_budget_record_response(status_code, available):
+    budget = RetryBudget(RetryBudgetPolicy(ratio=1, min_retries=0))
+
+    budget.record_response(status_code)
+
+    assert budget.available() == available
+
+
+def test_budget_window_expires():
+    budget = RetryBudget(RetryBudgetPolicy(ratio=1, min_retries=0, window=10))
+    with patch("time.monotonic", return_value=100.0):
+        budget.record_success()
+        assert budget.try_acquire()
+        assert not budget.try_acquire()
+
+    with patch("time.monotonic", return_value=109.0):
+        budget.record_success()
+        assert budget.try_acquire()
+
+    with patch("time.monotonic", return_value=110.5):
+        assert budget.available() == 0
+        budget.record_success()
+        assert budget.available() == 1
+
+    with patch("time.monotonic", return_value=130.0):
+        assert budget.available() == 0
+
+
+def test_retry_invalid_jitter():
+    with pytest.raises(ValueError):
+        BudgetedRetry(total=1, jitter=2)
+
+
+def test_retry_increment_keeps_budget():
+    budget = RetryBudget()
+    retry = BudgetedRetry(total=3, budget=budget, jitter=0.3)
+
+    retry = retry.increment("GET", "/", error=urllib3.exceptions.ProtocolError())
+
+    assert isinstance(retry, BudgetedRetry)
+    assert retry.budget is budget
+    assert retry.jitter == 0.3
+    assert retry.total == 2
+    assert budget.stats.retries == 1
+
+
+def test_retry_increment_budget_spent():
+    budget = RetryBudget(RetryBudgetPolicy(min_retries=0))
+    retry = BudgetedRetry(total=3, budget=budget)
+
+    with pytest.raises(urllib3.exceptions.MaxRetryError):
+        retry.increment("GET", "/", error=urllib3.exceptions.ProtocolError())
+
+    assert budget.stats.rejected == 1
+
+
+def test_retry_exhausted_does_not_spend_budget():
+    budget = RetryBudget()
+    retry = BudgetedRetry(total=0, budget=budget)
+
+    with pytest.raises(urllib3.exceptions.MaxRetryError):
+        retry.increment("GET", "/", error=urllib3.exceptions.ProtocolError())
+
+    assert budget.stats.retries == 0
+    assert budget.stats.rejected == 0
+
+
+@pytest.mark.parametrize("jitter", [0.0, 0.5, 1.0])
+def test_retry_backoff_jitter(jitter):
+    retry = BudgetedRetry(total=10, backoff_factor=1, jitter=jitter)
+    for _ in range(3):
+        retry = retry.increment("GET", "/", error=urllib3.exceptions.ProtocolError())
+
+    backoffs = {retry.get_backoff_time() for _ in range(50)}
+
+    assert all(4 * (1 - jitter) <= backoff <= 4 for backoff in backoffs)
+    assert (len(backoffs) > 1) == bool(jitter)
+
+
+@pytest.mark.parametrize(
+    "method,status_code,retried",
+    [
+        ("GET", 500, True),
+        ("GET", 503, True),
+        ("GET", 429, True),
+        ("POST", 429, True),
+        ("POST", 503, False),
+        ("GET", 401, False),
+        ("GET", 404, False),
+        ("GET", 501, False),
+    ],
+)
+def test_retry_is_retry_classification(method, status_code, retried):
+    assert BudgetedRetry(total=3).is_retry(method, status_code) is retried
+
+
+def test_retry_is_retry_fails_fast_outside_classification():
+    retries = BudgetedRetry(total=3, status_forcelist=[401, 503])
+
+    assert not retries.is_retry("GET", 401)
+    assert retries.is_retry("GET", 503)
+    assert not retries.is_retry("GET", 500)
+
+
+def test_http_client_bounds_retries(monkeypatch):
+    monkeypatch.setenv("CRAFT_STORE_BACKOFF", "0")
+    budget = RetryBudget(RetryBudgetPolicy(ratio=0.5, min_retries=2))
+    with StubStore() as store:
+        client = HTTPClient(user_agent="Agent", retry_budget=budget)
+        url = store.url + CHARMHUB.whoami
+        for _ in range(2):
+            client.get(url)
+
+        store.inject(ErrorBurst(count=100))
+        with pytest.raises(errors.NetworkError):
+            client.get(url)
+
+    # one request and the three retries the budget allows.
+    assert len(store.requests) == 2 + 4
+    assert budget.stats.successes == 2
+    assert budget.stats.retries == 3
+    assert budget.stats.rejected == 1
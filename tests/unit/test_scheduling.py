@@ -0,0 +1,276 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from craft_store import HTTPClient
+from craft_store.scheduling import Priority, RequestScheduler, SchedulerPolicy, priority
+from craft_store.transport import Transport
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"max_concurrency": 0},
+        {"quotas": {Priority.BATCH: 0}},
+        {"weights": {Priority.BATCH: 0}},
+    ],
+)
+def test_policy_invalid(kwargs):
+    with pytest.raises(ValueError):
+        SchedulerPolicy(**kwargs)
+
+
+class Recorder:
+    """Send callables recording their order, blocking until released."""
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.order = []
+        self.gates = {}
+        self.threads = []
+
+    def submit(self, name, priority_class, block=False):
+        gate = threading.Event()
+        if not block:
+            gate.set()
+        self.gates[name] = gate
+
+        def send():
+            self.order.append(name)
+            gate.wait()
+            return name
+
+        def worker():
+            with priority(priority_class):
+                self.scheduler.run(send)
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        self.threads.append(thread)
+
+    def wait_queued(self, priority_class, depth):
+        deadline = time.monotonic() + 2
+        while self.scheduler.queue_depth(priority_class) < depth:
+            assert time.monotonic() < deadline
+            time.sleep(0.001)
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+
+
+def test_run_default_priority():
+    scheduler = RequestScheduler()
+
+    assert scheduler.run(lambda: "ok") == "ok"
+    assert scheduler.stats[Priority.INTERACTIVE].requests == 1
+    assert scheduler.stats[Priority.BATCH].requests == 0
+
+    with priority(Priority.BATCH):
+        scheduler.run(lambda: "ok")
+
+    assert scheduler.stats[Priority.BATCH].requests == 1
+    assert scheduler.running(Priority.BATCH) == 0
+
+
+def test_try_acquire():
+    scheduler = RequestScheduler(SchedulerPolicy(max_concurrency=2))
+
+    assert scheduler.current_priority() == Priority.INTERACTIVE
+    assert scheduler.try_acquire(Priority.INTERACTIVE)
+    assert scheduler.try_acquire(Priority.INTERACTIVE)
+    assert not scheduler.try_acquire(Priority.INTERACTIVE)
+
+    scheduler.release(Priority.INTERACTIVE)
+    assert scheduler.running(Priority.INTERACTIVE) == 1
+    assert scheduler.try_acquire(Priority.INTERACTIVE)
+
+
+def test_try_acquire_not_ahead_of_queue():
+    scheduler = RequestScheduler(
+        SchedulerPolicy(max_concurrency=2, quotas={Priority.BATCH: 1})
+    )
+    assert scheduler.try_acquire(Priority.BATCH)
+
+    def batch():
+        with priority(Priority.BATCH):
+            scheduler.run(lambda: None)
+
+    queued = threading.Thread(target=batch)
+    queued.start()
+    while not scheduler.queue_depth(Priority.BATCH):
+        time.sleep(0.001)
+
+    assert not scheduler.try_acquire(Priority.INTERACTIVE)
+
+    scheduler.release(Priority.BATCH)
+    queued.join()
+    assert scheduler.try_acquire(Priority.INTERACTIVE)
+
+
+def test_run_releases_on_error():
+    scheduler = RequestScheduler(SchedulerPolicy(max_concurrency=1))
+
+    with pytest.raises(ValueError):
+        scheduler.run(Mock(side_effect=ValueError()))
+
+    assert scheduler.run(lambda: "ok") == "ok"
+
+
+def test_async_run():
+    scheduler = RequestScheduler(SchedulerPolicy(max_concurrency=1))
+    order = []
+
+    async def send(name):
+        order.append(name)
+        await asyncio.sleep(0.01)
+        return name
+
+    async def main():
+        with priority(Priority.BATCH):
+            batch = [
+                asyncio.ensure_future(scheduler.async_run(lambda n=n: send(n)))
+                for n in ("batch-1", "batch-2", "batch-3")
+            ]
+        await asyncio.sleep(0)
+        interactive = scheduler.async_run(lambda: send("interactive"))
+        return await asyncio.gather(*batch, interactive)
+
+    assert asyncio.run(main()) == ["batch-1", "batch-2", "batch-3", "interactive"]
+    assert order == ["batch-1", "interactive", "batch-2", "batch-3"]
+    assert scheduler.stats[Priority.BATCH].queued == 2
+    assert scheduler.running(Priority.BATCH) == 0
+
+
+def test_async_run_cancelled_while_queued():
+    scheduler = RequestScheduler(SchedulerPolicy(max_concurrency=1))
+
+    async def main():
+        first = asyncio.ensure_future(scheduler.async_run(lambda: asyncio.sleep(0.05)))
+        await asyncio.sleep(0)
+        queued = asyncio.ensure_future(scheduler.async_run(lambda: asyncio.sleep(0)))
+        await asyncio.sleep(0)
+        queued.cancel()
+        await first
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+
+    asyncio.run(main())
+
+    assert scheduler.queue_depth(Priority.INTERACTIVE) == 0
+    assert scheduler.running(Priority.INTERACTIVE) == 0
+
+
+def test_interactive_ahead_of_batch_backlog():
+    scheduler = RequestScheduler(SchedulerPolicy(max_concurrency=1))
+    recorder = Recorder(scheduler)
+    recorder.submit("batch-running", Priority.BATCH, block=True)
+    for index in range(3):
+        recorder.wait_queued(Priority.BATCH, index)
+        recorder.submit(f"batch-{index}", Priority.BATCH)
+    recorder.wait_queued(Priority.BATCH, 3)
+    recorder.submit("interactive", Priority.INTERACTIVE)
+    recorder.wait_queued(Priority.INTERACTIVE, 1)
+
+    recorder.gates["batch-running"].set()
+    recorder.join()
+
+    assert recorder.order == [
+        "batch-running",
+        "interactive",
+        "batch-0",
+        "batch-1",
+        "batch-2",
+    ]
+    assert scheduler.stats[Priority.INTERACTIVE].queued == 1
+    assert scheduler.stats[Priority.BATCH].queued == 3
+    assert scheduler.stats[Priority.BATCH].max_wait > 0
+    assert scheduler.stats[Priority.BATCH].mean_wait > 0
+
+
+def test_weighted_fair_queueing():
+    scheduler = RequestScheduler(
+        SchedulerPolicy(
+            max_concurrency=1,
+            weights={Priority.INTERACTIVE: 2.0, Priority.BATCH: 1.0},
+        )
+    )
+    recorder = Recorder(scheduler)
+    recorder.submit("blocker", Priority.BATCH, block=True)
+    for index in range(4):
+        for priority_class in Priority:
+            recorder.wait_queued(priority_class, index)
+            recorder.submit(f"{priority_class.name.lower()}-{index}", priority_class)
+    recorder.wait_queued(Priority.BATCH, 4)
+
+    recorder.gates["blocker"].set()
+    recorder.join()
+
+    assert recorder.order == [
+        "blocker",
+        "interactive-0",
+        "interactive-1",
+        "interactive-2",
+        "batch-0",
+        "interactive-3",
+        "batch-1",
+        "batch-2",
+        "batch-3",
+    ]
+
+
+def test_batch_quota_reserves_capacity():
+    scheduler = RequestScheduler(
+        SchedulerPolicy(max_concurrency=3, quotas={Priority.BATCH: 2})
+    )
+    recorder = Recorder(scheduler)
+    for index in range(3):
+        recorder.submit(f"batch-{index}", Priority.BATCH, block=True)
+    recorder.wait_queued(Priority.BATCH, 1)
+
+    assert scheduler.running(Priority.BATCH) == 2
+
+    recorder.submit("interactive", Priority.INTERACTIVE)
+    recorder.threads[-1].join()
+
+    assert "interactive" in recorder.order
+    assert len([name for name in recorder.order if name.startswith("batch")]) == 2
+
+    for gate in recorder.gates.values():
+        gate.set()
+    recorder.join()
+
+    assert scheduler.stats[Priority.BATCH].requests == 3
+
+
+def test_http_client_scheduler():
+    transport = Mock(spec=Transport, headers={})
+    transport.request.return_value = Mock(status_code=200, ok=True)
+    scheduler = RequestScheduler()
+    client = HTTPClient(user_agent="Agent", transport=transport, scheduler=scheduler)
+
+    client.get("https://foo.bar")
+    with priority(Priority.BATCH):
+        client.get("https://foo.bar")
+
+    assert scheduler.stats[Priority.INTERACTIVE].requests == 1
+    assert scheduler.stats[Priority.BATCH].requests == 1
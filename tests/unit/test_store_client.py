@@ -14,15 +14,35 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import base64
+import datetime
+import http.server
 import json
+import threading
+import time
+from typing import Any, Dict, List
 from unittest.mock import ANY, Mock, call, patch
+from urllib.parse import parse_qs, urlparse
 
 import pytest
-from macaroonbakery import bakery, httpbakery
+import requests
+from macaroonbakery import bakery, checkers, httpbakery
+from pymacaroons.caveat import Caveat
 from pymacaroons.macaroon import Macaroon
+from requests.adapters import Retry
 
-from craft_store import endpoints, errors
-from craft_store.store_client import StoreClient, WebBrowserWaitingInteractor
+from craft_store import endpoints, errors, scheduling
+from craft_store.cassette import REDACTED_MACAROON, Cassette, ReplayTransport
+from craft_store.concurrency import AIMDPolicy, ConcurrencyLimiter
+from craft_store.discharge_cache import DischargeCache
+from craft_store.models import WhoamiModel
+from craft_store.store_client import (
+    CandidAgentInteractor,
+    StoreClient,
+    WebBrowserWaitingInteractor,
+    _CachingBakeryClient,
+)
+from craft_store.transport import RequestsTransport, Transport
 
 
 def _fake_response(status_code, reason=None, json=None):
@@ -62,7 +82,13 @@ def http_client_request_mock(real_macaroon):
         elif args[1] == "GET" and "whoami" in args[2]:
             response = _fake_response(
                 200,
-                json={"name": "Fake Person", "username": "fakeuser", "id": "fake-id"},
+                json={
+                    "account": {
+                        "name": "Fake Person",
+                        "username": "fakeuser",
+                        "id": "fake-id",
+                    }
+                },
             )
         else:
             response = _fake_response(200)
@@ -153,7 +179,12 @@ def test_store_client_login(
     ]
 
     assert auth_mock.mock_calls == [
-        call("fakecraft", "https://fake-server.com", environment_auth=environment_auth),
+        call(
+            "fakecraft",
+            "https://fake-server.com",
+            environment_auth=environment_auth,
+            credential_broker=None,
+        ),
         call().set_credentials(real_macaroon),
         call().encode_credentials(real_macaroon),
     ]
@@ -215,7 +246,12 @@ def test_store_client_login_with_packages_and_channels(
     ]
 
     assert auth_mock.mock_calls == [
-        call("fakecraft", "https://fake-server.com", environment_auth=None),
+        call(
+            "fakecraft",
+            "https://fake-server.com",
+            environment_auth=None,
+            credential_broker=None,
+        ),
         call().set_credentials(real_macaroon),
         call().encode_credentials(real_macaroon),
     ]
@@ -232,7 +268,12 @@ def test_store_client_logout(auth_mock):
     store_client.logout()
 
     assert auth_mock.mock_calls == [
-        call("fakecraft", "https://fake-server.com", environment_auth=None),
+        call(
+            "fakecraft",
+            "https://fake-server.com",
+            environment_auth=None,
+            credential_broker=None,
+        ),
         call().del_credentials(),
     ]
 
@@ -253,16 +294,127 @@ def test_store_client_request(http_client_request_mock, real_macaroon, auth_mock
             "GET",
             "https://fake-server.com/fakepath",
             params=None,
-            headers={"Authorization": f"Macaroon {real_macaroon}"},
+            headers=None,
         )
     ]
+    assert (
+        store_client._transport.headers["Authorization"]  # pylint: disable=W0212
+        == f"Macaroon {real_macaroon}"
+    )
 
     assert auth_mock.mock_calls == [
-        call("fakecraft", "https://fake-server.com", environment_auth=None),
+        call(
+            "fakecraft",
+            "https://fake-server.com",
+            environment_auth=None,
+            credential_broker=None,
+        ),
         call().get_credentials(),
     ]
 
 
+def test_store_client_request_reuses_auth_header(
+    http_client_request_mock, real_macaroon, auth_mock
+):
+    store_client = StoreClient(
+        base_url="https://fake-server.com",
+        endpoints=endpoints.CHARMHUB,
+        application_name="fakecraft",
+        user_agent="FakeCraft Unix X11",
+    )
+
+    store_client.request("GET", "https://fake-server.com/fakepath")
+    store_client.request("GET", "https://fake-server.com/fakepath")
+
+    assert auth_mock.return_value.get_credentials.mock_calls == [call()]
+
+    store_client.logout()
+
+    assert (
+        "Authorization" not in store_client._transport.headers
+    )  # pylint: disable=W0212
+
+    store_client.request("GET", "https://fake-server.com/fakepath")
+
+    assert auth_mock.return_value.get_credentials.mock_calls == [call(), call()]
+
+
+def test_store_client_login_drops_auth_header(
+    http_client_request_mock, bakery_discharge_mock, auth_mock
+):
+    store_client = StoreClient(
+        base_url="https://fake-server.com",
+        endpoints=endpoints.CHARMHUB,
+        application_name="fakecraft",
+        user_agent="FakeCraft Unix X11",
+    )
+    store_client.request("GET", "https://fake-server.com/fakepath")
+
+    store_client.login(
+        permissions=["perm-1", "perm-2"], description="fakecraft@foo", ttl=60
+    )
+
+    assert (
+        "Authorization" not in store_client._transport.headers
+    )  # pylint: disable=W0212
+
+
+def test_store_client_candid_request_without_auth_header(auth_mock):
+    transport = Mock(spec=Transport, headers={}, retries=Retry(0))
+    store_client = StoreClient(
+        base_url="https://fake-server.com",
+        endpoints=endpoints.CHARMHUB,
+        application_name="fakecraft",
+        user_agent="FakeCraft Unix X11",
+        transport=transport,
+    )
+    # Another thread installs the credentials while discharging.
+    store_client._install_auth_header()  # pylint: disable=W0212
+
+    store_client._send_candid_request(  # pylint: disable=W0212
+        "POST",
+        "https://candid.fake/discharge",
+        headers={"Bakery-Protocol-Version": "3"},
+    )
+
+    transport.request.assert_called_once_with(
+        "POST",
+        "https://candid.fake/discharge",
+        headers={"Bakery-Protocol-Version": "3", "Authorization": None},
+    )
+
+
+@pytest.mark.parametrize(
+    "status_code,json",
+    [
+        (401, {}),
+        (403, {"error-list": [{"code": "macaroon-needs-refresh", "message": "m"}]}),
+    ],
+)
+def test_store_client_request_auth_expired_drops_auth_header(
+    auth_mock, status_code, json
+):
+    store_client = StoreClient(
+        base_url="https://fake-server.com",
+        endpoints=endpoints.CHARMHUB,
+        application_name="fakecraft",
+        user_agent="FakeCraft Unix X11",
+    )
+
+    with patch.object(
+        store_client._transport,  # pylint: disable=W0212
+        "request",
+        return_value=_fake_response(status_code, reason="unauthorized", json=json),
+    ):
+        with pytest.raises(errors.StoreServerError):
+            store_client.request("GET", "https://fake-server.com/fakepath")
+
+    assert (
+        "Authorization" not in store_client._transport.headers
+    )  # pylint: disable=W0212
+    assert store_client._auth_header is None  # pylint: disable=W0212
+
+
 def test_store_client_whoami(http_client_request_mock, real_macaroon, auth_mock):
     store_client = StoreClient(
         base_url="https://fake-server.com",
@@ -271,10 +423,12 @@ def test_store_client_whoami(http_client_request_mock, real_macaroon, auth_mock)
         user_agent="FakeCraft Unix X11",
     )
 
-    assert store_client.whoami() == {
-        "name": "Fake Person",
-        "username": "fakeuser",
-        "id": "fake-id",
+    whoami = store_client.whoami()
+
+    assert isinstance(whoami, WhoamiModel)
+    assert whoami.account.username == "fakeuser"
+    assert whoami.marshal() == {
+        "account": {"name": "Fake Person", "username": "fakeuser", "id": "fake-id"}
     }
 
     assert http_client_request_mock.mock_calls == [
@@ -283,16 +437,331 @@ def test_store_client_whoami(http_client_request_mock, real_macaroon, auth_mock)
             "GET",
             "https://fake-server.com/v1/whoami",
             params=None,
-            headers={"Authorization": f"Macaroon {real_macaroon}"},
+            headers=None,
         )
     ]
 
     assert auth_mock.mock_calls == [
-        call("fakecraft", "https://fake-server.com", environment_auth=None),
+        call(
+            "fakecraft",
+            "https://fake-server.com",
+            environment_auth=None,
+            credential_broker=None,
+        ),
         call().get_credentials(),
     ]
 
 
+def test_store_client_discharge_cache(auth_mock):
+    discharge_cache = DischargeCache()
+
+    store_client = StoreClient(
+        base_url="https://fake-server.com",
+        endpoints=endpoints.CHARMHUB,
+        application_name="fakecraft",
+        user_agent="FakeCraft Unix X11",
+        discharge_cache=discharge_cache,
+    )
+
+    bakery_client = store_client._bakery_client  # pylint: disable=W0212
+    assert isinstance(bakery_client, _CachingBakeryClient)
+    assert bakery_client.discharge_cache is discharge_cache
+    assert bakery_client.identity == "fakecraft"
+
+
+@pytest.fixture
+def fake_discharge():
+    discharge = bakery.Macaroon(
+        root_key=b"root-key",
+        id=b"caveat-id",
+        location="https://candid.fake",
+        version=bakery.LATEST_VERSION,
+    )
+    discharge.add_caveat(
+        checkers.time_before_caveat(
+            datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+        )
+    )
+    return discharge
+
+
+@pytest.fixture
+def interaction_mock(monkeypatch, fake_discharge):
+    token = httpbakery.DischargeToken(kind="macaroon", value=b"token")
+    interactions = []
+
+    def interact(self, location, error_info, payload):  # pylint: disable=W0613
+        interactions.append(location)
+        return token, None
+
+    def acquire_discharge(self, cav, payload):
+        self._interact(cav.location, None, payload)  # pylint: disable=W0212
+        return fake_discharge
+
+    monkeypatch.setattr(httpbakery.Client, "_interact", interact)
+    monkeypatch.setattr(httpbakery.Client, "acquire_discharge", acquire_discharge)
+    return interactions
+
+
+@pytest.fixture
+def discharge_with_token_mock(monkeypatch, fake_discharge):
+    acquire_mock = Mock(
+        return_value=_fake_response(200, json={"Macaroon": fake_discharge.to_dict()})
+    )
+    monkeypatch.setattr(
+        httpbakery.Client, "_acquire_discharge_with_token", acquire_mock
+    )
+    return acquire_mock
+
+
+def test_caching_bakery_client_reuses_token(
+    interaction_mock, discharge_with_token_mock
+):
+    client = _CachingBakeryClient(
+        discharge_cache=DischargeCache(), identity="fakecraft"
+    )
+    cav = Caveat(caveat_id="caveat-1", location="https://candid.fake")
+
+    client.acquire_discharge(cav, None)
+    client.acquire_discharge(
+        Caveat(caveat_id="caveat-2", location="https://candid.fake"), None
+    )
+
+    assert interaction_mock == ["https://candid.fake"]
+    assert discharge_with_token_mock.mock_calls == [
+        call(ANY, None, httpbakery.DischargeToken(kind="macaroon", value=b"token"))
+    ]
+
+
+def test_caching_bakery_client_rejected_token(
+    interaction_mock, discharge_with_token_mock
+):
+    discharge_cache = DischargeCache()
+    client = _CachingBakeryClient(discharge_cache=discharge_cache, identity="fakecraft")
+    cav = Caveat(caveat_id="caveat-1", location="https://candid.fake")
+    client.acquire_discharge(cav, None)
+    discharge_with_token_mock.return_value = _fake_response(401, json={})
+
+    client.acquire_discharge(cav, None)
+
+    assert interaction_mock == ["https://candid.fake", "https://candid.fake"]
+    assert discharge_cache.get("https://candid.fake", "fakecraft") is not None
+
+
+class FakeCandid(http.server.ThreadingHTTPServer):
+    """Local Candid discharger supporting agent interaction only."""
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), FakeCandidHandler)
+        self.location = f"http://127.0.0.1:{self.server_address[1]}"
+        self.oven = bakery.Oven(key=bakery.generate_key())
+        self.agent_logins: List[str] = []
+        self.discharges: List[Dict[str, Any]] = []
+
+
+class FakeCandidHandler(http.server.BaseHTTPRequestHandler):
+    server: FakeCandid
+
+    def log_message(self, *args):  # pylint: disable=W0221
+        pass
+
+    def _reply(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):  # pylint: disable=C0103
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        self.server.agent_logins.append(query["username"][0])
+        public_key = bakery.PublicKey.deserialize(query["public-key"][0])
+        macaroon = self.server.oven.macaroon(
+            bakery.LATEST_VERSION,
+            datetime.datetime.utcnow() + datetime.timedelta(minutes=5),
+            [bakery.local_third_party_caveat(public_key, bakery.LATEST_VERSION)],
+            [bakery.LOGIN_OP],
+        )
+        self._reply(200, {"macaroon": macaroon.to_dict()})
+
+    def do_POST(self):  # pylint: disable=C0103
+        length = int(self.headers["Content-Length"])
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+        self.server.discharges.append(form)
+        if form.get("token-kind") != "agent":
+            self._reply(
+                401,
+                {
+                    "Code": "interaction required",
+                    "Message": "interaction required",
+                    "Info": {
+                        "InteractionMethods": {"agent": {"login-url": "login-agent"}}
+                    },
+                },
+            )
+            return
+
+        caveat_id = (
+            form["id"].encode() if "id" in form else base64.b64decode(form["id64"])
+        )
+        discharge = bakery.Macaroon(
+            root_key=b"fake-root-key",
+            id=caveat_id,
+            location=self.server.location,
+            version=bakery.LATEST_VERSION,
+        )
+        discharge.add_caveat(
+            checkers.time_before_caveat(
+                datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+            )
+        )
+        self._reply(200, {"Macaroon": discharge.to_dict()})
+
+
+@pytest.fixture
+def fake_candid():
+    server = FakeCandid()
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _store_macaroon(candid_location: str) -> str:
+    candid_key = bakery.generate_key()
+    locator = bakery.ThirdPartyStore()
+    locator.add_info(
+        candid_location,
+        bakery.ThirdPartyInfo(
+            public_key=candid_key.public_key, version=bakery.LATEST_VERSION
+        ),
+    )
+    macaroon = bakery.Macaroon(
+        root_key=b"store-root-key",
+        id=b"store-id",
+        location="fake-server.com",
+        version=bakery.LATEST_VERSION,
+    )
+    macaroon.add_caveat(
+        checkers.Caveat(condition="is-authenticated-user", location=candid_location),
+        bakery.generate_key(),
+        locator,
+    )
+    return json.dumps(macaroon.to_dict())
+
+
+def test_store_client_agent_requires_key_and_username():
+    with pytest.raises(ValueError):
+        StoreClient(
+            base_url="https://fake-server.com",
+            endpoints=endpoints.CHARMHUB,
+            application_name="fakecraft",
+            user_agent="FakeCraft Unix X11",
+            agent_username="fake-agent@candid",
+        )
+
+
+@pytest.mark.parametrize("discharge_cache", (None, DischargeCache()))
+def test_store_client_agent_discharge(auth_mock, fake_candid, discharge_cache):
+    store_client = StoreClient(
+        base_url="https://fake-server.com",
+        endpoints=endpoints.CHARMHUB,
+        application_name="fakecraft",
+        user_agent="FakeCraft Unix X11",
+        agent_username="fake-agent@candid",
+        agent_key=str(bakery.generate_key()),
+        discharge_cache=discharge_cache,
+    )
+
+    interactors = (
+        store_client._bakery_client._interaction_methods
+    )  # pylint: disable=W0212
+    assert isinstance(interactors[0], CandidAgentInteractor)
+    assert isinstance(interactors[1], WebBrowserWaitingInteractor)
+
+    for _ in range(2):
+        discharged = store_client._candid_discharge(  # pylint: disable=W0212
+            _store_macaroon(fake_candid.location)
+        )
+        assert len(json.loads(base64.urlsafe_b64decode(discharged))) == 2
+
+    if discharge_cache is None:
+        assert fake_candid.agent_logins == ["fake-agent@candid"] * 2
+    else:
+        assert fake_candid.agent_logins == ["fake-agent@candid"]
+        assert discharge_cache.get(fake_candid.location, "fake-agent@candid")
+
+
+class FakeStoreTransport(Transport):
+    """Transport serving the store token endpoints, Candid over the network."""
+
+    def __init__(self, candid_location: str) -> None:
+        self.candid = RequestsTransport(retries=Retry(0))
+        super().__init__(retries=self.candid.retries)
+        self.candid_location = candid_location
+
+    @property
+    def headers(self):
+        return self.candid.headers
+
+    def request(self, method, url, params=None, headers=None, **kwargs):
+        if not url.startswith("https://fake-server.com/"):
+            return self.candid.request(
+                method, url, params=params, headers=headers, **kwargs
+            )
+        response = requests.Response()
+        response.status_code = 200
+        response.elapsed = datetime.timedelta()
+        if url.endswith("/tokens"):
+            payload = {"macaroon": _store_macaroon(self.candid_location)}
+        else:
+            payload = {"macaroon": "authorized-secret"}
+        response._content = json.dumps(payload).encode()  # pylint: disable=W0212
+        return response
+
+
+def test_store_client_login_record_replay(auth_mock, fake_candid, tmp_path):
+    cassette_path = tmp_path / "cassette.json"
+    store_client = StoreClient(
+        base_url="https://fake-server.com",
+        endpoints=endpoints.CHARMHUB,
+        application_name="fakecraft",
+        user_agent="FakeCraft Unix X11",
+        agent_username="fake-agent@candid",
+        agent_key=str(bakery.generate_key()),
+        transport=FakeStoreTransport(fake_candid.location),
+    )
+    login_kwargs = {"permissions": ["perm-1"], "description": "fakecraft", "ttl": 60}
+
+    with store_client.recording(cassette_path) as cassette:
+        store_client.login(**login_kwargs)
+
+    urls = [interaction.url for interaction in cassette.interactions]
+    assert urls[0] == "https://fake-server.com/v1/tokens"
+    assert urls[-1] == "https://fake-server.com/v1/tokens/exchange"
+    assert any(url.startswith(fake_candid.location) for url in urls[1:-1])
+    assert "authorized-secret" not in cassette_path.read_text()
+
+    auth_mock.reset_mock()
+    replay_client = StoreClient(
+        base_url="https://fake-server.com",
+        endpoints=endpoints.CHARMHUB,
+        application_name="fakecraft",
+        user_agent="FakeCraft Unix X11",
+        transport=ReplayTransport(Cassette.load(cassette_path)),
+    )
+
+    assert replay_client.login(**login_kwargs) == "c2VjcmV0LWtleXM="
+    assert auth_mock.return_value.set_credentials.mock_calls == [
+        call(json.dumps(REDACTED_MACAROON))
+    ]
+
+
 def test_webinteractore_wait_for_token(http_client_request_mock):
     http_client_request_mock.side_effect = None
     http_client_request_mock.return_value = _fake_response(
@@ -344,3 +813,260 @@ def test_webinteractore_wait_for_token_value_error(http_client_request_mock):
 
     with pytest.raises(errors.CandidTokenValueError):
         wbi._wait_for_token(object(), "https://foo.bar/candid")  # pylint: disable=W0212
+
+
+def test_store_client_inspect_credentials(auth_mock):
+    store_client = StoreClient(
+        base_url="https://fake-server.com",
+        endpoints=endpoints.CHARMHUB,
+        application_name="fakecraft",
+        user_agent="FakeCraft Unix X11",
+    )
+
+    info = store_client.inspect_credentials()
+    store_client.inspect_credentials()
+
+    assert info.caveats == ("time-before 2022-03-18T19:54:57.151721Z",)
+    assert info.is_expired()
+    assert auth_mock.return_value.get_credentials.mock_calls == [call()]
+
+
+@pytest.fixture
+def refresh_store_client(monkeypatch, tmp_path, auth_mock):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    store_client = StoreClient(
+        base_url="https://fake-server.com",
+        endpoints=endpoints.CHARMHUB,
+        application_name="fakecraft",
+        user_agent="FakeCraft Unix X11",
+    )
+    store_client.login = Mock(return_value="new-credentials")
+    return store_client
+
+
+def test_store_client_refresh_login(refresh_store_client, http_client_request_mock):
+    refresh_store_client.request("GET", "https://fake-server.com/fakepath")
+
+    credentials = refresh_store_client.refresh_login(
+        permissions=["perm"], description="desc", ttl=60
+    )
+
+    assert credentials == "new-credentials"
+    assert refresh_store_client.login.mock_calls == [
+        call(
+            permissions=["perm"],
+            description="desc",
+            ttl=60,
+            packages=None,
+            channels=None,
+        )
+    ]
+
+
+def test_store_client_refresh_login_refreshed_elsewhere(
+    refresh_store_client, http_client_request_mock, auth_mock
+):
+    refresh_store_client.request("GET", "https://fake-server.com/fakepath")
+    auth_mock.return_value.get_credentials.return_value = "refreshed"
+
+    credentials = refresh_store_client.refresh_login(
+        permissions=["perm"], description="desc", ttl=60
+    )
+
+    assert credentials == "c2VjcmV0LWtleXM="
+    assert auth_mock.return_value.encode_credentials.mock_calls[-1] == call("refreshed")
+    assert refresh_store_client.login.mock_calls == []
+    assert "Authorization" not in refresh_store_client._transport.headers
+
+
+def test_store_client_refresh_login_refreshed_elsewhere_after_expiry(
+    refresh_store_client, auth_mock
+):
+    with patch.object(
+        refresh_store_client._transport,  # pylint: disable=W0212
+        "request",
+        return_value=_fake_response(401, reason="unauthorized", json={}),
+    ):
+        with pytest.raises(errors.StoreServerError):
+            refresh_store_client.request("GET", "https://fake-server.com/fakepath")
+    auth_mock.return_value.get_credentials.return_value = "refreshed"
+
+    refresh_store_client.refresh_login(permissions=["perm"], description="desc", ttl=60)
+
+    assert auth_mock.return_value.encode_credentials.mock_calls[-1] == call("refreshed")
+    assert refresh_store_client.login.mock_calls == []
+
+
+def test_store_client_refresh_login_expired_not_refreshed(
+    refresh_store_client, auth_mock
+):
+    with patch.object(
+        refresh_store_client._transport,  # pylint: disable=W0212
+        "request",
+        return_value=_fake_response(401, reason="unauthorized", json={}),
+    ):
+        with pytest.raises(errors.StoreServerError):
+            refresh_store_client.request("GET", "https://fake-server.com/fakepath")
+
+    credentials = refresh_store_client.refresh_login(
+        permissions=["perm"], description="desc", ttl=60
+    )
+
+    assert credentials == "new-credentials"
+    assert len(refresh_store_client.login.mock_calls) == 1
+
+
+def test_store_client_slow_upload_does_not_cut_limit(auth_mock):
+    limiter = ConcurrencyLimiter(AIMDPolicy(min_samples=1, latency_slack=0.05))
+    store_client = StoreClient(
+        base_url="https://fake-server.com",
+        storage_base_url="https://storage.fake-server.com",
+        endpoints=endpoints.CHARMHUB,
+        application_name="fakecraft",
+        user_agent="FakeCraft Unix X11",
+        limiter=limiter,
+    )
+
+    def slow_upload(*args, **kwargs):  # pylint: disable=W0613
+        time.sleep(0.1)
+        return _fake_response(200, json={})
+
+    with patch.object(
+        store_client._transport,  # pylint: disable=W0212
+        "request",
+        return_value=_fake_response(200, json={}),
+    ):
+        store_client.request("GET", "https://fake-server.com/fakepath")
+    with patch.object(
+        store_client._storage_client._transport,  # pylint: disable=W0212
+        "request",
+        side_effect=slow_upload,
+    ):
+        store_client._storage_client.request(  # pylint: disable=W0212
+            "POST", "https://storage.fake-server.com/unscanned-upload/", data=b"a"
+        )
+    with patch.object(
+        store_client._transport,  # pylint: disable=W0212
+        "request",
+        return_value=_fake_response(200, json={}),
+    ):
+        store_client.request("GET", "https://fake-server.com/fakepath")
+
+    assert limiter.stats.slow == 0
+    assert limiter.stats.decreases == 0
+    assert limiter.stats.requests == 2
+
+
+def test_store_client_refresh_login_not_logged_in(refresh_store_client, auth_mock):
+    auth_mock.return_value.get_credentials.side_effect = errors.NotLoggedIn()
+
+    assert (
+        refresh_store_client.refresh_login(
+            permissions=["perm"], description="desc", ttl=60
+        )
+        == "new-credentials"
+    )
+
+
+def test_store_client_warmup(auth_mock):
+    transport = Mock(spec=Transport, headers={})
+    transport.warmup.return_value = 1
+    store_client = StoreClient(
+        base_url="https://fake-server.com",
+        endpoints=endpoints.CHARMHUB,
+        application_name="fakecraft",
+        user_agent="FakeCraft Unix X11",
+        transport=transport,
+    )
+
+    assert store_client.warmup(connections=4) == 1
+    assert transport.warmup.mock_calls == [call("https://fake-server.com", 4)]
+
+
+@pytest.fixture
+def release_store_client(auth_mock):
+    return StoreClient(
+        base_url="https://fake-server.com",
+        endpoints=endpoints.CHARMHUB,
+        application_name="fakecraft",
+        user_agent="FakeCraft Unix X11",
+    )
+
+
+def test_store_client_release_batch(release_store_client):
+    barrier = threading.Barrier(2, timeout=5)
+    priorities = []
+    error_response = _fake_response(
+        400,
+        reason="Bad Request",
+        json={"error-list": [{"code": "invalid-channel", "message": "nope"}]},
+    )
+
+    def request(*args, **kwargs):  # pylint: disable=W0613
+        priorities.append(scheduling._PRIORITY.get())
+        # both package requests are in flight at the same time.
+        barrier.wait()
+        if "bundle1" in args[2]:
+            raise errors.StoreServerError(error_response)
+        return _fake_response(200)
+
+    releases = [
+        endpoints.Release("charm1", 1, "latest/stable"),
+        endpoints.Release("bundle1", 2, "latest/edge"),
+        endpoints.Release("charm1", 2, "latest/edge"),
+    ]
+    with patch(
+        "craft_store.store_client.HTTPClient.request",
+        autospec=True,
+        side_effect=request,
+    ) as request_mock:
+        outcomes = release_store_client.release_batch(releases)
+
+    assert [outcome.release for outcome in outcomes] == releases
+    assert [outcome.ok for outcome in outcomes] == [True, False, True]
+    assert outcomes[0].error_list is None
+    assert "invalid-channel" in outcomes[1].error_list
+    assert priorities == [scheduling.Priority.BATCH] * 2
+    assert sorted(request_mock.mock_calls) == sorted(
+        [
+            call(
+                release_store_client,
+                "POST",
+                "https://fake-server.com/v1/charm/charm1/releases",
+                params=None,
+                headers=None,
+                json=[
+                    {"channel": "latest/stable", "revision": 1},
+                    {"channel": "latest/edge", "revision": 2},
+                ],
+            ),
+            call(
+                release_store_client,
+                "POST",
+                "https://fake-server.com/v1/charm/bundle1/releases",
+                params=None,
+                headers=None,
+                json=[{"channel": "latest/edge", "revision": 2}],
+            ),
+        ],
+        key=str,
+    )
+
+
+def test_store_client_release_batch_network_error(release_store_client):
+    network_error = errors.NetworkError(requests.exceptions.ConnectionError())
+    release = endpoints.Release("charm1", 1, "latest/stable")
+
+    with patch(
+        "craft_store.store_client.HTTPClient.request",
+        autospec=True,
+        side_effect=network_error,
+    ):
+        (outcome,) = release_store_client.release_batch([release])
+
+    assert outcome.error is network_error
+    assert outcome.error_list is None
+
+
+def test_store_client_release_batch_empty(release_store_client):
+    assert release_store_client.release_batch([]) == []
@@ -0,0 +1,194 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import http.server
+import json
+import threading
+import tracemalloc
+
+import pytest
+
+from craft_store import HTTPClient, errors
+from craft_store.http_client import get_default_retries
+from craft_store.streaming import iter_json_items
+from craft_store.transport import HTTPXTransport, RequestsTransport
+
+DOCUMENT = {
+    "before": {"nested": [1, {"revisions": "not this one"}], "text": "a,]}"},
+    "revisions": [
+        {"revision": 1, "name": "café ☃", "sizes": [1.5, -2e3]},
+        12345,
+        'string with "escaped" quotes',
+        [],
+        None,
+        True,
+    ],
+    "after": "ignored",
+}
+
+
+def _chunks(text, size):
+    data = text.encode()
+    return [data[i:][:size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 4096])
+def test_items_any_chunk_size(size):
+    text = json.dumps(DOCUMENT, ensure_ascii=False, indent=1)
+
+    items = list(iter_json_items(_chunks(text, size), path=["revisions"]))
+
+    assert items == DOCUMENT["revisions"]
+
+
+def test_items_top_level_array():
+    assert list(iter_json_items(["[1, ", "2", "3, ", "4]"])) == [1, 23, 4]
+
+
+def test_items_nested_path():
+    text = '{"a": 1, "b": {"c": [], "d": [{"e": 1}]}}'
+
+    assert list(iter_json_items(_chunks(text, 5), path=["b", "d"])) == [{"e": 1}]
+
+
+@pytest.mark.parametrize(
+    "text,path", [("[]", []), (" [ ] ", []), ('{"revisions": []}', ["revisions"])]
+)
+def test_items_empty(text, path):
+    assert list(iter_json_items(_chunks(text, 1), path=path)) == []
+
+
+def test_items_missing_path():
+    assert list(iter_json_items(['{"other": [1]}'], path=["revisions"])) == []
+
+
+def test_items_stop_at_end_of_array():
+    def chunks():
+        yield '{"revisions": [1, 2]'
+        raise AssertionError("read past the array")
+
+    assert list(iter_json_items(chunks(), path=["revisions"])) == [1, 2]
+
+
+@pytest.mark.parametrize(
+    "text", ["[1, 2", "[1 2]", "{", '{"revisions": {}}', "[1, }", "[tru]"]
+)
+def test_items_invalid(text):
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_items(_chunks(text, 2), path=["revisions"]))
+
+
+def test_items_memory_bounded():
+    item = {"revision": 1, "status": "released", "sha3-384": "a" * 96}
+    count = 20000
+
+    def chunks():
+        yield b'{"revisions": ['
+        encoded = json.dumps(item).encode()
+        for index in range(count):
+            yield encoded + (b"," if index < count - 1 else b"")
+        yield b"]}"
+
+    tracemalloc.start()
+    try:
+        total = sum(1 for _ in iter_json_items(chunks(), path=["revisions"]))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert total == count
+    document_size = count * len(json.dumps(item))
+    assert peak < document_size / 20
+
+
+class StreamingServer(http.server.ThreadingHTTPServer):
+    """Server sending a listing in two parts, the second one on demand."""
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), StreamingHandler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.release = threading.Event()
+        self.status = 200
+
+
+class StreamingHandler(http.server.BaseHTTPRequestHandler):
+    server: StreamingServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):  # pylint: disable=W0221
+        pass
+
+    def _chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):  # noqa: N802
+        if self.server.status != 200:
+            body = b'{"error-list": [{"code": "bad", "message": "bad"}]}'
+            self.send_response(self.server.status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self._chunk(b'{"revisions": [{"revision": 1},')
+        self.server.release.wait(timeout=5)
+        self._chunk(b'{"revision": 2}]}')
+        self._chunk(b"")
+
+
+@pytest.fixture
+def streaming_server():
+    server = StreamingServer()
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    yield server
+    server.release.set()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=["requests", "httpx"])
+def client(request, monkeypatch):
+    monkeypatch.setenv("CRAFT_STORE_BACKOFF", "0")
+    if request.param == "requests":
+        transport = RequestsTransport(retries=get_default_retries())
+    else:
+        pytest.importorskip("httpx")
+        transport = HTTPXTransport(retries=get_default_retries(), http2=False)
+    yield HTTPClient(user_agent="Agent", transport=transport)
+    transport.close()
+
+
+def test_stream_json_first_item_before_body(client, streaming_server):
+    items = client.stream_json("GET", streaming_server.url, path=["revisions"])
+
+    # the server only sends the rest of the body once the first item is read.
+    assert next(items) == {"revision": 1}
+    streaming_server.release.set()
+    assert list(items) == [{"revision": 2}]
+
+
+def test_stream_json_error(client, streaming_server):
+    streaming_server.status = 404
+
+    with pytest.raises(errors.StoreServerError):
+        list(client.stream_json("GET", streaming_server.url, path=["revisions"]))
@@ -0,0 +1,159 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from craft_store import errors
+from craft_store.stub_store import (
+    ConnectionReset,
+    ErrorBurst,
+    Fault,
+    LatencyBudget,
+    SlowBody,
+    constant,
+    lognormal,
+    uniform,
+)
+
+pytest_plugins = ["craft_store.pytest_plugin"]
+
+
+def test_whoami(stub_store, stub_store_client):
+    assert stub_store_client.whoami().marshal() == stub_store.account
+    assert stub_store.requests == [("GET", "/v1/whoami")]
+
+
+def test_login(stub_store, stub_store_client):
+    credentials = stub_store_client.login(
+        permissions=["package-access"], description="stubcraft@host", ttl=60
+    )
+
+    assert stub_store_client._auth.decode_credentials(credentials) == (
+        stub_store.credentials
+    )
+    assert stub_store.requests == [
+        ("POST", "/v1/tokens"),
+        ("POST", "/v1/tokens/exchange"),
+    ]
+
+
+def test_snap_store_paths(stub_store, stub_store_client):
+    response = stub_store_client.request(
+        "GET", stub_store.url + "/api/v2/tokens/whoami"
+    )
+
+    assert response.json() == stub_store.account
+
+
+def test_unknown_path(stub_store, stub_store_client):
+    with pytest.raises(errors.StoreServerError) as raised:
+        stub_store_client.request("GET", stub_store.url + "/unknown")
+
+    assert raised.value.response.status_code == 404
+
+
+def test_error_burst_retried(stub_store, stub_store_client):
+    stub_store.inject(ErrorBurst(status=503, count=2), ErrorBurst(status=429))
+
+    assert stub_store_client.whoami().marshal() == stub_store.account
+    assert len(stub_store.requests) == 4
+
+
+def test_error_burst_path(stub_store, stub_store_client):
+    stub_store.inject(ErrorBurst(status=500, count=10, path="/v1/tokens"))
+
+    stub_store_client.whoami()
+
+    assert len(stub_store.requests) == 1
+
+
+def test_error_burst_exhausts_retries(stub_store, stub_store_client):
+    stub_store.inject(ErrorBurst(status=503, count=100))
+
+    with pytest.raises(errors.CraftStoreError):
+        stub_store_client.whoami()
+
+    assert len(stub_store.requests) == 9
+
+
+def test_connection_reset(stub_store, stub_store_client):
+    stub_store.inject(ConnectionReset())
+
+    with pytest.raises(errors.NetworkError):
+        stub_store_client.post(stub_store.url + "/v1/tokens")
+
+
+def test_slow_body(stub_store, stub_store_client):
+    stub_store.inject(SlowBody(delay=0.01, chunk_size=8))
+
+    start = time.monotonic()
+    assert stub_store_client.whoami().marshal() == stub_store.account
+
+    assert time.monotonic() - start >= 0.05
+
+
+def test_latency(stub_store, stub_store_client, latency_budget):
+    stub_store.latency = constant(0.02)
+
+    for _ in range(5):
+        with latency_budget.measure():
+            stub_store_client.whoami()
+
+    assert latency_budget.percentile(50) >= 0.02
+    latency_budget.check(p95=5)
+    with pytest.raises(AssertionError, match="p50 latency"):
+        latency_budget.check(p50=0.01)
+
+
+def test_throughput(stub_store, stub_store_client, latency_budget):
+    def whoami(_):
+        with latency_budget.measure():
+            stub_store_client.whoami()
+
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(whoami, range(20)))
+
+    assert len(latency_budget.samples) == 20
+    latency_budget.check(min_throughput=1)
+    with pytest.raises(AssertionError, match="throughput"):
+        latency_budget.check(min_throughput=1e9)
+
+
+@pytest.mark.parametrize(
+    "latency,low,high",
+    [(constant(1), 1, 1), (uniform(1, 2), 1, 2), (lognormal(1, 0.5), 0, 100)],
+)
+def test_latency_distributions(stub_store, latency, low, high):
+    samples = [stub_store.sample(latency) for _ in range(100)]
+
+    assert all(low <= sample <= high for sample in samples)
+
+
+def test_fault_requires_inject():
+    with pytest.raises(TypeError):
+        Fault()  # pylint: disable=E0110
+
+
+def test_empty_budget():
+    budget = LatencyBudget()
+
+    with pytest.raises(ValueError):
+        budget.percentile(50)
+    with pytest.raises(ValueError):
+        budget.throughput  # pylint: disable=W0104
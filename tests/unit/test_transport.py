@@ -0,0 +1,418 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Conformance tests shared by all transports."""
+
+import collections
+import http.server
+import io
+import json
+import logging
+import socket
+import threading
+import time
+import warnings
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+from craft_store import HTTPClient, errors
+from craft_store.http_client import get_default_retries
+from craft_store.transport import HTTPXTransport, RequestsTransport
+
+
+class FakeServer(http.server.ThreadingHTTPServer):
+    """Local server with canned responses for transport tests."""
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), FakeHandler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.hits: Dict[str, int] = collections.Counter()
+        self.connections = 0
+        self.bodies: List[str] = []
+
+
+class FakeHandler(http.server.BaseHTTPRequestHandler):
+    server: FakeServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):  # pylint: disable=W0221
+        pass
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.connections += 1
+
+    def do_HEAD(self) -> None:  # noqa: N802
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _reply(self, status: int, payload, headers=None) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self) -> None:
+        url = urlparse(self.path)
+        self.server.hits[f"{self.command} {url.path}"] += 1
+        hits = self.server.hits[f"{self.command} {url.path}"]
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode()
+        self.server.bodies.append(body)
+
+        if url.path == "/echo":
+            self._reply(
+                200,
+                {
+                    "method": self.command,
+                    "query": parse_qs(url.query),
+                    "headers": dict(self.headers),
+                    "body": body,
+                },
+            )
+        elif url.path == "/flaky":
+            if hits < 3:
+                self._reply(503, {})
+            else:
+                self._reply(200, {"hits": hits})
+        elif url.path == "/truncated":
+            # the connection drops in the middle of a chunked body.
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            self.wfile.write(b"5\r\nhello\r\n")
+            self.wfile.flush()
+            self.close_connection = True
+        elif url.path == "/unavailable":
+            self._reply(503, {})
+        elif url.path == "/throttled":
+            self._reply(429, {}, headers={"Retry-After": "0"})
+        elif url.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "/echo")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        else:
+            self._reply(
+                404,
+                {"error-list": [{"code": "not-found", "message": "not found"}]},
+            )
+
+    do_GET = do_POST = do_PUT = _handle  # noqa: N815
+
+
+@pytest.fixture
+def fake_server():
+    server = FakeServer()
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=["requests", "httpx"])
+def http_client(request, monkeypatch):
+    monkeypatch.setenv("CRAFT_STORE_RETRIES", "3")
+    monkeypatch.setenv("CRAFT_STORE_BACKOFF", "0")
+    if request.param == "requests":
+        transport = RequestsTransport(retries=get_default_retries())
+    else:
+        pytest.importorskip("httpx")
+        transport = HTTPXTransport(retries=get_default_retries())
+    yield HTTPClient(user_agent="Secret Agent", transport=transport)
+    transport.close()
+
+
+def test_get(fake_server, http_client):
+    response = http_client.get(
+        fake_server.url + "/echo",
+        params={"q": "charm"},
+        headers={"X-Foo": "bar"},
+    )
+
+    assert response.status_code == 200
+    assert response.ok
+    assert response.headers["content-type"] == "application/json"
+    payload = response.json()
+    assert payload["method"] == "GET"
+    assert payload["query"] == {"q": ["charm"]}
+    assert payload["headers"]["User-Agent"] == "Secret Agent"
+    assert payload["headers"]["X-Foo"] == "bar"
+
+
+def test_post_json(fake_server, http_client):
+    response = http_client.post(fake_server.url + "/echo", json={"name": "foo"})
+
+    assert json.loads(response.json()["body"]) == {"name": "foo"}
+
+
+def test_timeout_tuple(fake_server, http_client):
+    response = http_client.get(fake_server.url + "/echo", timeout=(5.0, 10.0))
+
+    assert response.status_code == 200
+
+
+def test_stream_disconnect(fake_server, http_client):
+    response = http_client.get(fake_server.url + "/truncated", stream=True)
+
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        for _ in response.iter_content(2):
+            pass
+    response.close()
+
+
+def test_static_headers(fake_server, http_client):
+    http_client._set_static_header("Authorization", "secret")  # pylint: disable=W0212
+
+    headers = http_client.get(fake_server.url + "/echo").json()["headers"]
+
+    assert headers["Authorization"] == "secret"
+
+    http_client._del_static_header("Authorization")  # pylint: disable=W0212
+
+    headers = http_client.get(fake_server.url + "/echo").json()["headers"]
+
+    assert "Authorization" not in headers
+
+
+def test_header_removed(fake_server, http_client):
+    http_client._set_static_header("Authorization", "secret")  # pylint: disable=W0212
+
+    response = http_client._transport.request(  # pylint: disable=W0212
+        "GET", fake_server.url + "/echo", headers={"Authorization": None, "X-Foo": "a"}
+    )
+
+    headers = response.json()["headers"]
+    assert "Authorization" not in headers
+    assert headers["X-Foo"] == "a"
+
+
+def test_post_file(fake_server, http_client):
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", DeprecationWarning)
+        response = http_client.post(
+            fake_server.url + "/echo",
+            data=io.BytesIO(b"artifact"),
+            headers={"Content-Length": "8"},
+        )
+
+    assert response.json()["body"] == "artifact"
+
+
+def test_retry_rewinds_body(fake_server, http_client):
+    body = io.BytesIO(b"skip artifact")
+    body.seek(5)
+
+    response = http_client.put(
+        fake_server.url + "/flaky", data=body, headers={"Content-Length": "8"}
+    )
+
+    assert response.json() == {"hits": 3}
+    assert fake_server.bodies == ["artifact"] * 3
+
+
+def test_httpx_iterator_body_not_retried(fake_server):
+    pytest.importorskip("httpx")
+    transport = HTTPXTransport(retries=get_default_retries())
+
+    response = transport.request(
+        "PUT",
+        fake_server.url + "/flaky",
+        data=iter([b"arti", b"fact"]),
+        headers={"Content-Length": "8"},
+    )
+    transport.close()
+
+    assert response.status_code == 503
+    assert fake_server.bodies == ["artifact"]
+
+
+def test_redirect(fake_server, http_client):
+    response = http_client.get(fake_server.url + "/redirect")
+
+    assert response.json()["method"] == "GET"
+    assert response.url == fake_server.url + "/echo"
+
+
+def test_stream(fake_server, http_client):
+    response = http_client.get(fake_server.url + "/echo", stream=True)
+
+    body = b"".join(response.iter_content(chunk_size=8))
+
+    assert json.loads(body)["method"] == "GET"
+
+
+def test_retry_status(fake_server, http_client):
+    response = http_client.get(fake_server.url + "/flaky")
+
+    assert response.json() == {"hits": 3}
+
+
+def test_retry_status_exhausted(fake_server, http_client):
+    with pytest.raises(errors.NetworkError) as raised:
+        http_client.get(fake_server.url + "/unavailable")
+
+    assert str(raised.value) == "Maximum retries exceeded trying to reach the store."
+    assert raised.value.category == errors.ErrorCategory.RETRYABLE
+    assert fake_server.hits["GET /unavailable"] == 4
+
+
+def test_retry_after(fake_server, http_client):
+    with pytest.raises(errors.NetworkError):
+        http_client.get(fake_server.url + "/throttled")
+
+    assert fake_server.hits["GET /throttled"] == 4
+
+
+def test_post_not_retried(fake_server, http_client):
+    with pytest.raises(errors.StoreServerError) as raised:
+        http_client.post(fake_server.url + "/unavailable")
+
+    assert raised.value.response.status_code == 503
+    assert fake_server.hits["POST /unavailable"] == 1
+
+
+def test_store_server_error(fake_server, http_client):
+    with pytest.raises(errors.StoreServerError) as raised:
+        http_client.get(fake_server.url + "/missing")
+
+    assert raised.value.response.status_code == 404
+    assert "not-found" in raised.value.error_list
+    assert str(raised.value) == "Store operation failed:\n- not-found: not found"
+
+
+def test_connection_refused(http_client):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    with pytest.raises(errors.NetworkError) as raised:
+        http_client.get(f"http://127.0.0.1:{port}/echo")
+
+    assert str(raised.value) == "Maximum retries exceeded trying to reach the store."
+    assert raised.value.category == errors.ErrorCategory.RETRYABLE
+    assert raised.value.idempotency_safe
+
+
+def test_debug_logging(caplog, fake_server, http_client):
+    caplog.set_level(logging.DEBUG, logger="craft_store.http_client")
+
+    http_client.get(fake_server.url + "/echo", headers={"Macaroons": "secret"})
+
+    assert [
+        f"HTTP 'GET' for '{fake_server.url}/echo' with params None and headers "
+        "{'Macaroons': '<macaroon>', 'User-Agent': 'Secret Agent'}"
+    ] == [
+        rec.message for rec in caplog.records if rec.name == "craft_store.http_client"
+    ]
+
+
+def test_warmup(fake_server, http_client):
+    opened = http_client.warmup(fake_server.url)
+    _wait_for_connections(fake_server, 1)
+
+    http_client.get(fake_server.url + "/echo")
+
+    assert opened == 1
+    assert fake_server.connections == 1
+
+
+def test_warmup_unreachable(http_client):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+    assert http_client.warmup(url, 2) == 0
+
+
+def _wait_for_connections(server, count, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while server.connections < count and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def requests_transport(monkeypatch):
+    monkeypatch.setenv("CRAFT_STORE_BACKOFF", "0")
+    transports = []
+
+    def factory(**kwargs):
+        transport = RequestsTransport(retries=get_default_retries(), **kwargs)
+        transports.append(transport)
+        return transport
+
+    yield factory
+    for transport in transports:
+        transport.close()
+
+
+def test_requests_warmup_connections(fake_server, requests_transport):
+    transport = requests_transport()
+
+    assert transport.warmup(fake_server.url, 3) == 3
+    _wait_for_connections(fake_server, 3)
+    assert transport.warmup(fake_server.url, 3) == 0
+    assert transport.warmup(fake_server.url, 100) == 7
+    _wait_for_connections(fake_server, 10)
+
+    transport.request("GET", fake_server.url + "/echo")
+
+    assert fake_server.connections == 10
+
+
+@pytest.mark.parametrize("max_idle,connections", [(None, 1), (0.0, 2)])
+def test_requests_max_idle(fake_server, requests_transport, max_idle, connections):
+    transport = requests_transport(max_idle=max_idle)
+
+    transport.request("GET", fake_server.url + "/echo")
+    time.sleep(0.01)
+    transport.request("GET", fake_server.url + "/echo")
+
+    assert fake_server.connections == connections
+
+
+def test_requests_evict_idle(fake_server, requests_transport):
+    transport = requests_transport(max_idle=0.05)
+    transport.warmup(fake_server.url, 2)
+
+    assert transport.evict_idle() == 0
+
+    time.sleep(0.06)
+
+    assert transport.evict_idle() == 2
+    assert transport.evict_idle() == 0
+
+
+def test_requests_health_checks(fake_server, requests_transport):
+    transport = requests_transport(max_idle=0.0, health_check_interval=0.01)
+    transport.warmup(fake_server.url)
+
+    time.sleep(0.1)
+
+    assert transport.evict_idle() == 0
+    transport.close()
+    assert transport._health_checks is None  # pylint: disable=W0212
@@ -0,0 +1,388 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright 2021 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import email
+import email.policy
+import hashlib
+import http.server
+import io
+import json
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from craft_store import StoreClient, endpoints, errors
+from craft_store.hashing import StreamHasher, hash_file
+from craft_store.uploads import (
+    MultipartBody,
+    UploadJournal,
+    UploadManager,
+    UploadState,
+    file_digest,
+)
+
+
+def _parse_multipart(content_type, data):
+    message = email.message_from_bytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + data,
+        policy=email.policy.HTTP,
+    )
+    return {
+        part.get_param("name", header="content-disposition"): part.get_payload(
+            decode=True
+        )
+        for part in message.iter_parts()
+    }
+
+
+@pytest.fixture
+def artifact(tmp_path):
+    path = tmp_path / "artifact.charm"
+    path.write_bytes(b"charm bytes " * 1000)
+    return path
+
+
+def test_file_digest(artifact):
+    assert file_digest(artifact) == hashlib.sha3_384(artifact.read_bytes()).hexdigest()
+
+
+@pytest.mark.parametrize("size", [1, 7, 100, 8192, -1])
+def test_multipart_body_read(artifact, size):
+    sent = []
+    with MultipartBody(artifact, on_read=sent.append) as body:
+        chunks = iter(lambda: body.read(size), b"")
+        data = b"".join(chunks)
+
+        assert len(data) == len(body)
+        assert sent[-1] == artifact.stat().st_size
+        assert sent == sorted(sent)
+        fields = _parse_multipart(body.content_type, data)
+
+    assert fields == {"binary": artifact.read_bytes()}
+
+
+def test_multipart_body_seek(artifact):
+    with MultipartBody(artifact) as body:
+        data = body.read()
+        assert body.tell() == len(body)
+
+        # transports rewind the body to retry.
+        assert body.seek(0) == 0
+        assert body.read(500) == data[:500]
+        assert body.seek(-10, io.SEEK_END) == len(body) - 10
+        assert body.read() == data[-10:]
+        assert body.seek(10, io.SEEK_CUR) == len(body)
+        assert body.read() == b""
+
+
+def test_journal_reload(tmp_path, artifact):
+    journal_path = tmp_path / "journal"
+    journal = UploadJournal(journal_path)
+    upload = Mock(
+        digest="abc", path=artifact, size=3, state=UploadState.DONE, upload_id="id-1"
+    )
+    journal.record(upload)
+    upload.state = UploadState.FAILED
+    journal.record(upload)
+    journal.close()
+    # a crash while appending leaves a torn line behind.
+    with open(journal_path, "a", encoding="utf-8") as journal_file:
+        journal_file.write('{"digest": "def", "sta')
+
+    journal = UploadJournal(journal_path)
+    journal.close()
+
+    assert journal.entries == {
+        "abc": {
+            "digest": "abc",
+            "path": str(artifact),
+            "size": 3,
+            "state": "failed",
+            "upload-id": "id-1",
+        }
+    }
+    assert len(journal_path.read_text().splitlines()) == 1
+
+
+class FakeUploader:
+    """Uploader recording calls, blocking until released."""
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+        self.error = None
+
+    def __call__(self, path, progress):
+        self.calls.append(path)
+        self.release.wait(timeout=5)
+        progress(path.stat().st_size // 2)
+        progress(path.stat().st_size)
+        if self.error is not None:
+            raise self.error
+        return f"upload-{len(self.calls)}"
+
+
+@pytest.fixture
+def uploader():
+    return FakeUploader()
+
+
+def test_manager_upload(tmp_path, artifact, uploader):
+    progress = []
+    with UploadManager(
+        uploader, tmp_path / "journal", on_progress=lambda u: progress.append(u.sent)
+    ) as manager:
+        upload = manager.submit(artifact)
+
+        assert upload.result(timeout=5) == "upload-1"
+
+    assert upload.state == UploadState.DONE
+    assert upload.progress == 1.0
+    assert upload.digest == file_digest(artifact)
+    assert progress == [artifact.stat().st_size // 2, artifact.stat().st_size]
+    assert manager.stats.uploaded == 1
+
+
+def test_manager_concurrent_workers(tmp_path, uploader):
+    barrier = threading.Barrier(3, timeout=5)
+
+    def upload_file(path, progress):  # pylint: disable=unused-argument
+        barrier.wait()
+        return path.name
+
+    paths = []
+    for index in range(3):
+        paths.append(tmp_path / f"artifact-{index}")
+        paths[-1].write_text(str(index))
+
+    with UploadManager(upload_file, tmp_path / "journal", workers=3) as manager:
+        uploads = [manager.submit(path) for path in paths]
+
+        assert [upload.result(timeout=5) for upload in uploads] == [
+            path.name for path in paths
+        ]
+
+
+def test_manager_deduplicates(tmp_path, artifact, uploader):
+    copy = tmp_path / "copy.charm"
+    copy.write_bytes(artifact.read_bytes())
+    uploader.release.clear()
+
+    with UploadManager(uploader, tmp_path / "journal") as manager:
+        first = manager.submit(artifact)
+        second = manager.submit(copy)
+        uploader.release.set()
+
+        assert first is second
+        assert first.result(timeout=5) == "upload-1"
+        assert manager.submit(copy).upload_id == "upload-1"
+
+    assert len(uploader.calls) == 1
+    assert manager.stats.deduplicated == 2
+
+
+def test_manager_deduplicates_across_runs(tmp_path, artifact, uploader):
+    with UploadManager(uploader, tmp_path / "journal") as manager:
+        manager.submit(artifact).result(timeout=5)
+
+    with UploadManager(uploader, tmp_path / "journal") as manager:
+        upload = manager.submit(artifact)
+
+    assert upload.done()
+    assert upload.result() == "upload-1"
+    assert len(uploader.calls) == 1
+
+
+def test_manager_resumes_interrupted(tmp_path, artifact, uploader):
+    changed = tmp_path / "changed.charm"
+    changed.write_text("before")
+    journal = UploadJournal(tmp_path / "journal")
+    for path in (artifact, changed):
+        journal.record(
+            Mock(
+                digest=file_digest(path),
+                path=path,
+                size=path.stat().st_size,
+                state=UploadState.UPLOADING,
+                upload_id=None,
+            )
+        )
+    journal.close()
+    changed.write_text("after")
+
+    with UploadManager(uploader, tmp_path / "journal") as manager:
+        (upload,) = manager.uploads()
+
+        assert upload.path == artifact
+        assert upload.result(timeout=5) == "upload-1"
+
+    assert manager.stats.resumed == 1
+    assert uploader.calls == [artifact]
+
+
+def test_manager_failed_upload(tmp_path, artifact, uploader):
+    uploader.error = errors.CraftStoreError("broken")
+
+    with UploadManager(uploader, tmp_path / "journal") as manager:
+        upload = manager.submit(artifact)
+        with pytest.raises(errors.CraftStoreError):
+            upload.result(timeout=5)
+
+        assert upload.state == UploadState.FAILED
+        uploader.error = None
+        assert manager.submit(artifact).result(timeout=5) == "upload-2"
+
+    assert manager.stats.failed == 1
+
+
+def test_manager_close_without_wait(tmp_path, uploader):
+    uploader.release.clear()
+    paths = []
+    for index in range(2):
+        paths.append(tmp_path / f"artifact-{index}")
+        paths[-1].write_text(str(index))
+    manager = UploadManager(uploader, tmp_path / "journal", workers=1)
+    running, queued = [manager.submit(path) for path in paths]
+
+    manager.close(wait=False)
+    uploader.release.set()
+
+    with pytest.raises(errors.CraftStoreError):
+        queued.result(timeout=5)
+    running.result(timeout=5)
+    entries = UploadJournal(tmp_path / "journal").entries
+    assert entries[queued.digest]["state"] == "queued"
+
+
+def test_manager_submit_many(tmp_path, artifact, uploader):
+    copy = tmp_path / "copy.charm"
+    copy.write_bytes(artifact.read_bytes())
+    other = tmp_path / "other.charm"
+    other.write_text("other")
+
+    with UploadManager(uploader, tmp_path / "journal") as manager:
+        uploads = manager.submit_many([artifact, other, copy], max_workers=2)
+
+        assert uploads[0] is uploads[2]
+        assert [upload.digest for upload in uploads[:2]] == [
+            file_digest(artifact),
+            file_digest(other),
+        ]
+        for upload in uploads:
+            upload.result(timeout=5)
+
+    assert len(uploader.calls) == 2
+
+
+def test_manager_invalid_workers(tmp_path, uploader):
+    with pytest.raises(ValueError):
+        UploadManager(uploader, tmp_path / "journal", workers=0)
+
+
+class StorageServer(http.server.ThreadingHTTPServer):
+    """Storage API receiving multipart uploads."""
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), StorageHandler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.received = []
+        self.successful = True
+
+
+class StorageHandler(http.server.BaseHTTPRequestHandler):
+    server: StorageServer
+
+    def log_message(self, *args):  # pylint: disable=W0221
+        pass
+
+    def do_POST(self):  # noqa: N802
+        length = int(self.headers["Content-Length"])
+        fields = _parse_multipart(self.headers["Content-Type"], self.rfile.read(length))
+        self.server.received.append((self.path, dict(self.headers), fields))
+        body = json.dumps(
+            {"successful": self.server.successful, "upload_id": "upload-id"}
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def storage_server():
+    server = StorageServer()
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _store_client(storage_base_url=None):
+    return StoreClient(
+        base_url="https://fake-server.com",
+        storage_base_url=storage_base_url,
+        endpoints=endpoints.CHARMHUB,
+        application_name="testcraft",
+        user_agent="craft-store unit tests, should not be hitting a real server",
+    )
+
+
+def test_store_client_upload_file(storage_server, artifact):
+    client = _store_client(storage_server.url)
+    client._set_static_header("Authorization", "Macaroon secret")
+    progress = []
+
+    assert client.upload_file(artifact, progress=progress.append) == "upload-id"
+
+    ((path, headers, fields),) = storage_server.received
+    assert path == "/unscanned-upload/"
+    assert "Authorization" not in headers
+    assert fields == {"binary": artifact.read_bytes()}
+    assert progress[-1] == artifact.stat().st_size
+
+
+def test_store_client_upload_file_hasher(storage_server, artifact):
+    hasher = StreamHasher(artifact)
+
+    _store_client(storage_server.url).upload_file(artifact, hasher=hasher)
+
+    # the artifact was hashed while sent, nothing is left to read.
+    assert hasher._hashed == artifact.stat().st_size
+    assert hasher.digests() == hash_file(artifact)
+
+
+def test_store_client_upload_file_unsuccessful(storage_server, artifact):
+    storage_server.successful = False
+
+    with pytest.raises(errors.CraftStoreError):
+        _store_client(storage_server.url).upload_file(artifact)
+
+
+def test_store_client_upload_file_no_storage(artifact):
+    with pytest.raises(ValueError):
+        _store_client().upload_file(artifact)
+
+
+def test_store_client_upload_manager(storage_server, artifact, tmp_path):
+    client = _store_client(storage_server.url)
+
+    with client.upload_manager(tmp_path / "journal", workers=2) as manager:
+        assert manager.submit(artifact).result(timeout=5) == "upload-id"